@@ -12,6 +12,8 @@ from PySide6.QtCore import Slot
 from src.View.AddOnOptions import *
 from src.View.InputDialogs import *
 from src.Controller.PathHandler import data_path
+from src.Model.LineFillConfiguration import get_line_fill_configuration, \
+    refresh_line_fill_configuration
 
 
 # Create the Add-On Options class based on the UI from the file in
@@ -23,25 +25,12 @@ class AddOnOptions(QtWidgets.QMainWindow, UIAddOnOptions):
     def __init__(self, window):  # initialization function
         super(AddOnOptions, self).__init__()
         # read configuration file for line and fill options
-        with open(data_path("line&fill_configuration"), "r") \
-                as stream:
-            elements = stream.readlines()
-            # if file is not empty, each line represents the last saved
-            # configuration in the given order
-            if len(elements) > 0:
-                roi_line = int(elements[0].replace("\n", ""))
-                roi_opacity = int(elements[1].replace("\n", ""))
-                iso_line = int(elements[2].replace("\n", ""))
-                iso_opacity = int(elements[3].replace("\n", ""))
-                line_width = float(elements[4].replace("\n", ""))
-            else:  # if file is empty for some reason, use the default
-                # measures below
-                roi_line = 1
-                roi_opacity = 10
-                iso_line = 2
-                iso_opacity = 5
-                line_width = 2.0
-            stream.close()
+        line_fill_configuration = get_line_fill_configuration()
+        roi_line = line_fill_configuration["roi_line"]
+        roi_opacity = line_fill_configuration["roi_opacity"]
+        iso_line = line_fill_configuration["iso_line"]
+        iso_opacity = line_fill_configuration["iso_opacity"]
+        line_width = line_fill_configuration["line_width"]
 
         with open(data_path("draw_roi_configuration"), "r") as draw_roi_cfg_file:
             options = draw_roi_cfg_file.read().splitlines()
@@ -433,6 +422,7 @@ class AddOnOptions(QtWidgets.QMainWindow, UIAddOnOptions):
             stream.write(str(self.line_width.currentText()))
             stream.write("\n")
             stream.close()
+        refresh_line_fill_configuration()
 
         with open(data_path("draw_roi_configuration"), "w") as stream:
             stream.write(str(self.alpha_value_slider.value() / 10))
@@ -5,6 +5,7 @@ from PySide6.QtWidgets import QMessageBox
 
 from src.Controller.PathHandler import resource_path
 from src.Model.InitialModel import create_initial_model
+from src.Model.Isodose import clear_isodose_contours
 from src.Model.MovingDictContainer import MovingDictContainer
 from src.Model.MovingModel import read_images_for_fusion
 from src.Model.PatientDictContainer import PatientDictContainer
@@ -243,6 +244,8 @@ class MainWindow(QtWidgets.QMainWindow, UIMainWindow):
 
     def cleanup(self):
         patient_dict_container = PatientDictContainer()
+        # Stop the isodoses of the patient being calculated in the background
+        clear_isodose_contours(patient_dict_container)
         patient_dict_container.clear()
         # Close 3d vtk widget
         self.three_dimension_view.close()
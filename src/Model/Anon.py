@@ -5,7 +5,10 @@ import logging
 import os
 import pathlib
 import shutil
+import threading
 import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, \
+    as_completed
 
 import pandas as pd
 import pydicom
@@ -174,7 +177,7 @@ def _check_identity_mapping_file_exists(file_name):
     fully qualified path: ``str``
         optionally returned, only if parameter had value "patientHash.csv"
     """
-    print("file name:-- ", file_name)  # printing file name
+    logging.debug("file name: %s", file_name)
 
     if file_name == "patientHash.csv":
         data_folder_path = "/data/csv/"
@@ -182,19 +185,42 @@ def _check_identity_mapping_file_exists(file_name):
         file_path = (
                 cwd + data_folder_path + file_name
         )  # concatenating the current working directory with the csv filename
-        print("Full path :  ===========",
-              file_path)  # print the full csv file path
-        print(
-            "file exist: ", os.path.isfile(file_path)
-        )  # check if the file exist in the folder
-        if os.path.isfile(file_path):  # if file exist return True
-            print("returning true-----------------------")
-            return True, file_path
-        else:
-            print(
-                "returning false----------------------"
-            )  # if file not exist return false
-            return False, file_path
+        file_exists = os.path.isfile(file_path)
+        logging.debug("%s exists: %s", file_path, file_exists)
+        return file_exists, file_path
+
+
+# Rows already in each re-identification spreadsheet, by the path of the
+# spreadsheet, with the size and modification time of the file when they
+# were known. Rows are appended without rereading the spreadsheet unless it
+# was changed elsewhere, and the lock lets patients be anonymised in
+# parallel.
+_reidentification_rows = {}
+_reidentification_lock = threading.Lock()
+
+
+def _read_reidentification_rows(csv_file_path):
+    """Gets the rows of a re-identification spreadsheet, reading the
+    spreadsheet only if it changed since its rows were last known
+
+    Parameters
+    ----------
+    csv_file_path: ``str``
+            The fully qualified path of the spreadsheet
+
+    Returns
+    -------
+    ``set`` of ``tuple`` of ``str``
+        The original and anonymised identifiers of each row
+    """
+    stat = os.stat(csv_file_path)
+    known = _reidentification_rows.get(csv_file_path)
+    if known is not None and known[0] == (stat.st_size, stat.st_mtime_ns):
+        return known[1]
+    with open(csv_file_path, newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader, None)  # header
+        return {tuple(row) for row in reader}
 
 
 def _create_reidentification_spreadsheet(p_name, sha1_p_name, csv_filename):
@@ -212,7 +238,7 @@ def _create_reidentification_spreadsheet(p_name, sha1_p_name, csv_filename):
     csv_filename: ``str``
             The unqualified name of the desired or already available CSV
             file. However, if the file name provided is not patientHash.csv,
-            the file will be overwritten.  If the file name is
+            an error is raised.  If the file name is
             patientHash.csv, then the partially qualified path
             src/data/csv/patientHash.csv relative to the current working
             directory will be utilised.  If the partially qualified path
@@ -222,69 +248,32 @@ def _create_reidentification_spreadsheet(p_name, sha1_p_name, csv_filename):
     -------
 
     """
-    # print("Csv file name is : ",csv_filename)
-    # chcek if the patientHash.csv exist
+    # check if the patientHash.csv exist
     csv_exist, csv_file_path = _check_identity_mapping_file_exists(
         csv_filename)
 
-    csv_header = []
-    csv_header.append("Pname and ID")
-    csv_header.append("Hashed_Pname")
-    print("the headers are:--", csv_header)
-    # if the csv doent exist create a new CSV and export the Hash to that.
-    if not csv_exist:
-        print("-----Creating CSV------")
-
-        # hash_dictionary =  {patient_ID : hash_patient_ID}
-        # print("dictionary values",hash_dictionary)
-
-        row = [p_name, sha1_p_name]
-        sheet = []
-        sheet.append(row)
-        df_identifier_csv = pd.DataFrame(columns=csv_header).round(2)
-
-        print("The CSV dataframe is:::", df_identifier_csv)
-        print("---")
-        print(csv_file_path)
-        df_identifier_csv.to_csv(csv_file_path,
-                                 index=False)  # creating the CVS
-
-        with open(csv_file_path, "a") as csvFile:  # inserting the hash values
-            writer = csv.writer(csvFile)
+    csv_header = ["Pname and ID", "Hashed_Pname"]
+    row = (str(p_name), str(sha1_p_name))
+    with _reidentification_lock:
+        # if the csv doesn't exist create a new CSV and export the Hash to
+        # that, otherwise append the Hash unless it is already there
+        rows = _read_reidentification_rows(csv_file_path) if csv_exist \
+            else set()
+        if row in rows:
+            logging.debug("%s already has the patient", csv_file_path)
+            return
+        with open(csv_file_path, "a" if csv_exist else "w",
+                  newline="") as csv_file:
+            writer = csv.writer(csv_file, lineterminator="\n")
+            if not csv_exist:
+                writer.writerow(csv_header)
             writer.writerow(row)
-            csvFile.close()
-
-        # print("The dataframe",df_identifier_csv)
-        print("---------CSV created-----------")
-        # options()
-
-    else:
-        print("updating csv")
-        row = [p_name, sha1_p_name]
-        rows = {0: row}
-        sheet = pd.DataFrame.from_dict(
-            rows,
-            orient="index",
-            columns=csv_header,
-        )
-
-        # print("intending to update with:")
-        # print(sheet)
-        df_identifier = pd.read_csv(
-            csv_file_path,
-            header=0,
-        )
-        # print("Before updating:")
-        # print(df_identifier)
-        updated_df = pd.concat([df_identifier, sheet], ignore_index=True)
-        # print("after updating:")
-        # print(updated_df)
-
-        updated_df.drop_duplicates(inplace=True)
-        # print("after dropping duplicates")
-        # print(updated_df)
-        updated_df.to_csv(csv_file_path, index=False)
-        print("------CSV updated -----")
+        rows.add(row)
+        stat = os.stat(csv_file_path)
+        _reidentification_rows[csv_file_path] = \
+            ((stat.st_size, stat.st_mtime_ns), rows)
+        logging.debug("%s %s", "Updated" if csv_exist else "Created",
+                      csv_file_path)
 
 
 # ========getting Modality and Instance_number for new dicom file name=========
@@ -680,14 +669,152 @@ def _workaround_hacks_for_pmp_pseudo(ds_input: pydicom.dataset.Dataset):
     pass
 
 
-def anonymize(path, datasets, file_paths, rawdvh):
+def _prepare_pseudonymisation():
+    """Reads or creates the pepper of the hashes and the jitter of the
+    dates used by pseudonymisation, which are cached once created, so
+    datasets pseudonymised in parallel all use the same ones
+    """
+    pseudonymise.pseudonymisation_dispatch["LO"]("")
+    pseudonymise.pseudonymisation_dispatch["DA"]("20000101")
+
+
+def _pseudonymise_dataset(dicom_object_as_dataset,
+                          anonymised_patient_full_path, copy_dataset=True):
+    """Pseudonymises a DICOM object and writes it to the anonymised patient
+    directory
+
+    Parameters
+    ----------
+    dicom_object_as_dataset : ``pydicom.dataset.Dataset``
+        The DICOM object to be pseudonymised
+
+    anonymised_patient_full_path : ``pathlib.Path``
+        The directory the pseudonymised DICOM object is written to
+
+    copy_dataset : ``bool``
+        False to pseudonymise the DICOM object in place, when nothing else
+        uses it, rather than a copy of it
+
+    Returns
+    -------
+    ``str`` | ``pathlib.Path``
+        The full path of the file written
+    """
+    # _workaround_hacks_for_pmp_pseudo(dicom_object_as_dataset)
+    # Leave series description alone for SRs, as OnkoDICOM checks
+    # this tag when determining what is stored in the SR
+    if dicom_object_as_dataset.SOPClassUID.name == "Comprehensive SR Storage":
+        leave_unchanged = ["PatientSex", "PatientWeight",
+                           "PatientSize", "SeriesDescription"]
+    else:
+        # Leave PatientWeight and PatientSize unmodified per @AAM
+        leave_unchanged = ["PatientSex", "PatientWeight",
+                           "PatientSize"]
+
+    ds_pseudo = pmp_anonymise(
+        dicom_object_as_dataset,
+        keywords_to_leave_unchanged=leave_unchanged,
+        copy_dataset=copy_dataset,
+        replacement_strategy=pseudonymise.pseudonymisation_dispatch,
+        identifying_keywords=
+        pseudonymise.get_default_pseudonymisation_keywords(),
+    )
+    if not copy_dataset:
+        ds_pseudo = dicom_object_as_dataset
+    # PatientSex has specific values that are valid.
+    # pseudonymisation doesn't handle that any better than other
+    # anonymisation techniques. above, it's left alone.  But it
+    # could be set to empty or it could be set to O. But
+    # clinically... the gender of the patient can be quite relevant
+    # and if the organ involved or imaged is sex linked or sex
+    # influenced (breast, prostate, ovary), "hiding" the gender in
+    # the metadata may not really prevent re-identification of the
+    # gender/PatientSex
+
+    # Manually specify new name for comprehensive SR files, as
+    # pymedphys cannot handle them.
+    if ds_pseudo.SOPClassUID.name == "Comprehensive SR Storage":
+        ds_pseudo_full_path = \
+            anonymised_patient_full_path.joinpath(
+                ("SR." + ds_pseudo.SOPInstanceUID + ".dcm"))
+    else:
+        ds_pseudo_full_path = create_filename_from_dataset(
+            ds_pseudo, anonymised_patient_full_path)
+    ds_pseudo.save_as(ds_pseudo_full_path)
+    return ds_pseudo_full_path
+
+
+def _pseudonymise_file(file_path, anonymised_patient_full_path):
+    """Reads a DICOM file, pseudonymises it in place and writes it to the
+    anonymised patient directory, so only the files being pseudonymised
+    are held in memory
+
+    Parameters
+    ----------
+    file_path : ``str``
+        The path of the DICOM file
+
+    anonymised_patient_full_path : ``pathlib.Path``
+        The directory the pseudonymised DICOM object is written to
+
+    Returns
+    -------
+    ``str`` | ``pathlib.Path``
+        The full path of the file written
+    """
+    return _pseudonymise_dataset(pydicom.dcmread(file_path, force=True),
+                                 anonymised_patient_full_path,
+                                 copy_dataset=False)
+
+
+def _export_anonymised_csv_data(original_p_id, path, hashed_patient_id,
+                                anonymised_patient_full_path):
+    """Writes the anonymised DVH, Clinical Data and Pyradiomics CSV files of
+    a patient to the CSV directory of the anonymised patient directory
+
+    Parameters
+    ----------
+    original_p_id : ``str``
+        The PatientID as read in from the data for the patient
+    path : ``str`` | ``Path``
+        The top level directory of the patient's data
+    hashed_patient_id : ``str``
+        The anonymised patient ID
+    anonymised_patient_full_path : ``str`` | ``Path``
+        The anonymised patient directory
+    """
+    anonymisation_csv_full_path = pathlib.Path().joinpath(
+        anonymised_patient_full_path, "CSV"
+    )
+    os.makedirs(anonymisation_csv_full_path, exist_ok=True)
+
+    _export_anonymised_dvh_data(
+        original_p_id, path, hashed_patient_id, anonymisation_csv_full_path
+    )
+
+    _export_anonymised_clinical_data(
+        original_p_id, path, hashed_patient_id, anonymisation_csv_full_path
+    )
+
+    _export_anonymised_pyradiomics_data(
+        original_p_id,
+        path,
+        hashed_patient_id,
+        anonymisation_csv_full_path,
+        export_nrrd_files=False,
+        # TODO: ask AAM if he wants the nrrd files themselves copied
+    )
+
+
+def anonymize(path, datasets, file_paths, rawdvh, max_workers=None):
     """
     Create an anonymised copy of an entire patient data set, including
     DICOM files,
     DHV CSV file,
     Clinical Data CSV file,
     Pyradiomics CSV file
-    and place it in a subdirectory of the specified path
+    and place it in a subdirectory of the specified path.
+    The DICOM files are pseudonymised and written in parallel.
 
     Parameters
     ----------
@@ -706,6 +833,10 @@ def anonymize(path, datasets, file_paths, rawdvh):
     rawdvh: ``dict`` with key = ROINumber, value = DVH
         a representation of the Dose Volume Histogram
 
+    max_workers: ``int``
+        Maximum number of threads the DICOM files are pseudonymised and
+        written in. Defaults to the ThreadPoolExecutor default.
+
     Returns
     -------
     Full_Patient_Path_New_folder: ``str``
@@ -717,17 +848,7 @@ def anonymize(path, datasets, file_paths, rawdvh):
     new_dict_dataset = datasets
     first_file_path = next(iter(all_filepaths.values()))
     first_dicom_object = next(iter(new_dict_dataset.values()))
-    print("\n\nCurrent Work Directory is:  ==== ", os.getcwd())
-    print("IN ANON===================")
-    print("\n\n\n=====Path in ANONYMIZation   ===", path)
-    # print("=====Datasets========= in ANONYMIZation   ===",Datasets)
-    print("\n\n\n=====FilePaths in ANONYMIZation   ===")  # ), all_filepaths)
-    for key, filepath in all_filepaths.items():
-        print(key, ":", filepath)
-    # print("The value for CT 0 is : ", new_dict_dataset[0])
-    # for key in Datasets:
-    #     if (key != 'rtplan' and key != 'rtss' and key != 'rtdose'):
-    #         print("Values are:  ",Datasets[key])
+    logging.debug("Anonymising %d files of %s", len(all_filepaths), path)
 
     file_previously_anonymised = _file_previously_anonymised(first_file_path)
 
@@ -769,6 +890,7 @@ def anonymize(path, datasets, file_paths, rawdvh):
     else:
         # not bothering to check if the data itself was already pseudonymised.
         # if it was, just  apply (another round of) pseudonymisation.
+        _prepare_pseudonymisation()
         hashed_patient_id = anon_file_name(pseudonymise.pseudonymisation_dispatch["LO"](
             original_p_id))
         # hashed_patient_name = pseudonymise.pseudonymisation_dispatch[
@@ -788,71 +910,20 @@ def anonymize(path, datasets, file_paths, rawdvh):
         # SQ. identifying_keywords_less_sequences = [ x for x in
         # pseudonymise.get_default_pseudonymisation_keywords() if not
         # x.endswith("Sequence") ]
-        for key, dicom_object_as_dataset in new_dict_dataset.items():
-            # _workaround_hacks_for_pmp_pseudo(dicom_object_as_dataset)
-            # Leave series description alone for SRs, as OnkoDICOM checks
-            # this tag when determining what is stored in the SR
-            if dicom_object_as_dataset.SOPClassUID.name == "Comprehensive SR Storage":
-                leave_unchanged = ["PatientSex", "PatientWeight",
-                                   "PatientSize", "SeriesDescription"]
-            else:
-                # Leave PatientWeight and PatientSize unmodified per @AAM
-                leave_unchanged = ["PatientSex", "PatientWeight",
-                                   "PatientSize"]
-
-            ds_pseudo = pmp_anonymise(
-                dicom_object_as_dataset,
-                keywords_to_leave_unchanged=leave_unchanged,
-                replacement_strategy=pseudonymise.pseudonymisation_dispatch,
-                identifying_keywords=
-                pseudonymise.get_default_pseudonymisation_keywords(),
-            )
-            # PatientSex has specific values that are valid.
-            # pseudonymisation doesn't handle that any better than other
-            # anonymisation techniques. above, it's left alone.  But it
-            # could be set to empty or it could be set to O. But
-            # clinically... the gender of the patient can be quite relevant
-            # and if the organ involved or imaged is sex linked or sex
-            # influenced (breast, prostate, ovary), "hiding" the gender in
-            # the metadata may not really prevent re-identification of the
-            # gender/PatientSex
-
-            # Manually specify new name for comprehensive SR files, as
-            # pymedphys cannot handle them.
-            if ds_pseudo.SOPClassUID.name == "Comprehensive SR Storage":
-                ds_pseudo_full_path = \
-                    anonymised_patient_full_path.joinpath(
-                        ("SR." + ds_pseudo.SOPInstanceUID + ".dcm"))
-            else:
-                ds_pseudo_full_path = create_filename_from_dataset(
-                    ds_pseudo, anonymised_patient_full_path)
-            ds_pseudo.save_as(ds_pseudo_full_path)
+        # The loaded datasets are copied before they are pseudonymised, as
+        # they are still displayed
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for _ in executor.map(_pseudonymise_dataset,
+                                  new_dict_dataset.values(),
+                                  [anonymised_patient_full_path]
+                                  * len(new_dict_dataset)):
+                pass
 
-    print("\n\nThe New patient folder path is : ",
-          anonymised_patient_full_path)
+    logging.debug("The new patient folder path is %s",
+                  anonymised_patient_full_path)
 
-    anonymisation_csv_full_path = pathlib.Path().joinpath(
-        anonymised_patient_full_path, "CSV"
-    )
-    if not os.path.exists(anonymisation_csv_full_path):
-        os.makedirs(anonymisation_csv_full_path)
-
-    _export_anonymised_dvh_data(
-        original_p_id, path, hashed_patient_id, anonymisation_csv_full_path
-    )
-
-    _export_anonymised_clinical_data(
-        original_p_id, path, hashed_patient_id, anonymisation_csv_full_path
-    )
-
-    _export_anonymised_pyradiomics_data(
-        original_p_id,
-        path,
-        hashed_patient_id,
-        anonymisation_csv_full_path,
-        export_nrrd_files=False,
-        # TODO: ask AAM if he wants the nrrd files themselves copied
-    )
+    _export_anonymised_csv_data(original_p_id, path, hashed_patient_id,
+                                anonymised_patient_full_path)
 
     if not file_previously_anonymised:
         csv_filename = "patientHash.csv"
@@ -860,10 +931,144 @@ def anonymize(path, datasets, file_paths, rawdvh):
         # appends if the re-identification spreadsheet is already present
         _create_reidentification_spreadsheet(p_name_id, hashed_patient_id,
                                              csv_filename)
-        print("Updating patient re-identification spreadsheet")
 
     return str(anonymised_patient_full_path)
 
+
+def _anonymise_patient_records(patient_files, destination):
+    """
+    Create the anonymised directory of a patient, anonymise the patient's
+    CSV files into it and add the patient to the re-identification
+    spreadsheet.
+
+    Parameters
+    ----------
+    patient_files: ``list`` of ``str``
+        The DICOM files of the patient
+
+    destination: ``str`` | ``Path``
+        The directory the anonymised patient directory is placed in
+
+    Returns
+    -------
+    ``Path``
+        The fully qualified directory of the patient's anonymised data
+    """
+    first_dicom_object = pydicom.dcmread(
+        patient_files[0], stop_before_pixels=True, force=True)
+    original_p_id = first_dicom_object.PatientID
+    hashed_patient_id = anon_file_name(
+        pseudonymise.pseudonymisation_dispatch["LO"](original_p_id))
+    anonymised_patient_full_path = pathlib.Path(destination) \
+        .joinpath(hashed_patient_id).resolve()
+    os.makedirs(anonymised_patient_full_path, exist_ok=True)
+
+    # The patient's CSV files are in the directory of its files
+    path = os.path.commonpath(
+        [os.path.dirname(file_path) for file_path in patient_files])
+    _export_anonymised_csv_data(original_p_id, path, hashed_patient_id,
+                                anonymised_patient_full_path)
+    if not _file_previously_anonymised(patient_files[0]):
+        p_name_id, _ = _create_reidentification_item(first_dicom_object)
+        _create_reidentification_spreadsheet(p_name_id, hashed_patient_id,
+                                             "patientHash.csv")
+    return anonymised_patient_full_path
+
+
+def anonymize_patients(dicom_structure, destination, interrupt_flag,
+                       progress_callback=None, max_workers=None):
+    """
+    Create anonymised copies of the data sets of every patient in a
+    DICOMStructure, as anonymize does for one patient, placing them in
+    subdirectories of the destination. The DICOM files of all of the
+    patients are read, pseudonymised and written across one pool of
+    processes, a file at a time, and the patients' CSV files are
+    anonymised and the re-identification spreadsheet appended while they
+    are. Progress is reported as each patient's files are done.
+
+    Parameters
+    ----------
+    dicom_structure: ``DICOMStructure``
+        The patients to be anonymised, e.g. from get_dicom_structure
+
+    destination: ``str`` | ``Path``
+        The directory the anonymised patient directories are placed in
+
+    interrupt_flag: ``threading.Event``
+        Tells the function to stop anonymising
+
+    progress_callback: signal
+        Receives the progress as a tuple of a message and a percentage
+
+    max_workers: ``int``
+        Number of processes the DICOM files are pseudonymised and written
+        in. 1 uses a thread of this process, None uses every core.
+
+    Returns
+    -------
+    ``dict`` of {PatientID:``str``, anonymised directory:``str``}
+        The fully qualified directory of each patient's anonymised data, or
+        None if interrupted. Patients and files which could not be
+        anonymised are logged and left out.
+    """
+    # The worker processes read the pepper and jitter this creates
+    _prepare_pseudonymisation()
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    anonymised_patient_paths = {}
+    futures = {}
+    # The number of each patient's files still being anonymised
+    files_remaining = {}
+    # Pseudonymisation is bound by the interpreter, so only processes
+    # pseudonymise files in parallel
+    executor = ProcessPoolExecutor(max_workers=max_workers) \
+        if max_workers > 1 else ThreadPoolExecutor(max_workers=1)
+    try:
+        for patient_id, patient in dicom_structure.patients.items():
+            if interrupt_flag.is_set():
+                return None
+            patient_files = patient.get_files()
+            if not patient_files:
+                continue
+            # A patient which cannot be anonymised is left out of the rest
+            try:
+                anonymised_patient_full_path = _anonymise_patient_records(
+                    patient_files, destination)
+            except Exception as e:
+                logging.error("Unable to anonymise patient %s: %s",
+                              patient_id, e)
+                continue
+            files_remaining[patient_id] = len(patient_files)
+            for file_path in patient_files:
+                futures[executor.submit(_pseudonymise_file, file_path,
+                                        anonymised_patient_full_path)] = \
+                    (patient_id, file_path)
+            anonymised_patient_paths[patient_id] = \
+                str(anonymised_patient_full_path)
+
+        patients_done = 0
+        for future in as_completed(futures):
+            if interrupt_flag.is_set():
+                return None
+            patient_id, file_path = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logging.error("Unable to anonymise %s: %s", file_path, e)
+            files_remaining[patient_id] -= 1
+            if files_remaining[patient_id] == 0:
+                patients_done += 1
+                if progress_callback is not None:
+                    progress_callback.emit(
+                        ("Anonymising patients... (%d/%d)"
+                         % (patients_done, len(files_remaining)),
+                         100 * patients_done // len(files_remaining)))
+    finally:
+        # Files not yet started are not anonymised if interrupted
+        executor.shutdown(wait=False, cancel_futures=True)
+    return anonymised_patient_paths
+
+
 def anon_file_name(hashed_patient_id):
     """
     Validate the Anonymous File Name.
@@ -964,7 +1169,7 @@ def _export_anonymised_pyradiomics_data(
         additional_column_updates=directory_path_replacement,
     )
     if export_nrrd_files:
-        print("copying across the raw nrrd files")
+        logging.debug("copying across the raw nrrd files")
 
         _export_anonymised_nrrd_files(
             current_patient_top_directory,
@@ -973,9 +1178,9 @@ def _export_anonymised_pyradiomics_data(
             anonymised_patient_id,
         )
 
-        print("finished exporting anonymised nrrd files")
+        logging.debug("finished exporting anonymised nrrd files")
     else:
-        print("skipping the raw nrrd files")
+        logging.debug("skipping the raw nrrd files")
     return
 
 
@@ -1105,8 +1310,8 @@ def _export_anonymised_spreadsheet_data(
             spreadsheet_data_original_file_name
         )
     )
-    print(
-        "The full path of the spreadsheet file to check:",
+    logging.debug(
+        "The full path of the spreadsheet file to check: %s",
         original_spreadsheet_data_full_file_path,
     )
 
@@ -1124,11 +1329,10 @@ def _export_anonymised_spreadsheet_data(
         os.makedirs(destination_csv_directory)
 
     if os.path.exists(original_spreadsheet_data_full_file_path):
-        print("Updating the spreadsheet with the anonymised PatientID")
+        logging.debug("Updating the spreadsheet with the anonymised PatientID")
 
         spreadsheet_dataframe = pd.read_csv(
             original_spreadsheet_data_full_file_path)
-        print("The  Dataframe is :::\n\n", spreadsheet_dataframe)
 
         column_name_list = list(spreadsheet_dataframe.columns)
         index_of_patient_id_column = 0
@@ -1147,24 +1351,19 @@ def _export_anonymised_spreadsheet_data(
             pass
 
         P_count = spreadsheet_dataframe[patient_id_column_name].count()
-        print("The count of PatientId is ::::", P_count)
+        logging.debug("The count of PatientId is %d", P_count)
 
-        for i in range(0, P_count):
-            # ClinicalData_DF[]
-            # print(spreadsheet_dataframe.iloc[i, index_of_patient_id_column])
-            # print("Changing the value in dataframe")
-            spreadsheet_dataframe.iloc[
-                i, index_of_patient_id_column
-            ] = anonymised_patient_id
+        spreadsheet_dataframe.iloc[
+            :P_count, index_of_patient_id_column
+        ] = anonymised_patient_id
 
         if additional_column_updates is not None:
             for column_name, update_value in additional_column_updates.items():
                 try:
                     index_of_column = column_name_list.index(column_name)
                     rows = spreadsheet_dataframe[column_name].count()
-                    for i in range(0, rows):
-                        spreadsheet_dataframe.iloc[
-                            i, index_of_column] = update_value
+                    spreadsheet_dataframe.iloc[
+                        :rows, index_of_column] = update_value
                 except ValueError:
                     logging.error(
                         "%s column not found in %s",
@@ -1172,7 +1371,6 @@ def _export_anonymised_spreadsheet_data(
                         original_spreadsheet_data_full_file_path,
                     )
 
-        print("The Dataframe after change is :::\n\n", spreadsheet_dataframe)
         # write out the updated information
         spreadsheet_dataframe.to_csv(anonymised_spreadsheet_full_file_path,
                                      index=False)
@@ -1180,12 +1378,7 @@ def _export_anonymised_spreadsheet_data(
                       spreadsheet_type_name)
 
     else:
-        print(
-            "The current patient dataset did not include a ",
-            spreadsheet_type_name,
-            " data file",
-        )
-        print("No ", spreadsheet_type_name, " file to anonymise")
+        logging.debug("No %s file to anonymise", spreadsheet_type_name)
 
     logging.debug("%s spreadsheet anonymisation finished",
                   spreadsheet_type_name)
@@ -1,19 +1,19 @@
 import datetime
+import hashlib
 import math
-import multiprocessing
 
 import numpy as np
 import pandas as pd
 import pydicom
 
-from copy import deepcopy
+from copy import copy, deepcopy
 from pathlib import Path
 from dicompylercore.dvh import DVH
-from dicompylercore import dvhcalc
 from pydicom.dataset import Dataset, FileMetaDataset, validate_file_meta
 from pydicom.sequence import Sequence
 from pydicom.tag import Tag
 from pydicom.uid import generate_uid, ImplicitVRLittleEndian
+from src.Model import ImageLoading
 from src.Model.PatientDictContainer import PatientDictContainer
 from src import _version
 
@@ -43,65 +43,102 @@ def get_roi_info(ds_rtss):
     return dict_roi
 
 
-def multi_get_dvhs(rtss, dose, roi, queue, dose_limit=None):
+def calc_dvhs(rtss, rtdose, dict_roi, dose_limit=None, interrupt_flag=None,
+              progress_callback=None):
     """
-    Calculation of DVHs of a single roi using MultiProcessing.
+    Calculate dvhs of all rois using a pool of worker processes.
 
     :param rtss: Dataset of RTSS
-    :param dose: Dataset of RTDOSE
-    :param roi: ROINumber
-    :param queue: The queue for multiprocessing tasks
-    :param dose_limit:
+    :param rtdose: Dataset of RTDOSE
+    :param dict_roi: Dictionary of basic information of all ROIs within the
+    patient
+    :param dose_limit: Limit of dose
+    :param interrupt_flag: A threading.Event() object that tells the
+    function to stop calculation
+    :param progress_callback: Signal that receives the progress of the
+    calculation
+    :return: A dictionary of DVH {ROINumber: DVH}
     """
-    dvh = {}
-    # Calculate dvh for the roi under dose_limit
-    dvh[roi] = dvhcalc.get_dvh(rtss, dose, roi, dose_limit)
-    # put the result dvh into the multiprocessing queue
-    queue.put(dvh)
+    return ImageLoading.multi_calc_dvh(rtss, rtdose, dict_roi, {},
+                                       interrupt_flag, progress_callback,
+                                       dose_limit)
 
 
-def calc_dvhs(rtss, rtdose, dict_roi, dose_limit=None):
+def get_roi_fingerprints(rtss, rtdose):
     """
-    Calculate dvhs of all rois using multiprocesing.
+    Get a fingerprint of the content each ROI's DVH depends on, which is
+    its contour data and the dose it is calculated within.
+
+    :param rtss: Dataset of RTSS
+    :param rtdose: Dataset of RTDOSE
+    :return: A dictionary of fingerprints {ROINumber: hex digest}
+    """
+    dose_uid = str(rtdose.get("SOPInstanceUID", "")).encode()
+    fingerprints = {}
+    for roi_contour in rtss.get("ROIContourSequence", []):
+        fingerprint = hashlib.sha1(dose_uid)
+        for contour in roi_contour.get("ContourSequence", []):
+            contour_data = np.asarray(contour.get("ContourData", []),
+                                      dtype=np.float64)
+            fingerprint.update(contour_data.tobytes())
+            # Separates the contours so points can't move between them
+            fingerprint.update(b"|")
+        fingerprints[roi_contour.ReferencedROINumber] = \
+            fingerprint.hexdigest()
+    return fingerprints
+
+
+def calc_outdated_dvhs(rtss, rtdose, dict_roi, dict_thickness, dict_dvh,
+                       dvh_fingerprints=None, interrupt_flag=None,
+                       progress_callback=None):
+    """
+    Calculate the dvhs of only the rois that are new or have changed since
+    their dvh was calculated, reusing the dvhs of all other rois.
 
     :param rtss: Dataset of RTSS
     :param rtdose: Dataset of RTDOSE
     :param dict_roi: Dictionary of basic information of all ROIs within the
     patient
-    :param dose_limit: Limit of dose
-    :return: A dictionary of DVH {ROINumber: DVH}
+    :param dict_thickness: Dictionary of thicknesses {ROINumber: thickness}
+    :param dict_dvh: Dictionary of previously calculated DVHs
+    {ROINumber: DVH}
+    :param dvh_fingerprints: Fingerprints of the rois when the DVHs in
+    dict_dvh were calculated. If None, the DVHs in dict_dvh are treated as
+    up to date (e.g. when read from the RT Dose)
+    :param interrupt_flag: A threading.Event() object that tells the
+    function to stop calculation
+    :param progress_callback: Signal that receives the progress of the
+    calculation
+    :return: A tuple of the dictionary of DVH {ROINumber: DVH} of all rois
+    and the fingerprints of the rois, or None if interrupted
     """
-    # multiprocessing
-    queue = multiprocessing.Queue()
-    # List of processes
-    processes = []
-
-    # dvh dictionary
-    dict_dvh = {}
-
-    # List of all the rois within current data
-    roi_list = []
-    for key in dict_roi:
-        roi_list.append(key)
-
-    # Allocate tasks and add them into processes list
-    for i in range(len(roi_list)):
-        p = multiprocessing.Process(
-            target=multi_get_dvhs, args=(rtss, rtdose, roi_list[i], queue))
-        processes.append(p)
-        p.start()
-
-    # Get the results of dvh from every processes in the queue
-    # And update the dictionary of dvhs
-    for proc in processes:
-        dvh = queue.get()
-        dict_dvh.update(dvh)
-
-    # join all the prcesses
-    for proc in processes:
-        proc.join()
-
-    return dict_dvh
+    fingerprints = get_roi_fingerprints(rtss, rtdose)
+    if dvh_fingerprints is None:
+        dvh_fingerprints = {roi: fingerprints.get(roi) for roi in dict_dvh}
+
+    outdated_rois = {}
+    for roi in dict_roi:
+        if roi not in dict_dvh \
+                or dvh_fingerprints.get(roi) != fingerprints.get(roi):
+            outdated_rois[roi] = dict_roi[roi]
+
+    new_dvh = ImageLoading.multi_calc_dvh(rtss, rtdose, outdated_rois,
+                                          dict_thickness, interrupt_flag,
+                                          progress_callback)
+    if new_dvh is None:
+        return None
+
+    result = {}
+    for roi in dict_roi:
+        if roi in new_dvh:
+            result[roi] = new_dvh[roi]
+        else:
+            # The DVH may be shared, so a renamed ROI gets a renamed copy
+            result[roi] = dict_dvh[roi]
+            if result[roi].name != dict_roi[roi]['name']:
+                result[roi] = copy(result[roi])
+                result[roi].name = dict_roi[roi]['name']
+    return result, fingerprints
 
 
 def converge_to_zero_dvh(dict_dvh):
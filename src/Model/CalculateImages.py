@@ -1,54 +1,199 @@
+import functools
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
 import cv2
 import numpy as np
 import pydicom
+import SimpleITK as sitk
 from PySide6 import QtCore, QtGui
 
 import src.constants as constant
 
 
-def convert_raw_data(ds, rescaled=True, is_ct=False):
+def convert_raw_data(ds, rescaled=True, is_ct=False, memory_mapped=None):
     """
     Convert the raw pixel data to readable pixel data in every image dataset
+    The slices are written into one preallocated, contiguous 3D volume,
+    and the pixel array of each dataset is replaced with a view of its
+    slice of the volume so the pixel data is only held in memory once.
     :param ds: A dictionary of datasets of all the DICOM files of the patient
     :param rescaled: A boolean to determine if the data has already
     been rescaled
     :param is_ct: Boolean to determine if data is CT for rescaling
-    :return: np_pixels, a list of pixel arrays of all slices of the patient
+    :param memory_mapped: Boolean to determine if the volume is backed by
+    a memory-mapped temporary file. If None, large volumes are memory-mapped
+    :return: np_pixels, a 3D array of the pixels of all slices of the patient
     """
-    non_img_list = ['rtss', 'rtdose', 'rtplan', 'rtimage']
-    np_pixels = []
+    # Do the conversion to every slice (except RTSS, RTDOSE, RTPLAN)
+    keys = get_image_keys(ds)
 
     # Invert pixel colour of MONOCHROME1-style images
     inverted = (ds[0].PhotometricInterpretation == "MONOCHROME1")
 
-    # Do the conversion to every slice (except RTSS, RTDOSE, RTPLAN)
-    for key in ds:
-        if key not in non_img_list:
-            if isinstance(key, str) and key[0:3] == 'sr-':
-                continue
-            else:
-                # dataset of current slice
-                np_tmp = ds[key]
-                np_tmp.convert_pixel_data()
-                if not rescaled:
-                    # Perform the rescale
-                    data_arr = np_tmp._pixel_array
-                    slope, intercept = get_rescale(np_tmp, is_ct)
-                    data_arr = (data_arr * slope + intercept)
-                    # Store the rescaled data
-                    ds[key]._pixel_array = data_arr
-                np_pixels.append(np_tmp._pixel_array)
+    ds[keys[0]].convert_pixel_data()
+    shape = (len(keys),) + ds[keys[0]]._pixel_array.shape
+    dtype = get_volume_dtype([ds[key] for key in keys], rescaled, is_ct)
+    np_pixels = allocate_volume(shape, dtype, memory_mapped)
+
+    for i, key in enumerate(keys):
+        # dataset of current slice
+        np_tmp = ds[key]
+        np_tmp.convert_pixel_data()
+        data_arr = np_tmp._pixel_array
+        if not rescaled:
+            # Perform the rescale
+            slope, intercept = get_rescale(np_tmp, is_ct)
+            data_arr = (data_arr * slope + intercept)
+        np_pixels[i] = data_arr
+
+        # Store the rescaled data. Inverted volumes are not shared with the
+        # datasets, as the datasets keep the uninverted pixels.
+        if not inverted:
+            ds[key]._pixel_array = np_pixels[i]
+        elif not rescaled:
+            ds[key]._pixel_array = data_arr
 
     # Invert the colours based on max value
     if inverted:
         max_val = np.amax(np_pixels)
-        np_pixels_inverted = np.multiply(np_pixels, -1)
-        np_pixels_inverted = np.add(np_pixels_inverted, max_val)
-        return np_pixels_inverted
+        if np.issubdtype(np_pixels.dtype, np.integer) and \
+                int(max_val) - int(np.amin(np_pixels)) > \
+                np.iinfo(np_pixels.dtype).max:
+            np_pixels = np_pixels.astype(np.float32)
+        np.subtract(max_val, np_pixels, out=np_pixels)
 
     return np_pixels
 
 
+def get_image_keys(ds):
+    """
+    Get the keys of the image slices, in the order they are stacked in the
+    volume returned by convert_raw_data.
+    :param ds: A dictionary of datasets of all the DICOM files of the patient
+    :return: List of the keys of the image datasets
+    """
+    non_img_list = ['rtss', 'rtdose', 'rtplan', 'rtimage']
+    return [key for key in ds if key not in non_img_list
+            and not (isinstance(key, str) and key[0:3] == 'sr-')]
+
+
+def get_image_geometry(ds):
+    """
+    Get the geometry of the volume returned by convert_raw_data, in the
+    same way as SimpleITK derives it when reading the image files as a
+    series.
+    :param ds: A dictionary of datasets of all the DICOM files of the patient
+    :return: Tuple of the origin, spacing and direction of the volume in
+    (x, y, z) order, with the direction as a row-major 3x3 matrix
+    """
+    keys = get_image_keys(ds)
+    first, last = ds[keys[0]], ds[keys[-1]]
+    orientation = np.array(first.ImageOrientationPatient, dtype=np.float64)
+    row_direction, column_direction = orientation[:3], orientation[3:]
+    origin = np.array(first.ImagePositionPatient, dtype=np.float64)
+
+    # Like SimpleITK, the slice direction is normal to the first slice and
+    # the spacing is the mean distance between the slices
+    slice_direction = np.cross(row_direction, column_direction)
+    slice_distance = np.linalg.norm(
+        np.array(last.ImagePositionPatient, dtype=np.float64) - origin)
+    if len(keys) > 1 and slice_distance > 0:
+        slice_spacing = slice_distance / (len(keys) - 1)
+    else:
+        slice_spacing = float(first.get("SliceThickness") or 1.0)
+
+    spacing = (float(first.PixelSpacing[1]), float(first.PixelSpacing[0]),
+               slice_spacing)
+    direction = np.column_stack(
+        (row_direction, column_direction, slice_direction))
+    return tuple(origin), spacing, tuple(direction.ravel())
+
+
+def get_sitk_image(ds, np_pixels):
+    """
+    Build a SimpleITK image of the volume returned by convert_raw_data, so
+    the image files do not have to be read and decoded again. The pixel
+    values are the same as reading the files with SimpleITK, with the
+    additional CT rescale intercept removed.
+    :param ds: A dictionary of datasets of all the DICOM files of the patient
+    :param np_pixels: The 3D array returned by convert_raw_data
+    :return: sitk.Image of the volume
+    """
+    if ds[0].Modality == "CT":
+        np_pixels = np.subtract(np_pixels, constant.CT_RESCALE_INTERCEPT,
+                                dtype=np_pixels.dtype)
+    image = sitk.GetImageFromArray(np_pixels)
+    origin, spacing, direction = get_image_geometry(ds)
+    image.SetOrigin(origin)
+    image.SetSpacing(spacing)
+    image.SetDirection(direction)
+    return image
+
+
+def get_volume_dtype(datasets, rescaled=True, is_ct=False):
+    """
+    Get the smallest type a volume can use to hold the given slices.
+    int16 is used when every slice is guaranteed to fit in it once
+    rescaled, otherwise float32 is used.
+    :param datasets: A list of the datasets of all slices, with pixel data
+    already converted for the first slice
+    :param rescaled: A boolean to determine if the data has already
+    been rescaled
+    :param is_ct: Boolean to determine if data is CT for rescaling
+    :return: The numpy dtype of the volume
+    """
+    pixel_dtype = datasets[0]._pixel_array.dtype
+    if not np.issubdtype(pixel_dtype, np.integer):
+        return np.dtype(np.float32)
+    if np.can_cast(pixel_dtype, np.int16) and rescaled:
+        return np.dtype(np.int16)
+
+    int16_info = np.iinfo(np.int16)
+    for dataset in datasets:
+        bits_stored = dataset.get("BitsStored", pixel_dtype.itemsize * 8)
+        if dataset.get("PixelRepresentation", 0) == 1:
+            low, high = -2 ** (bits_stored - 1), 2 ** (bits_stored - 1) - 1
+        else:
+            low, high = 0, 2 ** bits_stored - 1
+
+        if not rescaled:
+            slope, intercept = get_rescale(dataset, is_ct)
+            if slope != int(slope):
+                return np.dtype(np.float32)
+            low, high = sorted((low * slope + intercept,
+                                high * slope + intercept))
+
+        if low < int16_info.min or high > int16_info.max:
+            return np.dtype(np.float32)
+
+    return np.dtype(np.int16)
+
+
+def allocate_volume(shape, dtype, memory_mapped=None):
+    """
+    Preallocate an uninitialised volume.
+    :param shape: Shape of the volume (slices, rows, columns)
+    :param dtype: numpy dtype of the volume
+    :param memory_mapped: Boolean to determine if the volume is backed by
+    a memory-mapped temporary file. If None, volumes larger than
+    VOLUME_MEMORY_MAP_THRESHOLD bytes are memory-mapped
+    :return: numpy array (or memmap) of the given shape and type
+    """
+    if memory_mapped is None:
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        memory_mapped = size > constant.VOLUME_MEMORY_MAP_THRESHOLD
+
+    if memory_mapped:
+        # The temporary file is removed by the OS once the memmap is
+        # garbage collected
+        return np.memmap(tempfile.TemporaryFile(), dtype=dtype, mode='w+',
+                         shape=shape)
+    return np.empty(shape, dtype=dtype)
+
+
 def get_rescale(np_tmp, is_ct):
     """
     For an image, grabs the rescale slope and rescale intercept
@@ -120,40 +265,41 @@ def scaled_pixmap(np_pixels, window, level, width, height,
     The dtype is dependent on the DICOM elements: BitsAllocated and PixelRepresentation.
     dtype could theoretically return any combination of unsigned/signed 1, 8, 16, 32, or 64 bit values.
     Undefined behaviour when np_pixels is any type other than uint16 or int16. '''
-    np_pixels = np_pixels.astype(np.int16)
-    if window != 0 and level != 0:
-        # Transformation applied to each individual pixel to unique
-        # contrast level
-        np_pixels = (np_pixels - level) / window * 255
-    else:
-        max_val = np.amax(np_pixels)
+    np_pixels = as_int16(np_pixels)
+    if window == 0 or level == 0:
+        # Stretch the slice's own range of values over the display range
         min_val = np.amin(np_pixels)
-        np_pixels = (np_pixels - min_val) / (max_val - min_val) * 255
-
-    np_pixels[np_pixels < 0] = 0
-    np_pixels[np_pixels > 255] = 255
-    np_pixels = np_pixels.astype(np.int8)
-
-    # Process heatmap for conversion of the np_pixels to rgb for the purpose
-    # of displaying the PT/CT view in RGB colorspace.
+        max_val = np.amax(np_pixels)
+        window = int(max_val) - int(min_val)
+        level = int(min_val)
 
-    # Convert numpy array data to QImage for PySide6
+    # The windowed slice is written into a buffer which is reused for every
+    # slice of the same shape. This is safe as converting the QImage to a
+    # QPixmap copies the pixels.
     if color == "Heat":
-
-        pixmap = QtGui.QPixmap(convert_pt_to_heatmap(np_pixels))
-
+        # Process heatmap for conversion of the np_pixels to rgb for the
+        # purpose of displaying the PT/CT view in RGB colorspace.
+        rgb = get_slice_buffer(np_pixels.shape + (3,))
+        np.take(get_heatmap_lut(window, level), np_pixels.view(np.uint16),
+                axis=0, out=rgb, mode='clip')
+        qimage = QtGui.QImage(
+            rgb,
+            rgb.shape[1],
+            rgb.shape[0],
+            rgb.shape[1] * 3,
+            QtGui.QImage.Format_RGB888)
     else:
         # Generate a grayscale image and set pixmap to the image
-        bytes_per_line = np_pixels.shape[1]
-
+        gray = apply_windowing(np_pixels, window, level,
+                               out=get_slice_buffer(np_pixels.shape))
         qimage = QtGui.QImage(
-            np_pixels,
-            np_pixels.shape[1],
-            np_pixels.shape[0],
-            bytes_per_line,
+            gray,
+            gray.shape[1],
+            gray.shape[0],
+            gray.shape[1],
             QtGui.QImage.Format_Indexed8)
 
-        pixmap = QtGui.QPixmap(qimage)
+    pixmap = QtGui.QPixmap(qimage)
 
     if fusion:
         width = constant.DEFAULT_WINDOW_SIZE
@@ -165,6 +311,89 @@ def scaled_pixmap(np_pixels, window, level, width, height,
     return pixmap
 
 
+def as_int16(np_pixels):
+    """
+    Converts pixels to int16 unless they already are, as the windowing
+    lookup tables are indexed by int16 values.
+    :param np_pixels: numpy array of pixels
+    :return: int16 numpy array of the pixels
+    """
+    np_pixels = np.asarray(np_pixels)
+    if np_pixels.dtype != np.int16:
+        np_pixels = np_pixels.astype(np.int16)
+    return np_pixels
+
+
+@functools.lru_cache(maxsize=constant.WINDOWING_LUT_CACHE_SIZE)
+def get_windowing_lut(window, level):
+    """
+    Get the lookup table mapping every int16 pixel value to its windowed
+    display value. The table is indexed by the int16 value reinterpreted
+    as a uint16, so it can be applied with np.take.
+    :param window: Window width of windowing function
+    :param level: Level value of windowing function
+    :return: read-only uint8 numpy array of 65536 entries
+    """
+    values = np.arange(65536, dtype=np.uint16).view(np.int16)
+    # Transformation applied to each individual pixel to unique
+    # contrast level
+    lut = (values - level) / window * 255
+    np.clip(lut, 0, 255, out=lut)
+    lut = lut.astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
+
+@functools.lru_cache(maxsize=constant.WINDOWING_LUT_CACHE_SIZE)
+def get_heatmap_lut(window, level):
+    """
+    Get the lookup table mapping every int16 pixel value straight to its
+    windowed RGB heat map colour. Equivalent to windowing the pixels and
+    then applying convert_pt_to_heatmap.
+    :param window: Window width of windowing function
+    :param level: Level value of windowing function
+    :return: read-only uint8 numpy array of shape (65536, 3)
+    """
+    gray = np.arange(256, dtype=np.uint8).reshape((1, 256))
+    heat = cv2.applyColorMap(gray, cv2.COLORMAP_HOT)
+    heat = cv2.cvtColor(heat, cv2.COLOR_BGR2RGB)[0]
+    lut = heat[get_windowing_lut(window, level)]
+    lut.flags.writeable = False
+    return lut
+
+
+def apply_windowing(np_pixels, window, level, out=None):
+    """
+    Window a slice, or a whole volume, with a single lookup.
+    :param np_pixels: numpy array of pixels of any shape
+    :param window: Window width of windowing function
+    :param level: Level value of windowing function
+    :param out: Optional uint8 array of the same shape to write into
+    :return: uint8 numpy array of the windowed pixels
+    """
+    np_pixels = as_int16(np_pixels)
+    return np.take(get_windowing_lut(window, level),
+                   np_pixels.view(np.uint16), out=out, mode='clip')
+
+
+_slice_buffers = threading.local()
+
+
+def get_slice_buffer(shape):
+    """
+    Get a uint8 buffer of the given shape which is reused by every call
+    from the same thread.
+    :param shape: Shape of the buffer
+    :return: uninitialised uint8 numpy array
+    """
+    buffers = getattr(_slice_buffers, "buffers", None)
+    if buffers is None:
+        buffers = _slice_buffers.buffers = {}
+    if shape not in buffers:
+        buffers[shape] = np.empty(shape, dtype=np.uint8)
+    return buffers[shape]
+
+
 def convert_pt_to_heatmap(np_pixels):
     """
     Converts the grayscale of the pixel array associated with the PET images
@@ -200,6 +429,8 @@ def get_pixmaps(pixel_array, window, level, pixmap_aspect,
                 fusion=False, color=None):
     """
     Get a dictionary of pixmaps.
+    The pixmaps are rendered lazily: each view is a SlicePixmaps mapping
+    which only renders a slice the first time it is requested.
 
     :param pixel_array: A list of converted pixel arrays
     :param window: Window width of windowing function
@@ -210,12 +441,11 @@ def get_pixmaps(pixel_array, window, level, pixmap_aspect,
     :return: dict_pixmaps, a dictionary of all pixmaps within the patient.
     """
     # Convert pixel array to numpy 3d array
-    pixel_array_3d = np.array(pixel_array)
+    pixel_array_3d = np.asarray(pixel_array)
 
-    # Pixmaps dictionaries of 3 views
-    dict_pixmaps_axial = {}
-    dict_pixmaps_coronal = {}
-    dict_pixmaps_sagittal = {}
+    # One cache is shared by the 3 views, and by any views later
+    # created from them with a different window and level
+    cache = SliceLRUCache()
 
     axial_width, axial_height = scaled_size(
         pixel_array_3d.shape[1] * pixmap_aspect["axial"],
@@ -228,39 +458,191 @@ def get_pixmaps(pixel_array, window, level, pixmap_aspect,
         pixel_array_3d.shape[2] * pixmap_aspect["sagittal"],
         pixel_array_3d.shape[0])
 
-    for i in range(pixel_array_3d.shape[0]):
-        dict_pixmaps_axial[i] = scaled_pixmap(
-            pixel_array_3d[i, :, :],
-            window,
-            level,
-            axial_width,
-            axial_height,
-            fusion,
-            color)
-
-    for i in range(pixel_array_3d.shape[1]):
-        dict_pixmaps_coronal[i] = scaled_pixmap(
-            pixel_array_3d[:, i, :],
-            window,
-            level,
-            coronal_width,
-            coronal_height,
-            fusion,
-            color)
-
-    for i in range(pixel_array_3d.shape[2]):
-        dict_pixmaps_sagittal[i] = scaled_pixmap(
-            pixel_array_3d[:, :, i],
-            window,
-            level,
-            sagittal_width,
-            sagittal_height,
-            fusion,
-            color)
+    dict_pixmaps_axial = SlicePixmaps(
+        pixel_array_3d, "axial", window, level, axial_width, axial_height,
+        cache, fusion, color)
+    dict_pixmaps_coronal = SlicePixmaps(
+        pixel_array_3d, "coronal", window, level, coronal_width,
+        coronal_height, cache, fusion, color)
+    dict_pixmaps_sagittal = SlicePixmaps(
+        pixel_array_3d, "sagittal", window, level, sagittal_width,
+        sagittal_height, cache, fusion, color)
 
     return dict_pixmaps_axial, dict_pixmaps_coronal, dict_pixmaps_sagittal
 
 
+def get_windowed_pixmaps(pixmaps, window, level):
+    """
+    Get the pixmaps of the same slices with a new window and level.
+    No slices are rendered until they are requested.
+
+    :param pixmaps: A tuple of the axial, coronal and sagittal
+        SlicePixmaps returned by get_pixmaps
+    :param window: Window width of windowing function
+    :param level: Level value of windowing function
+    :return: A tuple of the axial, coronal and sagittal SlicePixmaps
+    """
+    return tuple(view_pixmaps.windowed(window, level)
+                 for view_pixmaps in pixmaps)
+
+
+class SliceLRUCache:
+    """
+    A bounded, least recently used cache of what is rendered for slices,
+    such as pixmaps or ROI polygons. Pixmaps are keyed by (view, slice
+    index, window, level) so a cache can be shared between the views of a
+    volume and between windowing values.
+    """
+
+    def __init__(self, max_size=constant.PIXMAP_CACHE_SIZE):
+        """
+        :param max_size: Maximum number of values kept in the cache
+        """
+        self.max_size = max_size
+        self.values = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :param key: A tuple identifying the slice, such as (view, slice
+            index, window, level)
+        :return: The cached value, or None if it is not cached
+        """
+        with self.lock:
+            value = self.values.get(key)
+            if value is not None:
+                self.values.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """
+        Adds a value to the cache, evicting the least recently used values
+        if the cache is full.
+        :param key: A tuple identifying the slice, such as (view, slice
+            index, window, level)
+        :param value: The rendered value, such as a QPixmap
+        """
+        with self.lock:
+            self.values[key] = value
+            self.values.move_to_end(key)
+            while len(self.values) > self.max_size:
+                self.values.popitem(last=False)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.values
+
+    def __len__(self):
+        with self.lock:
+            return len(self.values)
+
+    def clear(self):
+        """
+        Removes all values from the cache.
+        """
+        with self.lock:
+            self.values.clear()
+
+
+class SlicePixmaps(Mapping):
+    """
+    A read-only mapping of slice index to QPixmap for one view of a
+    volume. Behaves like the dictionary of pixmaps previously generated
+    for every slice, but only renders a slice when it is requested and
+    keeps rendered slices in a SliceLRUCache.
+    """
+
+    def __init__(self, pixel_array_3d, view, window, level, width, height,
+                 cache, fusion=False, color=None):
+        """
+        :param pixel_array_3d: 3D numpy array of the volume
+        :param view: "axial", "coronal" or "sagittal"
+        :param window: Window width of windowing function
+        :param level: Level value of windowing function
+        :param width: Pixel width of the rendered pixmaps
+        :param height: Pixel height of the rendered pixmaps
+        :param cache: The SliceLRUCache to store rendered pixmaps in
+        :param fusion: Boolean to set scaling for overlayed images
+        :param color: String for conversion of pixels to specified color map
+        """
+        self.pixel_array_3d = pixel_array_3d
+        self.view = view
+        self.window = window
+        self.level = level
+        self.width = width
+        self.height = height
+        self.cache = cache
+        self.fusion = fusion
+        self.color = color
+        self.axis = {"axial": 0, "coronal": 1, "sagittal": 2}[view]
+
+    def __getitem__(self, index):
+        if not isinstance(index, (int, np.integer)) \
+                or not 0 <= index < len(self):
+            raise KeyError(index)
+        key = (self.view, int(index), self.window, self.level)
+        pixmap = self.cache.get(key)
+        if pixmap is None:
+            pixmap = self.render_slice(index)
+            self.cache.put(key, pixmap)
+        return pixmap
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def __len__(self):
+        return self.pixel_array_3d.shape[self.axis]
+
+    def get_slice(self, index):
+        """
+        :param index: Index of the slice in this view
+        :return: 2D numpy array of the slice
+        """
+        slice_index = [slice(None)] * 3
+        slice_index[self.axis] = index
+        return self.pixel_array_3d[tuple(slice_index)]
+
+    def render_slice(self, index):
+        """
+        :param index: Index of the slice in this view
+        :return: The slice rendered to a QPixmap
+        """
+        return scaled_pixmap(self.get_slice(index), self.window, self.level,
+                             self.width, self.height, self.fusion,
+                             self.color)
+
+    def is_cached(self, index):
+        """
+        :param index: Index of the slice in this view
+        :return: True if the slice has already been rendered
+        """
+        return (self.view, index, self.window, self.level) in self.cache
+
+    def prefetch(self, index, radius=constant.PIXMAP_PREFETCH_RADIUS):
+        """
+        Renders the slices around the given index so they are ready when
+        the user scrolls to them.
+        :param index: Index of the displayed slice
+        :param radius: Number of slices to render either side of index
+        """
+        for offset in range(1, radius + 1):
+            for neighbour in (index + offset, index - offset):
+                if 0 <= neighbour < len(self) \
+                        and not self.is_cached(neighbour):
+                    self[neighbour]
+
+    def windowed(self, window, level):
+        """
+        :param window: Window width of windowing function
+        :param level: Level value of windowing function
+        :return: A SlicePixmaps of the same slices and cache with the new
+            window and level
+        """
+        return SlicePixmaps(self.pixel_array_3d, self.view, window, level,
+                            self.width, self.height, self.cache,
+                            self.fusion, self.color)
+
+
 def scaled_size(width, height):
     if width > height:
         height = constant.DEFAULT_WINDOW_SIZE / width * height
@@ -0,0 +1,148 @@
+"""
+Batch contouring of 2D slices at a number of levels, as used to convert
+isodose and SUV levels to ROIs. Produces the contours of calling
+skimage.measure.find_contours for each level, but marching squares only
+runs over the part of a slice where the level can be crossed, which
+shrinks as the level rises, and large batches of slices can be contoured
+in a process pool. The
+points of a contour found within part of a slice are offset back to the
+whole slice, so they agree with skimage's to within floating-point
+rounding rather than exactly.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from skimage import measure
+
+from src.constants import CONTOUR_POOL_MIN_WORK, CONTOUR_POOL_MAX_WORKERS
+
+
+def get_level_bounds(grid, level, bounds):
+    """
+    Gets the bounds of the pixels above a level within the given bounds.
+    :param grid: 2D numpy array.
+    :param level: Value of the level.
+    :param bounds: Tuple of the first row, last row + 1, first column and
+        last column + 1 to search within.
+    :return: Bounds of the pixels above the level, or None if there are
+        none.
+    """
+    row_start, row_stop, column_start, column_stop = bounds
+    above = grid[row_start:row_stop, column_start:column_stop] > level
+    rows = np.flatnonzero(above.any(axis=1))
+    if not rows.size:
+        return None
+    columns = np.flatnonzero(above.any(axis=0))
+    return (row_start + rows[0], row_start + rows[-1] + 1,
+            column_start + columns[0], column_start + columns[-1] + 1)
+
+
+def find_level_contours(grid, levels):
+    """
+    Finds the contours of a slice at a number of levels. marching squares
+    only crosses a level in cells next to a pixel above the level, so each
+    level is contoured within the bounds of those pixels plus a margin of
+    one pixel, and the bounds of the pixels above a level are searched
+    for the pixels above the next higher level.
+    :param grid: 2D numpy array of at least 2x2 values.
+    :param levels: Iterable of levels.
+    :return: Dictionary of level to the list of contours that
+        skimage.measure.find_contours returns for it, to within
+        floating-point rounding.
+    """
+    grid = np.asarray(grid, dtype=np.float64)
+    rows, columns = grid.shape
+    contours = {}
+    bounds = (0, rows, 0, columns)
+    for level in sorted(set(levels)):
+        if bounds is not None:
+            bounds = get_level_bounds(grid, level, bounds)
+        if bounds is None:
+            contours[level] = []
+            continue
+
+        # Add a margin of one pixel, keeping at least 2x2 pixels
+        row_start = max(min(bounds[0] - 1, rows - 2), 0)
+        row_stop = min(max(bounds[1] + 1, row_start + 2), rows)
+        column_start = max(min(bounds[2] - 1, columns - 2), 0)
+        column_stop = min(max(bounds[3] + 1, column_start + 2), columns)
+
+        level_contours = measure.find_contours(
+            grid[row_start:row_stop, column_start:column_stop], level)
+        if row_start or column_start:
+            offset = np.array([row_start, column_start], dtype=np.float64)
+            for contour in level_contours:
+                contour += offset
+        contours[level] = level_contours
+    return contours
+
+
+def get_contour_workers(grids, levels):
+    """
+    Gets the number of processes worth contouring a batch of slices in.
+    Where worker processes are spawned, each imports the application
+    again, so the slices are contoured in this process unless there are at
+    least CONTOUR_POOL_MIN_WORK pixels times levels.
+    :param grids: List of 2D numpy arrays.
+    :param levels: List of the levels to contour each slice at.
+    :return: Number of processes, at most CONTOUR_POOL_MAX_WORKERS.
+    """
+    work = sum(grid.size * len(grid_levels)
+               for grid, grid_levels in zip(grids, levels))
+    if work < CONTOUR_POOL_MIN_WORK:
+        return 1
+    return max(1, min(os.cpu_count() or 1, CONTOUR_POOL_MAX_WORKERS))
+
+
+def find_slice_contours(grids, levels, max_workers=1,
+                        interrupt_flag=None, progress_callback=None,
+                        progress_range=(0, 100), mp_context=None):
+    """
+    Finds the contours of a number of slices at a number of levels each.
+    :param grids: List of 2D numpy arrays.
+    :param levels: List of the levels to contour each slice at.
+    :param max_workers: Number of processes to contour the slices in.
+        1 contours the slices in this process, None chooses the number
+        with get_contour_workers.
+    :param interrupt_flag: A threading.Event() object that tells the
+        function to stop.
+    :param progress_callback: Signal that receives the progress as a
+        tuple of a message and a percentage.
+    :param progress_range: Percentages to report the progress from and to.
+    :param mp_context: Multiprocessing context to start the processes
+        with, or None for the default.
+    :return: List of dictionaries of level to contours, one per slice, or
+        None if interrupted.
+    """
+    if max_workers is None:
+        max_workers = get_contour_workers(grids, levels)
+    start, stop = progress_range
+
+    def report(done):
+        if progress_callback is not None:
+            progress_callback.emit(
+                ("Calculating Boundaries... (%d/%d)" % (done, len(grids)),
+                 start + (stop - start) * done // max(len(grids), 1)))
+
+    slice_contours = []
+    if max_workers == 1 or len(grids) < 2:
+        for grid, grid_levels in zip(grids, levels):
+            if interrupt_flag is not None and interrupt_flag.is_set():
+                return None
+            slice_contours.append(find_level_contours(grid, grid_levels))
+            report(len(slice_contours))
+        return slice_contours
+
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             mp_context=mp_context) as executor:
+        results = executor.map(find_level_contours, grids, levels,
+                               chunksize=max(len(grids) // (4 * max_workers),
+                                             1))
+        for contours in results:
+            if interrupt_flag is not None and interrupt_flag.is_set():
+                executor.shutdown(wait=False, cancel_futures=True)
+                return None
+            slice_contours.append(contours)
+            report(len(slice_contours))
+    return slice_contours
@@ -3,10 +3,9 @@ File to handle the DICOM directory search functionality
 Searches a given directory to extract a Patient>Study>Series>Image structure
 """
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-from pydicom import dcmread
-from pydicom.errors import InvalidDicomError
-
+from src.Model.DICOM.DICOMIndex import DICOMIndex, read_header_record
 from src.Model.DICOM.Structure.DICOMStructure import DICOMStructure
 from src.Model.DICOM.Structure.DICOMPatient import Patient
 from src.Model.DICOM.Structure.DICOMStudy import Study
@@ -14,119 +13,142 @@ from src.Model.DICOM.Structure.DICOMSeries import Series
 from src.Model.DICOM.Structure.DICOMImage import Image
 
 
-def get_dicom_structure(path, interrupt_flag, progress_callback):
+def get_dicom_structure(path, interrupt_flag, progress_callback,
+                        use_index=True, max_workers=None):
     """
     Searches the given directory and creates a
     Patient>Study>Series>Image structure based on the DICOM files in the
     directory and subdirectories.
 
+    Only the header of each file is read (reading stops before the pixel
+    data) and files are read concurrently. When use_index is True, the
+    headers are stored in a persistent index so files which have not
+    changed since the previous search are not read again.
+
     :param path: The root directory to search from.
     :param interrupt_flag: A threading.Event() flag to indicate whether
         or not the process has been interrupted.
     :param progress_callback: A function that receives the progress of
         the current search.
+    :param use_index: Whether to read from and write to the persistent
+        directory index.
+    :param max_workers: Maximum number of threads used to read files.
+        Defaults to the ThreadPoolExecutor default.
     :return: Complete DICOMStructure object with associated DICOM files
     """
+    file_paths = get_file_paths(path, interrupt_flag)
+    if file_paths is None:
+        return None
 
-    dicom_structure = DICOMStructure()
-
-    files_searched = 0
+    index = DICOMIndex(path) if use_index else None
+    if index is not None:
+        index.load()
 
+    dicom_structure = DICOMStructure()
     files_with_no_patient_id = 1
 
-    for root, dirs, files in os.walk(path, topdown=True):
-        files = [f for f in files if not f[0] == '.']
-        dirs[:] = [d for d in dirs if not d[0] == '.']
-        for file in files:
-            if file[0] == '.':
-                break
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Files already in the index are resolved immediately, the rest
+        # are read concurrently. Results are consumed in directory order
+        # so the structure built is the same as a serial search.
+        pending = []
+        for file_path in file_paths:
+            found, record = (False, None) if index is None \
+                else index.lookup(file_path)
+            if found or os.path.basename(file_path) == "DICOMDIR":
+                # Fix to program crashing when encountering DICOMDIR files
+                pending.append((file_path, None, record))
+            else:
+                pending.append((file_path,
+                                executor.submit(read_header_record,
+                                                file_path), None))
+
+        for files_searched, (file_path, future, record) \
+                in enumerate(pending, 1):
             if interrupt_flag.is_set():
-                return
+                executor.shutdown(wait=False, cancel_futures=True)
+                return None
 
-            # The progress is updated first because the total files
-            # represent ALL files inside the selected directory, not
+            if future is not None:
+                record = future.result()
+                if index is not None:
+                    index.update(file_path, record)
+
+            # The progress is updated for every file because the total
+            # files represent ALL files inside the selected directory, not
             # just the DICOM files. Otherwise, most files would be
             # skipped and the progress would be inaccurate.
-            files_searched += 1
             progress_callback.emit(files_searched)
 
-            # Fix to program crashing when encountering DICOMDIR files
-            if file == "DICOMDIR":
+            if record is None:
                 continue
 
-            file_path = root + os.sep + file
-            try:
-                dicom_file = dcmread(file_path)
-            except (InvalidDicomError, FileNotFoundError, PermissionError):
-                pass
-            else:
-                if 'PatientID' in dicom_file:
-                    patient_id = dicom_file.PatientID
-                else:
-                    patient_id = "no_id_" + str(files_with_no_patient_id)
-                    files_with_no_patient_id += 1
-
-                if "SOPInstanceUID" in dicom_file \
-                        and "SOPClassUID" in dicom_file \
-                        and "Modality" in dicom_file:
-                    new_image = Image(file_path,
-                                      dicom_file.SOPInstanceUID,
-                                      dicom_file.SOPClassUID,
-                                      dicom_file.Modality)
-                    if not dicom_structure.has_patient(patient_id):
-                        new_series = Series(dicom_file.SeriesInstanceUID)
-                        new_series.series_description = dicom_file.get(
-                            "SeriesDescription")
-                        new_series.add_referenced_objects(dicom_file)
-                        new_series.add_image(new_image)
-
-                        new_study = Study(dicom_file.StudyInstanceUID)
-                        new_study.study_description = dicom_file.get(
-                            "StudyDescription")
-                        new_study.add_series(new_series)
-
-                        new_patient = Patient(patient_id,
-                                              dicom_file.PatientName)
-                        new_patient.add_study(new_study)
-
-                        dicom_structure.add_patient(new_patient)
-                    else:
-                        existing_patient = dicom_structure.get_patient(
-                            dicom_file.PatientID)
-                        if not existing_patient.has_study(
-                                dicom_file.StudyInstanceUID):
-                            new_series = Series(dicom_file.SeriesInstanceUID)
-                            new_series.series_description = dicom_file.get(
-                                "SeriesDescription")
-                            new_series.add_referenced_objects(dicom_file)
-                            new_series.add_image(new_image)
-
-                            new_study = Study(dicom_file.StudyInstanceUID)
-                            new_study.study_description = dicom_file.get(
-                                "StudyDescription")
-                            new_study.add_series(new_series)
-
-                            existing_patient.add_study(new_study)
-                        else:
-                            existing_study = existing_patient.get_study(
-                                dicom_file.StudyInstanceUID)
-                            if not existing_study.has_series(
-                                    dicom_file.SeriesInstanceUID):
-                                new_series = Series(
-                                    dicom_file.SeriesInstanceUID)
-                                new_series.series_description = dicom_file.get(
-                                    "SeriesDescription")
-                                new_series.add_referenced_objects(dicom_file)
-                                new_series.add_image(new_image)
-
-                                existing_study.add_series(new_series)
-                            else:
-                                existing_series = existing_study.get_series(
-                                    dicom_file.SeriesInstanceUID)
-                                if not existing_series.has_image(
-                                        dicom_file.SOPInstanceUID):
-                                    existing_series.series_description = \
-                                        dicom_file.get("SeriesDescription")
-                                    existing_series.add_image(new_image)
-                                    
+            patient_id = record["PatientID"]
+            if patient_id is None:
+                patient_id = "no_id_" + str(files_with_no_patient_id)
+                files_with_no_patient_id += 1
+
+            if record["SOPInstanceUID"] is not None \
+                    and record["SOPClassUID"] is not None \
+                    and record["Modality"] is not None:
+                add_record(dicom_structure, patient_id, file_path, record)
+
+    if index is not None:
+        index.save()
+
     return dicom_structure
+
+
+def get_file_paths(path, interrupt_flag):
+    """
+    Walks the given directory and lists every non-hidden file in it and
+    its non-hidden subdirectories.
+    :param path: The root directory to search from.
+    :param interrupt_flag: A threading.Event() flag to indicate whether
+        or not the process has been interrupted.
+    :return: List of file paths, or None if the walk was interrupted.
+    """
+    file_paths = []
+    for root, dirs, files in os.walk(path, topdown=True):
+        if interrupt_flag.is_set():
+            return None
+        dirs[:] = [d for d in dirs if not d[0] == '.']
+        file_paths += [root + os.sep + f for f in files if not f[0] == '.']
+    return file_paths
+
+
+def add_record(dicom_structure, patient_id, file_path, record):
+    """
+    Adds an image to the DICOMStructure, creating the patient, study and
+    series it belongs to if they do not exist yet.
+    :param dicom_structure: The DICOMStructure being built.
+    :param patient_id: PatientID of the image.
+    :param file_path: Path of the DICOM file.
+    :param record: Header record of the DICOM file.
+    """
+    new_image = Image(file_path,
+                      record["SOPInstanceUID"],
+                      record["SOPClassUID"],
+                      record["Modality"])
+
+    patient = dicom_structure.get_patient(patient_id)
+    if patient is None:
+        patient = Patient(patient_id, record["PatientName"])
+        dicom_structure.add_patient(patient)
+
+    study = patient.get_study(record["StudyInstanceUID"])
+    if study is None:
+        study = Study(record["StudyInstanceUID"])
+        study.study_description = record["StudyDescription"]
+        patient.add_study(study)
+
+    series = study.get_series(record["SeriesInstanceUID"])
+    if series is None:
+        series = Series(record["SeriesInstanceUID"])
+        series.series_description = record["SeriesDescription"]
+        series.set_referenced_objects(record["ReferencedObjects"])
+        series.add_image(new_image)
+        study.add_series(series)
+    elif not series.has_image(record["SOPInstanceUID"]):
+        series.series_description = record["SeriesDescription"]
+        series.add_image(new_image)
@@ -0,0 +1,162 @@
+"""
+File to handle the persistent index used by the DICOM directory search.
+Stores the header information of every file found under a search root so
+that re-scanning an unchanged directory only needs to stat the files.
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+from pydicom import dcmread
+from pydicom.errors import InvalidDicomError
+
+from src.Model.DICOM.Structure.DICOMSeries import get_referenced_objects
+
+# Bumped whenever the layout of a header record changes so that stale
+# index files are ignored rather than misread.
+INDEX_VERSION = 1
+
+# Header attributes copied into each record of the index.
+HEADER_ATTRIBUTES = ["PatientID", "PatientName", "StudyInstanceUID",
+                     "StudyDescription", "SeriesInstanceUID",
+                     "SeriesDescription", "SOPInstanceUID", "SOPClassUID",
+                     "Modality"]
+
+
+def read_header_record(file_path):
+    """
+    Reads the header of a DICOM file, stopping before the pixel data,
+    and returns the information the directory search needs from it.
+    :param file_path: Path of the file to read.
+    :return: Dictionary of header attributes, or None if the file is not
+        a readable DICOM file.
+    """
+    try:
+        dicom_file = dcmread(file_path, stop_before_pixels=True)
+    except (InvalidDicomError, FileNotFoundError, PermissionError):
+        return None
+
+    record = {}
+    for attribute in HEADER_ATTRIBUTES:
+        value = dicom_file.get(attribute)
+        record[attribute] = None if value is None else str(value)
+
+    record["ReferencedObjects"] = {}
+    if record["SOPInstanceUID"] is not None \
+            and record["SOPClassUID"] is not None \
+            and record["Modality"] is not None:
+        try:
+            record["ReferencedObjects"] = get_referenced_objects(dicom_file)
+        except (AttributeError, IndexError):
+            logging.warning("Could not read referenced objects of %s",
+                            file_path)
+    return record
+
+
+class DICOMIndex:
+    """
+    Persistent index of the DICOM headers found under a search root.
+    Each entry is keyed by file path and stores the file's modification
+    time and size, so an entry is only reused while the file is unchanged.
+    """
+
+    def __init__(self, root_path):
+        """
+        entries: Dictionary of file path to index entry.
+        :param root_path: The root directory the index describes.
+        """
+        self.root_path = os.path.abspath(root_path)
+        self.index_path = self.get_index_path(self.root_path)
+        self.entries = {}
+        self.seen_paths = set()
+
+    @staticmethod
+    def get_index_path(root_path):
+        """
+        :param root_path: The root directory the index describes.
+        :return: Path of the index file inside the hidden directory, or
+            None if the hidden directory has not been set up.
+        """
+        hidden_directory = os.environ.get('USER_ONKODICOM_HIDDEN')
+        if not hidden_directory:
+            return None
+        root_hash = hashlib.sha1(root_path.encode('utf-8')).hexdigest()
+        return Path(hidden_directory).joinpath('DICOMIndex',
+                                               root_hash + '.json')
+
+    def load(self):
+        """
+        Loads the index from disk. A missing, unreadable or outdated index
+        file results in an empty index.
+        """
+        self.entries = {}
+        if self.index_path is None or not self.index_path.is_file():
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            logging.warning("Ignoring unreadable DICOM index %s",
+                            self.index_path)
+            return
+        if index.get("version") == INDEX_VERSION \
+                and index.get("root") == self.root_path:
+            self.entries = index.get("entries", {})
+
+    def save(self):
+        """
+        Writes the entries of all files seen during the current scan to
+        disk. Files that no longer exist are dropped from the index.
+        """
+        if self.index_path is None:
+            return
+        entries = {path: entry for path, entry in self.entries.items()
+                   if path in self.seen_paths}
+        index = {"version": INDEX_VERSION, "root": self.root_path,
+                 "entries": entries}
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.index_path.with_suffix('.tmp')
+            with open(temp_path, 'w', encoding='utf-8') as index_file:
+                json.dump(index, index_file)
+            os.replace(temp_path, self.index_path)
+        except OSError:
+            logging.warning("Could not write DICOM index %s",
+                            self.index_path)
+
+    def lookup(self, file_path):
+        """
+        Gets the header record of a file if the file has not changed
+        since it was indexed.
+        :param file_path: Path of the file to look up.
+        :return: Tuple of (found, record). found is False if the file
+            needs to be read. record is None for non-DICOM files.
+        """
+        self.seen_paths.add(file_path)
+        entry = self.entries.get(file_path)
+        if entry is None:
+            return False, None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False, None
+        if entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            return False, None
+        return True, entry["header"]
+
+    def update(self, file_path, record):
+        """
+        Stores the header record of a file in the index.
+        :param file_path: Path of the file that was read.
+        :param record: Header record returned by read_header_record.
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return
+        self.seen_paths.add(file_path)
+        self.entries[file_path] = {"mtime": stat.st_mtime_ns,
+                                   "size": stat.st_size,
+                                   "header": record}
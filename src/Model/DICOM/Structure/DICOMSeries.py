@@ -28,51 +28,17 @@ class Series:
 
     def add_referenced_objects(self, dicom_file):
         """Adds referenced dicom file objects to Series"""
-        if "FrameOfReferenceUID" in dicom_file:
-            self.frame_of_reference_uid = dicom_file.FrameOfReferenceUID
-        if dicom_file.Modality == "RTSTRUCT":
-            self.add_referenced_image_series(dicom_file)
-        elif dicom_file.Modality == "RTPLAN":
-            self.add_referenced_rtstruct(dicom_file)
-        elif dicom_file.Modality == "RTDOSE":
-            self.add_referenced_rtstruct(dicom_file)
-            self.add_referenced_rtplan(dicom_file)
-        elif dicom_file.Modality == "SR":
-            self.referenced_frame_of_reference_uid = \
-                dicom_file.ReferencedFrameOfReferenceUID
-
-    def add_referenced_image_series(self, dicom_file):
-        """adds referenced images to series """
-        if "ReferencedFrameOfReferenceSequence" in dicom_file:
-            ref_frame = dicom_file.ReferencedFrameOfReferenceSequence
-            if "RTReferencedStudySequence" in ref_frame[0]:
-                ref_study = ref_frame[0].RTReferencedStudySequence[0]
-                if "RTReferencedSeriesSequence" in ref_study:
-                    if "SeriesInstanceUID" in \
-                            ref_study.RTReferencedSeriesSequence[0]:
-                        ref_series = ref_study.RTReferencedSeriesSequence[0]
-                        self.ref_image_series_uid = \
-                            ref_series.SeriesInstanceUID
-        else:
-            self.ref_image_series_uid = ''
-
-    def add_referenced_rtstruct(self, dicom_file):
-        """adds referenced rtstruct to series"""
-        if "ReferencedStructureSetSequence" in dicom_file:
-            self.ref_rtstruct_instance_uid = \
-                dicom_file.ReferencedStructureSetSequence[
-                    0].ReferencedSOPInstanceUID
-        else:
-            self.ref_rtstruct_instance_uid = ''
-
-    def add_referenced_rtplan(self, dicom_file):
-        """adds referenced rtplan to series"""
-        if "ReferencedRTPlanSequence" in dicom_file:
-            self.ref_rtplan_instance_uid = \
-                dicom_file.ReferencedRTPlanSequence[
-                    0].ReferencedSOPInstanceUID
-        else:
-            self.ref_rtplan_instance_uid = ''
+        self.set_referenced_objects(get_referenced_objects(dicom_file))
+
+    def set_referenced_objects(self, referenced_objects):
+        """
+        Sets the referenced objects of the Series from a dictionary
+        created by get_referenced_objects.
+        :param referenced_objects: Dictionary of attribute name to
+            referenced UID.
+        """
+        for attribute, value in referenced_objects.items():
+            setattr(self, attribute, value)
 
     def has_image(self, image_uid):
         """
@@ -136,3 +102,62 @@ class Series:
         widget_item.setFlags(widget_item.flags() | Qt.ItemIsUserCheckable)
         widget_item.setCheckState(0, Qt.Unchecked)
         return widget_item
+
+
+def get_referenced_objects(dicom_file):
+    """
+    Extracts the objects a DICOM file references, keyed by the Series
+    attribute they are stored in. The result only contains plain strings
+    so it can be kept in the directory search index.
+    :param dicom_file: A pydicom dataset (pixel data not required).
+    :return: Dictionary of Series attribute name to referenced UID.
+    """
+    referenced_objects = {}
+    if "FrameOfReferenceUID" in dicom_file:
+        referenced_objects["frame_of_reference_uid"] = \
+            str(dicom_file.FrameOfReferenceUID)
+    if dicom_file.Modality == "RTSTRUCT":
+        referenced_objects.update(get_referenced_image_series(dicom_file))
+    elif dicom_file.Modality == "RTPLAN":
+        referenced_objects.update(get_referenced_rtstruct(dicom_file))
+    elif dicom_file.Modality == "RTDOSE":
+        referenced_objects.update(get_referenced_rtstruct(dicom_file))
+        referenced_objects.update(get_referenced_rtplan(dicom_file))
+    elif dicom_file.Modality == "SR":
+        referenced_objects["referenced_frame_of_reference_uid"] = \
+            str(dicom_file.ReferencedFrameOfReferenceUID)
+    return referenced_objects
+
+
+def get_referenced_image_series(dicom_file):
+    """gets the image series referenced by an rtstruct"""
+    if "ReferencedFrameOfReferenceSequence" in dicom_file:
+        ref_frame = dicom_file.ReferencedFrameOfReferenceSequence
+        if "RTReferencedStudySequence" in ref_frame[0]:
+            ref_study = ref_frame[0].RTReferencedStudySequence[0]
+            if "RTReferencedSeriesSequence" in ref_study:
+                if "SeriesInstanceUID" in \
+                        ref_study.RTReferencedSeriesSequence[0]:
+                    ref_series = ref_study.RTReferencedSeriesSequence[0]
+                    return {"ref_image_series_uid":
+                            str(ref_series.SeriesInstanceUID)}
+        return {}
+    return {"ref_image_series_uid": ''}
+
+
+def get_referenced_rtstruct(dicom_file):
+    """gets the rtstruct referenced by an rtplan or rtdose"""
+    if "ReferencedStructureSetSequence" in dicom_file:
+        return {"ref_rtstruct_instance_uid": str(
+            dicom_file.ReferencedStructureSetSequence[
+                0].ReferencedSOPInstanceUID)}
+    return {"ref_rtstruct_instance_uid": ''}
+
+
+def get_referenced_rtplan(dicom_file):
+    """gets the rtplan referenced by an rtdose"""
+    if "ReferencedRTPlanSequence" in dicom_file:
+        return {"ref_rtplan_instance_uid": str(
+            dicom_file.ReferencedRTPlanSequence[
+                0].ReferencedSOPInstanceUID)}
+    return {"ref_rtplan_instance_uid": ''}
@@ -0,0 +1,216 @@
+"""
+Vectorised DVH calculation. Produces the same cumulative DVH objects as
+dicompylercore.dvhcalc.get_dvh, but parses the datasets once, resamples
+the dose grid once per contour plane for all ROIs and rasterises the
+contours of a plane with a single even-odd scanline pass.
+"""
+import logging
+
+import numpy as np
+from dicompylercore import dicomparser, dvh
+
+
+def get_plane_mask(contours, col_lut, row_lut, x_lut_index=0):
+    """
+    Rasterises the contours of a plane onto the dose grid using the
+    even-odd rule, so contours inside other contours form holes.
+    :param contours: List of contours, each an (N, 2) or (N, 3) array of
+        x, y (and z) coordinates in patient space.
+    :param col_lut: Patient coordinates of the dose grid columns.
+    :param row_lut: Patient coordinates of the dose grid rows.
+    :param x_lut_index: 0 if patient x runs across the columns, 1 if it
+        runs along the rows (decubitus).
+    :return: Boolean mask with one value per dose grid point.
+    """
+    rows, columns = len(row_lut), len(col_lut)
+    col_step = col_lut[1] - col_lut[0] if columns > 1 else 1.0
+    row_step = row_lut[1] - row_lut[0] if rows > 1 else 1.0
+
+    crossing_rows = []
+    crossing_cols = []
+    for contour in contours:
+        contour = np.asarray(contour, dtype=np.float64)
+        if len(contour) < 3:
+            continue
+        # Contour vertices in fractional column and row indices
+        cols = (contour[:, x_lut_index] - col_lut[0]) / col_step
+        rows_f = (contour[:, 1 - x_lut_index] - row_lut[0]) / row_step
+        c1, c2 = cols, np.roll(cols, -1)
+        t1, t2 = rows_f, np.roll(rows_f, -1)
+
+        # Each edge crosses the grid rows r where min(t) <= r < max(t)
+        first = np.clip(np.ceil(np.minimum(t1, t2)), 0, rows).astype(np.intp)
+        last = np.clip(np.ceil(np.maximum(t1, t2)), 0, rows).astype(np.intp)
+        count = last - first
+        if not count.sum():
+            continue
+        edges = np.repeat(np.arange(len(contour)), count)
+        offsets = np.arange(len(edges)) - np.repeat(np.cumsum(count) - count,
+                                                    count)
+        r = first[edges] + offsets
+        c = c1[edges] + (r - t1[edges]) * (c2[edges] - c1[edges]) \
+            / (t2[edges] - t1[edges])
+        crossing_rows.append(r)
+        crossing_cols.append(np.clip(np.floor(c) + 1, 0, columns)
+                             .astype(np.intp))
+
+    if not crossing_rows:
+        return np.zeros((rows, columns), dtype=bool)
+
+    # Every crossing toggles the points to its right, so a point is inside
+    # when an odd number of crossings lie to its left. Only the bounding
+    # box of the crossings can be inside.
+    crossing_rows = np.concatenate(crossing_rows)
+    crossing_cols = np.concatenate(crossing_cols)
+    row_min, row_max = crossing_rows.min(), crossing_rows.max() + 1
+    col_min, col_max = crossing_cols.min(), crossing_cols.max()
+    width = col_max - col_min + 1
+    toggles = np.bincount((crossing_rows - row_min) * width
+                          + crossing_cols - col_min,
+                          minlength=(row_max - row_min) * width)
+    toggles = toggles.reshape((row_max - row_min, width))[:, :-1]
+
+    mask = np.zeros((rows, columns), dtype=bool)
+    mask[row_min:row_max, col_min:col_max] = np.cumsum(toggles, axis=1) & 1
+    return mask
+
+
+class DVHCalculator:
+    """
+    Calculates the DVHs of the ROIs of an RTSS within an RTDOSE. The
+    parsed datasets and the dose binned at every contour plane are kept,
+    so calculating further ROIs only needs to rasterise their contours.
+    """
+
+    def __init__(self, dataset_rtss, dataset_rtdose, dose_limit=None):
+        """
+        :param dataset_rtss: RTSTRUCT DICOM dataset object.
+        :param dataset_rtdose: RTDOSE DICOM dataset object.
+        :param dose_limit: Limit of dose in cGy as the maximum bin of the
+            histograms.
+        """
+        self.rtss = dicomparser.DicomParser(dataset_rtss)
+        self.rtdose = dicomparser.DicomParser(dataset_rtdose)
+        self.structures = self.rtss.GetStructures()
+        self.has_dose = hasattr(self.rtdose, 'pixel_array')
+        self.dose_bins = {}
+
+        if self.has_dose:
+            self.dose_data = self.rtdose.GetDoseData()
+            self.image_data = self.rtdose.GetImageData()
+            col_lut, row_lut = self.dose_data['lut']
+            self.voxel_area = abs(np.mean(np.diff(col_lut))) \
+                * abs(np.mean(np.diff(row_lut)))
+            self.max_dose = int(self.dose_data['dosemax']
+                                * self.dose_data['dosegridscaling'] * 100) + 1
+            if isinstance(dose_limit, int) and dose_limit < self.max_dose:
+                self.max_dose = dose_limit
+
+    def get_dose_bins(self, z):
+        """
+        Gets the histogram bin of every dose grid point at a plane, in the
+        same way as numpy.histogram with one bin per cGy.
+        :param z: Position of the plane in mm.
+        :return: Array of bin indices, with -1 for points outside of the
+            histogram range, or None if the plane is outside the dose grid.
+        """
+        if z not in self.dose_bins:
+            dose_plane = self.rtdose.GetDoseGrid(z)
+            if not dose_plane.size:
+                self.dose_bins[z] = None
+            else:
+                dose = dose_plane * self.dose_data['dosegridscaling'] * 100
+                bins = np.floor(dose).astype(np.intp)
+                # The upper edge of the last bin is inclusive
+                bins[dose == self.max_dose] = self.max_dose - 1
+                bins[(dose < 0) | (dose > self.max_dose)] = -1
+                self.dose_bins[z] = bins
+        return self.dose_bins[z]
+
+    def get_dvh(self, roi, thickness=None):
+        """
+        Calculates the cumulative DVH of an ROI.
+        :param roi: ROI number.
+        :param thickness: Thickness of the ROI, calculated from the
+            contour planes if None.
+        :return: Cumulative dicompylercore.dvh.DVH in Gy.
+        """
+        structure = self.structures[roi]
+        planes = self.rtss.GetStructureCoordinates(roi)
+        if not thickness:
+            thickness = self.rtss.CalculatePlaneThickness(planes)
+
+        counts, volume, notes = self.get_histogram(planes, thickness)
+        if counts.max() > 0:
+            counts = np.trim_zeros(counts * volume / counts.sum(), trim='b')
+        else:
+            counts = np.array([0])
+            notes = 'Empty DVH'
+
+        bins = np.arange(0, 2) if counts.size == 1 \
+            else np.arange(0, counts.size + 1) / 100
+        return dvh.DVH(counts=counts, bins=bins, dvh_type='differential',
+                       dose_units='Gy', notes=notes,
+                       name=structure['name']).cumulative
+
+    def get_histogram(self, planes, thickness):
+        """
+        Calculates the differential histogram of the dose within the
+        contour planes of an ROI.
+        :param planes: Contour planes from DicomParser.GetStructureCoordinates.
+        :param thickness: Thickness of the ROI.
+        :return: Tuple of the histogram, the volume of the ROI in cm^3 and
+            any notes about the calculation.
+        """
+        if not planes or not self.has_dose:
+            return np.array([0]), 0, None
+
+        col_lut, row_lut = self.dose_data['lut']
+        origin_z = self.image_data['position'][2]
+        notes = None
+        roi_bins = []
+        voxels = 0
+        for z, plane in planes.items():
+            contours = [np.asarray(contour['data']) for contour in plane]
+            mask = get_plane_mask(contours, col_lut, row_lut,
+                                  self.dose_data['x_lut_index'])
+            dose_bins = self.get_dose_bins(z)
+            if dose_bins is None:
+                # Count the volume of the contours using the first dose
+                # plane, but leave them out of the histogram
+                logging.warning("Dose plane not found for %s. Using %s to "
+                                "calculate contour volume.", z, origin_z)
+                notes = 'Dose grid does not encompass every contour.' + \
+                    ' Volume calculated for all contours.'
+                voxels += np.count_nonzero(
+                    self.get_dose_bins(origin_z)[mask] >= 0)
+                continue
+            plane_bins = dose_bins[mask]
+            plane_bins = plane_bins[plane_bins >= 0]
+            voxels += plane_bins.size
+            roi_bins.append(plane_bins)
+
+        counts = np.zeros(self.max_dose)
+        if roi_bins:
+            counts += np.bincount(np.concatenate(roi_bins),
+                                  minlength=self.max_dose)
+        volume = voxels * self.voxel_area * thickness / 1000
+        return counts, volume, notes
+
+    def get_dvhs(self, rois, dict_thickness=None, interrupt_flag=None):
+        """
+        Calculates the cumulative DVHs of a number of ROIs.
+        :param rois: Iterable of ROI numbers.
+        :param dict_thickness: Dictionary where the keys are ROI numbers
+            and the values are thicknesses of the ROI.
+        :param interrupt_flag: A threading.Event() object that tells the
+            function to stop calculation.
+        :return: Dictionary of ROI number to DVH, or None if interrupted.
+        """
+        dict_thickness = dict_thickness or {}
+        dict_dvh = {}
+        for roi in rois:
+            dict_dvh[roi] = self.get_dvh(roi, dict_thickness.get(roi))
+            if interrupt_flag is not None and interrupt_flag.is_set():
+                return None
+        return dict_dvh
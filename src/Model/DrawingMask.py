@@ -0,0 +1,247 @@
+"""
+Masks of the pixels drawn in the Draw ROI window. The brush paints and
+erases a disk of pixels by slicing a precomputed stencil of the disk into
+the mask of the slice. The pixels drawn on every slice of the ROI are kept
+as one volume of bits, with the changes to it kept as run-length encoded
+differences of a slice so they can be undone. The contours of the ROI on
+each slice are the concave hull of its pixels, or are traced from its mask
+if DRAWING_CONTOURS_FROM_MASK is set.
+"""
+import collections
+import functools
+import math
+
+import cv2
+import numpy as np
+
+from src.Model.ROI import calculate_concave_hull_of_points
+from src.Model.RegionGrowing import mask_to_pixel_coords
+from src.constants import DRAWING_CONTOURS_FROM_MASK, DRAWING_UNDO_LIMIT
+
+
+@functools.lru_cache(maxsize=32)
+def get_disk_stencil(radius, closed=True):
+    """
+    Gets the pixels within a distance of a centre pixel.
+    :param radius: Distance from the centre in pixels.
+    :param closed: False to leave out the pixels at exactly radius after
+        the centre along either axis, as the brush's bounding square ends
+        before them.
+    :return: Tuple of the offset of the first row and column from the
+        centre, and a read-only 2D boolean numpy array of the disk.
+    """
+    start = -math.floor(radius)
+    stop = math.floor(radius) + 1 if closed else math.ceil(radius)
+    offsets = np.arange(start, max(stop, start))
+    stencil = np.sqrt(offsets[:, None] ** 2 + offsets[None, :] ** 2) \
+        <= radius
+    stencil.setflags(write=False)
+    return start, stencil
+
+
+def get_disk_window(center, radius, shape, bounds=None, closed=True):
+    """
+    Gets the part of a mask a disk covers.
+    :param center: x and y of the centre pixel.
+    :param radius: Distance from the centre in pixels.
+    :param shape: Shape of the mask, rows then columns.
+    :param bounds: Tuple of the minimum x and y, inclusive, and maximum x
+        and y, exclusive, of the pixels the disk may cover, or None.
+    :param closed: As for get_disk_stencil.
+    :return: Tuple of the row slice and column slice of the mask, and the
+        part of the stencil of the disk within them.
+    """
+    offset, stencil = get_disk_stencil(radius, closed)
+    min_x, min_y, max_x, max_y = (0, 0, shape[1], shape[0]) \
+        if bounds is None else bounds
+    center_x, center_y = int(center[0]), int(center[1])
+    row_start = max(center_y + offset, min_y, 0)
+    row_stop = min(center_y + offset + stencil.shape[0], max_y, shape[0])
+    column_start = max(center_x + offset, min_x, 0)
+    column_stop = min(center_x + offset + stencil.shape[1], max_x, shape[1])
+    row_stop = max(row_stop, row_start)
+    column_stop = max(column_stop, column_start)
+    return slice(row_start, row_stop), slice(column_start, column_stop), \
+        stencil[row_start - center_y - offset:row_stop - center_y - offset,
+                column_start - center_x - offset:
+                column_stop - center_x - offset]
+
+
+def encode_runs(mask):
+    """
+    Run-length encodes a mask.
+    :param mask: Boolean numpy array.
+    :return: 1D int32 numpy array of the indices of the flattened mask
+        where each run of True or False starts, after the first run of
+        False.
+    """
+    flat = np.ravel(mask)
+    starts = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    if flat.size and flat[0]:
+        starts = np.concatenate(([0], starts))
+    return starts.astype(np.int32)
+
+
+def decode_runs(runs, shape):
+    """
+    :param runs: Runs from encode_runs.
+    :param shape: Shape of the mask.
+    :return: Boolean numpy array of the mask.
+    """
+    toggles = np.zeros(int(np.prod(shape)), dtype=bool)
+    toggles[runs] = True
+    return np.logical_xor.accumulate(toggles).reshape(shape)
+
+
+def get_mask_contours(mask, alpha=None):
+    """
+    Traces the outlines of the regions of a mask. Gaps of fewer than
+    2 / alpha - 1 pixels, which the concave hull of the pixels spans, are
+    closed first, so the outlines cover the hull to within a few percent
+    of its area.
+    :param mask: 2D boolean numpy array indexed by y then x.
+    :param alpha: The alpha value of the concave hull, or None to close
+        no gaps.
+    :return: List of lists of the x and y of the points of each polygon,
+        counted from 1 as the points of calculate_concave_hull_of_points
+        are.
+    """
+    mask = np.ascontiguousarray(mask, dtype=np.uint8)
+    if alpha:
+        offset, stencil = get_disk_stencil(1 / alpha - 0.5)
+        # A margin so regions at the edge are closed as elsewhere
+        margin = 1 - offset
+        mask = np.ascontiguousarray(cv2.morphologyEx(
+            np.pad(mask, margin), cv2.MORPH_CLOSE,
+            stencil.astype(np.uint8))[margin:-margin, margin:-margin])
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL,
+                                   cv2.CHAIN_APPROX_SIMPLE)
+    # Regions a pixel wide have no area, as they had no concave hull
+    return [(contour.reshape(-1, 2) + 1).tolist() for contour in contours
+            if len(contour) > 2]
+
+
+def get_drawing_contours(mask, alpha):
+    """
+    Gets the polygons saved for the pixels drawn on a slice. These are the
+    concave hull of the pixels, unless DRAWING_CONTOURS_FROM_MASK is set,
+    when they are the faster approximation of get_mask_contours.
+    :param mask: 2D boolean numpy array indexed by y then x, with pixels
+        drawn.
+    :param alpha: The alpha value of the concave hull.
+    :return: List of lists of the x and y of the points of each polygon.
+    """
+    if DRAWING_CONTOURS_FROM_MASK:
+        return get_mask_contours(mask, alpha)
+    return calculate_concave_hull_of_points(mask_to_pixel_coords(mask),
+                                            alpha)
+
+
+class DrawingMask:
+    """
+    The pixels drawn of an ROI on each slice, packed into a volume of
+    bits, and the changes to them which can be undone.
+    """
+
+    def __init__(self, slices, rows, columns, undo_limit=DRAWING_UNDO_LIMIT):
+        """
+        :param slices: Number of slices.
+        :param rows: Number of rows of each slice.
+        :param columns: Number of columns of each slice.
+        :param undo_limit: Number of changes which can be undone.
+        """
+        self.shape = (slices, rows, columns)
+        self.bits = np.zeros((slices, rows, (columns + 7) // 8),
+                             dtype=np.uint8)
+        self.undo_stack = collections.deque(maxlen=undo_limit)
+
+    @property
+    def nbytes(self):
+        """
+        Memory used by the bits and the changes which can be undone.
+        """
+        return self.bits.nbytes + sum(
+            runs.nbytes for change in self.undo_stack for _, runs in change)
+
+    def get_slice(self, index):
+        """
+        :param index: Index of the slice.
+        :return: 2D boolean numpy array of the pixels drawn on the slice,
+            indexed by y then x.
+        """
+        return np.unpackbits(self.bits[index], axis=-1,
+                             count=self.shape[2]).view(bool)
+
+    def set_slice(self, index, mask, new_change=True):
+        """
+        Replaces the pixels drawn on a slice, keeping the change so it can
+        be undone.
+        :param index: Index of the slice.
+        :param mask: 2D boolean numpy array of the pixels drawn on the
+            slice, indexed by y then x.
+        :param new_change: False to undo the change together with the last
+            change, such as the slices of one 3D fill.
+        :return: True if the pixels drawn changed.
+        """
+        bits = np.packbits(mask, axis=-1)
+        changed = bits ^ self.bits[index]
+        if not changed.any():
+            return False
+        runs = encode_runs(
+            np.unpackbits(changed, axis=-1, count=self.shape[2]))
+        if new_change or not self.undo_stack:
+            self.undo_stack.append([])
+        self.undo_stack[-1].append((index, runs))
+        self.bits[index] = bits
+        return True
+
+    def is_drawn(self, index):
+        """
+        :param index: Index of the slice.
+        :return: True if any pixels are drawn on the slice.
+        """
+        return bool(self.bits[index].any())
+
+    def drawn_slices(self):
+        """
+        :return: List of the indices of the slices with pixels drawn on
+            them.
+        """
+        return np.flatnonzero(
+            self.bits.reshape(self.shape[0], -1).any(axis=1)).tolist()
+
+    def get_contours(self, index, alpha):
+        """
+        :param index: Index of a slice with pixels drawn on it.
+        :param alpha: The alpha value of the concave hull.
+        :return: The polygons of the pixels drawn on the slice, from
+            get_drawing_contours.
+        """
+        return get_drawing_contours(self.get_slice(index), alpha)
+
+    def can_undo(self):
+        """
+        :return: True if there are changes which can be undone.
+        """
+        return bool(self.undo_stack)
+
+    def undo(self):
+        """
+        Undoes the last change to the pixels drawn.
+        :return: List of the indices of the slices which changed, empty if
+            there was no change to undo.
+        """
+        if not self.undo_stack:
+            return []
+        change = self.undo_stack.pop()
+        for index, runs in change:
+            self.bits[index] ^= np.packbits(
+                decode_runs(runs, self.shape[1:]), axis=-1)
+        return [index for index, _ in change]
+
+    def clear(self):
+        """
+        Removes the pixels drawn on every slice and the changes to them.
+        """
+        self.bits[:] = 0
+        self.undo_stack.clear()
@@ -1,8 +1,8 @@
-from skimage import measure
 from src.Controller.PathHandler import data_path
 from src.Model import ImageLoading
 from src.Model import ROI
-from src.Model.Isodose import get_dose_grid
+from src.Model.Contouring import find_slice_contours
+from src.Model.Isodose import get_image_dose_volume
 from src.Model.PatientDictContainer import PatientDictContainer
 
 
@@ -90,29 +90,33 @@ class ISO2ROI:
         if not rt_dose_dose:
             return None
 
-        contours = {}
+        # The dose is resampled to every slice once for all isodose levels
+        dose_volume = get_image_dose_volume(patient_dict_container)
+        if dose_volume is None:
+            return {item: [[] for _ in range(slider_min, slider_max)]
+                    for item in isodose_levels}
+
+        # Dose level of each isodose level in dose grid values
+        dose_levels = {}
+        for item in isodose_levels:
+            if isodose_levels[item][0]:
+                dose_levels[item] = isodose_levels[item][1] / \
+                    (rt_plan_dose.DoseGridScaling * 100)
+            else:
+                dose_levels[item] = isodose_levels[item][1] * \
+                    rt_dose_dose / (rt_plan_dose.DoseGridScaling * 10000)
+
+        # Calculate boundaries for every isodose level of all slices, in a
+        # process pool if there are enough of them
+        slice_contours = find_slice_contours(
+            dose_volume[slider_min:slider_max],
+            [list(dose_levels.values())] * (slider_max - slider_min),
+            max_workers=None)
 
+        contours = {}
         for item in isodose_levels:
-            # Calculate boundaries for each isodose level for each slice
-            contours[item] = []
-            for slider_id in range(slider_min, slider_max):
-                contours[item].append([])
-                temp_ds = patient_dict_container.dataset[slider_id]
-                z = temp_ds.ImagePositionPatient[2]
-                grid = get_dose_grid(rt_plan_dose, float(z))
-
-                if not (len(grid) == 0):
-                    if isodose_levels[item][0]:
-                        dose_level = isodose_levels[item][1] / \
-                                     (rt_plan_dose.DoseGridScaling * 100)
-                        contours[item][slider_id] =\
-                            (measure.find_contours(grid, dose_level))
-                    else:
-                        dose_level = isodose_levels[item][1] * \
-                                     rt_dose_dose / \
-                                     (rt_plan_dose.DoseGridScaling * 10000)
-                        contours[item][slider_id] = \
-                            (measure.find_contours(grid, dose_level))
+            contours[item] = [slice_contours[slider_id][dose_levels[item]]
+                              for slider_id in range(slider_min, slider_max)]
 
         # Return list of contours for each isodose level for each slice
         return contours
@@ -155,6 +159,7 @@ class ISO2ROI:
 
             # Calculate isodose ROI for each slice, skip if slice has no
             # contour data
+            roi_list = []
             for i in range(slider_min, slider_max):
                 if not len(contours[item][i]):
                     continue
@@ -189,15 +194,17 @@ class ISO2ROI:
                         single_array[j].append(rcs_pixels[1])
                         single_array[j].append(z_coord)
 
-                # Create the ROI(s)
                 for array in single_array:
-                    rtss = ROI.create_roi(dataset_rtss, item,
-                                          [{'coords': array, 'ds': dataset}],
-                                          "DOSE_REGION")
-
-                    # Save the updated rtss
-                    patient_dict_container.set("dataset_rtss", rtss)
-                    patient_dict_container.set("rois",
-                                               ImageLoading.get_roi_info(rtss))
+                    roi_list.append({'coords': array, 'ds': dataset})
+
+            # Create the ROI with the contours of every slice at once
+            if roi_list:
+                rtss = ROI.create_roi(dataset_rtss, item, roi_list,
+                                      "DOSE_REGION")
+
+                # Save the updated rtss
+                patient_dict_container.set("dataset_rtss", rtss)
+                patient_dict_container.set("rois",
+                                           ImageLoading.get_roi_info(rtss))
 
         progress_callback.emit(("Writing to RT Structure Set", 85))
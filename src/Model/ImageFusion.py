@@ -1,6 +1,5 @@
 from PySide6 import QtCore, QtGui
 
-import json
 import numpy as np
 import SimpleITK as sitk
 import datetime
@@ -10,14 +9,15 @@ import os
 from copy import deepcopy
 from pydicom.tag import Tag
 
-from src.constants import CT_RESCALE_INTERCEPT
-from src.Controller.PathHandler import data_path
+from src.constants import CT_RESCALE_INTERCEPT, DEFAULT_WINDOW_SIZE
+from src.Model import ImageRegistration
+from src.Model.CalculateImages import get_image_keys, SliceLRUCache, \
+    SlicePixmaps
+from src.Model.ImageRegistration import get_parameter_hash, \
+    get_registration_parameters
 
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.MovingDictContainer import MovingDictContainer
-from platipy.imaging.registration.linear import linear_registration
-from platipy.imaging.visualisation.utils import generate_comparison_colormix, \
-    return_slice
 
 
 # Utility Functions
@@ -297,6 +297,10 @@ def write_transform_to_dcm(affine_matrix):
     spatial_registration.InstanceCreationTime = dicom_time
     spatial_registration.Modality = "REG"
     spatial_registration.SeriesDescription = "Image Registration"
+    spatial_registration.ContentLabel = "REGISTRATION"
+    spatial_registration.ContentDescription = \
+        "Registration parameters " + get_parameter_hash(
+            get_registration_parameters())
     spatial_registration.RegistrationSequence = [registration_sequence]
     spatial_registration.SOPClassUID = "1.2.840.10008.5.1.4.1.1.66.1"
     spatial_registration.SOPInstanceUID = \
@@ -324,6 +328,9 @@ def create_fused_model(old_images, new_image):
     patient_dict_container = PatientDictContainer()
     fused_image = register_images(old_images, new_image)
     patient_dict_container.set("fused_images", fused_image)
+    # The arrays and pixmaps of any previous registration are outdated
+    patient_dict_container.set("fused_arrays", None)
+    patient_dict_container.set("fused_pixmap_cache", None)
 
     if fused_image[2]:
         combined_affine = convert_composite_to_affine_transform(
@@ -335,207 +342,174 @@ def create_fused_model(old_images, new_image):
 def get_fused_window(level, window):
     """
     Apply windowing on the fixed and moving (linear-registered) images.
-    
+    The slices are blended and rendered lazily when they are displayed,
+    and rendered slices are kept in a cache shared between windowings.
+
     Args:
         level(int): the level (midpoint) of windowing
         window(any): the window (range) of windowing
-    
+
     Return:
-        color_axial (QtGui.QPixmap): pixmap of the registered image from axial 
-        view
-        color_sagittal (QtGui.QPixmap): pixmap of the registered image from 
+        color_axial (FusedPixmaps): pixmaps of the registered image from
+        axial view
+        color_sagittal (FusedPixmaps): pixmaps of the registered image from
         sagittal view
-        color_coronal (QtGui.QPixmap): pixmap of the registered image from 
+        color_coronal (FusedPixmaps): pixmaps of the registered image from
         coronal view
-        tfm (sitk.CompositeTransform): transformation object containing data 
+        tfm (sitk.CompositeTransform): transformation object containing data
         that is a product from linear_registration
     """
-
     patient_dict_container = PatientDictContainer()
-    old_images = patient_dict_container.get("sitk_original")
     fused_image = patient_dict_container.get("fused_images")
     tfm = fused_image[1]
-    array = sitk.GetArrayFromImage(old_images).shape
-
-    axial_slice_count = array[0]
-    coronal_slice_count = array[1]
-    sagittal_slice_count = array[1]
-
-    sp_plane, _, sp_slice = old_images.GetSpacing()
-    asp = (1.0 * sp_slice) / sp_plane
+    fixed_array, moving_array = get_fused_arrays()
 
-    color_axial = {}
-    color_sagittal = {}
-    color_coronal = {}
+    cache = patient_dict_container.get("fused_pixmap_cache")
+    if cache is None:
+        cache = SliceLRUCache()
+        patient_dict_container.set("fused_pixmap_cache", cache)
 
-    windowing = (int(level - CT_RESCALE_INTERCEPT), int(window))
+    color_axial, color_sagittal, color_coronal = [
+        FusedPixmaps(fixed_array, moving_array, view, window, level, cache)
+        for view in ("axial", "sagittal", "coronal")]
 
-    for i in range(axial_slice_count):
-        color_axial[i] = \
-            get_fused_pixmap(old_images, fused_image[0], asp, i, "axial",
-                             windowing)
+    return color_axial, color_sagittal, color_coronal, tfm
 
-    for i in range(sagittal_slice_count):
-        color_sagittal[i] = \
-            get_fused_pixmap(old_images, fused_image[0], asp, i, "sagittal",
-                             windowing)
 
-    for i in range(coronal_slice_count):
-        color_coronal[i] = \
-            get_fused_pixmap(old_images, fused_image[0], asp, i, "coronal",
-                             windowing)
+def get_fused_arrays():
+    """
+    Gets the fixed and moving (linear-registered) images as numpy arrays.
+    The images are only converted the first time, after which the arrays
+    are kept in the PatientDictContainer.
 
-    return color_axial, color_sagittal, color_coronal, tfm
+    Return:
+        fixed_array (ndarray): 3D array of the fixed image
+        moving_array (ndarray): 3D array of the registered moving image
+    """
+    patient_dict_container = PatientDictContainer()
+    fused_arrays = patient_dict_container.get("fused_arrays")
+    if fused_arrays is None:
+        fixed_image = patient_dict_container.get("sitk_original")
+        moving_image = patient_dict_container.get("fused_images")[0]
+        fused_arrays = (sitk.GetArrayFromImage(fixed_image),
+                        sitk.GetArrayFromImage(moving_image))
+        patient_dict_container.set("fused_arrays", fused_arrays)
+    return fused_arrays
 
 
-# Can be expanded to peform all of platipy's registrations
 def register_images(image_1, image_2):
     """
-    Registers the moving and fixed image.
+    Registers the moving and fixed image. The transform is reused if the
+    same images have been registered with the same parameters before.
     Args:
         image_1 (Image Matrix)
         image_2 (Image Matrix)
     Return:
         img_ct (Array)
         tfm (sitk.CompositeTransform)
+        store_object_into_dcm (bool)
     """
+    patient_dict_container = PatientDictContainer()
+    moving_dict_container = MovingDictContainer()
+    moving_datasets = [moving_dict_container.dataset[key] for key
+                       in get_image_keys(moving_dict_container.dataset)]
 
-    store_object_into_dcm = False
-
-    # Check to see if the imageWindowing.csv file exists
-    if os.path.exists(data_path('imageFusion.json')):
-        # If it exists, read data from file into the dictionary
-        with open(data_path("imageFusion.json"),
-                  "r") as file_input:
-            dict_fusion = json.load(file_input)
-
-        img_ct, tfm = linear_registration(
-            image_1,
-            image_2,
-            reg_method=dict_fusion["reg_method"],
-            metric=dict_fusion["metric"],
-            optimiser=dict_fusion["optimiser"],
-            shrink_factors=dict_fusion["shrink_factors"],
-            smooth_sigmas=dict_fusion["smooth_sigmas"],
-            sampling_rate=dict_fusion["sampling_rate"],
-            final_interp=dict_fusion["final_interp"],
-            number_of_iterations=dict_fusion["number_of_iterations"],
-            default_value=dict_fusion["default_value"],
-            verbose=False
-        )
-
-        # Flag for when a given registration method is rigid.
-        # As DICOM Frame of Reference Transformation Matrix allows
-        # RIGID, RIGID_SCALE or AFFINE
-
-        if dict_fusion["reg_method"] == 'rigid':
-            store_object_into_dcm = True
-    else:
-        # If csv does not exist, initialize registration normally
-        img_ct, tfm = linear_registration(
-            image_1,
-            image_2,
-            shrink_factors=[8],
-            smooth_sigmas=[10],
-            reg_method='rigid',
-            verbose=False
-        )
-        store_object_into_dcm = True
-
-    return img_ct, tfm, store_object_into_dcm
-
-
-def get_fused_pixmap(orig_image, fused_image, aspect,
-                     slice_num, view, windowing=(-250, 500)):
+    return ImageRegistration.register_images(
+        image_1, image_2,
+        patient_dict_container.dataset[0].SeriesInstanceUID,
+        moving_datasets[0].SeriesInstanceUID,
+        [ds.SOPInstanceUID for ds in moving_datasets],
+        os.path.join(patient_dict_container.path, 'transform.dcm'))
+
+
+def fused_pixmap(fixed_slice, moving_slice, windowing):
     """
-    Generates a colored pixmap of the array from the inputted view.
+    Renders the blend of a slice of the fixed and moving images.
     Args:
-        orig_image(ndarray): N dimension array containing signed int8 values
-        fused_image(ndarray): N dimension array containing signed int8 values
-        aspect(Any): currently not used
-        slice_num(int): slice number of the array
-        view(String): specified flag that can be sagittal, coronal or axial
-        windowing: upper and lower bound for windowing
-    windowing: target level and window of the fused image
+        fixed_slice(ndarray): 2D array of the fixed image
+        moving_slice(ndarray): 2D array of the registered moving image
+        windowing: lower bound and width of the windowing
     Returns:
-        pixmap (QtGui.QPixmap): returns the pixmap of co-registered fixed and 
-        moving images.
+        pixmap (QtGui.QPixmap): the blended slice scaled to the window size
     """
-    # Get dimension /could also input dimensions as parameters
-    image_array = sitk.GetArrayFromImage(orig_image)
-    if view == "sagittal":
-        image_slice = return_slice("x", slice_num)
-
-        pixel_array_color = \
-            np.array(generate_comparison_colormix(
-                [orig_image, fused_image],
-                arr_slice=image_slice, window=windowing))
-
-        # resize dimensions to stop image stretch
-        pixel_array_color = np.resize(pixel_array_color, (512, 345, 3))
-
-        # first adjusts rgb (0,1) scale to greyscale (0,255)
-        # then converts type and formats it to color.
-        qimage2 = \
-            QtGui.QImage(((255 * pixel_array_color).astype(np.uint8)),
-                         image_array.shape[1], image_array.shape[0],
-                         QtGui.QImage.Format_RGB888)
-
-        # Then continues to convert to pixmap just like in onko
-        pixmap = QtGui.QPixmap(qimage2)
-
-        pixmap = pixmap.scaled(512,
-                               512,
-                               QtCore.Qt.IgnoreAspectRatio,
-                               QtCore.Qt.SmoothTransformation)
-    elif view == "coronal":
-        image_slice = return_slice("y", slice_num)
-
-        pixel_array_color = np.array(generate_comparison_colormix(
-            [orig_image, fused_image],
-            arr_slice=image_slice, window=windowing))
-
-        # resize dimensions to stop image stretch
-        pixel_array_color = np.resize(pixel_array_color, (512, 345, 3))
-
-        # first adjusts rgb (0,1) scale to greyscale (0,255)
-        # then converts type and formats it to color.
-        qimage2 = QtGui.QImage(((255 * pixel_array_color).astype(np.uint8)),
-                               image_array.shape[1],
-                               image_array.shape[0],
-                               QtGui.QImage.Format_RGB888)
-
-        # Then continues to convert to pixmap just like in onko
-        pixmap = QtGui.QPixmap(qimage2)
-        pixmap = pixmap.scaled(512,
-                               512,
-                               QtCore.Qt.IgnoreAspectRatio,
-                               QtCore.Qt.SmoothTransformation)
-    else:
-        image_slice = return_slice("z", slice_num)
-
-        pixel_array_color = np.array(generate_comparison_colormix(
-            [orig_image, fused_image],
-            arr_slice=image_slice, window=windowing))
-
-        # first adjusts rgb (0,1) scale to greyscale (0,255)
-        # then converts type and formats it to color.
-        qimage = QtGui.QImage(((255 * pixel_array_color).astype(np.uint8)),
-                              image_array.shape[1],
-                              image_array.shape[1],
-                              QtGui.QImage.Format_RGB888)
-
-        # Then continues to convert to pixmap just like in onko
-        pixmap = QtGui.QPixmap(qimage)
-        pixmap = pixmap.scaled(512,
-                               512,
-                               QtCore.Qt.IgnoreAspectRatio,
-                               QtCore.Qt.SmoothTransformation)
-
-    # Generates an rgb color overlaid image,
-    # convert to contiguous array,
-    # and also flip the array if it is a coronal (y) or sagittal (x)
-    return pixmap
+    rgb = np.ascontiguousarray(
+        get_fused_rgb(fixed_slice, moving_slice, windowing))
+    qimage = QtGui.QImage(rgb, rgb.shape[1], rgb.shape[0], rgb.strides[0],
+                          QtGui.QImage.Format_RGB888)
+    return QtGui.QPixmap(qimage).scaled(DEFAULT_WINDOW_SIZE,
+                                        DEFAULT_WINDOW_SIZE,
+                                        QtCore.Qt.IgnoreAspectRatio,
+                                        QtCore.Qt.SmoothTransformation)
+
+
+def get_fused_rgb(fixed_slice, moving_slice, windowing,
+                  color_rotation=0.35):
+    """
+    Blends a slice of the fixed and moving images into an RGB image, in
+    the same way as platipy's generate_comparison_colormix. The hue shows
+    which image is brighter, the saturation how much they differ and the
+    value their mean.
+    Args:
+        fixed_slice(ndarray): 2D array of the fixed image
+        moving_slice(ndarray): 2D array of the registered moving image
+        windowing: lower bound and width of the windowing
+        color_rotation(float): hue where the fixed image is brighter
+    Returns:
+        rgb (ndarray): uint8 array of shape (rows, columns, 3)
+    """
+    lower, width = windowing
+    fixed = (np.clip(fixed_slice, lower, lower + width) - lower) / width
+    moving = (np.clip(moving_slice, lower, lower + width) - lower) / width
+    saturation = np.abs(fixed - moving)
+    value = (fixed + moving) / 2
+
+    rgb = np.empty(fixed.shape + (3,))
+    fixed_brighter = fixed > moving
+    for hue, mask in ((color_rotation, fixed_brighter),
+                      (0.5 + color_rotation, ~fixed_brighter)):
+        sector = np.floor(hue * 6)
+        f = hue * 6 - sector
+        s, v = saturation[mask], value[mask]
+        p = v * (1 - s)
+        q = v * (1 - f * s)
+        t = v * (1 - (1 - f) * s)
+        rgb[mask] = np.stack([(v, t, p), (q, v, p), (p, v, t), (p, q, v),
+                              (t, p, v), (v, p, q)][int(sector) % 6],
+                             axis=-1)
+    return (255 * rgb).astype(np.uint8)
+
+
+class FusedPixmaps(SlicePixmaps):
+    """
+    A read-only mapping of slice index to QPixmap of the blended fixed
+    and moving images for one view. Slices are only blended and rendered
+    when they are requested.
+    """
+
+    def __init__(self, fixed_array, moving_array, view, window, level,
+                 cache):
+        """
+        :param fixed_array: 3D numpy array of the fixed image
+        :param moving_array: 3D numpy array of the registered moving image
+        :param view: "axial", "coronal" or "sagittal"
+        :param window: Window width of windowing function
+        :param level: Level value of windowing function
+        :param cache: The SliceLRUCache to store rendered pixmaps in
+        """
+        super().__init__(fixed_array, view, window, level,
+                         DEFAULT_WINDOW_SIZE, DEFAULT_WINDOW_SIZE, cache)
+        self.moving_array = moving_array
+
+    def render_slice(self, index):
+        slice_index = [slice(None)] * 3
+        slice_index[self.axis] = index
+        windowing = (int(self.level - CT_RESCALE_INTERCEPT), int(self.window))
+        return fused_pixmap(self.get_slice(index),
+                            self.moving_array[tuple(slice_index)], windowing)
+
+    def windowed(self, window, level):
+        return FusedPixmaps(self.pixel_array_3d, self.moving_array,
+                            self.view, window, level, self.cache)
 
 
 def scaled_size(width, height):
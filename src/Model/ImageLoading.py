@@ -21,15 +21,18 @@ durability of the process).
 import collections
 import logging
 import math
+import os
 import re
 
-from multiprocessing import Queue, Process
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 import numpy as np
-from dicompylercore import dvhcalc
 from pydicom import dcmread, DataElement
 from pydicom.errors import InvalidDicomError
 
+from src.constants import DVH_INTERRUPT_POLL_INTERVAL
+from src.Model.DVHCalculator import DVHCalculator
+
 allowed_classes = {
     # CT Image
     "1.2.840.10008.5.1.4.1.1.2": {
@@ -456,61 +459,104 @@ def calc_dvhs(dataset_rtss, dataset_rtdose, rois, dict_thickness,
     :param dose_limit: Limit of dose for DVH calculation.
     :return: Dictionary of all the DVHs of all the ROIs of the patient.
     """
-    dict_dvh = {}
-    roi_list = []
-    for key in rois:
-        roi_list.append(key)
-
-    for roi in roi_list:
-        thickness = None
-        if roi in dict_thickness:
-            thickness = dict_thickness[roi]
-        dict_dvh[roi] = dvhcalc.get_dvh(dataset_rtss, dataset_rtdose, roi,
-                                        dose_limit, thickness=thickness)
-        if interrupt_flag.is_set():  # Stop calculating at the next DVH.
-            return
-
-    return dict_dvh
+    calculator = DVHCalculator(dataset_rtss, dataset_rtdose, dose_limit)
+    # Stops calculating at the next DVH when interrupted.
+    return calculator.get_dvhs(rois, dict_thickness, interrupt_flag)
 
 
-def calc_dvh_worker(rtss, dose, roi, queue, thickness, dose_limit=None):
-    dvh = {}
-    dvh[roi] = \
-        dvhcalc.get_dvh(rtss, dose, roi, dose_limit, thickness=thickness)
-    queue.put(dvh)
+# DVH calculator of a DVH process pool worker, set by init_dvh_worker when
+# the worker process starts.
+_dvh_worker_data = {}
 
 
-def multi_calc_dvh(dataset_rtss, dataset_rtdose, rois, dict_thickness,
-                   dose_limit=None):
+def init_dvh_worker(dataset_rtss, dataset_rtdose, dose_limit=None):
     """
-    Multiprocessing variant of calc_dvh for fork-based platforms.
+    Initializer of the DVH process pool workers. Creates a DVHCalculator
+    in the worker process, so the datasets are only sent to and parsed by
+    each worker once, rather than once per ROI.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :param dose_limit: Limit of dose for DVH calculation.
     """
-    queue = Queue()
-    processes = []
-    dict_dvh = {}
+    _dvh_worker_data["calculator"] = \
+        DVHCalculator(dataset_rtss, dataset_rtdose, dose_limit)
 
-    roi_list = []
-    for key in rois:
-        roi_list.append(key)
 
-    for i in range(len(roi_list)):
-        thickness = None
-        if roi_list[i] in dict_thickness:
-            thickness = dict_thickness[roi_list[i]]
-        p = Process(target=calc_dvh_worker,
-                    args=(dataset_rtss, dataset_rtdose, roi_list[i],
-                          queue, thickness, dose_limit,))
-        processes.append(p)
-        p.start()
-
-    for process in processes:
-        dvh = queue.get()
-        dict_dvh.update(dvh)
+def calc_dvh_worker(roi, thickness):
+    """
+    Calculates the DVH of a single ROI inside a DVH process pool worker.
+    :param roi: ROI number.
+    :param thickness: Thickness of the ROI, or None.
+    :return: Tuple of the ROI number and its DVH.
+    """
+    return roi, _dvh_worker_data["calculator"].get_dvh(roi, thickness)
 
-    for process in processes:
-        process.join()
 
-    return dict_dvh
+def multi_calc_dvh(dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                   interrupt_flag=None, progress_callback=None,
+                   dose_limit=None, max_workers=None,
+                   progress_range=(60, 80)):
+    """
+    Process pool variant of calc_dvhs. The ROIs are shared between a
+    bounded number of worker processes, each of which receives the
+    datasets once when it starts.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :param rois: Dictionary of ROI information.
+    :param dict_thickness: Dictionary where the keys are ROI numbers and
+        the values are thicknesses of the ROI.
+    :param interrupt_flag: A threading.Event() object that tells the
+        function to stop calculation.
+    :param progress_callback: Signal that receives a (message, percent)
+        tuple each time the DVH of an ROI has been calculated.
+    :param dose_limit: Limit of dose for DVH calculation.
+    :param max_workers: Maximum number of worker processes. Defaults to
+        the number of CPUs.
+    :param progress_range: Percentages reported for the first and last
+        DVH.
+    :return: Dictionary of all the DVHs of all the ROIs of the patient, or
+        None if the calculation was interrupted.
+    """
+    roi_list = list(rois)
+    if not roi_list:
+        return {}
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(roi_list)))
+
+    results = {}
+    start, end = progress_range
+    executor = ProcessPoolExecutor(max_workers=max_workers,
+                                   initializer=init_dvh_worker,
+                                   initargs=(dataset_rtss, dataset_rtdose,
+                                             dose_limit))
+    try:
+        pending = {executor.submit(calc_dvh_worker, roi,
+                                   dict_thickness.get(roi))
+                   for roi in roi_list}
+        while pending:
+            done, pending = wait(pending, timeout=DVH_INTERRUPT_POLL_INTERVAL,
+                                 return_when=FIRST_COMPLETED)
+            if interrupt_flag is not None and interrupt_flag.is_set():
+                return None
+            for future in done:
+                roi, dvh = future.result()
+                results[roi] = dvh
+            if done and progress_callback is not None:
+                progress = start + (end - start) * len(results) \
+                    // len(roi_list)
+                progress_callback.emit(
+                    ("Calculating DVHs... (%d/%d)"
+                     % (len(results), len(roi_list)), progress))
+    finally:
+        # Workers still calculating an ROI after an interrupt finish it in
+        # the background, everything not yet started is dropped.
+        executor.shutdown(wait=interrupt_flag is None
+                          or not interrupt_flag.is_set(),
+                          cancel_futures=True)
+
+    return {roi: results[roi] for roi in roi_list}
 
 
 def converge_to_0_dvh(raw_dvh):
@@ -590,6 +636,23 @@ def get_raw_contour_data(dataset_rtss):
 
 
 def calculate_matrix(img_ds):
+    """
+    Calculate the transformation matrix (pixlut) of a DICOM(image) dataset.
+    :param img_ds: DICOM(image) dataset
+    :return: pair of numpy arrays that represents the transformation
+        matrix
+    """
+    return calculate_pixluts([img_ds])[0]
+
+
+def get_pixlut_geometry(img_ds):
+    """
+    Get the values of an image dataset that its pixlut depends on.
+    Slices with the same geometry have identical pixluts.
+    :param img_ds: DICOM(image) dataset
+    :return: tuple of (row spacing, column spacing, Xx, Yy, Sx, Sy,
+        columns, rows)
+    """
     # Physical distance (in mm) between the center of each image pixel,
     # specified by a numeric pair
     # - adjacent row spacing (delimiter) adjacent column spacing.
@@ -603,29 +666,46 @@ def calculate_matrix(img_ds):
     # (center of the first voxel transmitted) of the image, in mm.
     # 3 values: [Sx, Sy, Sz]
     position = img_ds.ImagePositionPatient
+    return (float(dist_row), float(dist_col), float(orientation[0]),
+            float(orientation[4]), float(position[0]), float(position[1]),
+            int(img_ds.Columns), int(img_ds.Rows))
+
+
+def calculate_pixluts(img_datasets):
+    """
+    Calculate the pixluts of several image datasets at once. Slices with
+    the same geometry share one (read-only) pixlut, and the pixluts of
+    all distinct geometries of the same size are computed in a single
+    broadcasted operation.
+    :param img_datasets: list of DICOM(image) datasets
+    :return: list of pixluts, in the same order as img_datasets
+    """
+    geometries = [get_pixlut_geometry(img_ds) for img_ds in img_datasets]
+
+    # Group the distinct geometries by image size
+    groups = collections.defaultdict(list)
+    for geometry in dict.fromkeys(geometries):
+        groups[geometry[6:]].append(geometry)
+
+    pixluts = {}
+    for (columns, rows), group in groups.items():
+        dist_row, dist_col, x_x, y_y, s_x, s_y = \
+            np.array([geometry[:6] for geometry in group]).T
+
+        # Equation C.7.6.2.1-1, evaluated for the first row (x) and
+        # the first column (y) of every geometry.
+        # https://dicom.innolitics.com/ciods/rt-structure-set/roi-contour/30060039/30060040/30060050
+        x = (x_x * dist_row)[:, np.newaxis] * np.arange(columns) \
+            + s_x[:, np.newaxis]
+        y = (y_y * dist_col)[:, np.newaxis] * np.arange(rows) \
+            + s_y[:, np.newaxis]
+        x.flags.writeable = False
+        y.flags.writeable = False
+
+        for i, geometry in enumerate(group):
+            pixluts[geometry] = (x[i], y[i])
 
-    # Equation C.7.6.2.1-1.
-    # https://dicom.innolitics.com/ciods/rt-structure-set/roi-contour/30060039/30060040/30060050
-    matrix_m = np.matrix(
-        [[orientation[0] * dist_row, orientation[3] * dist_col, 0,
-          position[0]],
-         [orientation[1] * dist_row, orientation[4] * dist_col, 0,
-          position[1]],
-         [orientation[2] * dist_row, orientation[5] * dist_col, 0,
-          position[2]],
-         [0, 0, 0, 1]]
-    )
-    x = []
-    y = []
-    for i in range(0, img_ds.Columns):
-        i_mat = matrix_m * np.matrix([[i], [0], [0], [1]])
-        x.append(float(i_mat[0]))
-
-    for j in range(0, img_ds.Rows):
-        j_mat = matrix_m * np.matrix([[0], [j], [0], [1]])
-        y.append(float(j_mat[1]))
-
-    return np.array(x), np.array(y)
+    return [pixluts[geometry] for geometry in geometries]
 
 
 def get_pixluts(read_data_dict):
@@ -633,18 +713,18 @@ def get_pixluts(read_data_dict):
     :param read_data_dict: Dictionary of all DICOM dataset objects.
     :return: Dictionary of pixluts for the transformation from 3D to 2D.
     """
-    dict_pixluts = {}
     non_img_type = ['rtdose', 'rtplan', 'rtss', 'rtimage']
+    img_datasets = []
     for ds in read_data_dict:
         if ds not in non_img_type:
             if isinstance(ds, str) and ds[0:3] == 'sr-':
                 continue
             else:
-                img_ds = read_data_dict[ds]
-                pixlut = calculate_matrix(img_ds)
-                dict_pixluts[img_ds.SOPInstanceUID] = pixlut
+                img_datasets.append(read_data_dict[ds])
 
-    return dict_pixluts
+    pixluts = calculate_pixluts(img_datasets)
+    return {img_ds.SOPInstanceUID: pixlut
+            for img_ds, pixlut in zip(img_datasets, pixluts)}
 
 
 def get_image_uid_list(dataset):
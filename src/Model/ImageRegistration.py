@@ -0,0 +1,319 @@
+"""
+Registration of the moving image to the fixed image for image fusion.
+Transforms are cached on disk, keyed on the series of both images and the
+registration parameters, so re-opening a fused pair skips registration.
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+import pydicom
+import SimpleITK as sitk
+from platipy.imaging.registration.utils import apply_transform
+
+from src.constants import FUSION_NUMBER_OF_THREADS, FUSION_SHRINK_FACTORS, \
+    FUSION_SMOOTH_SIGMAS
+from src.Controller.PathHandler import data_path
+
+# Bumped whenever the way transforms are calculated or stored changes so
+# that stale cached transforms are not reused.
+REGISTRATION_CACHE_VERSION = 1
+
+# Parameters of linear_registration which are read from imageFusion.json
+REGISTRATION_PARAMETERS = ["reg_method", "metric", "optimiser",
+                           "shrink_factors", "smooth_sigmas",
+                           "sampling_rate", "final_interp",
+                           "number_of_iterations", "default_value"]
+
+
+def get_registration_parameters():
+    """
+    Gets the parameters of the registration from imageFusion.json, or the
+    default rigid registration if the file does not exist.
+    :return: Dictionary of linear_registration keyword arguments.
+    """
+    parameters = {"reg_method": "rigid",
+                  "shrink_factors": FUSION_SHRINK_FACTORS,
+                  "smooth_sigmas": FUSION_SMOOTH_SIGMAS}
+    if os.path.exists(data_path('imageFusion.json')):
+        with open(data_path("imageFusion.json"), "r") as file_input:
+            dict_fusion = json.load(file_input)
+        parameters = {key: dict_fusion[key]
+                      for key in REGISTRATION_PARAMETERS}
+    return parameters
+
+
+def get_number_of_threads():
+    """
+    Gets the number of threads SimpleITK uses for the registration, from
+    imageFusion.json or FUSION_NUMBER_OF_THREADS. 0 uses every core.
+    :return: The number of threads.
+    """
+    number_of_threads = FUSION_NUMBER_OF_THREADS
+    if os.path.exists(data_path('imageFusion.json')):
+        with open(data_path("imageFusion.json"), "r") as file_input:
+            number_of_threads = json.load(file_input).get(
+                "number_of_threads", number_of_threads)
+    return number_of_threads or os.cpu_count() or 1
+
+
+def get_parameter_hash(parameters):
+    """
+    :param parameters: Dictionary of linear_registration keyword arguments.
+    :return: Hash identifying the registration parameters.
+    """
+    text = json.dumps([REGISTRATION_CACHE_VERSION, parameters],
+                      sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def get_cache_path(fixed_series_uid, moving_series_uid, parameter_hash):
+    """
+    :param fixed_series_uid: SeriesInstanceUID of the fixed image.
+    :param moving_series_uid: SeriesInstanceUID of the moving image.
+    :param parameter_hash: Hash from get_parameter_hash.
+    :return: Path of the cached transform inside the hidden directory, or
+        None if the hidden directory has not been set up.
+    """
+    hidden_directory = os.environ.get('USER_ONKODICOM_HIDDEN')
+    if not hidden_directory:
+        return None
+    key = "\\".join([fixed_series_uid, moving_series_uid, parameter_hash])
+    key_hash = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return Path(hidden_directory).joinpath('Registrations',
+                                           key_hash + '.tfm')
+
+
+def read_cached_transform(cache_path):
+    """
+    :param cache_path: Path from get_cache_path.
+    :return: The cached transform, or None if it is missing or unreadable.
+    """
+    if cache_path is None or not cache_path.is_file():
+        return None
+    try:
+        return sitk.ReadTransform(str(cache_path)).Downcast()
+    except RuntimeError:
+        logging.warning("Ignoring unreadable registration %s", cache_path)
+        return None
+
+
+def write_cached_transform(cache_path, tfm):
+    """
+    :param cache_path: Path from get_cache_path.
+    :param tfm: The transform to cache.
+    """
+    if cache_path is None:
+        return
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = cache_path.with_suffix('.tmp.tfm')
+        sitk.WriteTransform(tfm, str(temp_path))
+        os.replace(temp_path, cache_path)
+    except (OSError, RuntimeError):
+        logging.warning("Could not write registration %s", cache_path)
+
+
+def read_transform_dcm(transform_path, moving_sop_instance_uids,
+                       parameter_hash):
+    """
+    Reads the transform of a spatial registration object written by
+    OnkoDICOM, if it registers the moving images with the same parameters.
+    OnkoDICOM stores the transform from the fixed to the moving image,
+    while the matrix of other spatial registrations maps the moving image
+    to the fixed image, so only OnkoDICOM's own objects are reused.
+    :param transform_path: Path of the spatial registration object.
+    :param moving_sop_instance_uids: SOPInstanceUIDs of the moving images.
+    :param parameter_hash: Hash from get_parameter_hash.
+    :return: sitk.AffineTransform, or None if the object does not apply.
+    """
+    if not os.path.isfile(transform_path):
+        return None
+    try:
+        # write_transform_to_dcm does not write a file meta header
+        spatial_registration = pydicom.dcmread(transform_path, force=True)
+        registration = spatial_registration.RegistrationSequence[0]
+        referenced = {item.ReferencedSOPInstanceUID for item
+                      in registration.ReferencedImageSequence}
+        matrix = registration.MatrixRegistrationSequence[0] \
+            .MatrixSequence[0].FrameOfReferenceTransformationMatrix
+    except (AttributeError, IndexError, OSError,
+            pydicom.errors.InvalidDicomError):
+        return None
+
+    description = spatial_registration.get("ContentDescription", "")
+    if spatial_registration.get("Manufacturer") != "OnkoDICOM" \
+            or parameter_hash not in description:
+        return None
+    if not referenced or not referenced <= set(moving_sop_instance_uids):
+        return None
+
+    matrix = np.asarray(matrix, dtype=np.float64).reshape(4, 4)
+    return sitk.AffineTransform(matrix[0:3, 0:3].flatten(), matrix[0:3, 3])
+
+
+def resample_moving_image(fixed_image, moving_image, tfm, parameters):
+    """
+    Resamples the moving image onto the fixed image in the same way as
+    linear_registration does after registering.
+    :param fixed_image: sitk.Image of the fixed image.
+    :param moving_image: sitk.Image of the moving image.
+    :param tfm: Transform from the fixed to the moving image.
+    :param parameters: Dictionary of linear_registration keyword arguments.
+    :return: The registered moving image.
+    """
+    moving_image_type = moving_image.GetPixelIDValue()
+    moving_image = sitk.Cast(moving_image, sitk.sitkFloat32)
+
+    default_value = parameters.get("default_value")
+    if default_value is None:
+        default_value = 0
+        # Test if image is CT-like
+        if sitk.GetArrayViewFromImage(moving_image).min() <= -1000:
+            default_value = -1000
+
+    registered_image = apply_transform(
+        input_image=moving_image,
+        reference_image=sitk.Cast(fixed_image, sitk.sitkFloat32),
+        transform=tfm,
+        default_value=default_value,
+        interpolator=parameters.get("final_interp", 2))
+    return sitk.Cast(registered_image, moving_image_type)
+
+
+def get_registration_transform(reg_method):
+    """
+    :param reg_method: Name of a linear transformation model, as accepted
+        by platipy's linear_registration.
+    :return: New sitk transform of the model.
+    """
+    transforms = {"translation": lambda: sitk.TranslationTransform(3),
+                  "similarity": sitk.Similarity3DTransform,
+                  "affine": lambda: sitk.AffineTransform(3),
+                  "rigid": sitk.VersorRigid3DTransform,
+                  "scale": lambda: sitk.ScaleTransform(3),
+                  "scaleversor": sitk.ScaleVersor3DTransform,
+                  "scaleskewversor": sitk.ScaleSkewVersor3DTransform}
+    if reg_method.lower() not in transforms:
+        raise ValueError("Unknown registration method " + reg_method)
+    return transforms[reg_method.lower()]()
+
+
+def linear_registration(fixed_image, moving_image, reg_method="similarity",
+                        metric="mean_squares", optimiser="gradient_descent",
+                        shrink_factors=(8, 2, 1), smooth_sigmas=(4, 2, 0),
+                        sampling_rate=0.25, final_interp=2,
+                        number_of_iterations=50, default_value=None,
+                        number_of_threads=None):
+    """
+    Registers the moving image to the fixed image in the same way as
+    platipy's linear_registration, which takes the same parameters, but
+    with the number of threads set on the registration method rather than
+    as the default of every SimpleITK filter.
+    :param fixed_image: sitk.Image of the fixed image.
+    :param moving_image: sitk.Image of the moving image.
+    :param number_of_threads: Number of threads of the registration, or
+        None for SimpleITK's default.
+    :return: Tuple of the registered moving image and the transform from
+        the fixed to the moving image.
+    """
+    float_fixed_image = sitk.Cast(fixed_image, sitk.sitkFloat32)
+    float_moving_image = sitk.Cast(moving_image, sitk.sitkFloat32)
+    initial_transform = sitk.CenteredTransformInitializer(
+        float_fixed_image, float_moving_image, sitk.Euler3DTransform(),
+        False)
+
+    registration = sitk.ImageRegistrationMethod()
+    if number_of_threads is not None:
+        registration.SetNumberOfThreads(number_of_threads)
+    registration.SetShrinkFactorsPerLevel(shrink_factors)
+    registration.SetSmoothingSigmasPerLevel(smooth_sigmas)
+    registration.SmoothingSigmasAreSpecifiedInPhysicalUnitsOn()
+    registration.SetMovingInitialTransform(initial_transform)
+
+    if metric.lower() == "correlation":
+        registration.SetMetricAsCorrelation()
+    elif metric.lower() == "mean_squares":
+        registration.SetMetricAsMeanSquares()
+    elif metric.lower() == "mattes_mi":
+        registration.SetMetricAsMattesMutualInformation()
+    elif metric.lower() == "joint_hist_mi":
+        registration.SetMetricAsJointHistogramMutualInformation()
+    registration.SetInterpolator(sitk.sitkLinear)
+    registration.SetMetricSamplingPercentage(sampling_rate, seed=42)
+    registration.SetMetricSamplingStrategy(
+        sitk.ImageRegistrationMethod.REGULAR)
+    registration.SetOptimizerScalesFromPhysicalShift()
+    registration.SetInitialTransform(get_registration_transform(reg_method))
+
+    if optimiser.lower() == "lbfgsb":
+        registration.SetOptimizerAsLBFGSB(
+            gradientConvergenceTolerance=1e-5,
+            numberOfIterations=number_of_iterations,
+            maximumNumberOfCorrections=50,
+            maximumNumberOfFunctionEvaluations=1024,
+            costFunctionConvergenceFactor=1e7)
+    elif optimiser.lower() == "exhaustive":
+        registration.SetOptimizerAsExhaustive([10] * 6)
+    elif optimiser.lower() == "gradient_descent_line_search":
+        registration.SetOptimizerAsGradientDescentLineSearch(
+            learningRate=1.0, numberOfIterations=number_of_iterations)
+    elif optimiser.lower() == "gradient_descent":
+        registration.SetOptimizerAsGradientDescent(
+            learningRate=1.0, numberOfIterations=number_of_iterations)
+
+    output_transform = registration.Execute(float_fixed_image,
+                                            float_moving_image)
+    tfm = sitk.CompositeTransform([initial_transform, output_transform])
+    parameters = {"final_interp": final_interp,
+                  "default_value": default_value}
+    return resample_moving_image(fixed_image, moving_image, tfm,
+                                 parameters), tfm
+
+
+def register_images(fixed_image, moving_image, fixed_series_uid,
+                    moving_series_uid, moving_sop_instance_uids=(),
+                    transform_path=None):
+    """
+    Registers the moving image to the fixed image, reusing the transform
+    cached for the pair of series and parameters, or the transform of an
+    existing spatial registration object.
+    :param fixed_image: sitk.Image of the fixed image.
+    :param moving_image: sitk.Image of the moving image.
+    :param fixed_series_uid: SeriesInstanceUID of the fixed image.
+    :param moving_series_uid: SeriesInstanceUID of the moving image.
+    :param moving_sop_instance_uids: SOPInstanceUIDs of the moving images.
+    :param transform_path: Path of an existing spatial registration object.
+    :return: Tuple of the registered moving image, the transform, and
+        whether the transform is rigid and not read from the spatial
+        registration object, so should be stored in one.
+    """
+    parameters = get_registration_parameters()
+    parameter_hash = get_parameter_hash(parameters)
+    cache_path = get_cache_path(fixed_series_uid, moving_series_uid,
+                                parameter_hash)
+
+    # DICOM Frame of Reference Transformation Matrix allows RIGID,
+    # RIGID_SCALE or AFFINE
+    is_rigid = parameters["reg_method"] == 'rigid'
+
+    tfm = read_cached_transform(cache_path)
+    if tfm is not None:
+        # The spatial registration object is written as if registered
+        return resample_moving_image(fixed_image, moving_image, tfm,
+                                     parameters), tfm, is_rigid
+    if transform_path is not None:
+        tfm = read_transform_dcm(transform_path, moving_sop_instance_uids,
+                                 parameter_hash)
+        if tfm is not None:
+            return resample_moving_image(fixed_image, moving_image, tfm,
+                                         parameters), tfm, False
+
+    img_ct, tfm = linear_registration(
+        fixed_image, moving_image,
+        number_of_threads=get_number_of_threads(), **parameters)
+    write_cached_transform(cache_path, tfm)
+    return img_ct, tfm, is_rigid
@@ -1,8 +1,13 @@
 """ Contains functions required for isodose display """
+import logging
+import threading
 
 import numpy as np
+from PySide6 import QtCore, QtGui
+from skimage import measure
 
-from src.Model.ROI import calculate_matrix
+from src.Model.ImageLoading import calculate_matrix, get_pixluts
+from src.Model.PatientDictContainer import PatientDictContainer
 
 
 def get_dose_pixels(pixlut, doselut, img_ds):
@@ -44,19 +49,27 @@ def get_dose_pixluts(dict_ds):
                         SOPInstanceUID as key
     """
 
-    dict_dose_pixluts = {}
     dict_dose_pixluts = {}
     non_img_type = ['rtdose', 'rtplan', 'rtss', 'rtimage']
     dose_data = calculate_matrix(dict_ds['rtdose'])
+    dict_pixluts = get_pixluts(dict_ds)
+
+    # Slices sharing a pixlut, position and spacing share dose pixels
+    shared_dose_pixluts = {}
     for ds in dict_ds:
         if ds not in non_img_type:
             if isinstance(ds, str) and ds[0:3] == 'sr-':
                 continue
             else:
                 img_ds = dict_ds[ds]
-                pixlut = calculate_matrix(img_ds)
-                dose_pixlut = get_dose_pixels(pixlut, dose_data, img_ds)
-                dict_dose_pixluts[img_ds.SOPInstanceUID] = dose_pixlut
+                pixlut = dict_pixluts[img_ds.SOPInstanceUID]
+                key = (id(pixlut), img_ds.PatientPosition,
+                       tuple(img_ds.PixelSpacing))
+                if key not in shared_dose_pixluts:
+                    shared_dose_pixluts[key] = \
+                        get_dose_pixels(pixlut, dose_data, img_ds)
+                dict_dose_pixluts[img_ds.SOPInstanceUID] = \
+                    shared_dose_pixluts[key]
 
     return dict_dose_pixluts
 
@@ -104,6 +117,305 @@ def get_dose_grid(rtd, z=0):
         return np.array([])
 
 
+def get_dose_volume(rtd, z_positions):
+    """
+    Resample the dose grid to a number of slice positions at once, in the
+    same way as calling get_dose_grid for each position.
+
+    :param rtd:         Data from RTDose file
+    :param z_positions: Positions of the slices in mm
+    :return:            Dose volume as a 3d numpy array with one plane per
+                        slice position, or None if the RTDose has no
+                        GridFrameOffsetVector
+    """
+    if 'GridFrameOffsetVector' not in rtd:
+        return None
+
+    z = np.asarray(z_positions, dtype=np.float64)[:, np.newaxis]
+    planes = rtd.ImageOrientationPatient[0] \
+        * np.array(rtd.GridFrameOffsetVector) \
+        + rtd.ImagePositionPatient[2]
+    pixel_array = rtd.pixel_array
+    pixel_array = pixel_array.reshape((len(planes),) + pixel_array.shape[-2:])
+
+    # The nearest plane, and the second nearest plane to blend it with
+    distances = np.fabs(planes - z)
+    ub = np.argmin(distances, axis=1)
+    rows = np.arange(len(z))
+    distances[rows, ub] = np.amax(distances, axis=1)
+    lb = np.argmin(distances, axis=1)
+
+    # Fractional distance from bottom to top
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fz = (z[:, 0] - planes[lb]) / (planes[ub] - planes[lb])
+    # Slices within 0.5mm of a plane use that plane, as do slices which
+    # have no second plane to blend with
+    on_plane = np.fabs(planes[ub] - z[:, 0]) < 0.5
+    fz[on_plane | ~np.isfinite(fz)] = 1.0
+
+    fz = fz[:, np.newaxis, np.newaxis]
+    return fz * pixel_array[ub] + (1.0 - fz) * pixel_array[lb]
+
+
+def get_image_dose_volume(patient_dict_container=None):
+    """
+    Gets the dose resampled to the position of every axial image slice.
+    The volume is calculated once per RTDose and kept in the container.
+
+    :param patient_dict_container: The container of the dose and images,
+                                   PatientDictContainer by default
+    :return:                       Dose volume indexed by slice, or None
+                                   if the dose cannot be resampled
+    """
+    if patient_dict_container is None:
+        patient_dict_container = PatientDictContainer()
+    dataset = patient_dict_container.dataset
+    dataset_rtdose = dataset['rtdose']
+    dose_key = (id(dataset_rtdose), dataset_rtdose.get('SOPInstanceUID'))
+
+    cached = patient_dict_container.get("dose_volume")
+    if cached is None or cached[0] != dose_key:
+        num_slices = len(patient_dict_container.get("dict_uid"))
+        z_positions = [float(dataset[i].ImagePositionPatient[2])
+                       for i in range(num_slices)]
+        cached = (dose_key, get_dose_volume(dataset_rtdose, z_positions))
+        patient_dict_container.set("dose_volume", cached)
+    return cached[1]
+
+
+def get_dose_polygons(dose_pixluts, contours):
+    """
+    Converts isodose contours of a dose grid into polygons on the image.
+    Only every second point of a contour is kept, which smooths the edges
+    of the polygons.
+    :param dose_pixluts: Lookup tables of the image pixel coordinates of
+        the dose grid columns and rows
+    :param contours: List of contours from skimage.measure.find_contours
+    :return: List of polygons of type QPolygonF
+    """
+    x_lut = np.asarray(dose_pixluts[0])
+    y_lut = np.asarray(dose_pixluts[1])
+    list_polygons = []
+    for contour in contours:
+        points = contour[::2].astype(np.intp)
+        # Points are truncated to whole pixels
+        x = np.trunc(x_lut[points[:, 1]])
+        y = np.trunc(y_lut[points[:, 0]])
+        list_polygons.append(QtGui.QPolygonF(
+            [QtCore.QPointF(*point) for point in zip(x.tolist(), y.tolist())]))
+    return list_polygons
+
+
+class IsodoseContours:
+    """
+    Cache of the isodose polygons of the axial slices, keyed on slice
+    UID and dose level. The polygons of a slice are calculated when it is
+    first displayed, after which the other slices are calculated for the
+    same dose levels in a background thread, nearest slices first. The
+    cache is cleared, and the background calculation stopped, when the
+    dose or the prescription changes or the patient is closed.
+    """
+
+    def __init__(self, patient_dict_container=None):
+        """
+        :param patient_dict_container: The container of the dose and
+            images, PatientDictContainer by default
+        """
+        if patient_dict_container is None:
+            patient_dict_container = PatientDictContainer()
+        self.patient_dict_container = patient_dict_container
+        self.polygons = {}
+        self.dose_key = None
+        self.generation = 0
+        self.precomputing = set()
+        self.lock = threading.Lock()
+        # Stops the background threads of the current generation
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def get_dose_key(self):
+        """
+        :return: A key which changes whenever the dose or the prescription
+            changes
+        """
+        dataset_rtdose = self.patient_dict_container.dataset['rtdose']
+        return (id(dataset_rtdose), dataset_rtdose.get('SOPInstanceUID'),
+                self.patient_dict_container.get("rx_dose_in_cgray"),
+                id(self.patient_dict_container.get("dose_pixluts")))
+
+    def check_dose(self):
+        """
+        Clears the cache if the dose or the prescription has changed.
+        :return: The generation of the cache
+        """
+        dose_key = self.get_dose_key()
+        with self.lock:
+            if dose_key != self.dose_key:
+                self.dose_key = dose_key
+                self.start_generation()
+            return self.generation
+
+    def start_generation(self):
+        """
+        Empties the cache and tells the background threads calculating
+        for it to stop. Must be called holding the lock.
+        :return: List of the background threads told to stop
+        """
+        self.polygons = {}
+        self.precomputing = set()
+        self.generation += 1
+        self.stop_event.set()
+        self.stop_event = threading.Event()
+        threads, self.threads = self.threads, []
+        return threads
+
+    def clear(self):
+        """
+        Clears the cache and stops any background calculation, waiting
+        for it to stop.
+        """
+        with self.lock:
+            self.dose_key = None
+            threads = self.start_generation()
+        for thread in threads:
+            thread.join()
+
+    def get_polygons(self, slice_id, dose_levels):
+        """
+        Gets the isodose polygons of a slice, calculating those which are
+        not cached yet.
+        :param slice_id: Index of the axial slice
+        :param dose_levels: List of isodose levels in % of the prescription
+        :return: Dictionary of dose level to list of QPolygonF
+        """
+        generation = self.check_dose()
+        slice_uid = self.patient_dict_container.get("dict_uid")[slice_id]
+        with self.lock:
+            missing = [level for level in dose_levels
+                       if (slice_uid, level) not in self.polygons]
+        if missing:
+            self.calculate_polygons(slice_id, missing, generation)
+        with self.lock:
+            return {level: self.polygons.get((slice_uid, level), [])
+                    for level in dose_levels}
+
+    def calculate_polygons(self, slice_id, dose_levels, generation):
+        """
+        Calculates and caches the isodose polygons of a slice.
+        :param slice_id: Index of the axial slice
+        :param dose_levels: List of isodose levels in % of the prescription
+        :param generation: The generation of the cache the polygons are for
+        """
+        container = self.patient_dict_container
+        dataset_rtdose = container.dataset['rtdose']
+        slice_uid = container.get("dict_uid")[slice_id]
+        dose_volume = get_image_dose_volume(container)
+
+        polygons = {}
+        for level in dose_levels:
+            if dose_volume is None:
+                polygons[(slice_uid, level)] = []
+                continue
+            dose_level = level * container.get("rx_dose_in_cgray") / \
+                (dataset_rtdose.DoseGridScaling * 10000)
+            contours = measure.find_contours(dose_volume[slice_id],
+                                             dose_level)
+            polygons[(slice_uid, level)] = get_dose_polygons(
+                container.get("dose_pixluts")[slice_uid], contours)
+
+        with self.lock:
+            if generation == self.generation:
+                self.polygons.update(polygons)
+
+    def precompute(self, slice_id, dose_levels):
+        """
+        Calculates the isodose polygons of every slice for the given dose
+        levels in a background thread, starting from the given slice.
+        :param slice_id: Index of the displayed axial slice
+        :param dose_levels: List of isodose levels in % of the prescription
+        """
+        generation = self.check_dose()
+        with self.lock:
+            dose_levels = [level for level in dose_levels
+                           if level not in self.precomputing]
+            self.precomputing.update(dose_levels)
+        if not dose_levels:
+            return
+
+        num_slices = len(self.patient_dict_container.get("dict_uid"))
+        slice_ids = sorted(range(num_slices),
+                           key=lambda other: abs(other - slice_id))
+        with self.lock:
+            if generation != self.generation:
+                return
+            thread = threading.Thread(
+                target=self.precompute_slices,
+                args=(slice_ids, dose_levels, generation, self.stop_event),
+                daemon=True)
+            self.threads = [other for other in self.threads
+                            if other.is_alive()] + [thread]
+            thread.start()
+
+    def precompute_slices(self, slice_ids, dose_levels, generation,
+                          stop_event):
+        """
+        Calculates the isodose polygons of the given slices which are not
+        cached yet, until told to stop. Failures are logged, as nothing
+        waits for the result.
+        :param slice_ids: Indices of the axial slices in order
+        :param dose_levels: List of isodose levels in % of the prescription
+        :param generation: The generation of the cache to calculate for
+        :param stop_event: A threading.Event() that tells the calculation
+            to stop
+        """
+        try:
+            dict_uid = self.patient_dict_container.get("dict_uid")
+            for slice_id in slice_ids:
+                if stop_event.is_set():
+                    return
+                with self.lock:
+                    missing = [level for level in dose_levels
+                               if (dict_uid[slice_id], level)
+                               not in self.polygons]
+                if missing:
+                    self.calculate_polygons(slice_id, missing, generation)
+        except Exception:
+            logging.exception("Unable to precompute the isodose polygons")
+
+
+def get_isodose_contours(patient_dict_container=None):
+    """
+    Gets the IsodoseContours of a container, creating it the first time.
+    :param patient_dict_container: The container of the dose and images,
+        PatientDictContainer by default
+    :return: IsodoseContours
+    """
+    if patient_dict_container is None:
+        patient_dict_container = PatientDictContainer()
+    isodose_contours = patient_dict_container.get("isodose_contours")
+    if isodose_contours is None:
+        isodose_contours = IsodoseContours(patient_dict_container)
+        patient_dict_container.set("isodose_contours", isodose_contours)
+    return isodose_contours
+
+
+def clear_isodose_contours(patient_dict_container=None):
+    """
+    Clears the IsodoseContours of a container, if it has one, stopping
+    its background calculation before the dose or the patient it is for
+    is replaced.
+    :param patient_dict_container: The container of the dose and images,
+        PatientDictContainer by default
+    """
+    if patient_dict_container is None:
+        patient_dict_container = PatientDictContainer()
+    if patient_dict_container.is_empty():
+        return
+    isodose_contours = patient_dict_container.get("isodose_contours")
+    if isodose_contours is not None:
+        isodose_contours.clear()
+
+
 def calculate_rx_dose_in_cgray(rtplan):
     GRAY_TO_CGRAY_SCALE_FACTOR = 100
 
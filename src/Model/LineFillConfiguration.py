@@ -0,0 +1,40 @@
+"""
+The line and fill settings used to display ROIs and isodoses. The
+settings are read from the line&fill_configuration file once, and read
+again after the Add-On Options save them.
+"""
+import functools
+
+from src.Controller.PathHandler import data_path
+
+# Settings used when the configuration file is empty
+DEFAULT_LINE_FILL_CONFIGURATION = {"roi_line": 1, "roi_opacity": 10,
+                                   "iso_line": 2, "iso_opacity": 5,
+                                   "line_width": 2.0}
+
+
+@functools.lru_cache(maxsize=1)
+def get_line_fill_configuration():
+    """
+    Gets the line and fill settings. Each line of the configuration file
+    holds one setting, in the order ROI line style, ROI opacity, isodose
+    line style, isodose opacity and line width.
+    :return: Dictionary of the settings.
+    """
+    with open(data_path('line&fill_configuration'), 'r') as stream:
+        elements = stream.readlines()
+    if len(elements) == 0:
+        return dict(DEFAULT_LINE_FILL_CONFIGURATION)
+    return {"roi_line": int(elements[0].replace('\n', '')),
+            "roi_opacity": int(elements[1].replace('\n', '')),
+            "iso_line": int(elements[2].replace('\n', '')),
+            "iso_opacity": int(elements[3].replace('\n', '')),
+            "line_width": float(elements[4].replace('\n', ''))}
+
+
+def refresh_line_fill_configuration():
+    """
+    Discards the settings read before, so they are read again from the
+    configuration file when next needed.
+    """
+    get_line_fill_configuration.cache_clear()
@@ -1,10 +1,10 @@
 import os
-import SimpleITK as sitk
 import pydicom
 
 from src.constants import CT_RESCALE_INTERCEPT
 
-from src.Model.CalculateImages import convert_raw_data, get_pixmaps
+from src.Model.CalculateImages import convert_raw_data, get_pixmaps, \
+    get_sitk_image
 from src.Model.GetPatientInfo import get_basic_info, DicomTree, \
     dict_instance_uid
 from src.Model.Isodose import get_dose_pixluts, calculate_rx_dose_in_cgray
@@ -166,28 +166,14 @@ def read_images_for_fusion(level=0, window=0):
         level = patient_dict_container.get("level")
         window = patient_dict_container.get("window")
 
-    amount = len(patient_dict_container.filepaths)
-    orig_fusion_list = []
-
-    for i in range(amount):
-        try:
-            orig_fusion_list.append(patient_dict_container.filepaths[i])
-        except KeyError:
-            continue
-
-    orig_image = sitk.ReadImage(orig_fusion_list)
+    # The images are built from the pixel values already loaded rather
+    # than reading the files again
+    orig_image = get_sitk_image(patient_dict_container.dataset,
+                                patient_dict_container.get("pixel_values"))
     patient_dict_container.set("sitk_original", orig_image)
 
-    amount = len(moving_dict_container.filepaths)
-    new_fusion_list = []
-
-    for i in range(amount):
-        try:
-            new_fusion_list.append(moving_dict_container.filepaths[i])
-        except KeyError:
-            continue
-
-    new_image = sitk.ReadImage(new_fusion_list)
+    new_image = get_sitk_image(moving_dict_container.dataset,
+                               moving_dict_container.get("pixel_values"))
     moving_dict_container.set("sitk_moving", new_image)
 
     create_fused_model(orig_image, new_image)
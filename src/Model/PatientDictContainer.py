@@ -8,9 +8,15 @@ Keyword arguments for DICOM-RT:
     rois
     raw_dvh
     dvh_x_y
+    dvh_fingerprints
     raw_contour
     num_points
     pixluts
+    dose_volume
+    isodose_contours
+    suv_volume
+    resliced_contours
+    roi_polygon_cache
 """
 from src.Model.Singleton import Singleton
 
@@ -1,10 +1,13 @@
 import collections
 import datetime
+import itertools
 import random
 import logging
+from collections.abc import Mapping
 from copy import deepcopy
 from pathlib import Path
 import pydicom
+import cv2
 from alphashape import alphashape
 from pydicom.uid import generate_uid
 from pydicom import Dataset, Sequence
@@ -15,10 +18,13 @@ from scipy.spatial.qhull import QhullError
 from shapely.geometry import Polygon, MultiPolygon, GeometryCollection
 from shapely.validation import make_valid
 
+from src.Model.ImageLoading import calculate_matrix, get_pixluts
 from src.Model.MovingDictContainer import MovingDictContainer
 from src.View.util.PatientDictContainerHelper import get_dict_slice_to_uid
-from src.constants import DEFAULT_WINDOW_SIZE
+from src.constants import DEFAULT_WINDOW_SIZE, ROI_POLYGON_CACHE_SIZE, \
+    ROI_POLYGON_PREFETCH_RADIUS
 from src.Model.CalculateImages import *
+from src.Model.CalculateImages import SliceLRUCache
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.Transform import inv_linear_transform
 
@@ -99,62 +105,88 @@ def add_to_roi(rtss, roi_name, roi_coordinates, data_set):
         :param data_set: Data Set of selected DICOM image file
         :return: rtss, with added ROI
     """
+    return add_contours_to_roi(
+        rtss, roi_name, [{'coords': roi_coordinates, 'ds': data_set}])
 
-    # Creating a new ROIContourSequence, ContourSequence,
-    # ContourImageSequence
-    contour_sequence = Sequence([Dataset()])
-    contour_image_sequence = Sequence([Dataset()])
 
-    number_of_contour_points = len(roi_coordinates) / 3
-    referenced_sop_class_uid = data_set.SOPClassUID
-    referenced_sop_instance_uid = data_set.SOPInstanceUID
+def add_contours_to_roi(rtss, roi_name, roi_list):
+    """
+    Add the contours of a number of slices to an existing ROI of the rtss.
+    The ROI is looked up once and its ContourSequence extended once, so
+    the cost does not grow with the number of contours already added.
+    :param rtss: dataset of RTSS
+    :param roi_name: ROIName
+    :param roi_list: the list of contours to be added to the ROI. Each
+        element consists of coordinates of pixels for new contour and data
+        set of selected DICOM image file.
+    :return: rtss, with the contours added to the ROI
+    """
+    if not roi_list:
+        return rtss
 
     existing_roi_number = None
     for item in rtss["StructureSetROISequence"]:
         if item.ROIName == roi_name:
             existing_roi_number = item.ROINumber
 
-    position = None
-
     # Get the index of the ROI
-    for index, contour in enumerate(rtss.ROIContourSequence):
-        if contour.ReferencedROINumber == existing_roi_number:
-            position = index
-
-    new_contour_number = len(
-        rtss.ROIContourSequence[position].ContourSequence) + 1
-
-    # ROI Sequence
-    for contour in contour_sequence:
-        # if data_set.get("ReferencedImageSequence"):
-        contour.add_new(Tag("ContourImageSequence"),
-                        "SQ", contour_image_sequence)
-
-        # Contour Sequence
-        for contour_image in contour_image_sequence:
-            # CT Image Storage
-            contour_image.add_new(Tag("ReferencedSOPClassUID"), "UI",
-                                  referenced_sop_class_uid)
-            contour_image.add_new(Tag("ReferencedSOPInstanceUID"), "UI",
-                                  referenced_sop_instance_uid)
-
-        contour.add_new(Tag("ContourNumber"), "IS", new_contour_number)
-        if not _is_closed_contour(roi_coordinates):
-            contour.add_new(Tag("ContourGeometricType"), "CS", "OPEN_PLANAR")
-            contour.add_new(Tag("NumberOfContourPoints"), "IS",
-                            number_of_contour_points)
-            contour.add_new(Tag("ContourData"), "DS", roi_coordinates)
-        else:
-            contour.add_new(Tag("ContourGeometricType"), "CS", "CLOSED_PLANAR")
-            contour.add_new(Tag("NumberOfContourPoints"), "IS",
-                            number_of_contour_points - 1)
-            contour.add_new(Tag("ContourData"), "DS", roi_coordinates[0:-3])
-
-    rtss.ROIContourSequence[position].ContourSequence.extend(contour_sequence)
+    position = get_roi_contour_positions(rtss)[existing_roi_number]
+    contour_sequence = rtss.ROIContourSequence[position].ContourSequence
+
+    first_contour_number = len(contour_sequence) + 1
+    contour_sequence.extend(
+        create_contour(roi_info['coords'], roi_info['ds'], contour_number)
+        for contour_number, roi_info in enumerate(roi_list,
+                                                  first_contour_number))
 
     return rtss
 
 
+def get_roi_contour_positions(rtss):
+    """
+    Get the index of the ROIContourSequence item of every ROI.
+    :param rtss: dataset of RTSS
+    :return: Dictionary of ReferencedROINumber to index in the
+        ROIContourSequence
+    """
+    return {contour.ReferencedROINumber: index
+            for index, contour in enumerate(rtss.ROIContourSequence)}
+
+
+def create_contour(roi_coordinates, data_set, contour_number):
+    """
+    Create a ContourSequence item of a contour on an image.
+    :param roi_coordinates: Coordinates of pixels for the contour
+    :param data_set: Data Set of the DICOM image file of the contour
+    :param contour_number: ContourNumber of the contour
+    :return: Dataset of the contour
+    """
+    number_of_contour_points = len(roi_coordinates) / 3
+
+    contour_image = Dataset()
+    # CT Image Storage
+    contour_image.add_new(Tag("ReferencedSOPClassUID"), "UI",
+                          data_set.SOPClassUID)
+    contour_image.add_new(Tag("ReferencedSOPInstanceUID"), "UI",
+                          data_set.SOPInstanceUID)
+
+    contour = Dataset()
+    contour.add_new(Tag("ContourImageSequence"), "SQ",
+                    Sequence([contour_image]))
+    contour.add_new(Tag("ContourNumber"), "IS", contour_number)
+    if not _is_closed_contour(roi_coordinates):
+        contour.add_new(Tag("ContourGeometricType"), "CS", "OPEN_PLANAR")
+        contour.add_new(Tag("NumberOfContourPoints"), "IS",
+                        number_of_contour_points)
+        contour.add_new(Tag("ContourData"), "DS", roi_coordinates)
+    else:
+        contour.add_new(Tag("ContourGeometricType"), "CS", "CLOSED_PLANAR")
+        contour.add_new(Tag("NumberOfContourPoints"), "IS",
+                        number_of_contour_points - 1)
+        contour.add_new(Tag("ContourData"), "DS", roi_coordinates[0:-3])
+    return contour
+
+
 def create_roi(rtss, roi_name, roi_list,
                rt_roi_interpreted_type="ORGAN", rtss_owner="PATIENT"):
     """
@@ -180,18 +212,13 @@ def create_roi(rtss, roi_name, roi_list,
     for key, value in existing_rois.items():
         if value["name"] == roi_name:
             roi_exists = True
-    for roi_info in roi_list:
-        data_set = roi_info['ds']
-        roi_coordinates = roi_info['coords']
-        if not roi_exists:
-            rtss = add_new_roi(rtss, roi_name, roi_coordinates, data_set,
-                               rt_roi_interpreted_type)
-            roi_exists = True
-        else:
-            # Add contour image data to existing ROI
-            rtss = add_to_roi(rtss, roi_name, roi_coordinates, data_set)
+    if not roi_exists and roi_list:
+        rtss = add_new_roi(rtss, roi_name, roi_list[0]['coords'],
+                           roi_list[0]['ds'], rt_roi_interpreted_type)
+        roi_list = roi_list[1:]
 
-    return rtss
+    # Add contour image data of the other slices to the ROI at once
+    return add_contours_to_roi(rtss, roi_name, roi_list)
 
 
 def add_new_roi(rtss, roi_name, roi_coordinates, data_set,
@@ -205,10 +232,6 @@ def add_new_roi(rtss, roi_name, roi_coordinates, data_set,
     :param rt_roi_interpreted_type: the interpreted type of the new ROI
     :return: rtss, with added ROI
     """
-    number_of_contour_points = len(roi_coordinates) / 3
-    referenced_sop_class_uid = data_set.SOPClassUID
-    referenced_sop_instance_uid = data_set.SOPInstanceUID
-
     # Check if there is any ROIs in rtss
     if not len(rtss["StructureSetROISequence"].value):
         referenced_frame_of_reference_uid = data_set.FrameOfReferenceUID
@@ -246,8 +269,8 @@ def add_new_roi(rtss, roi_name, roi_coordinates, data_set,
     # Saving a new ROIContourSequence, ContourSequence,
     # ContourImageSequence
     roi_contour_sequence = Sequence([Dataset()])
-    contour_sequence = Sequence([Dataset()])
-    contour_image_sequence = Sequence([Dataset()])
+    contour_sequence = Sequence([create_contour(roi_coordinates, data_set,
+                                                1)])
 
     # Original File
     original_roi_contour = rtss.ROIContourSequence
@@ -256,36 +279,6 @@ def add_new_roi(rtss, roi_name, roi_coordinates, data_set,
     for roi_contour in roi_contour_sequence:
         roi_contour.add_new(Tag("ROIDisplayColor"), "IS", rgb)
         roi_contour.add_new(Tag("ContourSequence"), "SQ", contour_sequence)
-
-        # ROI Sequence
-        for contour in contour_sequence:
-            # if data_set.get("ReferencedImageSequence"):
-            contour.add_new(Tag("ContourImageSequence"), "SQ",
-                            contour_image_sequence)
-
-            # Contour Sequence
-            for contour_image in contour_image_sequence:
-                contour_image.add_new(
-                    Tag("ReferencedSOPClassUID"), "UI",
-                    referenced_sop_class_uid)  # CT Image Storage
-                contour_image.add_new(Tag("ReferencedSOPInstanceUID"),
-                                      "UI", referenced_sop_instance_uid)
-
-            contour.add_new(Tag("ContourNumber"), "IS", 1)
-            if not _is_closed_contour(roi_coordinates):
-                contour.add_new(Tag("ContourGeometricType"), "CS",
-                                "OPEN_PLANAR")
-                contour.add_new(Tag("NumberOfContourPoints"), "IS",
-                                number_of_contour_points)
-                contour.add_new(Tag("ContourData"), "DS", roi_coordinates)
-            else:
-                contour.add_new(Tag("ContourGeometricType"), "CS",
-                                "CLOSED_PLANAR")
-                contour.add_new(Tag("NumberOfContourPoints"), "IS",
-                                number_of_contour_points - 1)
-                contour.add_new(Tag("ContourData"), "DS",
-                                roi_coordinates[0:-3])
-
         roi_contour.add_new(Tag("ReferencedROINumber"), "IS", roi_number)
 
     # Combine original ROIContourSequence with new
@@ -368,90 +361,6 @@ def get_raw_contour_data(rtss):
     return dict_roi, dict_num_points
 
 
-def calculate_matrix(img_ds):
-    """
-    Calculate the transformation matrix of a DICOM(image) dataset.
-    :param img_ds: DICOM(image) dataset
-    :return: pair of numpy arrays that represents the transformation
-        matrix
-    """
-    # Physical distance (in mm) between the center of each image pixel,
-    # specified by a numeric pair
-    # - adjacent row spacing (delimiter) adjacent column spacing.
-    dist_row = img_ds.PixelSpacing[0]
-    dist_col = img_ds.PixelSpacing[1]
-    # The direction cosines of the first row and the first column with
-    # respect to the patient.
-    # 6 values inside: [Xx, Xy, Xz, Yx, Yy, Yz]
-    orientation = img_ds.ImageOrientationPatient
-    # The x, y, and z coordinates of the upper left hand corner
-    # (center of the first voxel transmitted) of the image, in mm.
-    # 3 values: [Sx, Sy, Sz]
-    position = img_ds.ImagePositionPatient
-
-    # Equation C.7.6.2.1-1.
-    # https://dicom.innolitics.com/ciods/rt-structure-set/roi-contour/30060039/30060040/30060050
-    matrix_m = np.ndarray(
-        shape=(4, 4),
-        buffer=np.array(
-            [
-                [orientation[0] * dist_row, orientation[3] * dist_col, 0,
-                 position[0]],
-                [orientation[1] * dist_row, orientation[4] * dist_col, 0,
-                 position[1]],
-                [orientation[2] * dist_row, orientation[5] * dist_col, 0,
-                 position[2]],
-                [0, 0, 0, 1],
-            ],
-            dtype=float,
-        ),
-    )
-
-    x = []
-    y = []
-    for i in range(0, img_ds.Columns):
-        i_mat = np.matmul(
-            matrix_m,
-            np.ndarray(
-                shape=(4, 1),
-                buffer=np.array([[i], [0], [0], [1]], dtype=float)
-            ),
-        )
-        x.append(float(i_mat[0]))
-
-    for j in range(0, img_ds.Rows):
-        j_mat = np.matmul(
-            matrix_m,
-            np.ndarray(
-                shape=(4, 1),
-                buffer=np.array([[0], [j], [0], [1]], dtype=float)
-            ),
-        )
-        y.append(float(j_mat[1]))
-
-    return np.array(x), np.array(y)
-
-
-def get_pixluts(dict_ds):
-    """
-    Calculate transformation matrices for all the slices.
-    :param dict_ds: a dictionary of all the datasets
-    :return: a dictionary of transformation matrices
-    """
-    dict_pixluts = {}
-    non_img_type = ["rtdose", "rtplan", "rtss"]
-    for ds in dict_ds:
-        if ds not in non_img_type:
-            if isinstance(ds, str) and ds[0:3] == 'sr-':
-                continue
-            else:
-                img_ds = dict_ds[ds]
-                pixlut = calculate_matrix(img_ds)
-                dict_pixluts[img_ds.SOPInstanceUID] = pixlut
-
-    return dict_pixluts
-
-
 def calculate_pixels(pixlut, contour, prone=False, feetfirst=False):
     """
     Calculate (Convert) contour points.
@@ -461,33 +370,8 @@ def calculate_pixels(pixlut, contour, prone=False, feetfirst=False):
     :param feetfirst: label of feetfirst or head first
     :return: contour pixels
     """
-    pixels = []
-
-    np_x = np.array(pixlut[0])
-    np_y = np.array(pixlut[1])
-    if not feetfirst and not prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmax(np_x > con_x)
-            y = np.argmax(np_y > con_y)
-            pixels.append([x, y])
-    if feetfirst and not prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmin(np_x < con_x)
-            y = np.argmax(np_y > con_y)
-            pixels.append([x, y])
-    if prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmin(np_x < con_x)
-            y = np.argmin(np_y < con_y)
-            pixels.append([x, y])
-
-    return pixels
+    return calculate_contours_pixels(pixlut, [contour], prone,
+                                     feetfirst)[0]
 
 
 def calculate_pixels_sagittal(pixlut, contour, prone=False, feetfirst=False):
@@ -502,31 +386,72 @@ def calculate_pixels_sagittal(pixlut, contour, prone=False, feetfirst=False):
     ----------
     contour : object
     """
-    pixels = []
-    np_x = np.array(pixlut[0])
-    np_y = np.array(pixlut[1])
-    if not feetfirst and not prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmax(np_x > con_x)
-            y = np.argmax(np_y > con_y)
-            pixels.append([x, y])
-    if feetfirst and not prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmin(np_x < con_x)
-            y = np.argmax(np_y > con_y)
-            pixels.append([x, y])
+    return calculate_pixels(pixlut, contour, prone, feetfirst)
+
+
+def calculate_contours_pixels(pixlut, contours, prone=False,
+                              feetfirst=False):
+    """
+    Calculate (Convert) the points of several contours sharing the same
+    transformation matrix in one vectorised pass.
+    :param pixlut: transformation matrix
+    :param contours: list of raw contour data (3D)
+    :param prone: label of prone
+    :param feetfirst: label of feetfirst or head first
+    :return: list of contour pixels, one for each contour
+    """
+    coordinates = [np.asarray(contour, dtype=float) for contour in contours]
+    lengths = [len(contour[0::3]) for contour in coordinates]
+    con_x = np.concatenate([contour[0::3] for contour in coordinates])
+    con_y = np.concatenate([contour[1::3] for contour in coordinates])
+
     if prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmin(np_x < con_x)
-            y = np.argmin(np_y < con_y)
-            pixels.append([x, y])
-    return pixels
+        x = _first_index_at_least(pixlut[0], con_x)
+        y = _first_index_at_least(pixlut[1], con_y)
+    elif feetfirst:
+        x = _first_index_at_least(pixlut[0], con_x)
+        y = _first_index_above(pixlut[1], con_y)
+    else:
+        x = _first_index_above(pixlut[0], con_x)
+        y = _first_index_above(pixlut[1], con_y)
+
+    pixels = np.column_stack((x, y))
+    return [contour_pixels.tolist() for contour_pixels
+            in np.split(pixels, np.cumsum(lengths)[:-1])]
+
+
+def _first_index_above(axis, values):
+    """
+    Vectorised equivalent of np.argmax(axis > value) for every value,
+    i.e. the index of the first element of axis greater than the value,
+    or 0 if there is none.
+    :param axis: 1D array of pixel coordinates (one pixlut axis)
+    :param values: 1D array of contour coordinates
+    :return: 1D array of indices
+    """
+    axis = np.asarray(axis)
+    if np.all(axis[1:] >= axis[:-1]):
+        indices = np.searchsorted(axis, values, side='right')
+        indices[indices == len(axis)] = 0
+        return indices
+    return np.argmax(axis > values[:, np.newaxis], axis=1)
+
+
+def _first_index_at_least(axis, values):
+    """
+    Vectorised equivalent of np.argmin(axis < value) for every value,
+    i.e. the index of the first element of axis not less than the value,
+    or 0 if there is none.
+    :param axis: 1D array of pixel coordinates (one pixlut axis)
+    :param values: 1D array of contour coordinates
+    :return: 1D array of indices
+    """
+    axis = np.asarray(axis)
+    if np.all(axis[1:] >= axis[:-1]):
+        indices = np.searchsorted(axis, values, side='left')
+        indices[indices == len(axis)] = 0
+        return indices
+    return np.argmin(axis < values[:, np.newaxis], axis=1)
 
 
 def convert_hull_list_to_contours_data(rois_to_save, patient_dict_container):
@@ -653,12 +578,10 @@ def get_contour_pixel(
         # slice
         dict_pixels_of_roi = collections.defaultdict(list)
         raw_contours = dict_raw_contour_data[roi]
-        number_of_contours = len(raw_contours[curr_slice])
-        for i in range(number_of_contours):
-            contour_pixels = calculate_pixels(
-                pixlut, raw_contours[curr_slice][i], prone, feetfirst
+        if raw_contours[curr_slice]:
+            dict_pixels_of_roi[curr_slice] = calculate_contours_pixels(
+                pixlut, raw_contours[curr_slice], prone, feetfirst
             )
-            dict_pixels_of_roi[curr_slice].append(contour_pixels)
         dict_pixels[roi] = dict_pixels_of_roi
 
     return dict_pixels
@@ -678,12 +601,11 @@ def get_roi_contour_pixel(dict_raw_contour_data, roi_list, dict_pixluts):
         dict_pixels_of_roi = collections.defaultdict(list)
         raw_contour = dict_raw_contour_data[roi]
         for roi_slice in raw_contour:
-            pixlut = dict_pixluts[roi_slice]
-            number_of_contours = len(raw_contour[roi_slice])
-            for i in range(number_of_contours):
-                contour_pixels = calculate_pixels(pixlut,
-                                                  raw_contour[roi_slice][i])
-                dict_pixels_of_roi[roi_slice].append(contour_pixels)
+            # All contours of a slice share the slice's pixlut, so they
+            # are converted together
+            if raw_contour[roi_slice]:
+                dict_pixels_of_roi[roi_slice] = calculate_contours_pixels(
+                    dict_pixluts[roi_slice], raw_contour[roi_slice])
         dict_pixels[roi] = dict_pixels_of_roi
     return dict_pixels
 
@@ -691,7 +613,8 @@ def get_roi_contour_pixel(dict_raw_contour_data, roi_list, dict_pixluts):
 def transform_rois_contours(axial_rois_contours):
     """
        Transform the axial ROI contours into coronal and sagittal
-       contours
+       contours. Each ROI is filled into a 3D mask once, and the outlines
+       of the mask on every coronal and sagittal line are traced.
        :param axial_rois_contours: the dictionary of axial ROI contours
        :return: Tuple of coronal and sagittal ROI contours
     """
@@ -699,35 +622,110 @@ def transform_rois_contours(axial_rois_contours):
     sagittal_rois_contours = {}
     slice_ids = get_dict_slice_to_uid(PatientDictContainer())
     for name in axial_rois_contours.keys():
-        coronal_rois_contours[name] = {}
-        sagittal_rois_contours[name] = {}
-        for slice_id in slice_ids:
-            contours = axial_rois_contours[name][slice_id]
-            for contour in contours:
-                for i in range(len(contour)):
-                    if contour[i][1] in coronal_rois_contours[name]:
-                        coronal_rois_contours[name][contour[i][1]][0] \
-                            .append([contour[i][0], slice_ids[slice_id]])
-                    else:
-                        coronal_rois_contours[name][contour[i][1]] = [[]]
-                        coronal_rois_contours[name][contour[i][1]][0] \
-                            .append([contour[i][0], slice_ids[slice_id]])
-
-                    if contour[i][0] in sagittal_rois_contours[name]:
-                        sagittal_rois_contours[name][contour[i][0]][0] \
-                            .append([contour[i][1], slice_ids[slice_id]])
-                    else:
-                        sagittal_rois_contours[name][contour[i][0]] = [[]]
-                        sagittal_rois_contours[name][contour[i][0]][0] \
-                            .append([contour[i][1], slice_ids[slice_id]])
-
-    coronal_rois_contours = convert_coordinates_map_to_polygon_of_rois(
-        coronal_rois_contours)
-    sagittal_rois_contours = convert_coordinates_map_to_polygon_of_rois(
-        sagittal_rois_contours)
+        mask, offset = get_roi_mask(axial_rois_contours[name], slice_ids)
+        coronal_rois_contours[name] = get_mask_outlines(mask, offset, 1)
+        sagittal_rois_contours[name] = get_mask_outlines(mask, offset, 2)
     return coronal_rois_contours, sagittal_rois_contours
 
 
+def get_roi_mask(axial_roi_contours, slice_ids):
+    """
+    Fill the axial contours of an ROI into a 3D mask covering the
+    bounding box of the ROI.
+    :param axial_roi_contours: the dictionary of the axial contour pixels
+        of each slice of the ROI
+    :param slice_ids: dictionary of slice UID to slice index
+    :return: Tuple of the mask, indexed by slice, row and column, and the
+        slice, row and column of its first element. The mask is None if
+        the ROI has no contours.
+    """
+    slice_contours = []
+    for uid, slice_id in slice_ids.items():
+        contours = [np.asarray(contour, dtype=np.int32).reshape(-1, 2)
+                    for contour in axial_roi_contours.get(uid, [])]
+        contours = [contour for contour in contours if len(contour)]
+        if contours:
+            slice_contours.append((slice_id, contours))
+    if not slice_contours:
+        return None, (0, 0, 0)
+
+    points = np.concatenate([contour for _, contours in slice_contours
+                             for contour in contours])
+    x_min, y_min = points.min(axis=0)
+    x_max, y_max = points.max(axis=0)
+    slice_min = min(slice_id for slice_id, _ in slice_contours)
+    slice_max = max(slice_id for slice_id, _ in slice_contours)
+
+    mask = np.zeros((slice_max - slice_min + 1, y_max - y_min + 1,
+                     x_max - x_min + 1), dtype=np.uint8)
+    for slice_id, contours in slice_contours:
+        cv2.fillPoly(mask[slice_id - slice_min],
+                     [contour - (x_min, y_min) for contour in contours], 1)
+    return mask.view(bool), (slice_min, y_min, x_min)
+
+
+def get_mask_outlines(mask, offset, axis):
+    """
+    Trace the outlines of a 3D ROI mask on every coronal or sagittal line.
+    :param mask: the mask from get_roi_mask
+    :param offset: the slice, row and column of the first element of the
+        mask
+    :param axis: 1 for the coronal lines (rows), 2 for the sagittal lines
+        (columns)
+    :return: Dictionary of line index to a list of outlines, each a list
+        of points of the column or row and the slice index
+    """
+    outlines = {}
+    if mask is None:
+        return outlines
+    point_offset = np.array([offset[3 - axis], offset[0]])
+    for line in range(mask.shape[axis]):
+        plane = np.ascontiguousarray(mask.take(line, axis=axis))
+        if not plane.any():
+            continue
+        # The outer boundary pixels of each region, with the points of
+        # straight runs merged
+        contours, _ = cv2.findContours(plane.view(np.uint8),
+                                       cv2.RETR_EXTERNAL,
+                                       cv2.CHAIN_APPROX_SIMPLE)
+        outlines[line + offset[axis]] = [
+            (contour.reshape(-1, 2) + point_offset).tolist()
+            for contour in contours]
+    return outlines
+
+
+def get_resliced_roi_contours(roi_name, axial_rois_contours,
+                              patient_dict_container=None):
+    """
+    Get the coronal and sagittal contours of an ROI. They are calculated
+    once for the contour data of the ROI, and calculated again when the
+    ROI changes.
+    :param roi_name: the name of the ROI
+    :param axial_rois_contours: the dictionary of axial ROI contours,
+        including the ROI
+    :param patient_dict_container: PatientDictContainer by default
+    :return: Tuple of the coronal and sagittal contours of the ROI
+    """
+    if patient_dict_container is None:
+        patient_dict_container = PatientDictContainer()
+    raw_contour = patient_dict_container.get("raw_contour")[roi_name]
+    resliced_contours = patient_dict_container.get("resliced_contours")
+    if resliced_contours is None:
+        resliced_contours = {}
+        patient_dict_container.set("resliced_contours", resliced_contours)
+
+    # The raw contour data is replaced when the ROI changes, and the
+    # reference kept here stops its id being reused
+    cached = resliced_contours.get(roi_name)
+    if cached is None or cached[0] is not raw_contour:
+        coronal_contours, sagittal_contours = transform_rois_contours(
+            {roi_name: axial_rois_contours[roi_name]})
+        cached = (raw_contour, coronal_contours[roi_name],
+                  sagittal_contours[roi_name])
+        resliced_contours[roi_name] = cached
+    return cached[1], cached[2]
+
+
 def convert_coordinates_map_to_polygon_of_rois(contours_map):
     """
 
@@ -770,7 +768,7 @@ def calculate_concave_hull_of_points(pixel_coords, alpha=0.2):
     if isinstance(hull, Polygon):
         polygon_list.append(hull_to_points(hull))
     elif isinstance(hull, MultiPolygon):
-        for polygon in hull:
+        for polygon in hull.geoms:
             polygon_list.append(hull_to_points(polygon))
     return polygon_list
 
@@ -854,6 +852,129 @@ def calc_roi_polygon(curr_roi, curr_slice, dict_rois_contours,
     return list_polygons
 
 
+def get_roi_polygon_cache(patient_dict_container=None):
+    """
+    Gets the cache of the display polygons of ROI slices of a container,
+    creating it the first time. Polygons are keyed by (ROI, view, aspect,
+    generation, slice), where the generation identifies the ROIPolygons
+    they were calculated for, so polygons of an ROI which has since
+    changed are never reused.
+    :param patient_dict_container: PatientDictContainer by default
+    :return: SliceLRUCache
+    """
+    if patient_dict_container is None:
+        patient_dict_container = PatientDictContainer()
+    cache = patient_dict_container.get("roi_polygon_cache")
+    if cache is None:
+        cache = SliceLRUCache(ROI_POLYGON_CACHE_SIZE)
+        patient_dict_container.set("roi_polygon_cache", cache)
+    return cache
+
+
+class ROIPolygons(Mapping):
+    """
+    A read-only mapping of slice to the list of QPolygonF displaying an
+    ROI on it, for one view. Behaves like the dictionary of polygons
+    previously calculated for every slice when the ROI was selected, but
+    only calculates the polygons of a slice when it is first requested,
+    keeping them in the cache of get_roi_polygon_cache.
+    """
+
+    generations = itertools.count()
+
+    def __init__(self, roi_name, view, slice_keys, pixmap_aspect, cache,
+                 patient_dict_container=None):
+        """
+        :param roi_name: the name of the ROI
+        :param view: "axial", "coronal" or "sagittal"
+        :param slice_keys: the slices of the view in order, the slice UIDs
+            of the axial view or the line indices of the other views
+        :param pixmap_aspect: the scaling ratio passed to calc_roi_polygon
+        :param cache: the SliceLRUCache to store the polygons in
+        :param patient_dict_container: PatientDictContainer by default
+        """
+        if patient_dict_container is None:
+            patient_dict_container = PatientDictContainer()
+        self.roi_name = roi_name
+        self.view = view
+        self.slice_keys = list(slice_keys)
+        self.slice_indices = {key: index for index, key
+                              in enumerate(self.slice_keys)}
+        self.pixmap_aspect = pixmap_aspect
+        self.cache = cache
+        self.patient_dict_container = patient_dict_container
+        self.key = (roi_name, view, pixmap_aspect, next(self.generations))
+        self.dict_rois_contours = None
+
+    def __getitem__(self, slice_key):
+        if slice_key not in self.slice_indices:
+            raise KeyError(slice_key)
+        polygons = self.cache.get(self.key + (slice_key,))
+        if polygons is None:
+            polygons = calc_roi_polygon(self.roi_name, slice_key,
+                                        self.get_contours(slice_key),
+                                        self.pixmap_aspect)
+            self.cache.put(self.key + (slice_key,), polygons)
+        return polygons
+
+    def __iter__(self):
+        return iter(self.slice_keys)
+
+    def __len__(self):
+        return len(self.slice_keys)
+
+    def get_contours(self, slice_key):
+        """
+        Gets the pixel contours of the ROI needed to display a slice. Only
+        the contours of the slice are converted for the axial view, while
+        the coronal and sagittal views reslice the whole ROI the first
+        time any of their slices is displayed.
+        :param slice_key: the slice UID or line index
+        :return: Dictionary of the ROI name to its contours on the slices
+        """
+        container = self.patient_dict_container
+        if self.view == "axial":
+            raw_contour = container.get("raw_contour")[self.roi_name]
+            if not raw_contour.get(slice_key):
+                return {self.roi_name: {}}
+            return {self.roi_name: {slice_key: calculate_contours_pixels(
+                container.get("pixluts")[slice_key],
+                raw_contour[slice_key])}}
+
+        if self.dict_rois_contours is None:
+            dict_rois_contours = get_roi_contour_pixel(
+                container.get("raw_contour"), [self.roi_name],
+                container.get("pixluts"))
+            coronal_contours, sagittal_contours = \
+                get_resliced_roi_contours(self.roi_name,
+                                          dict_rois_contours, container)
+            self.dict_rois_contours = {
+                self.roi_name: coronal_contours
+                if self.view == "coronal" else sagittal_contours}
+        return self.dict_rois_contours
+
+    def is_cached(self, slice_key):
+        """
+        :param slice_key: the slice UID or line index
+        :return: True if the polygons of the slice have been calculated
+        """
+        return self.key + (slice_key,) in self.cache
+
+    def prefetch(self, slice_key, radius=ROI_POLYGON_PREFETCH_RADIUS):
+        """
+        Calculates the polygons of the slices around the given slice so
+        they are ready when the user scrolls to them.
+        :param slice_key: the displayed slice UID or line index
+        :param radius: Number of slices to calculate either side
+        """
+        index = self.slice_indices[slice_key]
+        for offset in range(1, radius + 1):
+            for neighbour in (index + offset, index - offset):
+                if 0 <= neighbour < len(self.slice_keys) \
+                        and not self.is_cached(self.slice_keys[neighbour]):
+                    self[self.slice_keys[neighbour]]
+
+
 def ordered_list_rois(rois):
     """
     Generate list of rois in alphabetical order
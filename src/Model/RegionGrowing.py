@@ -0,0 +1,258 @@
+"""
+Region growing used by the fill tools of the Draw ROI window. A region is
+grown from a seed over the pixels within a range of pixel values using
+connected-component labelling of the whole slice, or of the whole volume
+for the 3D fill, at once, and holes in the region up to a maximum size
+are filled in the same way.
+"""
+import numpy as np
+from scipy import ndimage
+
+from src.constants import VOLUME_FILL_SLAB_SIZE
+
+# Neighbourhoods of the region (8-connected, or 26-connected in 3D) and of
+# holes (4-connected)
+REGION_STRUCTURE = np.ones((3, 3), dtype=bool)
+VOLUME_STRUCTURE = np.ones((3, 3, 3), dtype=bool)
+HOLE_STRUCTURE = ndimage.generate_binary_structure(2, 1)
+
+# Margin around the slice, so the pixels outside it which touch the region
+# can be labelled and holes open to the outside are never filled
+MARGIN = 2
+
+
+def get_threshold_mask(pixel_array, min_pixel, max_pixel, bounds=None):
+    """
+    Gets the pixels a region can grow over.
+    :param pixel_array: 2D numpy array of the pixel values, indexed by y
+        then x.
+    :param min_pixel: Pixel values must be greater than min_pixel.
+    :param max_pixel: Pixel values must be less than max_pixel.
+    :param bounds: Tuple of the minimum x, minimum y, maximum x and maximum
+        y, exclusive, the pixels must lie between, or None for the whole
+        slice.
+    :return: 2D boolean numpy array.
+    """
+    pixel_array = np.asarray(pixel_array)
+    mask = (min_pixel < pixel_array) & (pixel_array < max_pixel)
+    if bounds is not None:
+        min_x, min_y, max_x, max_y = bounds
+        within = np.zeros(mask.shape, dtype=bool)
+        within[max(min_y + 1, 0):max(max_y, 0),
+               max(min_x + 1, 0):max(max_x, 0)] = True
+        mask &= within
+    return mask
+
+
+def grow_region(valid, seed, target=None, max_hole_size=0):
+    """
+    Grows a region from a seed over 8-connected valid pixels. The seed's
+    own neighbourhood is grown from whether or not the seed is valid, and
+    the region does not grow through pixels which are already in the
+    target. Holes next to the region whose outline is at most
+    max_hole_size pixels are then filled, if they are at most
+    max_hole_size pixels.
+    :param valid: 2D boolean numpy array from get_threshold_mask.
+    :param seed: x and y of the seed.
+    :param target: 2D boolean numpy array of the pixels already selected,
+        or None.
+    :param max_hole_size: Maximum size of the holes to fill, 0 to fill no
+        holes.
+    :return: 2D boolean numpy array of the target pixels and the grown
+        region.
+    """
+    rows, columns = valid.shape
+    if target is None:
+        target = np.zeros(valid.shape, dtype=bool)
+    seed_x, seed_y = int(seed[0]), int(seed[1])
+    if not (-1 <= seed_x <= columns and -1 <= seed_y <= rows):
+        # No pixel of the slice neighbours the seed
+        return target.copy()
+
+    # Work on the slice plus a margin, which is never valid
+    labels, _ = ndimage.label(np.pad(valid & ~target, MARGIN),
+                              structure=REGION_STRUCTURE)
+    seed_labels = np.unique(labels[seed_y + MARGIN - 1:seed_y + MARGIN + 2,
+                                   seed_x + MARGIN - 1:seed_x + MARGIN + 2])
+    region = np.isin(labels[MARGIN:-MARGIN, MARGIN:-MARGIN],
+                     seed_labels[seed_labels > 0])
+    return fill_region_holes(target | region, region, valid, max_hole_size,
+                             seed)
+
+
+def fill_region_holes(target, region, valid, max_hole_size, seed=None):
+    """
+    Fills the holes next to a region grown over a slice, whose outline is
+    at most max_hole_size pixels, if they are at most max_hole_size
+    pixels.
+    :param target: 2D boolean numpy array of the selected pixels,
+        including the region.
+    :param region: 2D boolean numpy array of the grown region.
+    :param valid: 2D boolean numpy array of the pixels the region could
+        grow over.
+    :param max_hole_size: Maximum size of the holes to fill, 0 to fill no
+        holes.
+    :param seed: x and y of the seed the region was grown from, or None.
+    :return: 2D boolean numpy array of the target pixels with the holes
+        filled.
+    """
+    if max_hole_size <= 0:
+        return target
+    padded_target = np.pad(target, MARGIN)
+    grown = np.pad(region, MARGIN)
+    if seed is not None:
+        grown[int(seed[1]) + MARGIN, int(seed[0]) + MARGIN] = True
+    outlines = ndimage.binary_dilation(grown, REGION_STRUCTURE) \
+        & ~np.pad(valid, MARGIN)
+    fill_holes(padded_target, outlines, max_hole_size)
+    return padded_target[MARGIN:-MARGIN, MARGIN:-MARGIN]
+
+
+def fill_holes(target, outlines, max_hole_size):
+    """
+    Fills the holes in the target which are next to an outline of at most
+    max_hole_size pixels, in place. Single pixel outlines are filled, and
+    other holes are filled if they are at most max_hole_size pixels and do
+    not touch the edge of the target array.
+    :param target: 2D boolean numpy array of the selected pixels, with a
+        margin of unselected pixels.
+    :param outlines: 2D boolean numpy array of the pixels around the
+        region which could not be grown over.
+    :param max_hole_size: Maximum size of the holes to fill.
+    """
+    outline_labels, _ = ndimage.label(outlines, structure=HOLE_STRUCTURE)
+    outline_sizes = np.bincount(outline_labels.ravel())
+    outline_sizes[0] = 0
+    small_outlines = (outline_sizes > 0) & (outline_sizes <= max_hole_size)
+    target |= (outline_sizes == 1)[outline_labels]
+    hole_outlines = (small_outlines & (outline_sizes > 1))[outline_labels]
+    if not hole_outlines.any():
+        return
+
+    hole_labels, _ = ndimage.label(~target, structure=HOLE_STRUCTURE)
+    hole_sizes = np.bincount(hole_labels.ravel())
+    fillable = hole_sizes <= max_hole_size
+    fillable[0] = False
+    # Holes open to the outside of the slice are unbounded
+    edges = np.concatenate((hole_labels[0], hole_labels[-1],
+                            hole_labels[:, 0], hole_labels[:, -1]))
+    fillable[edges] = False
+    outlined = np.zeros(hole_sizes.shape, dtype=bool)
+    outlined[hole_labels[hole_outlines]] = True
+    target |= (fillable & outlined)[hole_labels]
+
+
+def get_threshold_volume(pixel_arrays, min_pixel, max_pixel, bounds=None,
+                         interrupt_flag=None, progress_callback=None,
+                         progress_range=(0, 50)):
+    """
+    Gets the voxels a region can grow over, thresholding the slices in
+    slabs of VOLUME_FILL_SLAB_SIZE slices.
+    :param pixel_arrays: Sequence of the 2D numpy arrays of the pixel
+        values of each slice, indexed by y then x.
+    :param min_pixel: Pixel values must be greater than min_pixel.
+    :param max_pixel: Pixel values must be less than max_pixel.
+    :param bounds: Bounds of the pixels on each slice, as for
+        get_threshold_mask.
+    :param interrupt_flag: A threading.Event() object that tells the
+        function to stop.
+    :param progress_callback: Signal that receives the progress as a
+        tuple of a message and a percentage.
+    :param progress_range: Percentages to report the progress from and to.
+    :return: 3D boolean numpy array indexed by slice, y then x, or None if
+        interrupted.
+    """
+    start, stop = progress_range
+    valid = np.zeros((len(pixel_arrays),) + np.shape(pixel_arrays[0]),
+                     dtype=bool)
+    for slab_start in range(0, len(pixel_arrays), VOLUME_FILL_SLAB_SIZE):
+        if interrupt_flag is not None and interrupt_flag.is_set():
+            return None
+        slab_stop = min(slab_start + VOLUME_FILL_SLAB_SIZE, len(pixel_arrays))
+        for i in range(slab_start, slab_stop):
+            valid[i] = get_threshold_mask(pixel_arrays[i], min_pixel,
+                                          max_pixel, bounds)
+        if progress_callback is not None:
+            progress_callback.emit(
+                ("Thresholding slices... (%d/%d)"
+                 % (slab_stop, len(pixel_arrays)),
+                 start + (stop - start) * slab_stop // len(pixel_arrays)))
+    return valid
+
+
+def grow_volume(valid, seed, max_hole_size=0, interrupt_flag=None,
+                progress_callback=None, progress_range=(50, 100)):
+    """
+    Grows a region from a seed over 26-connected valid voxels in one pass,
+    then fills the holes of the region on each slice as grow_region does.
+    The whole volume is grown and filled before it is returned, and the
+    progress is reported for each slab of VOLUME_FILL_SLAB_SIZE slices
+    filled.
+    :param valid: 3D boolean numpy array from get_threshold_volume.
+    :param seed: x and y of the seed, and the index of its slice.
+    :param max_hole_size: Maximum size of the holes to fill on each slice,
+        0 to fill no holes.
+    :param interrupt_flag: A threading.Event() object that tells the
+        function to stop.
+    :param progress_callback: Signal that receives the progress as a
+        tuple of a message and a percentage.
+    :param progress_range: Percentages to report the progress from and to.
+    :return: 3D boolean numpy array of the region, indexed by slice, y
+        then x, or None if interrupted.
+    """
+    slices, rows, columns = valid.shape
+    seed_x, seed_y, seed_slice = (int(value) for value in seed)
+    start, stop = progress_range
+    if progress_callback is not None:
+        progress_callback.emit(("Growing region...", start))
+
+    # The seed's own neighbourhood is grown from, on the seed's slice
+    labels, _ = ndimage.label(valid, structure=VOLUME_STRUCTURE)
+    seed_labels = np.unique(labels[seed_slice,
+                                   max(seed_y - 1, 0):max(seed_y + 2, 0),
+                                   max(seed_x - 1, 0):max(seed_x + 2, 0)])
+    seed_labels = seed_labels[seed_labels > 0]
+    if not seed_labels.size:
+        return np.zeros(valid.shape, dtype=bool)
+    region_volume = np.isin(labels, seed_labels)
+    del labels
+    reached = np.flatnonzero(region_volume.reshape(slices, -1).any(axis=1))
+
+    for slab_start in range(0, slices, VOLUME_FILL_SLAB_SIZE):
+        slab_stop = min(slab_start + VOLUME_FILL_SLAB_SIZE, slices)
+        for i in reached[(reached >= slab_start) & (reached < slab_stop)]:
+            if interrupt_flag is not None and interrupt_flag.is_set():
+                return None
+            region = region_volume[i]
+            region_volume[i] = fill_region_holes(
+                region, region, valid[i], max_hole_size,
+                (seed_x, seed_y) if i == seed_slice else None)
+        if progress_callback is not None:
+            progress_callback.emit(
+                ("Filling slices... (%d/%d)" % (slab_stop, slices),
+                 start + (stop - start) * slab_stop // slices))
+    return region_volume
+
+
+def mask_to_pixel_coords(mask):
+    """
+    :param mask: 2D boolean numpy array indexed by y then x.
+    :return: Set of the x and y of the pixels in the mask.
+    """
+    y_coords, x_coords = np.nonzero(mask)
+    return set(zip(x_coords.tolist(), y_coords.tolist()))
+
+
+def pixel_coords_to_mask(pixel_coords, shape):
+    """
+    :param pixel_coords: Iterable of the x and y of pixels.
+    :param shape: Shape of the mask, rows then columns.
+    :return: 2D boolean numpy array of the pixels within the shape.
+    """
+    mask = np.zeros(shape, dtype=bool)
+    if pixel_coords:
+        coords = np.array(list(pixel_coords), dtype=np.int64).reshape(-1, 2)
+        inside = (coords[:, 0] >= 0) & (coords[:, 0] < shape[1]) \
+            & (coords[:, 1] >= 0) & (coords[:, 1] < shape[0])
+        mask[coords[inside, 1], coords[inside, 0]] = True
+    return mask
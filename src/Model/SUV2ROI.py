@@ -1,8 +1,9 @@
 import numpy
-from skimage import measure
 from src.Model import ImageLoading
 from src.Model import ROI
+from src.Model.Contouring import find_slice_contours
 from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.SUVVolume import get_image_suv_volume
 from src.View.InputDialogs import PatientWeightDialog
 
 
@@ -12,7 +13,6 @@ class SUV2ROI:
     """
     def __init__(self):
         self.patient_weight = None
-        self.weight_over_dose = None
         self.suv2roi_status = False
         self.failure_reason = None
 
@@ -36,7 +36,8 @@ class SUV2ROI:
 
         # Calculate contours
         progress_callback.emit(("Calculating Boundaries", 40))
-        contour_data = self.calculate_contours()
+        contour_data = self.calculate_contours(interrupt_flag,
+                                               progress_callback)
 
         # Stop loading
         if interrupt_flag.is_set():
@@ -107,60 +108,16 @@ class SUV2ROI:
         """
         self.patient_weight = weight_in_grams
 
-    def pet2suv(self, dataset):
-        """
-        Converts DICOM PET pixel array values to SUV values. Currently
-        only handles PET datasets in Bq/mL that are attenuation and
-        decay corrected.
-        :param dataset: the DICOM PET dataset.
-        :return: DICOM PET pixel data in SUV.
-        """
-        # Return if units are not Bq/mL
-        if not dataset.Units == "BQML":
-            self.failure_reason = "UNIT"
-            return None
-
-        # Return if CorrectedImage does not contain DECY, and
-        # decay correction is not START
-        if (["DECY"] not in dataset.CorrectedImage) and \
-                (dataset.DecayCorrection != "START"):
-            self.failure_reason = "DECY"
-            return None
-
-        # Return if patient weight not set
-        if self.patient_weight is None:
-            self.failure_reason = "WEIGHT"
-            return None
-
-        # Get radiopharmaceutical information
-        radiopharmaceutical_info = \
-            dataset.RadiopharmaceuticalInformationSequence[0]
-
-        # Calculate patient weight divided by total dose once
-        if self.weight_over_dose is None:
-            radionuclide_total_dose = \
-                radiopharmaceutical_info['RadionuclideTotalDose'].value
-            self.weight_over_dose = \
-                self.patient_weight / radionuclide_total_dose
-
-        # Get rescale slope and intercept
-        rescale_slope = dataset.RescaleSlope
-        rescale_intercept = dataset.RescaleIntercept
-
-        # Get pixel data
-        pixel_array = dataset.pixel_array
-
-        # Convert Bq/ml to SUV
-        suv = (pixel_array * rescale_slope + rescale_intercept) \
-            * self.weight_over_dose
-
-        # Return SUV data
-        return suv
-
-    def calculate_contours(self):
+    def calculate_contours(self, interrupt_flag=None,
+                           progress_callback=None, progress_range=(40, 60)):
         """
         Calculate SUV boundaries for each slice from an SUV value of 1
         all the way to the maximum SUV value in that slice.
+        :param interrupt_flag: interrupt flag to stop process.
+        :param progress_callback: signal that receives the progress of
+                                  each slice.
+        :param progress_range: percentages to report the progress from
+                               and to.
         :return: Dictionary where key is SUV ROI name and value is
                  a list containing tuples of slice id and lists of
                  contours.
@@ -168,37 +125,39 @@ class SUV2ROI:
         # Create dictionary to store contour data
         contour_data = {}
 
-        # Initialise variables needed for function
-        patient_dict_container = PatientDictContainer()
-        slider_min = 0
-        slider_max = len(patient_dict_container.get("pixmaps_axial"))
-
-        # Loop through each PET image in the dataset
-        for slider_id in range(slider_min, slider_max):
-            # Get SUV data from PET file
-            temp_ds = patient_dict_container.dataset[slider_id]
-            suv_data = self.pet2suv(temp_ds)
+        # Convert every PET image in the dataset to SUV at once. The
+        # volume is shared with other users of the patient's SUV.
+        suv_volume, self.failure_reason = \
+            get_image_suv_volume(self.patient_weight)
 
-            # Return None if PET 2 SUV failed
-            if suv_data is None:
-                return None
-
-            # Set current and max SUV for the current slice
-            current_suv = 1
-            max_suv = numpy.amax(suv_data)
+        # Return None if PET 2 SUV failed
+        if suv_volume is None:
+            return None
 
-            # Continue calculating SUV contours for the slice until the
-            # max SUV has been reached.
-            while current_suv < max_suv:
-                # Find the contours for the SUV (i)
-                contours = measure.find_contours(suv_data, current_suv)
+        # Calculate contours for every SUV from 1 until the max SUV of
+        # each slice has been reached
+        max_suvs = suv_volume.max(axis=(1, 2))
+        suv_levels = [range(1, int(numpy.ceil(max_suv)))
+                      for max_suv in max_suvs]
+
+        # Find the contours of every SUV of all slices, in a process pool
+        # if there are enough of them
+        slice_contours = find_slice_contours(
+            suv_volume, suv_levels, max_workers=None,
+            interrupt_flag=interrupt_flag,
+            progress_callback=progress_callback,
+            progress_range=progress_range)
+        if slice_contours is None:
+            return None
 
+        for slider_id, contours in enumerate(slice_contours):
+            for current_suv in suv_levels[slider_id]:
                 # Get the SUV name
                 name = "SUV-" + str(current_suv)
                 if name not in contour_data:
                     contour_data[name] = []
-                contour_data[name].append((slider_id, contours))
-                current_suv += 1
+                contour_data[name].append(
+                    (slider_id, contours[current_suv]))
 
         # Return contour data
         return contour_data
@@ -244,6 +203,7 @@ class SUV2ROI:
             current_progress += progress_increment
 
             # Loop through each slice
+            roi_list = []
             for i in range(len(contours[item])):
                 slider_id = contours[item][i][0]
                 dataset = patient_dict_container.dataset[slider_id]
@@ -268,13 +228,14 @@ class SUV2ROI:
                         single_array[j].append(rcs_pixels[1])
                         single_array[j].append(z_coord)
 
-                # Create the ROI(s)
                 for array in single_array:
-                    rtss = ROI.create_roi(dataset_rtss, item,
-                                          [{'coords': array, 'ds': dataset}],
-                                          "")
-
-                    # Save the updated rtss
-                    patient_dict_container.set("dataset_rtss", rtss)
-                    patient_dict_container.set("rois",
-                                               ImageLoading.get_roi_info(rtss))
+                    roi_list.append({'coords': array, 'ds': dataset})
+
+            # Create the ROI with the contours of every slice at once
+            if roi_list:
+                rtss = ROI.create_roi(dataset_rtss, item, roi_list, "")
+
+                # Save the updated rtss
+                patient_dict_container.set("dataset_rtss", rtss)
+                patient_dict_container.set("rois",
+                                           ImageLoading.get_roi_info(rtss))
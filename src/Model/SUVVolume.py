@@ -0,0 +1,139 @@
+"""
+Conversion of PET images in Bq/mL to standardised uptake values (SUV).
+The whole series is converted at once into a float32 volume from the
+pixel values that were loaded for display, and the volume is kept in the
+container of the images, so SUV2ROI and the PET/CT view share it.
+"""
+import numpy as np
+
+from src.Model.CalculateImages import get_image_keys
+from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.PTCTDictContainer import PTCTDictContainer
+
+
+def get_suv_failure_reason(dataset, patient_weight):
+    """
+    Checks whether a PET image can be converted to SUV. Currently only
+    handles PET datasets in Bq/mL that are attenuation and decay
+    corrected.
+    :param dataset: A DICOM PET dataset.
+    :param patient_weight: The patient's weight in grams, or None.
+    :return: None if the image can be converted, otherwise "UNIT",
+             "DECY" or "WEIGHT".
+    """
+    # Units must be Bq/mL
+    if not dataset.Units == "BQML":
+        return "UNIT"
+
+    # CorrectedImage must contain DECY, or decay correction be START
+    if ("DECY" not in dataset.CorrectedImage) and \
+            (dataset.DecayCorrection != "START"):
+        return "DECY"
+
+    if patient_weight is None:
+        return "WEIGHT"
+
+    return None
+
+
+def get_weight_over_dose(dataset, patient_weight):
+    """
+    Gets the factor converting Bq/mL to SUV, the patient weight divided by
+    the total dose injected.
+    :param dataset: A DICOM PET dataset.
+    :param patient_weight: The patient's weight in grams.
+    :return: The patient weight divided by the radionuclide total dose.
+    """
+    radiopharmaceutical_info = \
+        dataset.RadiopharmaceuticalInformationSequence[0]
+    radionuclide_total_dose = \
+        radiopharmaceutical_info['RadionuclideTotalDose'].value
+    return patient_weight / radionuclide_total_dose
+
+
+def get_suv_volume(datasets, pixel_values, rescaled, weight_over_dose):
+    """
+    Converts a PET series to SUV in one operation.
+    :param datasets: List of the PET datasets, in the order of the slices
+                     of pixel_values.
+    :param pixel_values: 3D numpy array of the pixel values of the series,
+                         as returned by convert_raw_data.
+    :param rescaled: True if the rescale slope and intercept have already
+                     been applied to pixel_values.
+    :param weight_over_dose: Factor from get_weight_over_dose.
+    :return: float32 numpy array of the SUV of every slice.
+    """
+    suv = np.asarray(pixel_values, dtype=np.float32)
+    if not rescaled:
+        slopes = np.array([float(ds.RescaleSlope) for ds in datasets],
+                          dtype=np.float32)
+        intercepts = np.array([float(ds.RescaleIntercept)
+                               for ds in datasets], dtype=np.float32)
+        suv = suv * slopes[:, None, None] + intercepts[:, None, None]
+    else:
+        suv = suv.copy()
+    suv *= np.float32(weight_over_dose)
+    return suv
+
+
+def get_image_suv_volume(patient_weight, patient_dict_container=None):
+    """
+    Gets the SUV volume of the PET images of the patient. The volume is
+    calculated once per series and patient weight and kept in the
+    container.
+    :param patient_weight: The patient's weight in grams.
+    :param patient_dict_container: The container of the images,
+                                   PatientDictContainer by default.
+    :return: Tuple of the SUV volume, or None if the images cannot be
+             converted, and the reason they cannot be converted.
+    """
+    if patient_dict_container is None:
+        patient_dict_container = PatientDictContainer()
+    dataset = patient_dict_container.dataset
+    datasets = [dataset[key] for key in get_image_keys(dataset)]
+    for ds in datasets:
+        failure_reason = get_suv_failure_reason(ds, patient_weight)
+        if failure_reason is not None:
+            return None, failure_reason
+
+    suv_key = (tuple(ds.SOPInstanceUID for ds in datasets), patient_weight)
+    cached = patient_dict_container.get("suv_volume")
+    if cached is None or cached[0] != suv_key:
+        # The pixel values are only rescaled when loaded for display
+        suv_volume = get_suv_volume(
+            datasets, patient_dict_container.get("pixel_values"),
+            patient_dict_container.has_attribute("scaled"),
+            get_weight_over_dose(datasets[0], patient_weight))
+        cached = (suv_key, suv_volume)
+        patient_dict_container.set("suv_volume", cached)
+    return cached[1], None
+
+
+def get_pt_suv_volume(pt_ct_dict_container=None):
+    """
+    Gets the SUV volume of the PET images of the PET/CT view, using the
+    patient weight of the PET images. The volume is calculated once and
+    kept in the container.
+    :param pt_ct_dict_container: The container of the images,
+                                 PTCTDictContainer by default.
+    :return: The SUV volume, or None if the images cannot be converted.
+    """
+    if pt_ct_dict_container is None:
+        pt_ct_dict_container = PTCTDictContainer()
+    if pt_ct_dict_container.has_attribute("pt_suv_volume"):
+        return pt_ct_dict_container.get("pt_suv_volume")
+
+    pt_dataset = pt_ct_dict_container.pt_dataset
+    datasets = [pt_dataset[key] for key in get_image_keys(pt_dataset)]
+    patient_weight = datasets[0].get("PatientWeight")
+    patient_weight = float(patient_weight) * 1000 if patient_weight \
+        else None
+    suv_volume = None
+    if all(get_suv_failure_reason(ds, patient_weight) is None
+           for ds in datasets):
+        suv_volume = get_suv_volume(
+            datasets, pt_ct_dict_container.get("pt_pixel_values"),
+            pt_ct_dict_container.has_attribute("pt_scaled"),
+            get_weight_over_dose(datasets[0], patient_weight))
+    pt_ct_dict_container.set("pt_suv_volume", suv_volume)
+    return suv_volume
@@ -1,7 +1,7 @@
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.PTCTDictContainer import PTCTDictContainer
 from src.Model.MovingDictContainer import MovingDictContainer
-from src.Model.CalculateImages import get_pixmaps
+from src.Model.CalculateImages import get_windowed_pixmaps
 from src.Model.ImageFusion import get_fused_window
 
 
@@ -39,12 +39,14 @@ def windowing_model_direct(level, window, init):
     pt_ct_dict_container = PTCTDictContainer()
 
     # Update the dictionary of pixmaps with the update window and
-    # level values
+    # level values. Slices are only rendered once they are displayed.
     if init[0]:
-        pixel_values = patient_dict_container.get("pixel_values")
-        pixmap_aspect = patient_dict_container.get("pixmap_aspect")
         pixmaps_axial, pixmaps_coronal, pixmaps_sagittal = \
-            get_pixmaps(pixel_values, window, level, pixmap_aspect)
+            get_windowed_pixmaps(
+                (patient_dict_container.get("pixmaps_axial"),
+                 patient_dict_container.get("pixmaps_coronal"),
+                 patient_dict_container.get("pixmaps_sagittal")),
+                window, level)
 
         patient_dict_container.set("pixmaps_axial", pixmaps_axial)
         patient_dict_container.set("pixmaps_coronal", pixmaps_coronal)
@@ -54,11 +56,12 @@ def windowing_model_direct(level, window, init):
 
     # Update CT
     if init[2]:
-        ct_pixel_values = pt_ct_dict_container.get("ct_pixel_values")
-        ct_pixmap_aspect = pt_ct_dict_container.get("ct_pixmap_aspect")
         ct_pixmaps_axial, ct_pixmaps_coronal, ct_pixmaps_sagittal = \
-            get_pixmaps(ct_pixel_values, window, level, ct_pixmap_aspect,
-                        fusion=True)
+            get_windowed_pixmaps(
+                (pt_ct_dict_container.get("ct_pixmaps_axial"),
+                 pt_ct_dict_container.get("ct_pixmaps_coronal"),
+                 pt_ct_dict_container.get("ct_pixmaps_sagittal")),
+                window, level)
 
         pt_ct_dict_container.set("ct_pixmaps_axial", ct_pixmaps_axial)
         pt_ct_dict_container.set("ct_pixmaps_coronal", ct_pixmaps_coronal)
@@ -68,11 +71,12 @@ def windowing_model_direct(level, window, init):
 
     # Update PT
     if init[1]:
-        pt_pixel_values = pt_ct_dict_container.get("pt_pixel_values")
-        pt_pixmap_aspect = pt_ct_dict_container.get("pt_pixmap_aspect")
         pt_pixmaps_axial, pt_pixmaps_coronal, pt_pixmaps_sagittal = \
-            get_pixmaps(pt_pixel_values, window, level, pt_pixmap_aspect,
-                        fusion=True, color="Heat")
+            get_windowed_pixmaps(
+                (pt_ct_dict_container.get("pt_pixmaps_axial"),
+                 pt_ct_dict_container.get("pt_pixmaps_coronal"),
+                 pt_ct_dict_container.get("pt_pixmaps_sagittal")),
+                window, level)
 
         pt_ct_dict_container.set("pt_pixmaps_axial", pt_pixmaps_axial)
         pt_ct_dict_container.set("pt_pixmaps_coronal", pt_pixmaps_coronal)
@@ -82,7 +86,7 @@ def windowing_model_direct(level, window, init):
 
     # Update Fusion
     if init[3]:
-        fusion_axial, fusion_coronal, fusion_sagittal, tfm = \
+        fusion_axial, fusion_sagittal, fusion_coronal, tfm = \
             get_fused_window(level, window)
         patient_dict_container.set("color_axial", fusion_axial)
         patient_dict_container.set("color_coronal", fusion_coronal)
@@ -99,17 +99,19 @@ class BatchProcessSUV2ROI(BatchProcess):
 
         # Calculate boundaries
         self.progress_callback.emit(("Calculating Boundaries", 60))
-        contour_data = suv2roi.calculate_contours()
-
-        if not contour_data:
-            self.summary = "SUV_" + suv2roi.failure_reason
-            return False
+        contour_data = suv2roi.calculate_contours(self.interrupt_flag,
+                                                  self.progress_callback,
+                                                  (60, 80))
 
         # Stop loading
         if self.interrupt_flag.is_set():
             self.summary = "INTERRUPT"
             return False
 
+        if not contour_data:
+            self.summary = "SUV_" + suv2roi.failure_reason
+            return False
+
         # Generate ROIs
         self.progress_callback.emit(("Generating ROIs...", 80))
         suv2roi.generate_ROI(contour_data, self.progress_callback)
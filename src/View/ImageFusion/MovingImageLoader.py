@@ -1,5 +1,4 @@
 import os
-import platform
 from pathlib import Path
 
 from PySide6 import QtCore
@@ -65,8 +64,9 @@ class MovingImageLoader(ImageLoader):
                 self.update_calc_dvh)
             self.signal_request_calc_dvh.emit()
 
-            while not self.advised_calc_dvh:
-                pass
+            if not self.wait_for_dvh_advice(interrupt_flag):
+                print("stopped")
+                return False
 
         if 'rtss' in file_names_dict:
             dataset_rtss = dcmread(file_names_dict['rtss'])
@@ -106,26 +106,13 @@ class MovingImageLoader(ImageLoader):
             if 'rtdose' in file_names_dict and self.calc_dvh:
                 dataset_rtdose = dcmread(file_names_dict['rtdose'])
 
-                # Spawn-based platforms (i.e Windows and MacOS) have a large
-                # overhead when creating a new process, which ends up making
-                # multiprocessing on these platforms more expensive than linear
-                # calculation. As such, multiprocessing is only available on
-                # Linux until a better solution is found.
-                fork_safe_platforms = ['Linux']
-                if platform.system() in fork_safe_platforms:
-                    progress_callback.emit(("Calculating DVHs...", 60))
-                    raw_dvh = ImageLoading.multi_calc_dvh(dataset_rtss,
-                                                          dataset_rtdose,
-                                                          rois,
-                                                          dict_thickness)
-                else:
-                    progress_callback.emit(
-                        ("Calculating DVHs... (This may take a while)", 60))
-                    raw_dvh = ImageLoading.calc_dvhs(dataset_rtss,
-                                                     dataset_rtdose,
-                                                     rois,
-                                                     dict_thickness,
-                                                     interrupt_flag)
+                progress_callback.emit(("Calculating DVHs...", 60))
+                raw_dvh = ImageLoading.multi_calc_dvh(dataset_rtss,
+                                                      dataset_rtdose,
+                                                      rois,
+                                                      dict_thickness,
+                                                      interrupt_flag,
+                                                      progress_callback)
 
                 if interrupt_flag.is_set():  # Stop loading.
                     print("stopped")
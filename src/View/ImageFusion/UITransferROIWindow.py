@@ -457,7 +457,7 @@ class UITransferROIWindow:
 
         # get sitk for the fixed image
         dicom_image = read_dicom_image_to_sitk(
-            self.patient_dict_container.filepaths)
+            self.patient_dict_container)
 
         if not check_interrupt_flag(interrupt_flag):
             return False
@@ -474,7 +474,7 @@ class UITransferROIWindow:
 
         # get sitk for the moving image
         moving_dicom_image = read_dicom_image_to_sitk(
-            self.moving_dict_container.filepaths)
+            self.moving_dict_container)
 
         if not check_interrupt_flag(interrupt_flag):
             return False
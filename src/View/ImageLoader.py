@@ -1,18 +1,56 @@
 import os
-import platform
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from pathlib import Path
 
 from PySide6 import QtCore
 from pydicom import dcmread, dcmwrite
 
+from src.constants import DVH_INTERRUPT_POLL_INTERVAL
 from src.Model import ImageLoading
-from src.Model.CalculateDVHs import dvh2rtdose, rtdose2dvh, create_initial_rtdose_from_ct
+from src.Model.CalculateDVHs import calc_outdated_dvhs, dvh2rtdose, \
+    rtdose2dvh, create_initial_rtdose_from_ct
+from src.Model.Isodose import clear_isodose_contours
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.ROI import create_initial_rtss_from_ct
 from src.Model.xrRtstruct import create_initial_rtss_from_cr
 from src.Model.GetPatientInfo import DicomTree
 
 
+class DeferredProgress:
+    """
+    Forwards the progress of a calculation running in another thread to
+    a progress signal, from when the calculation's result is wanted. The
+    latest progress made before then is forwarded when it is.
+    """
+
+    def __init__(self, progress_callback):
+        """
+        :param progress_callback: A signal that receives the progress as
+        a tuple of a message and a percentage.
+        """
+        self.progress_callback = progress_callback
+        self.lock = threading.Lock()
+        self.forwarding = False
+        self.latest_progress = None
+
+    def emit(self, progress):
+        with self.lock:
+            if self.forwarding:
+                self.progress_callback.emit(progress)
+            else:
+                self.latest_progress = progress
+
+    def start(self):
+        """
+        Forwards the latest progress and all progress after it.
+        """
+        with self.lock:
+            self.forwarding = True
+            if self.latest_progress is not None:
+                self.progress_callback.emit(self.latest_progress)
+
+
 class ImageLoader(QtCore.QObject):
     """
     This class is responsible for initializing and creating all the values
@@ -30,6 +68,7 @@ class ImageLoader(QtCore.QObject):
         self.existing_rtss = existing_rtss
         self.calc_dvh = False
         self.advised_calc_dvh = False
+        self.dvh_advice = threading.Event()
 
     def load(self, interrupt_flag, progress_callback):
         """
@@ -50,6 +89,9 @@ class ImageLoader(QtCore.QObject):
 
         # Populate the initial values in the PatientDictContainer singleton.
         patient_dict_container = PatientDictContainer()
+        # Stop the isodoses of the last patient being calculated in the
+        # background
+        clear_isodose_contours(patient_dict_container)
         patient_dict_container.clear()
         patient_dict_container.set_initial_values(
             path,
@@ -110,65 +152,68 @@ class ImageLoader(QtCore.QObject):
                 # Check to see if DVH data exists in the RT Dose. If
                 # it is there, return (it will be populated later). If
                 # not, ask if the user wants it calculated.
+                dvh_data = {}
                 try:
                     dvh_data = rtdose2dvh()
                     if bool(dvh_data) and not dvh_data["diff"]:
                         return True
+                    dvh_data.pop("diff")
                 except KeyError:
                     pass
 
+                # Start calculating the DVHs the RT Dose does not have
+                # while the user decides whether they want them, so they
+                # are ready or cancelled when the user answers.
+                dataset_rtdose = dcmread(file_names_dict['rtdose'])
+                dvh_interrupt_flag = threading.Event()
+                dvh_progress = DeferredProgress(progress_callback)
+                executor = ThreadPoolExecutor(max_workers=1)
+                dvh_future = executor.submit(
+                    calc_outdated_dvhs, dataset_rtss, dataset_rtdose, rois,
+                    dict_thickness, dvh_data, None, dvh_interrupt_flag,
+                    dvh_progress)
+                executor.shutdown(wait=False)
+
+                # The advice of an earlier load is not this load's
+                self.dvh_advice.clear()
                 self.parent_window.signal_advise_calc_dvh.connect(
                     self.update_calc_dvh)
                 self.signal_request_calc_dvh.emit()
 
-                while not self.advised_calc_dvh:
-                    pass
-
-                # Calculate DVHs
-                if self.calc_dvh:
-                    dataset_rtdose = dcmread(file_names_dict['rtdose'])
-
-                    # Spawn-based platforms (i.e Windows and MacOS) have
-                    # a large overhead when creating a new process, which
-                    # ends up making multiprocessing on these platforms more
-                    # expensive than linear calculation. As such,
-                    # multiprocessing is only available on Linux until a better
-                    # solution is found.
-                    fork_safe_platforms = ['Linux']
-                    if platform.system() in fork_safe_platforms:
-                        progress_callback.emit(("Calculating DVHs...", 60))
-                        raw_dvh = \
-                            ImageLoading.multi_calc_dvh(dataset_rtss,
-                                                        dataset_rtdose, rois,
-                                                        dict_thickness)
-                    else:
-                        progress_callback.emit(
-                            ("Calculating DVHs... (This may take a while)",
-                             60))
-                        raw_dvh = \
-                            ImageLoading.calc_dvhs(dataset_rtss,
-                                                   dataset_rtdose, rois,
-                                                   dict_thickness,
-                                                   interrupt_flag)
-
-                    if interrupt_flag.is_set():  # Stop loading.
-                        return False
-
-                    progress_callback.emit(("Converging to zero...", 80))
-                    dvh_x_y = ImageLoading.converge_to_0_dvh(raw_dvh)
-
-                    if interrupt_flag.is_set():  # Stop loading.
-                        return False
-
-                    # Add DVH values to PatientDictContainer
-                    patient_dict_container.set("raw_dvh", raw_dvh)
-                    patient_dict_container.set("dvh_x_y", dvh_x_y)
-                    patient_dict_container.set("dvh_outdated", False)
-
-                    # Write DVH data to the RT Dose
-                    dvh2rtdose(raw_dvh)
+                if not self.wait_for_dvh_advice(interrupt_flag):
+                    dvh_interrupt_flag.set()
+                    return False
 
+                if not self.calc_dvh:
+                    dvh_interrupt_flag.set()
                     return True
+
+                # Calculate DVHs
+                progress_callback.emit(("Calculating DVHs...", 60))
+                dvh_progress.start()
+                result = self.wait_for_dvhs(dvh_future, interrupt_flag)
+                if result is None:  # Stop loading.
+                    dvh_interrupt_flag.set()
+                    return False
+                raw_dvh, dvh_fingerprints = result
+
+                progress_callback.emit(("Converging to zero...", 80))
+                dvh_x_y = ImageLoading.converge_to_0_dvh(raw_dvh)
+
+                if interrupt_flag.is_set():  # Stop loading.
+                    return False
+
+                # Add DVH values to PatientDictContainer
+                patient_dict_container.set("raw_dvh", raw_dvh)
+                patient_dict_container.set("dvh_x_y", dvh_x_y)
+                patient_dict_container.set("dvh_fingerprints",
+                                           dvh_fingerprints)
+                patient_dict_container.set("dvh_outdated", False)
+
+                # Write DVH data to the RT Dose
+                dvh2rtdose(raw_dvh)
+
+                return True
         else:
             self.load_temp_rtss(path, progress_callback, interrupt_flag)
 
@@ -279,5 +324,36 @@ class ImageLoader(QtCore.QObject):
 
 
     def update_calc_dvh(self, advice):
-        self.advised_calc_dvh = True
         self.calc_dvh = advice
+        self.advised_calc_dvh = True
+        self.dvh_advice.set()
+
+    def wait_for_dvh_advice(self, interrupt_flag):
+        """
+        Blocks until the user has decided whether to calculate DVHs.
+        :param interrupt_flag: A threading.Event() object that tells the
+        function to stop waiting.
+        :return: True if the user decided, False if loading was
+        interrupted first.
+        """
+        while not self.dvh_advice.wait(DVH_INTERRUPT_POLL_INTERVAL):
+            if interrupt_flag.is_set():
+                return False
+        return True
+
+    @staticmethod
+    def wait_for_dvhs(dvh_future, interrupt_flag):
+        """
+        Blocks until a background DVH calculation has finished.
+        :param dvh_future: Future of the calc_outdated_dvhs call.
+        :param interrupt_flag: A threading.Event() object that tells the
+        function to stop waiting.
+        :return: The result of calc_outdated_dvhs, or None if loading was
+        interrupted first.
+        """
+        while True:
+            try:
+                return dvh_future.result(DVH_INTERRUPT_POLL_INTERVAL)
+            except TimeoutError:
+                if interrupt_flag.is_set():
+                    return None
@@ -2,6 +2,7 @@ from PySide6 import QtCore, QtGui, QtWidgets
 from PySide6.QtGui import QPainter
 from PySide6.QtWidgets import (QPushButton, QRadioButton)
 from src.Model.PTCTDictContainer import PTCTDictContainer
+from src.Model.SUVVolume import get_pt_suv_volume
 
 
 # This class, even though similarly to DicomView is not actually quite the
@@ -216,6 +217,7 @@ class PetCtView(QtWidgets.QWidget):
             "pt_pixmaps_" + self.slice_view)
         m = float(len(pt_pixmaps)) / len(ct_pixmaps)
         pt_image = pt_pixmaps[int(m * slider_id)].toImage()
+        self.update_pt_label(pt_pixmaps.axis, int(m * slider_id))
 
         # Get alpha
         alpha = float(self.alpha_slider.value() / 100)
@@ -233,6 +235,20 @@ class PetCtView(QtWidgets.QWidget):
         self.scene = QtWidgets.QGraphicsScene()
         self.scene.addItem(label)
 
+    def update_pt_label(self, axis, pt_slice_id):
+        """
+        Shows the maximum SUV of the displayed PET slice next to the PET
+        end of the alpha slider, if the PET images can be converted to SUV.
+        :param axis: Axis of the PET volume the slices are taken along.
+        :param pt_slice_id: Index of the displayed PET slice.
+        """
+        suv_volume = get_pt_suv_volume(self.pt_ct_dict_container)
+        if suv_volume is None:
+            self.pt_label.setText("PET")
+            return
+        max_suv = suv_volume.take(pt_slice_id, axis=axis).max()
+        self.pt_label.setText("PET (SUVmax %.1f)" % max_suv)
+
     def zoom_in(self):
         """
         Zooms in on PET/CT
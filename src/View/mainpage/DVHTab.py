@@ -10,7 +10,8 @@ from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 
 from src.Controller.PathHandler import resource_path
 from src.Model import ImageLoading
-from src.Model.CalculateDVHs import dvh2csv, dvh2rtdose, rtdose2dvh
+from src.Model.CalculateDVHs import calc_outdated_dvhs, dvh2csv, \
+    dvh2rtdose, get_roi_fingerprints, rtdose2dvh
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.Worker import Worker
 
@@ -286,6 +287,13 @@ class DVHTab(QtWidgets.QWidget):
             self.patient_dict_container.set("raw_dvh", result)
             self.patient_dict_container.set("dvh_x_y", dvh_x_y)
 
+            # The DVHs in the RT Dose are taken to match the loaded RTSS
+            fingerprints = get_roi_fingerprints(
+                self.patient_dict_container.dataset['rtss'], self.rt_dose)
+            self.patient_dict_container.set(
+                "dvh_fingerprints",
+                {roi: fingerprints.get(roi) for roi in result})
+
             # If incomplete, tell the user about this
             if incomplete:
                 self.patient_dict_container.set("dvh_outdated", True)
@@ -339,20 +347,34 @@ class CalculateDVHProgressWindow(QtWidgets.QDialog):
 
         dict_thickness = ImageLoading.get_thickness_dict(dataset_rtss, self.patient_dict_container.dataset)
 
+        # Only the DVHs of ROIs changed since the last calculation are
+        # recalculated
+        raw_dvh = {}
+        dvh_fingerprints = {}
+        if self.patient_dict_container.has_attribute("raw_dvh"):
+            raw_dvh = self.patient_dict_container.get("raw_dvh")
+        if self.patient_dict_container.has_attribute("dvh_fingerprints"):
+            dvh_fingerprints = \
+                self.patient_dict_container.get("dvh_fingerprints")
+
         interrupt_flag = threading.Event()
-        fork_safe_platforms = ['Linux']
-        if platform.system() in fork_safe_platforms:
-            worker = Worker(ImageLoading.multi_calc_dvh, dataset_rtss, dataset_rtdose, rois, dict_thickness)
-        else:
-            worker = Worker(ImageLoading.calc_dvhs, dataset_rtss, dataset_rtdose, rois, dict_thickness, interrupt_flag)
+        worker = Worker(calc_outdated_dvhs, dataset_rtss, dataset_rtdose,
+                        rois, dict_thickness, raw_dvh, dvh_fingerprints,
+                        interrupt_flag)
 
         worker.signals.result.connect(self.dvh_calculated)
 
         self.threadpool.start(worker)
 
     def dvh_calculated(self, result):
-        dvh_x_y = ImageLoading.converge_to_0_dvh(result)
-        self.patient_dict_container.set("raw_dvh", result)
+        # The calculation was interrupted
+        if result is None:
+            self.close()
+            return
+        raw_dvh, dvh_fingerprints = result
+        dvh_x_y = ImageLoading.converge_to_0_dvh(raw_dvh)
+        self.patient_dict_container.set("raw_dvh", raw_dvh)
+        self.patient_dict_container.set("dvh_fingerprints", dvh_fingerprints)
         self.patient_dict_container.set("dvh_x_y", dvh_x_y)
         self.signal_dvh_calculated.emit()
         self.close()
@@ -1,10 +1,10 @@
 from PySide6 import QtWidgets, QtCore, QtGui
-from skimage import measure
 
 from src.View.mainpage.DicomView import DicomView
-from src.Model.Isodose import get_dose_grid
+from src.Model.Isodose import get_isodose_contours
+from src.Model.LineFillConfiguration import get_line_fill_configuration
 from src.Model.PatientDictContainer import PatientDictContainer
-from src.Controller.PathHandler import data_path, resource_path
+from src.Controller.PathHandler import resource_path
 
 
 class DicomAxialView(DicomView):
@@ -279,76 +279,43 @@ class DicomAxialView(DicomView):
         for roi in selected_rois:
             selected_rois_name.append(rois[roi]['name'])
 
+        displayed_polygons = []
         for roi in selected_rois:
             roi_name = rois[roi]['name']
-            polygons = self.patient_dict_container.get("dict_polygons_axial")[
-                roi_name][curr_slice]
-            super().draw_roi_polygons(roi, polygons)
+            roi_polygons = self.patient_dict_container.get(
+                "dict_polygons_axial")[roi_name]
+            super().draw_roi_polygons(roi, roi_polygons[curr_slice])
+            displayed_polygons.append(roi_polygons)
+        self.prefetch_roi_polygons(displayed_polygons, curr_slice)
 
     def isodose_display(self):
         """
         Display isodoses on the DICOM Image.
         """
         slider_id = self.slider.value()
-        curr_slice_uid = self.patient_dict_container.get("dict_uid")[slider_id]
-        z = self.patient_dict_container.dataset[slider_id].ImagePositionPatient[2]
-        dataset_rtdose = self.patient_dict_container.dataset['rtdose']
-        grid = get_dose_grid(dataset_rtdose, float(z))
-
-        if not (len(grid) == 0):
-            # sort selected_doses in ascending order so that the high dose isodose washes
-            # paint over the lower dose isodose washes
-            for sd in sorted(self.patient_dict_container.get("selected_doses")):
-                dose_level = sd * self.patient_dict_container.get("rx_dose_in_cgray") / \
-                    (dataset_rtdose.DoseGridScaling * 10000)
-                contours = measure.find_contours(grid, dose_level)
-
-                polygons = self.calc_dose_polygon(
-                    self.patient_dict_container.get("dose_pixluts")[curr_slice_uid], contours)
-
-                brush_color = self.iso_color[sd]
-                with open(data_path('line&fill_configuration'), 'r') as stream:
-                    elements = stream.readlines()
-                    if len(elements) > 0:
-                        iso_line = int(elements[2].replace('\n', ''))
-                        iso_opacity = int(elements[3].replace('\n', ''))
-                        line_width = float(elements[4].replace('\n', ''))
-                    else:
-                        iso_line = 2
-                        iso_opacity = 5
-                        line_width = 2.0
-                    stream.close()
-                iso_opacity = int((iso_opacity / 100) * 255)
-                brush_color.setAlpha(iso_opacity)
-                pen_color = QtGui.QColor(
-                    brush_color.red(), brush_color.green(), brush_color.blue())
-                pen = self.get_qpen(pen_color, iso_line, line_width)
-                for i in range(len(polygons)):
-                    self.scene.addPolygon(
-                        polygons[i], pen, QtGui.QBrush(brush_color))
-
-    def calc_dose_polygon(self, dose_pixluts, contours):
-        """
-        Calculate a list of polygons to display for a given isodose.
-        :param dose_pixluts:
-         lookup table (LUT) to get the image pixel values
-        :param contours:
-          trace outline of the isodose to be displayed
-        :return: List of polygons of type QPolygonF.
-        """
-        list_polygons = []
-        for contour in contours:
-            list_qpoints = []
-            # Slicing controls how many points considered for visualization
-            # Essentially affects sharpness of edges, fewer points equals "smoother" edges
-            for point in contour[::2]:
-                curr_qpoint = QtCore.QPoint(
-                    dose_pixluts[0][int(point[1])], dose_pixluts[1][int(point[0])])
-                list_qpoints.append(curr_qpoint)
-            curr_polygon = QtGui.QPolygonF(list_qpoints)
-            list_polygons.append(curr_polygon)
-
-        return list_polygons
+        # sort selected_doses in ascending order so that the high dose isodose washes
+        # paint over the lower dose isodose washes
+        selected_doses = sorted(
+            self.patient_dict_container.get("selected_doses"))
+        isodose_contours = get_isodose_contours(self.patient_dict_container)
+        isodose_polygons = isodose_contours.get_polygons(slider_id,
+                                                         selected_doses)
+
+        line_fill_configuration = get_line_fill_configuration()
+        iso_line = line_fill_configuration["iso_line"]
+        iso_opacity = int((line_fill_configuration["iso_opacity"] / 100) * 255)
+        line_width = line_fill_configuration["line_width"]
+        for sd in selected_doses:
+            brush_color = self.iso_color[sd]
+            brush_color.setAlpha(iso_opacity)
+            pen_color = QtGui.QColor(
+                brush_color.red(), brush_color.green(), brush_color.blue())
+            pen = self.get_qpen(pen_color, iso_line, line_width)
+            for polygon in isodose_polygons[sd]:
+                self.scene.addPolygon(polygon, pen, QtGui.QBrush(brush_color))
+
+        # Calculate the other slices so scrolling does not wait for them
+        isodose_contours.precompute(slider_id, selected_doses)
 
     def suv2roi_handler(self):
         """
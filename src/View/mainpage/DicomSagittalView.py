@@ -17,11 +17,14 @@ class DicomSagittalView(DicomView):
         for roi in selected_rois:
             selected_rois_name.append(rois[roi]['name'])
 
+        displayed_polygons = []
         for roi in selected_rois:
             roi_name = rois[roi]['name']
-            polygons = self.patient_dict_container.get(
-                "dict_polygons_sagittal")[roi_name][slider_id]
-            super().draw_roi_polygons(roi, polygons)
+            roi_polygons = self.patient_dict_container.get(
+                "dict_polygons_sagittal")[roi_name]
+            super().draw_roi_polygons(roi, roi_polygons[slider_id])
+            displayed_polygons.append(roi_polygons)
+        self.prefetch_roi_polygons(displayed_polygons, slider_id)
 
     def isodose_display(self):
         # TODO: Display ISODose on Sagittal View
@@ -1,9 +1,11 @@
 from PySide6 import QtWidgets, QtCore, QtGui
 
 from src.View.mainpage.DicomGraphicsScene import GraphicsScene
+from src.Model.CalculateImages import SlicePixmaps
 from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.ROI import ROIPolygons
 from src.constants import INITIAL_ONE_VIEW_ZOOM
-from src.Controller.PathHandler import data_path
+from src.Model.LineFillConfiguration import get_line_fill_configuration
 
 class CustomGraphicsView(QtWidgets.QGraphicsView):
     def __init__(self, parent=None):
@@ -146,6 +148,37 @@ class DicomView(QtWidgets.QWidget):
         label = QtWidgets.QGraphicsPixmapItem(image)
         self.scene = GraphicsScene(
             label, self.horizontal_view, self.vertical_view)
+        self.prefetch_pixmaps(pixmaps, slider_id)
+
+    def prefetch_pixmaps(self, pixmaps, slider_id):
+        """
+        Renders the slices next to the displayed slice once the event loop
+        is idle, so scrolling to them does not have to wait for rendering.
+        :param pixmaps: SlicePixmaps of the displayed view
+        :param slider_id: Index of the displayed slice
+        """
+        if isinstance(pixmaps, SlicePixmaps):
+            QtCore.QTimer.singleShot(0, lambda: pixmaps.prefetch(slider_id))
+
+    def prefetch_roi_polygons(self, roi_polygons, slice_key):
+        """
+        Calculates the polygons of the displayed ROIs on the slices next
+        to the displayed slice once the event loop is idle, with one timer
+        for all of the ROIs.
+        :param roi_polygons: List of the polygons of each displayed ROI in
+        the displayed view
+        :param slice_key: UID or index of the displayed slice
+        """
+        roi_polygons = [polygons for polygons in roi_polygons
+                        if isinstance(polygons, ROIPolygons)]
+        if not roi_polygons:
+            return
+
+        def prefetch():
+            for polygons in roi_polygons:
+                polygons.prefetch(slice_key)
+
+        QtCore.QTimer.singleShot(0, prefetch)
 
     def draw_roi_polygons(self, roi_id, polygons, roi_color=None):
         """
@@ -159,17 +192,10 @@ class DicomView(QtWidgets.QWidget):
             color = self.roi_color[roi_id]
         else:
             color = roi_color[roi_id]
-        with open(data_path('line&fill_configuration'), 'r') as stream:
-            elements = stream.readlines()
-            if len(elements) > 0:
-                roi_line = int(elements[0].replace('\n', ''))
-                roi_opacity = int(elements[1].replace('\n', ''))
-                line_width = float(elements[4].replace('\n', ''))
-            else:
-                roi_line = 1
-                roi_opacity = 10
-                line_width = 2.0
-            stream.close()
+        line_fill_configuration = get_line_fill_configuration()
+        roi_line = line_fill_configuration["roi_line"]
+        roi_opacity = line_fill_configuration["roi_opacity"]
+        line_width = line_fill_configuration["line_width"]
         roi_opacity = int((roi_opacity / 100) * 255)
         color.setAlpha(roi_opacity)
         pen_color = QtGui.QColor(color.red(), color.green(), color.blue())
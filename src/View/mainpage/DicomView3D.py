@@ -9,6 +9,7 @@ from vtkmodules.vtkRenderingCore import vtkColorTransferFunction, \
     vtkRenderer, vtkVolumeProperty, vtkVolume
 from vtkmodules.vtkRenderingVolume import vtkFixedPointVolumeRayCastMapper
 
+from src.Model.CalculateImages import apply_windowing, get_image_geometry
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.View.util.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
 
@@ -59,15 +60,11 @@ class DicomView3D(QtWidgets.QWidget):
         convert it to a vtk 3D array
         """
 
-        three_dimension_np_array = np.array(self.patient_dict_container.
-                                            additional_data["pixel_values"])
-        three_dimension_np_array = three_dimension_np_array.astype(np.int16)
-        three_dimension_np_array = (three_dimension_np_array -
-                                    (self.patient_dict_container.get("level"))) / \
-            self.patient_dict_container.get("window") * 255
-        three_dimension_np_array[three_dimension_np_array < 0] = 0
-        three_dimension_np_array[three_dimension_np_array > 255] = 255
-        three_dimension_np_array = three_dimension_np_array.astype(np.int8)
+        # The whole volume is windowed with a single lookup table pass
+        three_dimension_np_array = apply_windowing(
+            self.patient_dict_container.additional_data["pixel_values"],
+            self.patient_dict_container.get("window"),
+            self.patient_dict_container.get("level")).view(np.int8)
         self.depth_array = numpy_support.numpy_to_vtk(three_dimension_np_array.
                                                       ravel(order="F"),
                                                       deep=True,
@@ -103,6 +100,10 @@ class DicomView3D(QtWidgets.QWidget):
         # Convert 3d pixel array into vtkImageData to display as vtkVolume
         self.imdata = vtkImageData()
         self.imdata.SetDimensions(self.shape)
+        # The volume is indexed by slice, row and column, so the spacing
+        # of the image geometry is reversed
+        _, spacing, _ = get_image_geometry(self.patient_dict_container.dataset)
+        self.imdata.SetSpacing(spacing[::-1])
         self.imdata.GetPointData().SetScalars(self.depth_array)
 
         self.volume_mapper = vtkFixedPointVolumeRayCastMapper()
@@ -114,11 +115,6 @@ class DicomView3D(QtWidgets.QWidget):
         self.volume = vtkVolume()
         self.volume.SetMapper(self.volume_mapper)
         self.volume.SetProperty(self.volume_property)
-        self.volume.SetScale(
-            self.patient_dict_container.get("pixmap_aspect")["axial"],
-            self.patient_dict_container.get("pixmap_aspect")["sagittal"],
-            self.patient_dict_container.get("pixmap_aspect")["sagittal"]
-        )
 
         # Add the volume to the renderer
         self.renderer.ResetCamera()
@@ -9,8 +9,23 @@ from PySide6.QtCore import Slot
 
 import src.constants as constant
 from src.constants import DEFAULT_WINDOW_SIZE
+from src.Model.DrawingMask import get_disk_window
+from src.Model.RegionGrowing import get_threshold_mask, grow_region, \
+    mask_to_pixel_coords
 from src.Model.Transform import linear_transform, get_pixel_coords, \
-    get_first_entry, inv_linear_transform
+    inv_linear_transform
+
+
+def get_image_array(q_image):
+    """
+    Gets a writable view of the pixels of a 32 bit QImage.
+    :param q_image: QImage in Format_RGB32 or Format_ARGB32
+    :return: numpy array of the blue, green, red and alpha of each pixel,
+        indexed by y then x
+    """
+    buffer = numpy.frombuffer(q_image.bits(), dtype=numpy.uint8)
+    return buffer.reshape(q_image.height(), q_image.bytesPerLine())[
+        :, :q_image.width() * 4].reshape(q_image.height(), q_image.width(), 4)
 
 
 class Drawing(QtWidgets.QGraphicsScene):
@@ -19,12 +34,14 @@ class Drawing(QtWidgets.QGraphicsScene):
     """
 
     seed = Signal(list)
+    # Emitted when a brush stroke or a fill is finished
+    drawn = Signal()
 
     # Initialisation function  of the class
     def __init__(self, imagetoPaint, pixmapdata, min_pixel, max_pixel, dataset,
                  draw_roi_window_instance, slice_changed,
                  current_slice, drawing_tool_radius, keep_empty_pixel, pixel_transparency,
-                 max_internal_hole_size, target_pixel_coords=set(), **kwargs):
+                 max_internal_hole_size, target_mask=None, **kwargs):
         super(Drawing, self).__init__()
 
         # create the canvas to draw the line on and all its necessary
@@ -53,10 +70,12 @@ class Drawing(QtWidgets.QGraphicsScene):
         self.pixel_array = None
         self.pen = QtGui.QPen(QtGui.QColor("yellow"))
         self.pen.setStyle(QtCore.Qt.DashDotDotLine)
-        # This will contain the new pixel coordinates specified by the min
-        # and max pixel density
-        self.target_pixel_coords = target_pixel_coords
-        self.according_color_dict = {}
+        # This will contain the pixels specified by the min and max pixel
+        # density, indexed by y then x
+        self.target_mask = numpy.zeros((self.rows, self.cols), dtype=bool)
+        if target_mask is not None:
+            self.target_mask |= target_mask
+        self._original_image = None
         self.q_image = None
         self.q_pixmaps = None
         self.label = QtWidgets.QLabel()
@@ -107,171 +126,117 @@ class Drawing(QtWidgets.QGraphicsScene):
     def _display_pixel_color(self):
         """
         Finds the pixel coordinates used to draw the ROI based on the min and max values.
-        This process uses a generic BFS that is bound to the min and max bounds,
-        as well as the min and max pixel density.
+        The region is grown from the fill source over the connected pixels within the
+        min and max bounds and the min and max pixel density, and holes up to the max
+        internal hole size are filled.
         """
         self.set_bounds()
         self.pixel_array = self.dataset._pixel_array
 
-        self.q_image = self.img.toImage()
-        queue = [self.fill_source]
-
-        if self.is_hole_filling:
-            outlines = set()
-
-        while len(queue) > 0:
-            current = queue.pop(0)
-
-            for x_neighbour in range(-1, 2):
-                for y_neighbour in range(-1, 2):
-                    element = [current[0] + x_neighbour, current[1] + y_neighbour]
-
-                    if self.check_roi_validity(element):
-                        if (element[0], element[1]) not in self.target_pixel_coords:
-                            queue.append([element[0], element[1]])
-                            self.target_pixel_coords.add((element[0], element[1]))
-                    else:
-                        if self.is_hole_filling:
-                            if (element[0], element[1]) not in outlines:
-                                outlines.add((element[0], element[1]))
-
-        if self.is_hole_filling:
-            self.fill_holes(outlines)
-
-        """For the meantime, a new image is created and the pixels 
-        specified are coloured. The _set_colour_of_pixels function
-         is then called to colour the newly drawn pixels and blend in
-         transparency."""
-        # Convert QPixMap into Qimage
-        for x_coord, y_coord in self.target_pixel_coords:
-            temp = set()
-            temp.add((x_coord, y_coord))
-            points = get_pixel_coords(temp, self.rows, self.cols)
-            temp_2 = get_first_entry(points)
-            c = self.q_image.pixel(temp_2[0], temp_2[1])
-            colors = QColor(c).getRgbF()
-            self.according_color_dict[(x_coord, y_coord)] = colors
-
-        points = get_pixel_coords(self.according_color_dict, self.rows, self.cols)
-
-        self._set_color_of_pixels(points)
-        self.refresh_image()
-        return False if len(points) < 1 else True
+        valid = get_threshold_mask(
+            self.pixel_array, self.min_pixel, self.max_pixel,
+            (self.min_bounds_x, self.min_bounds_y,
+             self.max_bounds_x, self.max_bounds_y))
+        max_hole_size = \
+            self.max_internal_hole_size if self.is_hole_filling else 0
+        target = grow_region(valid, self.fill_source, self.target_mask,
+                             max_hole_size)
+        return self.display_region(target)
 
-    def fill_holes(self, outlines):
+    def display_region(self, region):
         """
-        Finds holes that have a size that matches the specified max internal hole value or less, and
-        updates the targeted pixel coords with the pixels of the holes to be filled in.
+        Adds the pixels of a region to the highlighted pixels and displays them.
 
-        :param outlines:  Set of x and y co-ordinates of pixels that outline all the holes in the selected ROI region.
+        :param region: 2D boolean numpy array of the pixels, indexed by y then x
+        :return: True if any pixels are highlighted
         """
-        hole_outline_list = []
-
-        while len(outlines) != 0:
-            for first_element in outlines:
-                break
-
-            queue = [first_element]
-            hole_outline = set()
-
-            while len(queue) > 0:
-                current = queue.pop(0)
-
-                # Catches hole's that have the volume of 1
-                if (current[0], current[1]) in outlines:
-                    if (current[0], current[1]) not in hole_outline:
-                        hole_outline.add((current[0], current[1]))
-                        outlines.remove((current[0], current[1]))
-
-                # Check left, right
-                for x_neighbour in range(-1, 2, 2):
-                    element = [current[0] + x_neighbour, current[1]]
-
-                    if (element[0], element[1]) in outlines:
-                        if (element[0], element[1]) not in hole_outline:
-                            queue.append([element[0], element[1]])
-                            hole_outline.add((element[0], element[1]))
-                            outlines.remove((element[0], element[1]))
-
-                # Check down, up
-                for y_neighbour in range(-1, 2, 2):
-                    element = [current[0], current[1] + y_neighbour]
-
-                    if (element[0], element[1]) in outlines:
-                        if (element[0], element[1]) not in hole_outline:
-                            queue.append([element[0], element[1]])
-                            hole_outline.add((element[0], element[1]))
-                            outlines.remove((element[0], element[1]))
-
-            if len(hole_outline) <= self.max_internal_hole_size:
-                hole_outline_list.append(hole_outline)
-
-        for i in range(len(hole_outline_list)):
-            hole_outline = hole_outline_list[i]
-
-            for first_element in hole_outline:
-                break
-
-            # If the hole_outline a single pixel
-            if len(hole_outline) == 1:
-                if 1 <= self.max_internal_hole_size:
-                    self.target_pixel_coords.add((first_element[0], first_element[1]))
-                continue
-
-            queue = [first_element]
-            volume = 0
-            hole_pixel_coords = set()
-
-            while len(queue) > 0:
-                current = queue.pop(0)
-
-                # Check left, right
-                for x_neighbour in range(-1, 2, 2):
-                    element = [current[0] + x_neighbour, current[1]]
-
-                    if (element[0], element[1]) not in hole_pixel_coords:
-                        if (element[0], element[1]) not in self.target_pixel_coords:
-                            queue.append([element[0], element[1]])
-                            hole_pixel_coords.add((element[0], element[1]))
-                            volume = volume + 1
-
-                # Check down, up
-                for y_neighbour in range(-1, 2, 2):
-                    element = [current[0], current[1] + y_neighbour]
+        self.q_image = self.img.toImage()
+        self.target_mask |= region
+        dirty_rect = self._set_color_of_pixels()
+        self.refresh_image()
+        return dirty_rect is not None
 
-                    if (element[0], element[1]) not in hole_pixel_coords:
-                        if (element[0], element[1]) not in self.target_pixel_coords:
-                            queue.append([element[0], element[1]])
-                            hole_pixel_coords.add((element[0], element[1]))
-                            volume = volume + 1
+    @property
+    def target_pixel_coords(self):
+        """
+        Set of the x and y co-ordinates of the highlighted pixels.
+        """
+        return mask_to_pixel_coords(self.target_mask)
 
-                if volume > self.max_internal_hole_size:
-                    break
+    def set_target_mask(self, target_mask):
+        """
+        Replaces the highlighted pixels and displays them.
 
-            if volume <= self.max_internal_hole_size:
-                self.target_pixel_coords.update(hole_pixel_coords)
+        :param target_mask: 2D boolean numpy array of the pixels, indexed by y then x
+        """
+        self.target_mask = target_mask.copy()
+        self.q_image = self.img.toImage()
+        self._set_color_of_pixels()
+        self.refresh_image()
 
-    def _set_color_of_pixels(self, points):
+    def _set_color_of_pixels(self):
         """
-        Takes a set of points that need to be coloured, and updates the colour of
-        each pixel with the drawn on colour, blended together based on the transparency value.
+        Updates the colour of each highlighted pixel with the drawn on colour, blended
+        together with the original colour based on the transparency value.
 
-        :param points:  Set of x and y co-ordinates of pixels to be coloured
+        :return: QRect bounding the pixels coloured, or None if there are none
         """
         logging.debug("_set_color_of_pixels started")
-        img = self.img.toImage()
-        for x_coord, y_coord in points:
-            old_color = img.pixelColor(x_coord, y_coord)
-            # Blend the individual RGB values of the original pixel with the drawn ROI colour values
-            new_color = QtGui.QColor(self.drawn_pixel_color.red() * (1 - self.pixel_transparency)
-                                     + old_color.red() * self.pixel_transparency,
-                                     self.drawn_pixel_color.blue() * (1 - self.pixel_transparency)
-                                     + old_color.blue() * self.pixel_transparency,
-                                     self.drawn_pixel_color.green() * (1 - self.pixel_transparency)
-                                     + old_color.green() * self.pixel_transparency,
-                                     255)
-            self.q_image.setPixelColor(x_coord, y_coord, new_color)
+        y_coords, x_coords = numpy.nonzero(self.target_mask)
+        dirty_rect = self._paint_pixels(
+            *self._get_display_coords(x_coords, y_coords))
         logging.debug("_set_color_of_pixels finished")
+        return dirty_rect
+
+    def _paint_pixels(self, x_coords, y_coords, erase=False):
+        """
+        Blends the drawn on colour into displayed pixels, or restores their
+        original colour.
+
+        :param x_coords: numpy array of the x co-ordinates of the pixels in the image
+        :param y_coords: numpy array of the y co-ordinates of the pixels in the image
+        :param erase: True to restore the original colour of the pixels
+        :return: QRect bounding the pixels painted, or None if there are none
+        """
+        original = get_image_array(self._get_original_image())
+        if self.q_image.format() != QtGui.QImage.Format_RGB32:
+            self.q_image = self.q_image.convertToFormat(
+                QtGui.QImage.Format_RGB32)
+        image = get_image_array(self.q_image)
+        inside = (x_coords >= 0) & (x_coords < image.shape[1]) \
+            & (y_coords >= 0) & (y_coords < image.shape[0])
+        x_coords, y_coords = x_coords[inside], y_coords[inside]
+        if not x_coords.size:
+            return None
+
+        if erase:
+            image[y_coords, x_coords] = original[y_coords, x_coords]
+        else:
+            # Blend the individual BGR values of the original pixels with the drawn ROI colour values
+            drawn = numpy.array([self.drawn_pixel_color.blue(),
+                                 self.drawn_pixel_color.green(),
+                                 self.drawn_pixel_color.red()], dtype=numpy.float64)
+            old = original[y_coords, x_coords, :3].astype(numpy.float64)
+            new = drawn * (1 - self.pixel_transparency) \
+                + old * self.pixel_transparency
+            image[y_coords, x_coords, :3] = numpy.clip(new, 0, 255).astype(numpy.uint8)
+            image[y_coords, x_coords, 3] = 255
+        return QtCore.QRect(int(x_coords.min()), int(y_coords.min()),
+                            int(x_coords.max() - x_coords.min()) + 1,
+                            int(y_coords.max() - y_coords.min()) + 1)
+
+    def _get_original_image(self):
+        """
+        Gets the image before it is drawn on, converted once per pixmap.
+
+        :return: QImage in Format_RGB32
+        """
+        if self._original_image is None \
+                or self._original_image[0] != self.img.cacheKey():
+            self._original_image = (
+                self.img.cacheKey(),
+                self.img.toImage().convertToFormat(QtGui.QImage.Format_RGB32))
+        return self._original_image[1]
 
     def update_pixel_transparency(self):
         """
@@ -279,22 +244,10 @@ class Drawing(QtWidgets.QGraphicsScene):
         transparency value set by user and refreshes the image.
         """
         logging.debug("update_pixel_transparency started")
-        self._set_color_of_pixels(get_pixel_coords(self.target_pixel_coords, self.rows, self.cols))
+        self._set_color_of_pixels()
         self.refresh_image()
         logging.debug("update_pixel_transparency finished")
 
-    def check_roi_validity(self, coords):
-        """
-        checks the validity of the ROI coordinates
-        returning true or false
-        """
-        if self.min_bounds_x < coords[0] < self.max_bounds_x:
-            if self.min_bounds_y < coords[1] < self.max_bounds_y:
-                # note that the x and y are purposely flipped, this was pre-existing
-                if self.min_pixel < self.pixel_array[int(coords[1])][int(coords[0])] < self.max_pixel:
-                    return True
-        return False
-
     def update_dicom_image(self):
         """
         Updates the dicom image data, recalculating the roi pixel colour and displaying changes
@@ -302,10 +255,7 @@ class Drawing(QtWidgets.QGraphicsScene):
         logging.debug("update_dicom_image started for slice %s", self.current_slice)
 
         self.q_image = self.img.toImage()
-
-        points = get_pixel_coords(self.according_color_dict, self.rows, self.cols)
-        self._set_color_of_pixels(points)
-
+        self._set_color_of_pixels()
         self.refresh_image()
 
     def getValues(self):
@@ -313,21 +263,33 @@ class Drawing(QtWidgets.QGraphicsScene):
         This function gets the corresponding values of all the points in the
         drawn line from the dataset.
         """
-        for i in range(DEFAULT_WINDOW_SIZE):
-            for j in range(DEFAULT_WINDOW_SIZE):
-                x, y = linear_transform(
-                    i, j, self.rows, self.cols)
-                if (x <self.cols and y < self.rows and x>=0 and y>=0):
-                    self.values.append(self.data[x][y])
-                else:
-                    msg = f"x {x} or y {y} value out of range while drawing, cols={self.cols} rows={self.rows}"
-                    logging.warning(msg)
+        i, j = numpy.meshgrid(numpy.arange(DEFAULT_WINDOW_SIZE),
+                              numpy.arange(DEFAULT_WINDOW_SIZE), indexing='ij')
+        x = (float(self.rows) / DEFAULT_WINDOW_SIZE * i).astype(int)
+        y = (float(self.cols) / DEFAULT_WINDOW_SIZE * j).astype(int)
+        inside = (x < self.cols) & (y < self.rows)
+        if not inside.all():
+            msg = f"{numpy.count_nonzero(~inside)} x or y values out of range while drawing, " \
+                  f"cols={self.cols} rows={self.rows}"
+            logging.warning(msg)
+        self.values = list(self.data[x[inside], y[inside]])
 
-    def refresh_image(self):
+    def refresh_image(self, dirty_rect=None):
         """
         Convert QImage containing modified CT slice with highlighted pixels
         into a QPixmap, and then display it onto the view.
-        """
+        :param dirty_rect: QRect of the only pixels which changed, or None
+        to convert the whole image
+        """
+        if dirty_rect is not None and self.q_pixmaps \
+                and self.q_image is not None:
+            pixmap = self.q_pixmaps.pixmap()
+            painter = QtGui.QPainter(pixmap)
+            painter.setCompositionMode(QtGui.QPainter.CompositionMode_Source)
+            painter.drawImage(dirty_rect, self.q_image, dirty_rect)
+            painter.end()
+            self.q_pixmaps.setPixmap(pixmap)
+            return
         if self.q_pixmaps:
             self.removeItem(self.q_pixmaps)
         if (self.q_image is None):
@@ -345,43 +307,28 @@ class Drawing(QtWidgets.QGraphicsScene):
         clicked_y: the current y coordinate
         """
         logging.debug("remove_pixels_within_circle started")
-        # Calculate euclidean distance between each highlighted point and
-        # the clicked point. If the distance is less than the radius,
-        # remove it from the highlighted pixels.
+        # The highlighted pixels within the radius of the clicked point are
+        # removed.
 
         # The roi drawn on current slice is changed after several pixels are
         # modified
         self.slice_changed = True
         clicked_x, clicked_y = linear_transform(
             clicked_x, clicked_y, self.rows, self.cols)
-        according_color_dict_key_list = list(self.according_color_dict.keys())
-
-        for x, y in according_color_dict_key_list:
-            colors = self.according_color_dict[(x, y)]
-            clicked_point = numpy.array((clicked_x, clicked_y))
-            point_to_check = numpy.array((x, y))
-            distance = numpy.linalg.norm(clicked_point - point_to_check)
-            if distance <= self.draw_tool_radius * (
-                    float(self.rows) / DEFAULT_WINDOW_SIZE):
-                temp = set()
-                temp.add((x, y))
-                points = get_pixel_coords(temp,
-                                          self.rows,
-                                          self.cols)
-                for x_t, y_t in points:
-                    self.q_image.setPixelColor(x_t, y_t,
-                                               QColor.fromRgbF(
-                                                   colors[0],
-                                                   colors[1],
-                                                   colors[2],
-                                                   colors[3]))
-                self.target_pixel_coords.remove((x, y))
-                self.according_color_dict.pop((x, y))
-                # The roi drawn on current slice is changed after several
-                # pixels are modified
-                self.slice_changed = True
-
-        self.refresh_image()
+        rows, columns, stencil = get_disk_window(
+            (clicked_x, clicked_y),
+            self.draw_tool_radius * (float(self.rows) / DEFAULT_WINDOW_SIZE),
+            self.target_mask.shape)
+        erased = stencil & self.target_mask[rows, columns]
+        y_coords, x_coords = numpy.nonzero(erased)
+        y_coords += rows.start
+        x_coords += columns.start
+        self.target_mask[y_coords, x_coords] = False
+
+        dirty_rect = self._paint_pixels(
+            *self._get_display_coords(x_coords, y_coords), erase=True)
+        if dirty_rect is not None:
+            self.refresh_image(dirty_rect)
         logging.debug("remove_pixels_within_circle finished")
 
     def fill_pixels_within_circle(self, clicked_x, clicked_y):
@@ -391,59 +338,51 @@ class Drawing(QtWidgets.QGraphicsScene):
         clicked_y: the current y coordinate
         """
         logging.debug("fill_pixels_within_circle started")
-        # Calculate euclidean distance between each highlighted point and
-        # the clicked point. If the distance is less than the radius,
-        # add it to the highlighted pixels.
-
-        # Set of points to color
-        points_to_color = set()
+        # The pixels within the radius of the clicked point and the bounds
+        # are highlighted.
 
         # The roi drawn on current slice is changed after several pixels are
         # modified
         self.slice_changed = True
         clicked_x, clicked_y = linear_transform(
             clicked_x, clicked_y, self.rows, self.cols)
-        scaled_tool_radius = self.draw_tool_radius * (
-                float(self.rows) / DEFAULT_WINDOW_SIZE)
-
-        min_y_bound_square = math.ceil(clicked_y - scaled_tool_radius)
-        min_x_bound_square = math.ceil(clicked_x - scaled_tool_radius)
-        max_y_bound_square = math.ceil(clicked_y + scaled_tool_radius)
-        max_x_bound_square = math.ceil(clicked_x + scaled_tool_radius)
-        for y_coord in range(
-                max(self.min_bounds_y, min_y_bound_square),
-                min(self.max_bounds_y, max_y_bound_square)):
-            for x_coord in range(
-                    max(self.min_bounds_x, min_x_bound_square),
-                    min(self.max_bounds_x, max_x_bound_square)):
-                clicked_point = numpy.array((clicked_x, clicked_y))
-                point_to_check = numpy.array((x_coord, y_coord))
-                distance = numpy.linalg.norm(
-                    clicked_point - point_to_check)
-
-                if (self.keep_empty_pixel or
-                    self.min_pixel <= self.pixel_array[y_coord][
-                        x_coord] <= self.max_pixel) \
-                        and distance <= scaled_tool_radius:
-                    temp = set()
-                    temp.add((x_coord, y_coord))
-                    points = get_pixel_coords(temp, self.rows, self.cols)
-                    temp_2 = get_first_entry(points)
-                    c = self.q_image.pixel(temp_2[0], temp_2[1])
-                    colors = QColor(c)
-                    if (x_coord, y_coord) not in self.according_color_dict:
-                        self.according_color_dict[
-                            (x_coord, y_coord)] = colors.getRgbF()
-                        points_to_color.add((x_coord, y_coord))
-                        self.target_pixel_coords.add((x_coord, y_coord))
-
-        points = get_pixel_coords(points_to_color, self.rows, self.cols)
-
-        self._set_color_of_pixels(points)
-
-        self.refresh_image()
+        rows, columns, stencil = get_disk_window(
+            (clicked_x, clicked_y),
+            self.draw_tool_radius * (float(self.rows) / DEFAULT_WINDOW_SIZE),
+            self.target_mask.shape,
+            (self.min_bounds_x, self.min_bounds_y,
+             self.max_bounds_x, self.max_bounds_y),
+            closed=False)
+        painted = stencil & ~self.target_mask[rows, columns]
+        if not self.keep_empty_pixel:
+            pixels = self.dataset._pixel_array[rows, columns]
+            painted &= (self.min_pixel <= pixels) & (pixels <= self.max_pixel)
+        y_coords, x_coords = numpy.nonzero(painted)
+        y_coords += rows.start
+        x_coords += columns.start
+        self.target_mask[y_coords, x_coords] = True
+
+        dirty_rect = self._paint_pixels(
+            *self._get_display_coords(x_coords, y_coords))
+        if dirty_rect is not None:
+            self.refresh_image(dirty_rect)
         logging.debug("fill_pixels_within_circle finished")
 
+    def _get_display_coords(self, x_coords, y_coords):
+        """
+        Gets the pixels of the displayed image which show pixels of the dataset.
+
+        :param x_coords: numpy array of the x co-ordinates of pixels of the dataset
+        :param y_coords: numpy array of the y co-ordinates of pixels of the dataset
+        :return: Tuple of numpy arrays of the x and y co-ordinates in the image
+        """
+        if self.rows == DEFAULT_WINDOW_SIZE and self.cols == DEFAULT_WINDOW_SIZE:
+            return x_coords, y_coords
+        pixel_coords = get_pixel_coords(
+            set(zip(x_coords.tolist(), y_coords.tolist())), self.rows, self.cols)
+        xy = numpy.array(list(pixel_coords), dtype=numpy.int64).reshape(-1, 2)
+        return xy[:, 0], xy[:, 1]
+
     def clear_cursor(self, drawing_tool_radius):
         """
         Clean the current cursor
@@ -557,7 +496,8 @@ class Drawing(QtWidgets.QGraphicsScene):
         x, y = linear_transform(
             math.floor(event.scenePos().x()), math.floor(event.scenePos().y()),
             self.rows, self.cols)
-        is_coloured = (x, y) in self.according_color_dict
+        is_coloured = 0 <= x < self.cols and 0 <= y < self.rows \
+            and bool(self.target_mask[int(y), int(x)])
         self.is_current_pixel_coloured = is_coloured
         self.draw_cursor(event.scenePos().x(), event.scenePos().y(),
                          self.draw_tool_radius, new_circle=True)
@@ -608,3 +548,4 @@ class Drawing(QtWidgets.QGraphicsScene):
         self.drag_position = QtCore.QPoint()
         super().mouseReleaseEvent(event)
         self.update()
+        self.drawn.emit()
@@ -1,9 +1,9 @@
 import logging
 import platform
 
-import pydicom
+import numpy as np
 from PySide6 import QtCore, QtGui, QtWidgets
-from PySide6.QtCore import Qt, QSize, QRegularExpression, Slot, Signal, QThread
+from PySide6.QtCore import Qt, QSize, QRegularExpression, Slot, Signal
 from PySide6.QtGui import QIcon, QPixmap, QRegularExpressionValidator
 from PySide6.QtWidgets import QFormLayout, QLabel, QLineEdit, \
     QSizePolicy, QHBoxLayout, QPushButton, QWidget, \
@@ -12,8 +12,10 @@ from PySide6.QtWidgets import QFormLayout, QLabel, QLineEdit, \
 from src.Controller.MainPageController import MainPageCallClass
 from src.Controller.PathHandler import resource_path, data_path
 from src.Model import ROI
+from src.Model.CalculateImages import get_image_keys
+from src.Model.DrawingMask import DrawingMask, get_drawing_contours
 from src.Model.PatientDictContainer import PatientDictContainer
-from src.Model.ROI import calculate_concave_hull_of_points
+from src.Model.RegionGrowing import get_threshold_volume, grow_volume
 from src.View.ProgressWindow import ProgressWindow
 from src.View.mainpage.DicomAxialView import DicomAxialView
 from src.View.mainpage.DrawROIWindow.DrawBoundingBox import DrawBoundingBox
@@ -44,7 +46,14 @@ class UIDrawROIWindow:
         self.dataset_rtss = dataset_rtss
         self.signal_roi_drawn = signal_roi_drawn
         self.signal_draw_roi_closed = signal_draw_roi_closed
-        self.drawn_roi_list = {}
+        # The pixels drawn on each slice
+        dataset = self.patient_dict_container.dataset
+        first_image = dataset[get_image_keys(dataset)[0]]
+        self.drawing_mask = DrawingMask(len(get_image_keys(dataset)),
+                                        first_image.Rows, first_image.Columns)
+        # The min and max pixel density and max internal hole size of the
+        # last drawing, used by the drawings created from drawing_mask
+        self.drawing_parameters = None
         self.standard_organ_names = []
         self.standard_volume_names = []
         self.standard_names = []  # Combination of organ and volume
@@ -518,6 +527,20 @@ class UIDrawROIWindow:
         self.button_contour_preview.setIcon(icon_preview)
         self.transect_preview_contour_box. \
             addWidget(self.button_contour_preview)
+
+        # Create an undo button
+        self.button_undo = QtWidgets.QPushButton("Undo")
+        self.button_undo. \
+            setProperty("QPushButtonClass", "draw-roi-button")
+        self.button_undo.setSizePolicy(
+            QSizePolicy(QSizePolicy.MinimumExpanding, QSizePolicy.Minimum))
+        self.button_undo.resize(
+            self.button_undo.sizeHint().width(),
+            self.button_undo.sizeHint().height())
+        self.button_undo.setShortcut(QtGui.QKeySequence.Undo)
+        self.button_undo.clicked.connect(self.onUndoClicked)
+        self.transect_preview_contour_box. \
+            addWidget(self.button_undo)
         self.draw_roi_window_input_container_box. \
             addRow(self.transect_preview_contour_box)
 
@@ -740,10 +763,8 @@ class UIDrawROIWindow:
         self.dicom_view.update_view()
 
         # check if this slice has any drawings before
-        if self.drawn_roi_list.get(self.current_slice) is not None:
-            self.drawingROI = self.drawn_roi_list[
-                self.current_slice]['drawingROI']
-            self.ds = self.drawn_roi_list[self.current_slice]['ds']
+        if self.drawing_mask.is_drawn(self.current_slice):
+            self.load_drawing(self.current_slice)
             self.dicom_view.view.setScene(self.drawingROI)
             self.enable_cursor_diameter_transparency()
             self.drawingROI.clear_cursor(self.drawing_tool_radius)
@@ -754,6 +775,61 @@ class UIDrawROIWindow:
             self.ds = None
             self.has_drawing = False
 
+    def load_drawing(self, slice_number):
+        """
+        Creates the drawing of a slice from the pixels drawn on it, with the
+        parameters and tool of the last drawing
+        :param slice_number: the slice number of the drawing
+        """
+        dt = self.patient_dict_container.dataset[slice_number]
+        dt.convert_pixel_data()
+        # Dataset of the image, which the ROI contours reference
+        self.ds = dt
+        is_drawing = self.drawingROI.is_drawing \
+            if getattr(self, 'drawingROI', None) else False
+        min_pixel, max_pixel, max_internal_hole_size = \
+            self.drawing_parameters
+
+        self.drawingROI = Drawing(
+            self.patient_dict_container.get("pixmaps_axial")[slice_number],
+            dt._pixel_array.transpose(),
+            min_pixel,
+            max_pixel,
+            dt,
+            self.draw_roi_window_instance,
+            False,
+            slice_number,
+            self.drawing_tool_radius,
+            self.keep_empty_pixel,
+            self.pixel_transparency,
+            max_internal_hole_size,
+            self.drawing_mask.get_slice(slice_number)
+        )
+        self.drawingROI.set_is_drawing(is_drawing)
+        self.drawingROI.drawn.connect(self.on_drawing_drawn)
+        self.drawingROI.update_dicom_image()
+
+    def on_drawing_drawn(self):
+        """
+        Saves the drawing progress when a brush stroke or fill is
+        finished, so it can be undone
+        """
+        self.save_drawing_progress(self.current_slice)
+
+    def onUndoClicked(self):
+        """
+        Function triggered when the Undo button is clicked. Undoes the last
+        brush stroke or fill, and displays the slice it changed
+        """
+        self.save_drawing_progress(self.current_slice)
+        slice_numbers = self.drawing_mask.undo()
+        if not slice_numbers:
+            return
+        if self.current_slice in slice_numbers:
+            self.set_current_slice(self.current_slice)
+        else:
+            self.dicom_view.slider.setValue(slice_numbers[0])
+
     def update_draw_roi_pixmaps(self):
         """
         Updates the pixmaps_axial data for the displayed DICOM draw roi panel.
@@ -764,12 +840,12 @@ class UIDrawROIWindow:
         self.save_drawing_progress(self.current_slice)
         self.dicom_view.update_view()
 
-        # for each drawn ROI slice
-        for slice_number in self.drawn_roi_list:
-            if self.drawn_roi_list.get(slice_number)['drawingROI'] is not None:
-                slice_drawing_roi = self.drawn_roi_list[slice_number]['drawingROI']
-                slice_drawing_roi.img = self.patient_dict_container.get("pixmaps_axial")[slice_number]
-                slice_drawing_roi.update_dicom_image()
+        # The drawings of the other slices are created from the new pixmaps
+        # when they are displayed
+        if getattr(self, 'drawingROI', None):
+            self.drawingROI.img = self.patient_dict_container.get(
+                "pixmaps_axial")[self.drawingROI.current_slice]
+            self.drawingROI.update_dicom_image()
 
         if hasattr(self, 'drawingROI') and self.drawingROI:
             self.dicom_view.view.setScene(self.drawingROI)
@@ -887,26 +963,14 @@ class UIDrawROIWindow:
         this function saves the drawing progress on current slice
         :param image_slice_number: the slice number to be saved
         """
-        if self.slice_changed:
-            if hasattr(self, 'drawingROI') and self.drawingROI \
-                    and self.ds is not None \
-                    and len(self.drawingROI.target_pixel_coords) != 0:
-                alpha = self.input_alpha_value.value()
-                pixel_hull_list = calculate_concave_hull_of_points(
-                    self.drawingROI.target_pixel_coords, alpha)
-                coord_list = []
-                for pixel_hull in pixel_hull_list:
-                    coord_list.append(pixel_hull)
-                self.drawn_roi_list[image_slice_number] = {
-                    'coords': coord_list,
-                    'ds': self.ds,
-                    'drawingROI': self.drawingROI
-                }
-                self.slice_changed = False
-                return True
-        else:
-            return True
-
+        # The pixels are kept whenever they change, not only when the
+        # drawing was created, and the change is kept so it can be undone
+        if hasattr(self, 'drawingROI') and self.drawingROI \
+                and self.ds is not None \
+                and self.drawingROI.current_slice == image_slice_number:
+            self.drawing_mask.set_slice(image_slice_number,
+                                        self.drawingROI.target_mask)
+            self.slice_changed = False
         return True
 
     def on_transect_close(self):
@@ -1010,9 +1074,8 @@ class UIDrawROIWindow:
 
         dt = self.patient_dict_container.dataset[id]
         dt.convert_pixel_data()
-        # Path to the selected .dcm file
-        location = self.patient_dict_container.filepaths[id]
-        self.ds = pydicom.dcmread(location)
+        # Dataset of the selected image, which the ROI contours reference
+        self.ds = dt
 
         self.drawingROI = Drawing(
             pixmaps[id],
@@ -1027,92 +1090,68 @@ class UIDrawROIWindow:
             self.keep_empty_pixel,
             self.pixel_transparency,
             max_internal_hole_size,
-            set(),
             UI=UI
         )
+        self.drawingROI.drawn.connect(self.on_drawing_drawn)
+        self.drawing_parameters = (min_pixel, max_pixel, max_internal_hole_size)
 
         self.slice_changed = True
         self.has_drawing = True
         self.dicom_view.view.setScene(self.drawingROI)
         self.enable_cursor_diameter_transparency()
 
-    def process_3D_roi(self, min_pixel, max_pixel, pixmaps, id, max_internal_hole_size, thread=None, interrupt_flag=None,
+    def process_3D_roi(self, min_pixel, max_pixel, id, max_internal_hole_size, bounds, interrupt_flag=None,
                        progress_callback=None):
         """
         Processes roi drawing accross multiple slices using a seperate thread, allowing for the user to start drawing on the dicom view
-        Creates drawing across multiple slides allowing for the user to start drawing on dicom view.
+        The region is grown from the seed through the pixel volume in one pass, then the region on each slice it
+        reaches is added to the drawing mask as one change. Only the drawing mask is changed, the filled slices are
+        displayed together by show_3D_roi once this has finished.
+        :param bounds: the minimum x and y and maximum x and y the region is grown within
+        :return: the last slice number the region reached, or None if it reached no slice
         """
         logging.debug("process_3D_roi started")
 
         # If the seed is set then start searching, else assign the drawing function to the left click
+        last_slice = None
         if hasattr(self, 'seed'):
-            # Search down from the start position then up from the start position
-            total_slices = len(self.patient_dict_container.dataset)
-            for x in range(0, 2):
-
-                if x == 0:
-                    # search down slice
-                    slice_start = id - 1
-                    slice_end = 1
-                    step = -1
-                else:
-                    # search up slices
-                    slice_start = id
-                    slice_end = total_slices - 1
-                    step = 1
-
-                # Search the slides in the above ranges (down and up)
-                for y_search in range(slice_start, slice_end, step):
-                    # checking for interrupt (threading)
-                    if interrupt_flag.isSet():
-                        logging.debug("interrupting process_3D_roi")
-                        break
-
-                    # updating progress
-                    progress_callback.emit(
-                        ("Processing ROI for multiple slices", int(len(self.drawn_roi_list) / total_slices * 100)))
-                    temp_id = y_search
-
-                    # saving previous drawing and updating slice
-                    self.save_drawing_progress(self.current_slice)
-                    self.current_slice = temp_id
-
-                    if self.drawn_roi_list.get(self.current_slice) is not None:
-                        # do not redraw, continue to check the next slice
-                        continue
-
-                    dt = self.patient_dict_container.dataset[temp_id]
-                    dt.convert_pixel_data()
-
-                    # Path to the selected .dcm file
-                    location = self.patient_dict_container.filepaths[temp_id]
-                    self.ds = pydicom.dcmread(location)
-
-                    self.drawingROI = Drawing(
-                        pixmaps[temp_id],
-                        dt._pixel_array.transpose(),
-                        min_pixel,
-                        max_pixel,
-                        self.patient_dict_container.dataset[temp_id],
-                        self.draw_roi_window_instance,
-                        self.slice_changed,
-                        self.current_slice,
-                        self.drawing_tool_radius,
-                        self.keep_empty_pixel,
-                        self.pixel_transparency,
-                        max_internal_hole_size,
-                        set(),
-                        xy=self.seed
-                    )
-                    self.slice_changed = True
-                    self.has_drawing = True
-                    self.enable_cursor_diameter_transparency()
-
-                    roi_drawn = self.drawingROI._display_pixel_color()
-                    self.drawingROI.moveToThread(thread)
-                    if not roi_drawn:
-                        break
+            dataset = self.patient_dict_container.dataset
+            keys = get_image_keys(dataset)
+            valid = get_threshold_volume(
+                [dataset[key]._pixel_array for key in keys], min_pixel, max_pixel, bounds,
+                interrupt_flag, progress_callback, (0, 30))
+            if valid is None:
+                logging.debug("interrupting process_3D_roi")
+                return None
+
+            region = grow_volume(valid, (self.seed[0], self.seed[1], keys.index(id)), max_internal_hole_size,
+                                 interrupt_flag, progress_callback, (30, 100))
+            if region is None:
+                logging.debug("interrupting process_3D_roi")
+                return None
+
+            is_new_change = True
+            for slice_index in np.flatnonzero(region.reshape(len(region), -1).any(axis=1)):
+                last_slice = keys[slice_index]
+                if self.drawing_mask.is_drawn(last_slice):
+                    # do not redraw, continue to the next slice
+                    continue
+
+                self.drawing_mask.set_slice(last_slice, region[slice_index], is_new_change)
+                is_new_change = False
         logging.debug("process_3D_roi finished")
+        return last_slice
+
+    def show_3D_roi(self, last_slice):
+        """
+        Displays the slices filled by process_3D_roi. The drawing of the current slice is recreated from the drawing
+        mask first, so the drawing the seed was selected on is not saved over the filled region, then the last slice
+        filled is displayed.
+        :param last_slice: the last slice number filled, or None
+        """
+        self.set_current_slice(self.current_slice)
+        if last_slice is not None and last_slice != self.current_slice:
+            self.dicom_view.slider.setValue(last_slice)
 
     @Slot(list)
     def set_seed(self, s):
@@ -1122,25 +1161,29 @@ class UIDrawROIWindow:
         """
 
         self.seed = s
+        self.save_drawing_progress(self.current_slice)
+        self.drawingROI.set_bounds()
+        bounds = (self.drawingROI.min_bounds_x, self.drawingROI.min_bounds_y,
+                  self.drawingROI.max_bounds_x, self.drawingROI.max_bounds_y)
         roi_processing_window = ProgressWindow()
 
-        def finished():
+        def finished(loaded):
             """Inner function called when 3D ROI is finished"""
             roi_processing_window.close()
-            self.dicom_view.slider.setValue(self.current_slice)
+            self.show_3D_roi(loaded[0])
 
         def errored(err):
             """Inner function called when 3D ROI has errored"""
             logging.error('process_3D_roi has errored: %s', err)
             roi_processing_window.close()
+            self.show_3D_roi(None)
 
         roi_processing_window.signal_loaded.connect(finished)
         roi_processing_window.signal_error.connect(errored)
 
         roi_processing_window.start(self.process_3D_roi, float(self.min_pixel_density_line_edit.text()),
                                     float(self.max_pixel_density_line_edit.text()),
-                                    self.patient_dict_container.get("pixmaps_axial"),
-                                    self.current_slice, int(self.internal_hole_max_line_edit.text()), QThread.currentThread())
+                                    self.current_slice, int(self.internal_hole_max_line_edit.text()), bounds)
 
     def onBoxDrawClicked(self):
         """
@@ -1181,7 +1224,7 @@ class UIDrawROIWindow:
         This function is used when reset button is clicked
         """
         self.onClearClicked()
-        self.drawn_roi_list = {}
+        self.drawing_mask.clear()
 
     def onSaveClicked(self):
         """
@@ -1201,8 +1244,16 @@ class UIDrawROIWindow:
                               "Please ensure you have selected your ROI instance before saving.")
             return
 
+        # The contours of each slice are traced from the pixels drawn on it
+        alpha = self.input_alpha_value.value()
+        rois_to_save = {}
+        for slice_number in self.drawing_mask.drawn_slices():
+            rois_to_save[slice_number] = {
+                'coords': self.drawing_mask.get_contours(slice_number, alpha),
+                'ds': self.patient_dict_container.dataset[slice_number]
+            }
         roi_list = ROI.convert_hull_list_to_contours_data(
-            self.drawn_roi_list, self.patient_dict_container)
+            rois_to_save, self.patient_dict_container)
         if len(roi_list) == 0:
             QMessageBox.about(self.draw_roi_window_instance, "No ROI Detected",
                               "Please ensure you have drawn your ROI first.")
@@ -1229,11 +1280,11 @@ class UIDrawROIWindow:
         """
         function triggered when Preview button is clicked
         """
-        if hasattr(self, 'drawingROI') and self.drawingROI and len(
-                self.drawingROI.target_pixel_coords) > 0:
+        if hasattr(self, 'drawingROI') and self.drawingROI \
+                and self.drawingROI.target_mask.any():
             alpha = self.input_alpha_value.value()
-            polygon_list = calculate_concave_hull_of_points(
-                self.drawingROI.target_pixel_coords, alpha)
+            polygon_list = get_drawing_contours(
+                self.drawingROI.target_mask, alpha)
             self.drawingROI.draw_contour_preview(polygon_list)
         else:
             QMessageBox.about(self.draw_roi_window_instance, "Not Enough Data",
@@ -1325,7 +1376,7 @@ class UIDrawROIWindow:
             stream.write(str(self.input_alpha_value.value()))
             stream.write("\n")
 
-        self.drawn_roi_list = {}
+        self.drawing_mask.clear()
         if hasattr(self, 'bounds_box_draw'):
             delattr(self, 'bounds_box_draw')
         if hasattr(self, 'drawingROI'):
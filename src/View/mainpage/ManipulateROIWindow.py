@@ -1,4 +1,3 @@
-import pydicom
 from PySide6 import QtCore, QtGui
 from PySide6.QtCore import Qt, QRegularExpression
 from PySide6.QtGui import QIcon, QPixmap, QFont, QRegularExpressionValidator
@@ -462,8 +461,7 @@ class UIManipulateROIWindow:
 
         for uid, contour_sequence in self.new_ROI_contours.items():
             slider_id = slice_ids_dict[uid]
-            location = self.patient_dict_container.filepaths[slider_id]
-            ds = pydicom.dcmread(location)
+            ds = self.patient_dict_container.dataset[slider_id]
             slice_info = {
                 'coords': contour_sequence,
                 'ds': ds
@@ -13,8 +13,8 @@ from src.Model.CalculateDVHs import dvh2rtdose
 from src.Model.GetPatientInfo import DicomTree
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.MovingDictContainer import MovingDictContainer
-from src.Model.ROI import ordered_list_rois, get_roi_contour_pixel, \
-    calc_roi_polygon, transform_rois_contours, merge_rtss
+from src.Model.ROI import ordered_list_rois, get_roi_polygon_cache, \
+    ROIPolygons, merge_rtss
 from src.View.mainpage.StructureWidget import StructureWidget
 from src.View.util.SelectRTSSPopUp import SelectRTSSPopUp
 from src.Controller.PathHandler import data_path, resource_path
@@ -477,36 +477,20 @@ class StructureTab(QtWidgets.QWidget):
         roi_name = rois[roi_id]['name']
 
         if state:
-            new_dict_polygons_axial[roi_name] = {}
-            new_dict_polygons_coronal[roi_name] = {}
-            new_dict_polygons_sagittal[roi_name] = {}
-            dict_rois_contours_axial = get_roi_contour_pixel(
-                self.patient_dict_container.get("raw_contour"),
-                [roi_name], self.patient_dict_container.get("pixluts"))
-            dict_rois_contours_coronal, dict_rois_contours_sagittal = \
-                transform_rois_contours(
-                    dict_rois_contours_axial)
-
-            for slice_id in self.patient_dict_container.get(
-                    "dict_uid").values():
-                polygons = calc_roi_polygon(roi_name, slice_id,
-                                            dict_rois_contours_axial)
-                new_dict_polygons_axial[roi_name][slice_id] = polygons
-
-            for slice_id in range(0, len(self.patient_dict_container.get(
-                    "pixmaps_coronal"))):
-                polygons_coronal = calc_roi_polygon(
-                    roi_name, slice_id,
-                    dict_rois_contours_coronal,
-                    aspect["coronal"])
-                polygons_sagittal = calc_roi_polygon(
-                    roi_name, slice_id,
-                    dict_rois_contours_sagittal,
-                    1 / aspect["sagittal"])
-                new_dict_polygons_coronal[roi_name][
-                    slice_id] = polygons_coronal
-                new_dict_polygons_sagittal[roi_name][
-                    slice_id] = polygons_sagittal
+            # Polygons are calculated when a slice is first displayed
+            cache = get_roi_polygon_cache(self.patient_dict_container)
+            new_dict_polygons_axial[roi_name] = ROIPolygons(
+                roi_name, "axial",
+                self.patient_dict_container.get("dict_uid").values(), 1,
+                cache, self.patient_dict_container)
+            new_dict_polygons_coronal[roi_name] = ROIPolygons(
+                roi_name, "coronal", range(len(
+                    self.patient_dict_container.get("pixmaps_coronal"))),
+                aspect["coronal"], cache, self.patient_dict_container)
+            new_dict_polygons_sagittal[roi_name] = ROIPolygons(
+                roi_name, "sagittal", range(len(
+                    self.patient_dict_container.get("pixmaps_sagittal"))),
+                1 / aspect["sagittal"], cache, self.patient_dict_container)
 
             self.patient_dict_container.set("dict_polygons_axial",
                                             new_dict_polygons_axial)
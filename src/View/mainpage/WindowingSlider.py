@@ -218,7 +218,7 @@ class WindowingSlider(QWidget):
             self.densities[s] = [0] * WindowingSlider.MAX_PIXEL_VALUE
 
             # Count each pixel value
-            pixels_flat = np.array(self.pixel_values[s]).flat
+            pixels_flat = np.asarray(self.pixel_values[s]).flat
             for pixel in pixels_flat:
                 # Clamp value between 0 and MAX_PIXEL_VALUE
                 p = min(pixel, WindowingSlider.MAX_PIXEL_VALUE)
@@ -1,4 +1,4 @@
-import SimpleITK as sitk
+from src.Model.CalculateImages import get_sitk_image
 
 
 def get_dict_slice_to_uid(patient_dict_container):
@@ -11,20 +11,13 @@ def get_dict_slice_to_uid(patient_dict_container):
         (v, k) for k, v in patient_dict_container.get("dict_uid").items())
 
 
-def read_dicom_image_to_sitk(filepaths):
+def read_dicom_image_to_sitk(dict_container):
     """
-    this function reads dicom image to sitk object
-    :param filepaths: dictionary of filepaths in a dict container
+    this function converts the image of a dict container to sitk object,
+    using the pixel values already loaded rather than reading the files
+    :param dict_container: PatientDictContainer or MovingDictContainer
 
-    Returns: sitk object from filepaths
+    Returns: sitk object of the image
     """
-    amount = len(filepaths)
-    image_filepath_list = []
-
-    for i in range(amount):
-        try:
-            image_filepath_list.append(filepaths[i])
-        except KeyError:
-            continue
-
-    return sitk.ReadImage(image_filepath_list)
+    return get_sitk_image(dict_container.dataset,
+                          dict_container.get("pixel_values"))
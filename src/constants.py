@@ -3,3 +3,25 @@ INITIAL_ONE_VIEW_ZOOM = 1
 INITIAL_FOUR_VIEW_ZOOM = 0.5
 INITIAL_DRAWING_TOOL_RADIUS = 19
 CT_RESCALE_INTERCEPT = 1024
+PIXMAP_CACHE_SIZE = 256
+PIXMAP_PREFETCH_RADIUS = 2
+ROI_POLYGON_CACHE_SIZE = 4096
+ROI_POLYGON_PREFETCH_RADIUS = 2
+VOLUME_FILL_SLAB_SIZE = 16
+DRAWING_UNDO_LIMIT = 100
+# Save drawn ROIs with contours traced from their pixels, closing the gaps
+# the concave hull spans, instead of the concave hull itself. This is much
+# faster on large ROIs, but changes the saved contours by up to a few
+# percent of their area.
+DRAWING_CONTOURS_FROM_MASK = False
+VOLUME_MEMORY_MAP_THRESHOLD = 1024 ** 3
+WINDOWING_LUT_CACHE_SIZE = 16
+DVH_INTERRUPT_POLL_INTERVAL = 0.1
+FUSION_SHRINK_FACTORS = [8]
+FUSION_SMOOTH_SIGMAS = [10]
+FUSION_NUMBER_OF_THREADS = 0
+# Spawned worker processes import the application again, which takes
+# seconds, so slices are only contoured in a process pool when there are
+# at least this many pixels times levels to contour.
+CONTOUR_POOL_MIN_WORK = 2 * 10 ** 8
+CONTOUR_POOL_MAX_WORKERS = 4
@@ -0,0 +1,79 @@
+"""
+Benchmark of converting SUV levels to contours, comparing marching
+squares over the whole of every slice for each level against the batch
+contouring of src.Model.Contouring, serially and in a process pool whose
+processes are forked or spawned.
+
+The volume is a synthetic PET volume of hot spots in a noisy body,
+as the PET test data is not available in every checkout. Spawned
+processes here only import this script, whereas in the application each
+imports main.py, PySide6 and the models again, which took about 2 s per
+process when CONTOUR_POOL_MIN_WORK was chosen.
+"""
+import multiprocessing
+import time
+
+import numpy as np
+from scipy import ndimage
+from skimage import measure
+
+from src.Model.Contouring import find_slice_contours, get_contour_workers
+from src.constants import CONTOUR_POOL_MAX_WORKERS
+
+
+def create_volume(slices=200, rows=192, columns=192):
+    rng = np.random.default_rng(0)
+    z, y, x = np.mgrid[0:slices, 0:rows, 0:columns].astype(np.float32)
+    # Body of SUV around 0.5 to 1.5 within an empty field of view
+    body = ((y - rows / 2) / (rows * 0.3)) ** 2 \
+        + ((x - columns / 2) / (columns * 0.4)) ** 2 < 1
+    noise = ndimage.gaussian_filter(
+        rng.random((slices, rows, columns), dtype=np.float32), 2)
+    volume = body * (0.5 + (noise - noise.min()) / np.ptp(noise))
+    for _ in range(12):
+        centre = rng.random(3) * (slices, rows, columns)
+        width = rng.random() * 8 + 3
+        volume += rng.random() * 15 * np.exp(
+            -((z - centre[0]) ** 2 + (y - centre[1]) ** 2
+              + (x - centre[2]) ** 2) / (2 * width ** 2))
+    return [grid.astype(np.float64) for grid in volume]
+
+
+def main():
+    suv_slices = create_volume()
+    suv_levels = [range(1, int(np.ceil(grid.max()))) for grid in suv_slices]
+
+    # One marching squares pass over the whole slice per level, as before
+    start = time.perf_counter()
+    for grid, levels in zip(suv_slices, suv_levels):
+        for level in levels:
+            measure.find_contours(grid, level)
+    before = time.perf_counter() - start
+
+    start = time.perf_counter()
+    find_slice_contours(suv_slices, suv_levels)
+    serial = time.perf_counter() - start
+
+    pools = {}
+    for start_method in ["fork", "spawn"]:
+        if start_method not in multiprocessing.get_all_start_methods():
+            continue
+        start = time.perf_counter()
+        find_slice_contours(
+            suv_slices, suv_levels, max_workers=CONTOUR_POOL_MAX_WORKERS,
+            mp_context=multiprocessing.get_context(start_method))
+        pools[start_method] = time.perf_counter() - start
+
+    work = sum(grid.size * len(levels)
+               for grid, levels in zip(suv_slices, suv_levels))
+    print(f"Per level: {before:.2f} s, batch: {serial:.2f} s, "
+          + "".join(f"batch in {CONTOUR_POOL_MAX_WORKERS} {method}ed "
+                    f"processes: {seconds:.2f} s, "
+                    for method, seconds in pools.items())
+          + f"{work} pixels times levels contoured in "
+          f"{get_contour_workers(suv_slices, suv_levels)} process(es) "
+          "by default")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Benchmark of DVH calculation for a synthetic 100-ROI plan, comparing the
+vectorised DVHCalculator with dicompylercore.dvhcalc.get_dvh.
+"""
+import time
+
+from dicompylercore import dvhcalc
+
+from src.Model.DVHCalculator import DVHCalculator
+
+from dicom_builders import create_rtdose, create_rtss
+
+
+def main():
+    frames = 60
+    dataset_rtdose = create_rtdose(rows=160, columns=200, frames=frames)
+    dataset_rtss = create_rtss(num_rois=100, frames=frames)
+    rois = range(1, 101)
+
+    start = time.perf_counter()
+    for roi in rois:
+        dvhcalc.get_dvh(dataset_rtss, dataset_rtdose, roi)
+    before = time.perf_counter() - start
+
+    start = time.perf_counter()
+    DVHCalculator(dataset_rtss, dataset_rtdose).get_dvhs(rois)
+    after = time.perf_counter() - start
+
+    print(f"DVHs of 100 ROIs: dicompylercore {before:.2f} s, "
+          f"DVHCalculator {after:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Micro-benchmark of windowing slices and a volume with the lookup tables
+of CalculateImages, against the arithmetic they replace.
+"""
+import sys
+import timeit
+
+import numpy as np
+from PySide6 import QtWidgets
+
+from src.Model.CalculateImages import apply_windowing, scaled_pixmap
+
+from legacy import legacy_windowing
+
+
+def measure(function, repeat):
+    """Returns the fastest mean time of a call of function in seconds."""
+    return min(timeit.repeat(function, number=repeat, repeat=3)) / repeat
+
+
+def report(name, function, repeat):
+    """Prints the fastest mean time of a call of function."""
+    print(f"{name}: {measure(function, repeat) * 1000:.3f} ms")
+
+
+def compare(name, before, after, repeat):
+    """Prints the fastest mean times of calls of before and after."""
+    before_seconds = measure(before, repeat)
+    after_seconds = measure(after, repeat)
+    print(f"{name}: before {before_seconds * 1000:.3f} ms, "
+          f"after {after_seconds * 1000:.3f} ms, "
+          f"{before_seconds / after_seconds:.1f}x faster")
+
+
+def main():
+    app = QtWidgets.QApplication.instance() or \
+        QtWidgets.QApplication(sys.argv)
+
+    rng = np.random.default_rng(0)
+    volume = rng.integers(-1000, 3000, size=(300, 512, 512), dtype=np.int16)
+    np_slice = volume[150]
+    window, level = 400, 1000
+
+    # Build the lookup table outside of the timed region, as it is cached
+    # for each window and level
+    apply_windowing(np_slice, window, level)
+
+    compare("window slice (512x512)",
+            lambda: legacy_windowing(np_slice, window, level),
+            lambda: apply_windowing(np_slice, window, level), 50)
+    # The arithmetic was applied to one slice at a time
+    compare("window volume (300 slices)",
+            lambda: [legacy_windowing(np_pixels, window, level)
+                     for np_pixels in volume],
+            lambda: apply_windowing(volume, window, level), 1)
+    report("scaled_pixmap (to 512x512)",
+           lambda: scaled_pixmap(np_slice, window, level, 512, 512), 20)
+    app.processEvents()
+
+
+if __name__ == "__main__":
+    main()
@@ -31,3 +31,42 @@ def qapp_auto():
     yield app
     app.processEvents()
     app.quit()
+
+
+class FakeSignal:
+    """Stands in for a Qt signal, recording the values emitted."""
+
+    def __init__(self):
+        self.values = []
+
+    def emit(self, value):
+        self.values.append(value)
+
+
+class FakeDictContainer:
+    """Stands in for PatientDictContainer."""
+
+    def __init__(self, dataset=None, attributes=None):
+        self.dataset = {} if dataset is None else dataset
+        self.attributes = {} if attributes is None else attributes
+
+    def get(self, key):
+        return self.attributes.get(key)
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def has_attribute(self, key):
+        return key in self.attributes
+
+
+@pytest.fixture
+def fake_signal():
+    """Creates FakeSignals to pass as progress callbacks."""
+    return FakeSignal
+
+
+@pytest.fixture
+def fake_dict_container():
+    """Creates FakeDictContainers of the given datasets and attributes."""
+    return FakeDictContainer
@@ -0,0 +1,145 @@
+"""
+Builders of small synthetic DICOM datasets shared by the tests and the
+benchmarks.
+"""
+import numpy as np
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.sequence import Sequence
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+
+def write_ct_slice(file_path, patient_id, study_uid, series_uid):
+    """Writes a small CT slice with pixel data to file_path."""
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = pydicom.uid.CTImageStorage
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = Dataset()
+    ds.file_meta = file_meta
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    ds.PatientID = patient_id
+    ds.PatientName = "Test^" + patient_id
+    ds.StudyInstanceUID = study_uid
+    ds.SeriesInstanceUID = series_uid
+    ds.SeriesDescription = "CT series"
+    ds.SOPClassUID = file_meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+    ds.Modality = "CT"
+    ds.FrameOfReferenceUID = study_uid
+    ds.Rows = 4
+    ds.Columns = 4
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 1
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.PixelData = np.zeros((4, 4), dtype=np.int16).tobytes()
+    ds.save_as(file_path, write_like_original=False)
+    return ds.SOPInstanceUID
+
+
+def create_rtdose(rows=60, columns=50, frames=12, spacing=2.5,
+                  slice_spacing=3.0):
+    """Creates an RTDOSE with a smooth dose distribution peaking at 66 Gy."""
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.MediaStorageSOPClassUID = pydicom.uid.RTDoseStorage
+    ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    ds.SOPClassUID = ds.file_meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+    ds.Modality = "RTDOSE"
+    ds.ImagePositionPatient = [-60.0, -70.0, 0.0]
+    ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    ds.PixelSpacing = [spacing, spacing]
+    ds.GridFrameOffsetVector = [i * slice_spacing for i in range(frames)]
+    ds.Rows, ds.Columns = rows, columns
+    ds.NumberOfFrames = frames
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = 32
+    ds.BitsStored = 32
+    ds.HighBit = 31
+    ds.PixelRepresentation = 0
+    ds.DoseUnits = "GY"
+    ds.DoseType = "PHYSICAL"
+    ds.DoseSummationType = "PLAN"
+    ds.DoseGridScaling = 0.0001
+
+    z, y, x = np.meshgrid(np.arange(frames), np.arange(rows),
+                          np.arange(columns), indexing="ij")
+    distance = ((x - columns / 2) ** 2 + (y - rows / 2) ** 2
+                + (z - frames / 2) ** 2) / (rows * columns / 8)
+    dose = 660000 * np.exp(-distance)
+    ds.PixelData = dose.astype(np.uint32).tobytes()
+    return ds
+
+
+def create_contour(center, radius, z, points=24):
+    """Creates a closed planar circular contour."""
+    contour = Dataset()
+    contour.ContourGeometricType = "CLOSED_PLANAR"
+    contour.NumberOfContourPoints = points
+    angles = np.linspace(0, 2 * np.pi, points, endpoint=False)
+    xyz = np.column_stack((center[0] + radius * np.cos(angles),
+                           center[1] + radius * np.sin(angles),
+                           np.full(points, z)))
+    contour.ContourData = [round(value, 3) for value in xyz.ravel()]
+    return contour
+
+
+def create_rtss(num_rois=3, slice_spacing=3.0, frames=12, seed=0):
+    """
+    Creates an RTSS of num_rois ROIs. Every ROI is a stack of circles,
+    the second ROI has a hole, and the last one extends past the dose grid.
+    """
+    rng = np.random.default_rng(seed)
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.MediaStorageSOPClassUID = pydicom.uid.RTStructureSetStorage
+    ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    ds.SOPClassUID = ds.file_meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+    ds.Modality = "RTSTRUCT"
+    ds.StructureSetROISequence = Sequence()
+    ds.ROIContourSequence = Sequence()
+    ds.RTROIObservationsSequence = Sequence()
+
+    for roi in range(1, num_rois + 1):
+        structure_set_roi = Dataset()
+        structure_set_roi.ROINumber = roi
+        structure_set_roi.ROIName = "ROI %d" % roi
+        structure_set_roi.ReferencedFrameOfReferenceUID = generate_uid()
+        structure_set_roi.ROIGenerationAlgorithm = "MANUAL"
+        ds.StructureSetROISequence.append(structure_set_roi)
+
+        observation = Dataset()
+        observation.ObservationNumber = roi
+        observation.ReferencedROINumber = roi
+        observation.RTROIInterpretedType = "ORGAN"
+        ds.RTROIObservationsSequence.append(observation)
+
+        center = rng.uniform(-25, 5, size=2)
+        radius = rng.uniform(6, 20)
+        first = 1 if roi < num_rois else -3
+        roi_contour = Dataset()
+        roi_contour.ReferencedROINumber = roi
+        roi_contour.ContourSequence = Sequence()
+        for plane in range(first, frames - 2):
+            z = plane * slice_spacing
+            roi_contour.ContourSequence.append(
+                create_contour(center, radius, z))
+            if roi == 2:
+                roi_contour.ContourSequence.append(
+                    create_contour(center, radius / 2, z))
+        ds.ROIContourSequence.append(roi_contour)
+    return ds
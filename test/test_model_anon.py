@@ -7,15 +7,22 @@ Created on Fri Aug  21 12:33:04 2020
 import os
 import pathlib
 import tempfile
+import threading
+import pydicom
 import pytest
+from pydicom.uid import generate_uid
 
 from src.Model.Anon import (
     _check_identity_mapping_file_exists,
     _create_reidentification_spreadsheet,
     _trim_bracketing_single_quotes,
     anonymize,
+    anonymize_patients,
     anon_file_name,
 )
+from src.Model.DICOM.DICOMDirectorySearch import get_dicom_structure
+
+from dicom_builders import write_ct_slice
 
 
 def test_trim_single_quotes():
@@ -131,3 +138,140 @@ def test_anon_file_name():
     file_name_all_special_characters = "_!@#_%^__()[]{}___.______`_-=_+"
     assert file_name_hashed_patient_id == anon_file_name(hashed_patient_id)
     assert file_name_all_special_characters == anon_file_name(all_special_characters)
+
+
+@pytest.fixture
+def patient_tree(tmp_path, monkeypatch):
+    """
+    Creates two patients of CT slices, one with clinical data, and the
+    directory of the re-identification spreadsheet, in the current working
+    directory. pymedphys keeps its pseudonymisation settings in the home
+    directory.
+    """
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(tmp_path / "data" / "csv")
+    root = tmp_path / "dicom"
+    for patient_id in ["A", "B"]:
+        study_uid = generate_uid()
+        series_uid = generate_uid()
+        folder = root / patient_id
+        folder.mkdir(parents=True)
+        for i in range(3):
+            write_ct_slice(str(folder / ("CT%d.dcm" % i)), patient_id,
+                           study_uid, series_uid)
+    os.makedirs(root / "A" / "CSV")
+    (root / "A" / "CSV" / "ClinicalData_A.csv").write_text(
+        "PatientID,Age\nA,60\n")
+    return root
+
+
+def read_hash_csv():
+    with open(os.path.join("data", "csv", "patientHash.csv")) as f:
+        return f.read().splitlines()
+
+
+def test_anonymize_in_parallel(patient_tree):
+    folder = patient_tree / "A"
+    file_paths = {i: str(folder / ("CT%d.dcm" % i)) for i in range(3)}
+    datasets = {i: pydicom.dcmread(file_path)
+                for i, file_path in file_paths.items()}
+    anonymised_path = pathlib.Path(
+        anonymize(str(folder), datasets, file_paths, None, max_workers=2))
+    assert anonymised_path.parent == patient_tree
+    anonymised_files = sorted(anonymised_path.glob("*.dcm"))
+    assert len(anonymised_files) == 3
+    for file_path in anonymised_files:
+        assert pydicom.dcmread(file_path).PatientID != "A"
+    # the loaded datasets are left as they were
+    assert all(ds.PatientID == "A" for ds in datasets.values())
+    clinical_data = anonymised_path / "CSV" / \
+        ("ClinicalData_" + anonymised_path.name + ".csv")
+    assert anonymised_path.name in clinical_data.read_text()
+    assert read_hash_csv() == ["Pname and ID,Hashed_Pname",
+                               "Test^A + A," + anonymised_path.name]
+
+
+def test_anonymize_patients(patient_tree, fake_signal):
+    dicom_structure = get_dicom_structure(str(patient_tree),
+                                          threading.Event(), fake_signal(),
+                                          use_index=False)
+    progress = fake_signal()
+    destination = patient_tree.parent / "anonymised"
+    anonymised_paths = anonymize_patients(dicom_structure, destination,
+                                          threading.Event(), progress,
+                                          max_workers=2)
+    assert sorted(anonymised_paths) == ["A", "B"]
+    for patient_id, anonymised_path in anonymised_paths.items():
+        anonymised_path = pathlib.Path(anonymised_path)
+        assert anonymised_path.parent == destination.resolve()
+        anonymised_files = list(anonymised_path.glob("*.dcm"))
+        assert len(anonymised_files) == 3
+        for file_path in anonymised_files:
+            # the worker processes pseudonymise with the same pepper
+            assert anon_file_name(pydicom.dcmread(file_path).PatientID) \
+                == anonymised_path.name
+    assert os.path.exists(pathlib.Path(anonymised_paths["A"]).joinpath(
+        "CSV", "ClinicalData_" + pathlib.Path(anonymised_paths["A"]).name
+        + ".csv"))
+    assert progress.values == [("Anonymising patients... (1/2)", 50),
+                               ("Anonymising patients... (2/2)", 100)]
+    assert len(read_hash_csv()) == 3
+
+    # anonymising again adds no rows to the re-identification spreadsheet
+    assert anonymize_patients(dicom_structure, destination,
+                              threading.Event(),
+                              max_workers=1) == anonymised_paths
+    assert len(read_hash_csv()) == 3
+
+
+def test_anonymize_patients_with_corrupt_patient(patient_tree,
+                                                 fake_signal):
+    for patient_id in ["C", "D"]:
+        folder = patient_tree / patient_id
+        folder.mkdir()
+        write_ct_slice(str(folder / "CT0.dcm"), patient_id, generate_uid(),
+                       generate_uid())
+    dicom_structure = get_dicom_structure(str(patient_tree),
+                                          threading.Event(), fake_signal(),
+                                          use_index=False)
+    # B's files are damaged after they were found
+    for file_path in (patient_tree / "B").glob("*.dcm"):
+        file_path.write_bytes(b"not a DICOM file")
+    progress = fake_signal()
+    anonymised_paths = anonymize_patients(dicom_structure,
+                                          patient_tree.parent / "anon",
+                                          threading.Event(), progress,
+                                          max_workers=1)
+    assert sorted(anonymised_paths) == ["A", "C", "D"]
+    for anonymised_path in anonymised_paths.values():
+        assert any(pathlib.Path(anonymised_path).glob("*.dcm"))
+    assert progress.values[-1] == ("Anonymising patients... (3/3)", 100)
+    assert len(read_hash_csv()) == 4
+
+
+def test_anonymize_patients_interrupted(patient_tree, fake_signal):
+    dicom_structure = get_dicom_structure(str(patient_tree),
+                                          threading.Event(), fake_signal(),
+                                          use_index=False)
+    interrupt_flag = threading.Event()
+    interrupt_flag.set()
+    assert anonymize_patients(dicom_structure, patient_tree.parent / "anon",
+                              interrupt_flag) is None
+    assert not os.path.exists(os.path.join("data", "csv", "patientHash.csv"))
+
+
+def test_hash_csv_changed_elsewhere(patient_tree):
+    csv_filename = "patientHash.csv"
+    _create_reidentification_spreadsheet("ABC123", "FakeAnonABC123",
+                                         csv_filename)
+    # a row added by another program is not added again
+    with open(os.path.join("data", "csv", csv_filename), "a") as f:
+        f.write("DEF456,FakeAnonDEF456\n")
+    _create_reidentification_spreadsheet("DEF456", "FakeAnonDEF456",
+                                         csv_filename)
+    _create_reidentification_spreadsheet("ABC123", "FakeAnonABC123",
+                                         csv_filename)
+    assert read_hash_csv() == ["Pname and ID,Hashed_Pname",
+                               "ABC123,FakeAnonABC123",
+                               "DEF456,FakeAnonDEF456"]
@@ -0,0 +1,236 @@
+import numpy as np
+import pytest
+import SimpleITK as sitk
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+from src.Model.CalculateImages import apply_windowing, convert_raw_data, \
+    convert_pt_to_heatmap, get_heatmap_lut, get_pixmaps, \
+    get_sitk_image, get_windowed_pixmaps, scaled_pixmap, scaled_size, \
+    SliceLRUCache
+
+from legacy import legacy_windowing
+
+PIXMAP_ASPECT = {"axial": 1, "coronal": 1, "sagittal": 1}
+
+
+@pytest.fixture
+def pixel_values():
+    """A small synthetic CT volume of 6 slices of 8x10 pixels."""
+    rng = np.random.default_rng(0)
+    return list(rng.integers(0, 2000, size=(6, 8, 10), dtype=np.int16))
+
+
+def create_datasets(slices, slope=1, intercept=0,
+                    photometric="MONOCHROME2"):
+    """
+    Creates a dictionary of datasets, one for each 2D array in slices,
+    in the same layout as PatientDictContainer.dataset.
+    """
+    datasets = {}
+    for i, np_slice in enumerate(slices):
+        ds = Dataset()
+        ds.file_meta = FileMetaDataset()
+        ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        ds.is_little_endian = True
+        ds.is_implicit_VR = False
+        ds.Rows, ds.Columns = np_slice.shape
+        ds.BitsAllocated = 16
+        ds.BitsStored = 12
+        ds.HighBit = 11
+        ds.PixelRepresentation = 0
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = photometric
+        ds.RescaleSlope = slope
+        ds.RescaleIntercept = intercept
+        ds.PixelData = np_slice.astype(np.uint16).tobytes()
+        datasets[i] = ds
+    datasets["rtss"] = Dataset()
+    return datasets
+
+
+def test_convert_raw_data_volume():
+    """
+    Tests that the slices are rescaled into one int16 volume which the
+    datasets share.
+    """
+    slices = np.arange(3 * 4 * 5).reshape((3, 4, 5)) * 10
+    datasets = create_datasets(slices, intercept=-1024)
+    volume = convert_raw_data(datasets, rescaled=False, is_ct=True)
+
+    assert volume.dtype == np.int16
+    assert volume.flags["C_CONTIGUOUS"]
+    # The CT intercept is offset by CT_RESCALE_INTERCEPT
+    assert np.array_equal(volume, slices)
+    for i in range(3):
+        assert np.shares_memory(datasets[i].pixel_array, volume)
+
+    # Converting again with rescaled=True reuses the rescaled pixels
+    assert np.array_equal(convert_raw_data(datasets, rescaled=True), slices)
+
+
+def test_convert_raw_data_float_and_memory_mapped():
+    """
+    Tests that non-integer rescales produce a float32 volume, and that the
+    volume can be memory-mapped.
+    """
+    slices = np.arange(2 * 3 * 3).reshape((2, 3, 3))
+    datasets = create_datasets(slices, slope=0.5)
+    volume = convert_raw_data(datasets, rescaled=False, memory_mapped=True)
+
+    assert isinstance(volume, np.memmap)
+    assert volume.dtype == np.float32
+    assert np.allclose(volume, slices * 0.5)
+
+
+def test_convert_raw_data_monochrome1():
+    """
+    Tests that MONOCHROME1 images are inverted based on the max value.
+    """
+    slices = np.arange(2 * 2 * 2).reshape((2, 2, 2))
+    datasets = create_datasets(slices, photometric="MONOCHROME1")
+    volume = convert_raw_data(datasets)
+
+    assert np.array_equal(volume, slices.max() - slices)
+    assert np.array_equal(datasets[1].pixel_array, slices[1])
+
+
+@pytest.mark.parametrize("slice_step", [2.5, -3.0])
+def test_get_sitk_image_matches_read_image(tmp_path, slice_step):
+    """
+    Tests that the SimpleITK image built from the loaded volume is the
+    same as reading the files, for slices stacked in either direction.
+    """
+    rng = np.random.default_rng(0)
+    slices = rng.integers(0, 3000, size=(4, 6, 5))
+    datasets = create_datasets(slices, intercept=-1024)
+    filepaths = []
+    for i in range(4):
+        ds = datasets[i]
+        ds.file_meta.MediaStorageSOPClassUID = CTImageStorage
+        ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+        ds.SOPClassUID = CTImageStorage
+        ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+        ds.Modality = "CT"
+        ds.PixelSpacing = [0.8, 1.2]
+        ds.SliceThickness = abs(slice_step)
+        ds.ImageOrientationPatient = [1, 0, 0, 0, 0.6, -0.8]
+        ds.ImagePositionPatient = [-30.0, -40.0 + 0.8 * i * slice_step,
+                                   10.0 + 0.6 * i * slice_step]
+        filepaths.append(str(tmp_path / ("%d.dcm" % i)))
+        ds.save_as(filepaths[-1], write_like_original=False)
+
+    expected = sitk.ReadImage(filepaths)
+    volume = convert_raw_data(datasets, rescaled=False, is_ct=True)
+    image = get_sitk_image(datasets, volume)
+
+    assert image.GetSize() == expected.GetSize()
+    assert np.allclose(image.GetOrigin(), expected.GetOrigin())
+    assert np.allclose(image.GetSpacing(), expected.GetSpacing())
+    assert np.allclose(image.GetDirection(), expected.GetDirection())
+    assert np.array_equal(sitk.GetArrayViewFromImage(image),
+                          sitk.GetArrayViewFromImage(expected))
+
+
+def test_get_pixmaps_is_lazy(pixel_values):
+    """
+    Tests that no slices are rendered until requested and that each view
+    has one pixmap per slice along its axis.
+    """
+    axial, coronal, sagittal = get_pixmaps(pixel_values, 400, 1000,
+                                           PIXMAP_ASPECT)
+    assert len(axial.cache) == 0
+    assert (len(axial), len(coronal), len(sagittal)) == (6, 8, 10)
+    assert list(axial) == list(range(6))
+
+    pixmap = axial[2]
+    assert len(axial.cache) == 1
+    assert axial[2] is pixmap
+    with pytest.raises(KeyError):
+        axial[6]
+
+
+def test_get_pixmaps_matches_scaled_pixmap(pixel_values):
+    """
+    Tests that the lazily rendered slices are the same as rendering the
+    slice directly.
+    """
+    axial, coronal, _ = get_pixmaps(pixel_values, 400, 1000, PIXMAP_ASPECT)
+    volume = np.array(pixel_values)
+
+    width, height = scaled_size(volume.shape[1], volume.shape[2])
+    expected = scaled_pixmap(volume[3], 400, 1000, width, height)
+    assert axial[3].toImage() == expected.toImage()
+
+    width, height = scaled_size(volume.shape[1], volume.shape[0])
+    expected = scaled_pixmap(volume[:, 4, :], 400, 1000, width, height)
+    assert coronal[4].toImage() == expected.toImage()
+
+
+def test_windowed_pixmaps_share_cache(pixel_values):
+    """
+    Tests that re-windowing does not render anything and that switching
+    back to a previous window reuses the rendered slices.
+    """
+    pixmaps = get_pixmaps(pixel_values, 400, 1000, PIXMAP_ASPECT)
+    first = pixmaps[0][1]
+
+    rewindowed = get_windowed_pixmaps(pixmaps, 1600, 700)
+    assert rewindowed[0].cache is pixmaps[0].cache
+    assert len(pixmaps[0].cache) == 1
+    assert not rewindowed[0].is_cached(1)
+
+    restored = get_windowed_pixmaps(rewindowed, 400, 1000)
+    assert restored[0][1] is first
+
+
+def test_prefetch_and_cache_bound(pixel_values):
+    """
+    Tests that prefetching renders the neighbouring slices and that the
+    cache evicts the least recently used pixmaps.
+    """
+    axial, _, _ = get_pixmaps(pixel_values, 400, 1000, PIXMAP_ASPECT)
+    axial.prefetch(3, radius=2)
+    assert [axial.is_cached(i) for i in range(6)] == \
+           [False, True, True, False, True, True]
+
+    cache = SliceLRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert "a" in cache and "c" in cache and "b" not in cache
+
+
+@pytest.mark.parametrize("window, level", [(400, 1000), (1600, -300),
+                                           (275, 762.5), (1, 0)])
+def test_apply_windowing_matches_legacy(window, level):
+    """
+    Tests that the lookup table windowing is identical to the previous
+    arithmetic over the whole int16 range.
+    """
+    np_pixels = np.arange(-32768, 32768, dtype=np.int16).reshape((256, 256))
+    assert np.array_equal(apply_windowing(np_pixels, window, level),
+                          legacy_windowing(np_pixels, window, level))
+
+    # Float volumes are truncated to int16 first
+    np_pixels = np.linspace(-2000, 3000, 1000).reshape((10, 100))
+    assert np.array_equal(apply_windowing(np_pixels, window, level),
+                          legacy_windowing(np_pixels, window, level))
+
+
+def test_heatmap_lut_matches_convert_pt_to_heatmap():
+    """
+    Tests that the fused heat map lookup table gives the same colours as
+    windowing and then applying convert_pt_to_heatmap.
+    """
+    np_pixels = np.arange(0, 4000, 4, dtype=np.int16).reshape((10, 100))
+    windowed = legacy_windowing(np_pixels, 400, 1000).view(np.int8)
+    expected = convert_pt_to_heatmap(windowed)
+
+    rgb = np.ascontiguousarray(
+        get_heatmap_lut(400, 1000)[np_pixels.view(np.uint16)])
+    assert rgb.shape == (10, 100, 3)
+    pixmap = scaled_pixmap(np_pixels, 400, 1000, 100, 10, color="Heat")
+    assert pixmap.toImage() == expected.convertToFormat(
+        pixmap.toImage().format())
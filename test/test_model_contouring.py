@@ -0,0 +1,108 @@
+import multiprocessing
+import threading
+
+import numpy as np
+import pytest
+from skimage import measure
+
+from src.Model import Contouring
+from src.Model.Contouring import find_level_contours, find_slice_contours, \
+    get_contour_workers
+
+
+def create_slices(count=6, shape=(64, 48), seed=0):
+    """Smooth PET-like slices with a few hot spots."""
+    rng = np.random.default_rng(seed)
+    rows, columns = np.mgrid[0:shape[0], 0:shape[1]]
+    slices = []
+    for _ in range(count):
+        grid = rng.random(shape) * 0.5
+        for _ in range(3):
+            row, column = rng.random(2) * shape
+            width = rng.random() * 6 + 2
+            grid += rng.random() * 9 * np.exp(
+                -((rows - row) ** 2 + (columns - column) ** 2)
+                / (2 * width ** 2))
+        slices.append(grid)
+    return slices
+
+
+def assert_same_contours(contours, expected):
+    assert len(contours) == len(expected)
+    for contour, expected_contour in zip(contours, expected):
+        assert np.allclose(contour, expected_contour)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_level_contours_match_find_contours(seed):
+    """
+    Tests that contouring within the bounds of each level gives the same
+    contours as contouring the whole slice.
+    """
+    grid = create_slices(1, seed=seed)[0]
+    # Hot spot on the edge of the slice
+    grid[0:3, -3:] = 7.5
+    levels = [0.2, 1, 2, 3, 5, 7, 20]
+    contours = find_level_contours(grid, levels)
+    assert sorted(contours) == levels
+    for level in levels:
+        assert_same_contours(contours[level],
+                             measure.find_contours(grid, level))
+    assert contours[20] == []
+
+
+@pytest.mark.parametrize("max_workers, start_method",
+                         [(1, None), (2, None), (2, "spawn")])
+def test_slice_contours_match_find_contours(max_workers, start_method):
+    """
+    Tests that the contours of a batch of slices, each at their own levels,
+    are the same when found in this process or in a process pool, including
+    one whose processes are spawned as on Windows and macOS.
+    """
+    slices = create_slices()
+    levels = [range(1, int(np.ceil(grid.max()))) for grid in slices]
+    progress = []
+    mp_context = multiprocessing.get_context(start_method) \
+        if start_method else None
+
+    class Callback:
+        def emit(self, value):
+            progress.append(value)
+
+    slice_contours = find_slice_contours(slices, levels,
+                                         max_workers=max_workers,
+                                         progress_callback=Callback(),
+                                         progress_range=(20, 60),
+                                         mp_context=mp_context)
+    assert len(slice_contours) == len(slices)
+    for grid, grid_levels, contours in zip(slices, levels, slice_contours):
+        assert list(contours) == list(grid_levels)
+        for level in grid_levels:
+            assert_same_contours(contours[level],
+                                 measure.find_contours(grid, level))
+    assert progress[-1] == ("Calculating Boundaries... (6/6)", 60)
+
+
+def test_contour_workers(monkeypatch):
+    """
+    Tests that small batches are contoured in this process and large ones
+    in a capped number of processes.
+    """
+    slices = create_slices()
+    levels = [[1, 2]] * len(slices)
+    assert get_contour_workers(slices, levels) == 1
+
+    monkeypatch.setattr(Contouring, "CONTOUR_POOL_MIN_WORK",
+                        64 * 48 * 2 * len(slices))
+    monkeypatch.setattr(Contouring.os, "cpu_count", lambda: 16)
+    assert get_contour_workers(slices, levels[1:]) == 1
+    assert get_contour_workers(slices, levels) == \
+        Contouring.CONTOUR_POOL_MAX_WORKERS
+
+
+def test_slice_contours_interrupted():
+    """Tests that no contours are returned when interrupted."""
+    interrupt_flag = threading.Event()
+    interrupt_flag.set()
+    assert find_slice_contours(create_slices(), [[1, 2]] * 6,
+                               interrupt_flag=interrupt_flag) is None
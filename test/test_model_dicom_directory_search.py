@@ -0,0 +1,89 @@
+import os
+import threading
+from unittest import mock
+
+import pytest
+from pydicom.uid import generate_uid
+
+from src.Model.DICOM import DICOMDirectorySearch
+from src.Model.DICOM.DICOMIndex import DICOMIndex
+
+from dicom_builders import write_ct_slice
+
+
+@pytest.fixture
+def dicom_tree(tmp_path, monkeypatch):
+    """Creates two patients in nested folders plus a non-DICOM file."""
+    monkeypatch.setenv('USER_ONKODICOM_HIDDEN', str(tmp_path / 'hidden'))
+    root = tmp_path / 'dicom'
+    uids = {}
+    for patient_id in ["A", "B"]:
+        study_uid = generate_uid()
+        series_uid = generate_uid()
+        folder = root / patient_id
+        folder.mkdir(parents=True)
+        uids[patient_id] = (study_uid, series_uid, [
+            write_ct_slice(str(folder / ("CT%d.dcm" % i)), patient_id,
+                           study_uid, series_uid) for i in range(3)])
+    (root / "notes.txt").write_text("not a DICOM file")
+    return root, uids
+
+
+def test_get_dicom_structure(dicom_tree, fake_signal):
+    """
+    Tests that the header-only search builds the expected
+    Patient>Study>Series>Image structure and reports progress per file.
+    """
+    root, uids = dicom_tree
+    progress = fake_signal()
+    structure = DICOMDirectorySearch.get_dicom_structure(
+        str(root), threading.Event(), progress)
+
+    assert progress.values == list(range(1, 8))
+    assert set(structure.patients) == {"A", "B"}
+    for patient_id, (study_uid, series_uid, image_uids) in uids.items():
+        patient = structure.get_patient(patient_id)
+        series = patient.get_study(study_uid).get_series(series_uid)
+        assert set(series.images) == set(image_uids)
+        assert series.series_description == "CT series"
+        assert series.frame_of_reference_uid == study_uid
+    assert len(structure.get_files()) == 6
+
+
+def test_get_dicom_structure_uses_index(dicom_tree, fake_signal):
+    """
+    Tests that a second search of an unchanged directory is served from
+    the persistent index, and that changed files are read again.
+    """
+    root, uids = dicom_tree
+    first = DICOMDirectorySearch.get_dicom_structure(
+        str(root), threading.Event(), fake_signal())
+    assert DICOMIndex.get_index_path(str(root)).is_file()
+
+    with mock.patch.object(DICOMDirectorySearch, 'read_header_record') \
+            as read_header_record:
+        second = DICOMDirectorySearch.get_dicom_structure(
+            str(root), threading.Event(), fake_signal())
+        read_header_record.assert_not_called()
+    assert sorted(first.get_files()) == sorted(second.get_files())
+
+    study_uid, series_uid, _ = uids["A"]
+    changed_path = root / "A" / "CT0.dcm"
+    new_uid = write_ct_slice(str(changed_path), "A", study_uid, series_uid)
+    # Make sure the change is visible on file systems with coarse mtimes
+    mtime = changed_path.stat().st_mtime
+    os.utime(changed_path, (mtime + 10, mtime + 10))
+    third = DICOMDirectorySearch.get_dicom_structure(
+        str(root), threading.Event(), fake_signal())
+    series = third.get_patient("A").get_study(study_uid).get_series(
+        series_uid)
+    assert series.has_image(new_uid)
+
+
+def test_get_dicom_structure_interrupted(dicom_tree, fake_signal):
+    """Tests that an interrupted search returns None."""
+    root, _ = dicom_tree
+    interrupt_flag = threading.Event()
+    interrupt_flag.set()
+    assert DICOMDirectorySearch.get_dicom_structure(
+        str(root), interrupt_flag, fake_signal()) is None
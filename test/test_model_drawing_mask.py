@@ -0,0 +1,150 @@
+import math
+
+import numpy as np
+import pytest
+
+from shapely.geometry import Polygon
+
+from src.Model import DrawingMask as drawing_mask_module
+from src.Model.DrawingMask import get_disk_window, encode_runs, \
+    decode_runs, get_mask_contours, DrawingMask
+from src.Model.ROI import calculate_concave_hull_of_points
+from src.Model.RegionGrowing import mask_to_pixel_coords
+
+
+def legacy_painted_pixels(center, radius, bounds):
+    """The pixels fill_pixels_within_circle painted before, for comparison."""
+    min_x, min_y, max_x, max_y = bounds
+    pixels = set()
+    for y in range(max(min_y, math.ceil(center[1] - radius)),
+                   min(max_y, math.ceil(center[1] + radius))):
+        for x in range(max(min_x, math.ceil(center[0] - radius)),
+                       min(max_x, math.ceil(center[0] + radius))):
+            distance = np.linalg.norm(np.array(center) - np.array((x, y)))
+            if distance <= radius:
+                pixels.add((x, y))
+    return pixels
+
+
+def window_pixels(window):
+    rows, columns, stencil = window
+    y_coords, x_coords = np.nonzero(stencil)
+    return set(zip((x_coords + columns.start).tolist(),
+                   (y_coords + rows.start).tolist()))
+
+
+@pytest.mark.parametrize("radius", [0, 1, 2.5, 7, 19, 9.5 * 0.5])
+@pytest.mark.parametrize("center", [(30, 40), (2, 3), (62, 60), (70, -4)])
+def test_disk_window_matches_legacy(radius, center):
+    """
+    Tests that the stencil paints the pixels of the bounding square the
+    brush painted, and erases the pixels within the radius.
+    """
+    shape = (64, 64)
+    for bounds in [(0, 0, 64, 64), (5, 10, 50, 45)]:
+        assert window_pixels(get_disk_window(center, radius, shape, bounds,
+                                             closed=False)) == \
+               legacy_painted_pixels(center, radius, bounds)
+
+    everywhere = {(x, y) for x in range(64) for y in range(64)}
+    assert window_pixels(get_disk_window(center, radius, shape)) == \
+           {pixel for pixel in everywhere
+            if np.linalg.norm(np.array(center) - np.array(pixel)) <= radius}
+
+
+def test_runs():
+    """
+    Tests that masks are restored from their runs.
+    """
+    rng = np.random.default_rng(0)
+    for mask in [np.zeros((6, 7), dtype=bool), np.ones((6, 7), dtype=bool),
+                 rng.random((40, 33)) < 0.5]:
+        assert np.array_equal(decode_runs(encode_runs(mask), mask.shape),
+                              mask)
+    assert encode_runs(np.array([1, 1, 0, 1, 0, 0], dtype=bool)).tolist() \
+        == [0, 2, 3, 4]
+
+
+def test_drawing_mask_undo():
+    """
+    Tests that the slices drawn are kept as bits, and that each change,
+    or each group of changes, is undone.
+    """
+    drawing_mask = DrawingMask(5, 30, 21)
+    first = np.zeros((30, 21), dtype=bool)
+    first[3:10, 4:20] = True
+    second = first.copy()
+    second[20:25, :] = True
+
+    assert drawing_mask.set_slice(1, first)
+    assert not drawing_mask.set_slice(1, first)
+    assert drawing_mask.set_slice(1, second)
+    assert drawing_mask.set_slice(3, first)
+    assert drawing_mask.set_slice(4, second, new_change=False)
+    assert drawing_mask.drawn_slices() == [1, 3, 4]
+    assert drawing_mask.bits.nbytes == 5 * 30 * 3
+
+    assert drawing_mask.undo() == [3, 4]
+    assert drawing_mask.drawn_slices() == [1]
+    assert np.array_equal(drawing_mask.get_slice(1), second)
+    assert drawing_mask.undo() == [1]
+    assert np.array_equal(drawing_mask.get_slice(1), first)
+    assert drawing_mask.undo() == [1]
+    assert not drawing_mask.is_drawn(1)
+    assert drawing_mask.undo() == []
+
+    drawing_mask.set_slice(2, first)
+    drawing_mask.clear()
+    assert drawing_mask.drawn_slices() == []
+    assert not drawing_mask.can_undo()
+
+
+# alphashape builds a numpy matrix for every triangle of the pixels
+@pytest.mark.filterwarnings("ignore::PendingDeprecationWarning")
+@pytest.mark.parametrize("alpha", [0.2, 0.5, 0.9])
+def test_mask_contours_match_concave_hull(alpha):
+    """
+    Tests that the contours traced from a mask cover the concave hull of
+    its pixels, with a notch narrower than the gaps the hull spans at
+    small alpha values.
+    """
+    y, x = np.mgrid[:64, :64]
+    mask = (x - 30) ** 2 + (y - 32) ** 2 < 20 ** 2
+    mask[30:32, 35:] = False
+    mask[5:9, 55:60] = True
+
+    hull = [Polygon(points)
+            for points in calculate_concave_hull_of_points(
+                mask_to_pixel_coords(mask), alpha)]
+    contours = [Polygon(points) for points in get_mask_contours(mask, alpha)]
+    assert len(contours) == len(hull) == 2
+    hull_area = sum(polygon.area for polygon in hull)
+    contours_area = sum(polygon.area for polygon in contours)
+    overlap = sum(a.intersection(b).area for a in hull for b in contours)
+    assert overlap / (hull_area + contours_area - overlap) > 0.97
+
+    # Regions without area have no contour
+    line = np.zeros((10, 10), dtype=bool)
+    line[5, 2:8] = True
+    assert get_mask_contours(line) == []
+
+
+@pytest.mark.filterwarnings("ignore::PendingDeprecationWarning")
+def test_drawing_contours_setting(monkeypatch):
+    """
+    Tests that the contours saved are the concave hull of the pixels
+    drawn unless they are set to be traced from the mask.
+    """
+    y, x = np.mgrid[:32, :32]
+    mask = (x - 15) ** 2 + (y - 16) ** 2 < 10 ** 2
+    mask[15:17, 18:] = False
+    drawing_mask = DrawingMask(1, 32, 32)
+    drawing_mask.set_slice(0, mask)
+
+    assert drawing_mask.get_contours(0, 0.5) == \
+        calculate_concave_hull_of_points(mask_to_pixel_coords(mask), 0.5)
+
+    monkeypatch.setattr(drawing_mask_module, "DRAWING_CONTOURS_FROM_MASK",
+                        True)
+    assert drawing_mask.get_contours(0, 0.5) == \
+        get_mask_contours(mask, 0.5)
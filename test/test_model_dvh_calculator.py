@@ -0,0 +1,143 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from dicompylercore import dvhcalc
+from pydicom.uid import generate_uid
+
+from src.Model import ImageLoading
+from src.Model.CalculateDVHs import calc_outdated_dvhs
+from src.Model.DVHCalculator import DVHCalculator, get_plane_mask
+
+from dicom_builders import create_rtdose, create_rtss
+
+
+def assert_dvh_close(actual, expected):
+    """
+    Asserts two cumulative DVHs have the same bins and volumes within a
+    tolerance allowing for grid points on the edges of the contours.
+    """
+    assert actual.name == expected.name
+    assert actual.dvh_type == expected.dvh_type == "cumulative"
+    assert np.array_equal(actual.bins, expected.bins) or \
+        abs(actual.bins.size - expected.bins.size) <= 2
+    assert actual.volume == pytest.approx(expected.volume, rel=0.02)
+    for statistic in ["max", "min", "mean"]:
+        assert getattr(actual, statistic) == \
+               pytest.approx(getattr(expected, statistic), rel=0.02, abs=0.05)
+    for dose in [10, 30, 50]:
+        assert actual.volume_constraint(dose, 'Gy').value == pytest.approx(
+            expected.volume_constraint(dose, 'Gy').value, rel=0.03, abs=0.1)
+
+
+def test_get_plane_mask_even_odd():
+    """
+    Tests that a contour inside another contour forms a hole, and that the
+    winding direction of the contours does not matter.
+    """
+    lut = np.arange(10.0)
+    outer = [[0.5, 0.5], [8.5, 0.5], [8.5, 8.5], [0.5, 8.5]]
+    inner = [[3.5, 3.5], [3.5, 5.5], [5.5, 5.5], [5.5, 3.5]]
+    mask = get_plane_mask([np.array(outer), np.array(inner)], lut, lut)
+
+    expected = np.zeros((10, 10), dtype=bool)
+    expected[1:9, 1:9] = True
+    expected[4:6, 4:6] = False
+    assert np.array_equal(mask, expected)
+
+    # Decubitus grids have x along the rows
+    mask = get_plane_mask([np.array(outer)[:, ::-1]], lut, lut, 1)
+    expected[4:6, 4:6] = True
+    assert np.array_equal(mask, expected)
+
+
+def test_dvhs_match_dicompyler():
+    """
+    Tests that the DVHs match dicompyler-core for solid ROIs, ROIs with
+    holes, ROIs outside the dose grid and with a dose limit.
+    """
+    dataset_rtdose = create_rtdose()
+    dataset_rtss = create_rtss()
+    calculator = DVHCalculator(dataset_rtss, dataset_rtdose)
+
+    for roi in [1, 2, 3]:
+        assert_dvh_close(calculator.get_dvh(roi),
+                         dvhcalc.get_dvh(dataset_rtss, dataset_rtdose, roi))
+    assert "Dose grid does not encompass" in calculator.get_dvh(3).notes
+
+    limited = DVHCalculator(dataset_rtss, dataset_rtdose, dose_limit=4000)
+    assert_dvh_close(limited.get_dvh(1, thickness=2.0),
+                     dvhcalc.get_dvh(dataset_rtss, dataset_rtdose, 1, 4000,
+                                     thickness=2.0))
+
+
+def test_dvhs_match_dicompyler_on_test_data():
+    """Tests the DVHs of the test patient against dicompyler-core."""
+    desired_path = Path.cwd().joinpath('test', 'testdata')
+    if not desired_path.is_dir():
+        pytest.skip("Test data is not available")
+    selected_files = [str(path) for path in desired_path.rglob('*')
+                      if path.is_file()]
+    read_data_dict, file_names_dict = \
+        ImageLoading.get_datasets(selected_files)
+    if 'rtss' not in file_names_dict or 'rtdose' not in file_names_dict:
+        pytest.skip("Test data has no RTSS and RTDOSE")
+
+    dataset_rtss = read_data_dict['rtss']
+    dataset_rtdose = read_data_dict['rtdose']
+    rois = ImageLoading.get_roi_info(dataset_rtss)
+    dict_thickness = ImageLoading.get_thickness_dict(dataset_rtss,
+                                                     read_data_dict)
+    dict_dvh = DVHCalculator(dataset_rtss, dataset_rtdose).get_dvhs(
+        rois, dict_thickness)
+    for roi in rois:
+        expected = dvhcalc.get_dvh(dataset_rtss, dataset_rtdose, roi,
+                                   thickness=dict_thickness.get(roi))
+        if expected.volume > 1:
+            assert_dvh_close(dict_dvh[roi], expected)
+
+
+def test_calc_outdated_dvhs():
+    """
+    Tests that only the DVHs of changed and new ROIs are recalculated, and
+    that a different dose recalculates every ROI.
+    """
+    dataset_rtdose = create_rtdose()
+    dataset_rtss = create_rtss()
+    rois = ImageLoading.get_roi_info(dataset_rtss)
+    dict_dvh, fingerprints = calc_outdated_dvhs(
+        dataset_rtss, dataset_rtdose, rois, {}, {}, {})
+    assert list(dict_dvh) == [1, 2, 3]
+
+    unchanged = calc_outdated_dvhs(dataset_rtss, dataset_rtdose, rois, {},
+                                   dict_dvh, fingerprints)
+    assert unchanged[1] == fingerprints
+    assert all(unchanged[0][roi] is dict_dvh[roi] for roi in rois)
+
+    # A renamed ROI gets a renamed copy of its DVH
+    old_name = rois[1]['name']
+    renamed_rois = {roi: dict(rois[roi]) for roi in rois}
+    renamed_rois[1]['name'] = "Renamed"
+    renamed = calc_outdated_dvhs(dataset_rtss, dataset_rtdose,
+                                 renamed_rois, {}, dict_dvh, fingerprints)[0]
+    assert renamed[1].name == "Renamed"
+    assert dict_dvh[1].name == old_name
+    assert np.array_equal(renamed[1].counts, dict_dvh[1].counts)
+
+    # Shrink the second ROI and drop the DVH of the third
+    contour = dataset_rtss.ROIContourSequence[1].ContourSequence[0]
+    contour.ContourData = contour.ContourData[:-3]
+    contour.NumberOfContourPoints -= 1
+    partial_dvh = {roi: dict_dvh[roi] for roi in [1, 2]}
+    updated, updated_fingerprints = calc_outdated_dvhs(
+        dataset_rtss, dataset_rtdose, rois, {}, partial_dvh, fingerprints)
+    assert updated[1] is dict_dvh[1]
+    assert updated[2] is not dict_dvh[2]
+    assert updated[3] is not dict_dvh[3]
+    assert updated_fingerprints[2] != fingerprints[2]
+    assert updated_fingerprints[3] == fingerprints[3]
+
+    dataset_rtdose.SOPInstanceUID = generate_uid()
+    new_dose = calc_outdated_dvhs(dataset_rtss, dataset_rtdose, rois, {},
+                                  updated, updated_fingerprints)[0]
+    assert all(new_dose[roi] is not updated[roi] for roi in rois)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from platipy.imaging.visualisation.utils import generate_comparison_colormix
+
+from src.Model.CalculateImages import SliceLRUCache
+from src.Model.ImageFusion import FusedPixmaps, fused_pixmap, \
+    get_fused_rgb
+from src.constants import CT_RESCALE_INTERCEPT
+
+
+@pytest.fixture
+def volumes():
+    """A fixed and a moving synthetic CT volume of 6x8x10 voxels."""
+    rng = np.random.default_rng(0)
+    fixed = rng.integers(-1024, 2000, size=(6, 8, 10)).astype(np.int16)
+    moving = rng.integers(-1024, 2000, size=(6, 8, 10)).astype(np.int16)
+    # Include voxels where both images are equal
+    moving[:, 0, :] = fixed[:, 0, :]
+    return fixed, moving
+
+
+@pytest.mark.parametrize("windowing", [(-250, 500), (0, 1), (-1024, 3000)])
+def test_get_fused_rgb_matches_platipy(volumes, windowing):
+    """
+    Tests that the blended slices are the same as platipy's comparison
+    colormix.
+    """
+    fixed, moving = volumes
+    for arr_slice in [(3, slice(None), slice(None)),
+                      (slice(None), 4, slice(None)),
+                      (slice(None), slice(None), 5)]:
+        expected = generate_comparison_colormix(
+            [fixed, moving], arr_slice=arr_slice, window=windowing)
+        rgb = get_fused_rgb(fixed[arr_slice], moving[arr_slice], windowing)
+        assert rgb.dtype == np.uint8
+        assert np.array_equal(rgb, (255 * expected).astype(np.uint8))
+
+
+def test_fused_pixmaps(volumes):
+    """
+    Tests that the fused slices are rendered lazily from the slices of
+    the view, and that rewindowing shares the cache.
+    """
+    fixed, moving = volumes
+    cache = SliceLRUCache()
+    window, level = 500, 0
+    sagittal = FusedPixmaps(fixed, moving, "sagittal", window, level, cache)
+    assert len(sagittal) == 10
+    assert len(cache) == 0
+
+    windowing = (int(level - CT_RESCALE_INTERCEPT), window)
+    assert sagittal[5].toImage() == fused_pixmap(
+        fixed[:, :, 5], moving[:, :, 5], windowing).toImage()
+    assert len(cache) == 1
+
+    rewindowed = sagittal.windowed(800, 200)
+    assert rewindowed.cache is cache
+    assert rewindowed[5].toImage() != sagittal[5].toImage()
+    assert len(cache) == 2
+
+    axial = FusedPixmaps(fixed, moving, "axial", window, level, cache)
+    assert axial[2].toImage() == fused_pixmap(
+        fixed[2], moving[2], windowing).toImage()
@@ -0,0 +1,56 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from src.Model import ImageLoading
+
+pytestmark = pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork",
+    reason="The fake DVH calculator is only inherited by forked workers")
+
+
+class FakeDVHCalculator:
+    """Stands in for DVHCalculator, returning the arguments it got."""
+
+    def __init__(self, dataset_rtss, dataset_rtdose, dose_limit=None):
+        self.datasets = (dataset_rtss, dataset_rtdose, dose_limit)
+
+    def get_dvh(self, roi, thickness=None):
+        time.sleep(0.01 * roi)
+        return self.datasets + (roi, thickness)
+
+
+@pytest.fixture
+def rois(monkeypatch):
+    monkeypatch.setattr(ImageLoading, "DVHCalculator", FakeDVHCalculator)
+    return {roi: {"name": "ROI %d" % roi} for roi in [5, 1, 3, 2, 4]}
+
+
+def test_multi_calc_dvh(rois, fake_signal):
+    """
+    Tests that every ROI is calculated with the shared datasets and its
+    own thickness, and that progress is reported up to the end of the
+    progress range.
+    """
+    progress = fake_signal()
+    dict_dvh = ImageLoading.multi_calc_dvh(
+        "rtss", "rtdose", rois, {3: 2.5}, threading.Event(), progress,
+        dose_limit=70, max_workers=2)
+
+    assert list(dict_dvh) == list(rois)
+    for roi, dvh in dict_dvh.items():
+        thickness = 2.5 if roi == 3 else None
+        assert dvh == ("rtss", "rtdose", 70, roi, thickness)
+    assert progress.values[-1] == ("Calculating DVHs... (5/5)", 80)
+    assert [value[1] for value in progress.values] == \
+           sorted(value[1] for value in progress.values)
+
+
+def test_multi_calc_dvh_interrupted(rois):
+    """Tests that an interrupted calculation returns None."""
+    interrupt_flag = threading.Event()
+    interrupt_flag.set()
+    assert ImageLoading.multi_calc_dvh("rtss", "rtdose", rois, {},
+                                       interrupt_flag) is None
@@ -0,0 +1,159 @@
+import numpy as np
+import pydicom
+import pytest
+import SimpleITK as sitk
+from platipy.imaging.registration import linear
+from pydicom.dataset import Dataset
+
+from src.Model import ImageRegistration
+from src.Model.ImageRegistration import get_parameter_hash, \
+    get_registration_parameters, linear_registration, read_transform_dcm, \
+    register_images
+
+
+@pytest.fixture
+def images():
+    """A fixed image of a sphere, and a moving image of it translated."""
+    z, y, x = np.mgrid[0:24, 0:32, 0:32]
+    sphere = 1000.0 * (((x - 16) ** 2 + (y - 16) ** 2 + (z - 12) ** 2)
+                       < 49) - 1000
+    fixed_image = sitk.GetImageFromArray(sphere.astype(np.int16))
+    moving_image = sitk.GetImageFromArray(
+        np.roll(sphere, 2, axis=2).astype(np.int16))
+    return fixed_image, moving_image
+
+
+@pytest.fixture
+def hidden_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv('USER_ONKODICOM_HIDDEN', str(tmp_path))
+    return tmp_path
+
+
+def test_register_images_is_cached(images, hidden_directory, monkeypatch):
+    """
+    Tests that registering the same series with the same parameters
+    reuses the cached transform, and that other series are registered.
+    """
+    fixed_image, moving_image = images
+    registered, tfm, store = register_images(fixed_image, moving_image,
+                                             "1.1", "1.2")
+    assert store
+    assert len(list(hidden_directory.joinpath('Registrations').iterdir())) \
+        == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The images were registered again")
+
+    monkeypatch.setattr(ImageRegistration, "linear_registration", fail)
+    cached, cached_tfm, store = register_images(fixed_image, moving_image,
+                                                "1.1", "1.2")
+    assert store
+    assert np.allclose(cached_tfm.TransformPoint((1.0, 2.0, 3.0)),
+                       tfm.TransformPoint((1.0, 2.0, 3.0)))
+    assert np.array_equal(sitk.GetArrayViewFromImage(cached),
+                          sitk.GetArrayViewFromImage(registered))
+
+    with pytest.raises(AssertionError):
+        register_images(fixed_image, moving_image, "1.1", "1.3")
+
+
+def test_linear_registration_matches_platipy(images):
+    """
+    Tests that registering with the number of threads set on the
+    registration gives the same result as platipy's linear_registration,
+    and leaves SimpleITK's default number of threads alone.
+    """
+    fixed_image, moving_image = images
+    parameters = get_registration_parameters()
+    default_number_of_threads = \
+        sitk.ProcessObject.GetGlobalDefaultNumberOfThreads()
+    registered, tfm = linear_registration(
+        fixed_image, moving_image,
+        number_of_threads=default_number_of_threads, **parameters)
+    expected, expected_tfm = linear.linear_registration(
+        fixed_image, moving_image, **parameters)
+
+    assert sitk.ProcessObject.GetGlobalDefaultNumberOfThreads() == \
+        default_number_of_threads
+    assert np.allclose(tfm.TransformPoint((1.0, 2.0, 3.0)),
+                       expected_tfm.TransformPoint((1.0, 2.0, 3.0)))
+    assert registered.GetPixelID() == expected.GetPixelID()
+    assert np.array_equal(sitk.GetArrayViewFromImage(registered),
+                          sitk.GetArrayViewFromImage(expected))
+
+
+def write_spatial_registration(transform_path, matrix, manufacturer,
+                               content_description):
+    """Writes a spatial registration object of the moving image 1.2.1."""
+    item = Dataset()
+    item.ReferencedSOPInstanceUID = "1.2.1"
+    matrix_item = Dataset()
+    matrix_item.FrameOfReferenceTransformationMatrixType = 'RIGID'
+    matrix_item.FrameOfReferenceTransformationMatrix = \
+        [str(value) for value in matrix.ravel()]
+    matrix_registration = Dataset()
+    matrix_registration.MatrixSequence = [matrix_item]
+    registration = Dataset()
+    registration.ReferencedImageSequence = [item]
+    registration.MatrixRegistrationSequence = [matrix_registration]
+    spatial_registration = Dataset()
+    spatial_registration.Manufacturer = manufacturer
+    spatial_registration.ContentDescription = content_description
+    spatial_registration.RegistrationSequence = [registration]
+    spatial_registration.is_little_endian = True
+    spatial_registration.is_implicit_VR = True
+    pydicom.dcmwrite(transform_path, spatial_registration)
+
+
+def test_read_transform_dcm(tmp_path):
+    """
+    Tests that a spatial registration object is only reused for the
+    moving images it references, and the parameters it was created with.
+    """
+    parameter_hash = get_parameter_hash(get_registration_parameters())
+    matrix = np.eye(4)
+    matrix[0:3, 3] = [5, -2, 1]
+    transform_path = str(tmp_path / 'transform.dcm')
+    write_spatial_registration(transform_path, matrix, "OnkoDICOM",
+                               "Registration parameters " + parameter_hash)
+
+    tfm = read_transform_dcm(transform_path, ["1.2.1", "1.2.2"],
+                             parameter_hash)
+    assert np.allclose(tfm.TransformPoint((1.0, 1.0, 1.0)), (6, -1, 2))
+    assert read_transform_dcm(transform_path, ["1.3.1"],
+                              parameter_hash) is None
+    assert read_transform_dcm(transform_path, ["1.2.1"], "other") is None
+
+
+def test_third_party_transform_dcm_is_not_reused(images, tmp_path,
+                                                 monkeypatch):
+    """
+    Tests that the matrix of a spatial registration object written by
+    another program, which maps the moving image to the fixed image, is
+    not used as the transform from the fixed to the moving image, and the
+    images are registered instead.
+    """
+    monkeypatch.delenv('USER_ONKODICOM_HIDDEN', raising=False)
+    parameter_hash = get_parameter_hash(get_registration_parameters())
+    matrix = np.eye(4)
+    matrix[0:3, 0:3] = [[0, -1, 0], [1, 0, 0], [0, 0, 1]]
+    matrix[0:3, 3] = [5, -2, 1]
+    transform_path = str(tmp_path / 'transform.dcm')
+    write_spatial_registration(transform_path, matrix, "Other",
+                               "Registration parameters " + parameter_hash)
+    assert read_transform_dcm(transform_path, ["1.2.1"],
+                              parameter_hash) is None
+
+    registered = []
+
+    def register(fixed_image, moving_image, **kwargs):
+        registered.append(moving_image)
+        return moving_image, sitk.Euler3DTransform()
+
+    monkeypatch.setattr(ImageRegistration, "linear_registration", register)
+    fixed_image, moving_image = images
+    _, tfm, store = register_images(fixed_image, moving_image, "1.1", "1.2",
+                                    ["1.2.1"], transform_path)
+    assert registered == [moving_image]
+    assert store
+    assert np.allclose(tfm.TransformPoint((1.0, 1.0, 1.0)), (1, 1, 1))
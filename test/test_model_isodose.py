@@ -0,0 +1,157 @@
+import time
+
+import numpy as np
+import pytest
+from PySide6 import QtCore, QtGui
+from pydicom.dataset import Dataset
+from skimage import measure
+
+from src.Model.Isodose import get_dose_grid, get_dose_volume, \
+    get_image_dose_volume, IsodoseContours
+
+from dicom_builders import create_rtdose
+
+
+def legacy_polygons(container, slice_id, level):
+    """The isodose polygons as DicomAxialView calculated them before."""
+    dataset_rtdose = container.dataset["rtdose"]
+    grid = get_dose_grid(dataset_rtdose,
+                         float(container.dataset[slice_id]
+                               .ImagePositionPatient[2]))
+    dose_level = level * container.get("rx_dose_in_cgray") / \
+        (dataset_rtdose.DoseGridScaling * 10000)
+    dose_pixluts = container.get("dose_pixluts")[
+        container.get("dict_uid")[slice_id]]
+    polygons = []
+    for contour in measure.find_contours(grid, dose_level):
+        polygons.append(QtGui.QPolygonF(
+            [QtCore.QPoint(dose_pixluts[0][int(point[1])],
+                           dose_pixluts[1][int(point[0])])
+             for point in contour[::2]]))
+    return points(polygons)
+
+
+def points(polygons):
+    """The points of a list of polygons, as QPolygonF compares by identity."""
+    return [polygon.toList() for polygon in polygons]
+
+
+@pytest.fixture
+def container(fake_dict_container):
+    """A FakeDictContainer with a dose and 8 axial slices."""
+    container = fake_dict_container(
+        {"rtdose": create_rtdose()},
+        {"rx_dose_in_cgray": 6000, "dict_uid": {}, "dose_pixluts": {}})
+    for i in range(8):
+        ds = Dataset()
+        ds.ImagePositionPatient = [-60.0, -70.0, 1.5 * i + 4]
+        container.dataset[i] = ds
+        uid = "1.2.%d" % i
+        container.attributes["dict_uid"][i] = uid
+        container.attributes["dose_pixluts"][uid] = \
+            (np.arange(50) * 2.5 + 0.3, np.arange(60) * 2.5 - 0.3)
+    return container
+
+
+def test_isodose_polygons_match_legacy(container):
+    """
+    Tests that the cached polygons are the same as calculating them on
+    every display, and that they are only calculated once.
+    """
+    isodose_contours = IsodoseContours(container)
+    polygons = isodose_contours.get_polygons(3, [50, 80, 100])
+    for level in [50, 80, 100]:
+        assert points(polygons[level]) == \
+            legacy_polygons(container, 3, level)
+    assert polygons[50]
+
+    again = isodose_contours.get_polygons(3, [50, 80])
+    assert again[50] is polygons[50]
+
+
+def test_isodose_polygons_invalidated(container):
+    """
+    Tests that changing the prescription or the dose clears the cache.
+    """
+    isodose_contours = IsodoseContours(container)
+    polygons = isodose_contours.get_polygons(2, [80])[80]
+
+    container.set("rx_dose_in_cgray", 5000)
+    rescaled = isodose_contours.get_polygons(2, [80])[80]
+    assert rescaled is not polygons
+    assert points(rescaled) == legacy_polygons(container, 2, 80)
+
+    container.dataset["rtdose"] = create_rtdose(rows=60, columns=50,
+                                                spacing=2.0)
+    assert isodose_contours.get_polygons(2, [80])[80] is not rescaled
+
+
+def test_isodose_precompute(container):
+    """
+    Tests that the other slices are calculated in the background.
+    """
+    isodose_contours = IsodoseContours(container)
+    isodose_contours.precompute(4, [50, 90])
+    deadline = time.monotonic() + 10
+    while len(isodose_contours.polygons) < 16 \
+            and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(isodose_contours.polygons) == 16
+    assert points(isodose_contours.get_polygons(7, [90])[90]) == \
+        legacy_polygons(container, 7, 90)
+
+
+def test_isodose_precompute_stopped(container):
+    """
+    Tests that clearing the cache stops the background calculation, and
+    that a failing calculation is logged.
+    """
+    isodose_contours = IsodoseContours(container)
+    isodose_contours.precompute(0, [50, 70, 90])
+    threads = list(isodose_contours.threads)
+    assert threads
+    isodose_contours.clear()
+    assert not any(thread.is_alive() for thread in threads)
+    assert isodose_contours.threads == []
+    time.sleep(0.05)
+    assert isodose_contours.polygons == {}
+
+
+def test_isodose_precompute_failure_logged(container, caplog):
+    isodose_contours = IsodoseContours(container)
+    isodose_contours.check_dose()
+    # The slices are gone before the background calculation reaches them
+    container.dataset = {"rtdose": container.dataset["rtdose"]}
+    isodose_contours.precompute(0, [50])
+    for thread in isodose_contours.threads:
+        thread.join()
+    assert "Unable to precompute the isodose polygons" in caplog.text
+
+
+def test_dose_volume_matches_dose_grid():
+    """
+    Tests that resampling the dose to all slices at once is the same as
+    resampling each slice, on, between and outside of the dose planes.
+    """
+    dataset_rtdose = create_rtdose()
+    z_positions = [-4.0, 0.0, 0.2, 1.0, 4.5, 17.9, 33.0, 40.0]
+    dose_volume = get_dose_volume(dataset_rtdose, z_positions)
+    assert dose_volume.shape == (8, 60, 50)
+    for grid, z in zip(dose_volume, z_positions):
+        assert np.allclose(grid, get_dose_grid(dataset_rtdose, z))
+
+
+def test_image_dose_volume_is_cached(container):
+    """
+    Tests that the dose volume of the slices is only resampled once per
+    dose.
+    """
+    dose_volume = get_image_dose_volume(container)
+    assert get_image_dose_volume(container) is dose_volume
+    for i in range(8):
+        z = container.dataset[i].ImagePositionPatient[2]
+        assert np.allclose(dose_volume[i],
+                           get_dose_grid(container.dataset["rtdose"], z))
+
+    container.dataset["rtdose"] = create_rtdose()
+    assert get_image_dose_volume(container) is not dose_volume
@@ -0,0 +1,183 @@
+import threading
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from src.Model.RegionGrowing import get_threshold_mask, grow_region, \
+    mask_to_pixel_coords, pixel_coords_to_mask, get_threshold_volume, \
+    grow_volume
+
+
+def legacy_region_growing(pixel_array, seed, min_pixel, max_pixel, bounds,
+                          max_hole_size, target_pixel_coords):
+    """The breadth first search Drawing used before, for comparison."""
+    min_x, min_y, max_x, max_y = bounds
+    target_pixel_coords = set(target_pixel_coords)
+
+    def check_roi_validity(coords):
+        if min_x < coords[0] < max_x and min_y < coords[1] < max_y:
+            return min_pixel < pixel_array[coords[1]][coords[0]] < max_pixel
+        return False
+
+    queue = [seed]
+    outlines = set()
+    while len(queue) > 0:
+        current = queue.pop(0)
+        for x_neighbour in range(-1, 2):
+            for y_neighbour in range(-1, 2):
+                element = (current[0] + x_neighbour,
+                           current[1] + y_neighbour)
+                if check_roi_validity(element):
+                    if element not in target_pixel_coords:
+                        queue.append(element)
+                        target_pixel_coords.add(element)
+                elif max_hole_size > 0:
+                    outlines.add(element)
+    if max_hole_size <= 0:
+        return target_pixel_coords
+
+    neighbours = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    hole_outline_list = []
+    while outlines:
+        first_element = next(iter(outlines))
+        queue = [first_element]
+        hole_outline = {first_element}
+        outlines.remove(first_element)
+        while queue:
+            current = queue.pop(0)
+            for x_neighbour, y_neighbour in neighbours:
+                element = (current[0] + x_neighbour,
+                           current[1] + y_neighbour)
+                if element in outlines:
+                    queue.append(element)
+                    hole_outline.add(element)
+                    outlines.remove(element)
+        if len(hole_outline) <= max_hole_size:
+            hole_outline_list.append(hole_outline)
+
+    for hole_outline in hole_outline_list:
+        first_element = next(iter(hole_outline))
+        if len(hole_outline) == 1:
+            target_pixel_coords.add(first_element)
+            continue
+        queue = [first_element]
+        volume = 0
+        hole_pixel_coords = set()
+        while queue:
+            current = queue.pop(0)
+            for x_neighbour, y_neighbour in neighbours:
+                element = (current[0] + x_neighbour,
+                           current[1] + y_neighbour)
+                if element not in hole_pixel_coords \
+                        and element not in target_pixel_coords:
+                    queue.append(element)
+                    hole_pixel_coords.add(element)
+                    volume += 1
+            if volume > max_hole_size:
+                break
+        if volume <= max_hole_size:
+            target_pixel_coords.update(hole_pixel_coords)
+    return target_pixel_coords
+
+
+def create_slice(size=96, seed=0):
+    """A slice of smooth noise with a bright blob and dark holes in it."""
+    rng = np.random.default_rng(seed)
+    noise = ndimage.gaussian_filter(rng.normal(size=(size, size)), 2)
+    y, x = np.mgrid[:size, :size]
+    blob = ((x - size / 2) ** 2 + (y - size / 2) ** 2) < (size / 3) ** 2
+    pixel_array = (noise * 400 + blob * 1000).astype(np.int16)
+    holes = rng.random((size, size)) < 0.02
+    pixel_array[holes & blob] = -1000
+    return pixel_array
+
+
+@pytest.mark.parametrize("seed", range(6))
+@pytest.mark.parametrize("max_hole_size", [0, 1, 5, 30])
+def test_grow_region_matches_legacy(seed, max_hole_size):
+    """
+    Tests that growing a region with labelling selects the same pixels
+    as the breadth first search, with and without hole filling, bounds
+    and pixels selected before.
+    """
+    pixel_array = create_slice(seed=seed)
+    size = pixel_array.shape[0]
+    bounds = (0, 0, size, size) if seed % 2 else (10, 5, 80, 90)
+    existing = {(40, y) for y in range(30, 60)} if seed % 3 == 0 else set()
+    fill_source = (size // 2, size // 2)
+
+    expected = legacy_region_growing(pixel_array, fill_source, 800, 1600,
+                                     bounds, max_hole_size, existing)
+    valid = get_threshold_mask(pixel_array, 800, 1600, bounds)
+    target = grow_region(valid, fill_source,
+                         pixel_coords_to_mask(existing, valid.shape),
+                         max_hole_size)
+    assert mask_to_pixel_coords(target) == expected
+    assert len(expected) > len(existing) + 100
+
+
+def test_grow_region_from_invalid_seed():
+    """
+    Tests that the neighbours of an invalid seed are grown from, and that
+    a seed away from the slice selects nothing.
+    """
+    pixel_array = np.zeros((8, 8))
+    pixel_array[2:5, 3:5] = 1
+    valid = get_threshold_mask(pixel_array, 0.5, 2)
+    assert mask_to_pixel_coords(grow_region(valid, (2, 1))) == \
+        {(x, y) for x in range(3, 5) for y in range(2, 5)}
+    assert not grow_region(valid, (1, 1)).any()
+    assert not grow_region(valid, (20, -5), max_hole_size=9).any()
+
+
+def create_volume(slices=40, size=64):
+    """
+    A volume with a bright sphere, holes of one pixel in its slices, and
+    a bright blob which does not touch the sphere.
+    """
+    z, y, x = np.mgrid[:slices, :size, :size]
+    sphere = ((x - 32) ** 2 + (y - 32) ** 2 + (z - 20) ** 2) < 15 ** 2
+    blob = ((x - 55) ** 2 + (y - 55) ** 2 + (z - 30) ** 2) < 4 ** 2
+    volume = np.where(sphere | blob, 1000, 0).astype(np.int16)
+    volume[:, 32, 32] = 0
+    return volume, sphere
+
+
+def test_grow_volume(fake_signal):
+    """
+    Tests that the region grows through the slices connected to the seed
+    only, filling the holes of each slice.
+    """
+    volume, sphere = create_volume()
+    progress = fake_signal()
+    valid = get_threshold_volume(list(volume), 500, 1500,
+                                 progress_callback=progress)
+    assert np.array_equal(valid[7], get_threshold_mask(volume[7], 500, 1500))
+    assert progress.values[-1][1] == 50
+
+    region = grow_volume(valid, (32, 32, 20), 0, progress_callback=progress)
+    reached = np.flatnonzero(region.reshape(len(region), -1).any(axis=1))
+    assert list(reached) == list(range(6, 35))
+    assert progress.values[-1][1] == 100
+    assert np.array_equal(region, sphere & valid)
+
+    filled = grow_volume(valid, (32, 32, 20), 1)
+    for i in reached:
+        expected = grow_region(valid[i], (32, 32), max_hole_size=1) \
+            if i == 20 else sphere[i]
+        assert np.array_equal(filled[i], expected)
+
+
+def test_grow_volume_interrupted():
+    """
+    Tests that thresholding and growing stop when interrupted.
+    """
+    volume, _ = create_volume()
+    interrupt_flag = threading.Event()
+    valid = get_threshold_volume(list(volume), 500, 1500)
+    interrupt_flag.set()
+    assert grow_volume(valid, (32, 32, 20), 0, interrupt_flag) is None
+    assert get_threshold_volume(list(volume), 500, 1500,
+                                interrupt_flag=interrupt_flag) is None
+    assert not grow_volume(valid, (5, 5, 20)).any()
@@ -10,11 +10,19 @@ from pathlib import Path
 from pydicom import dataset, dcmread
 from pydicom.errors import InvalidDicomError
 from pydicom.tag import Tag
+from shapely.geometry import Point, Polygon
 
 from src.Model import ImageLoading
+from src.Model.ImageLoading import get_pixluts
 from src.Model.PatientDictContainer import PatientDictContainer
-from src.Model.ROI import add_to_roi, calculate_matrix, create_roi, roi_to_geometry, \
-    get_roi_contour_pixel, manipulate_rois, geometry_to_roi, create_initial_rtss_from_ct
+from src.Model.ROI import add_to_roi, add_contours_to_roi, calculate_matrix, \
+    create_roi, roi_to_geometry, \
+    get_roi_contour_pixel, manipulate_rois, geometry_to_roi, create_initial_rtss_from_ct, \
+    calculate_pixels, calculate_contours_pixels, get_resliced_roi_contours, \
+    transform_rois_contours, calc_roi_polygon, ROIPolygons, \
+    get_roi_polygon_cache
+from src.Model.CalculateImages import SliceLRUCache
+from src.constants import ROI_POLYGON_CACHE_SIZE
 
 
 def find_DICOM_files(file_path):
@@ -102,6 +110,100 @@ def test_calculate_matrix():
     assert np.all(array_y == np.array([0, 1, 2, 3]))
 
 
+def test_get_pixluts():
+    """
+    Tests that the broadcasted pixluts match the per-pixel matrix products,
+    and that slices with the same geometry share their pixlut.
+    """
+    datasets = {}
+    geometries = [([0.9, 1.1], [1, 0, 0, 0, 1, 0], [-250, -180, 0]),
+                  ([0.9, 1.1], [1, 0, 0, 0, 1, 0], [-250, -180, 3]),
+                  ([0.7, 0.7], [-1, 0, 0, 0, -1, 0], [120.5, 95.25, 6]),
+                  ([1.0, 2.0], [0.8, 0.6, 0, -0.6, 0.8, 0], [10, 20, 9])]
+    for i, (spacing, orientation, position) in enumerate(geometries):
+        image_ds = dataset.Dataset()
+        image_ds.SOPInstanceUID = "1.2.3." + str(i)
+        image_ds.PixelSpacing = spacing
+        image_ds.ImageOrientationPatient = orientation
+        image_ds.ImagePositionPatient = position
+        image_ds.Rows = 6
+        image_ds.Columns = 5
+        datasets[i] = image_ds
+    datasets["rtss"] = dataset.Dataset()
+
+    pixluts = get_pixluts(datasets)
+    assert len(pixluts) == 4
+    for i, (spacing, orientation, position) in enumerate(geometries):
+        matrix_m = np.array(
+            [[orientation[0] * spacing[0], orientation[3] * spacing[1], 0,
+              position[0]],
+             [orientation[1] * spacing[0], orientation[4] * spacing[1], 0,
+              position[1]],
+             [orientation[2] * spacing[0], orientation[5] * spacing[1], 0,
+              position[2]],
+             [0, 0, 0, 1]])
+        x = [(matrix_m @ [i, 0, 0, 1])[0] for i in range(5)]
+        y = [(matrix_m @ [0, j, 0, 1])[1] for j in range(6)]
+        pixlut = pixluts["1.2.3." + str(i)]
+        assert np.allclose(pixlut[0], x) and np.allclose(pixlut[1], y)
+
+    # The first two slices only differ in z, so they share a pixlut
+    assert pixluts["1.2.3.0"] is pixluts["1.2.3.1"]
+    assert pixluts["1.2.3.0"] is not pixluts["1.2.3.2"]
+
+
+def legacy_calculate_pixels(pixlut, contour, prone=False, feetfirst=False):
+    """The per-point implementation of calculate_pixels, for comparison."""
+    pixels = []
+    np_x = np.array(pixlut[0])
+    np_y = np.array(pixlut[1])
+    for i in range(0, len(contour), 3):
+        con_x = contour[i]
+        con_y = contour[i + 1]
+        if prone:
+            pixels.append([np.argmin(np_x < con_x), np.argmin(np_y < con_y)])
+        elif feetfirst:
+            pixels.append([np.argmin(np_x < con_x), np.argmax(np_y > con_y)])
+        else:
+            pixels.append([np.argmax(np_x > con_x), np.argmax(np_y > con_y)])
+    return pixels
+
+
+@pytest.mark.parametrize("prone, feetfirst",
+                         [(False, False), (False, True), (True, False),
+                          (True, True)])
+@pytest.mark.parametrize("axis_order", ["ascending", "descending", "mixed"])
+def test_calculate_pixels_matches_legacy(prone, feetfirst, axis_order):
+    """
+    Tests that the vectorised calculate_pixels gives exactly the same
+    pixels as the per-point implementation, including points outside the
+    image and points exactly on a pixel centre.
+    """
+    rng = np.random.default_rng(1)
+    np_x = np.arange(64) * 0.9 - 30
+    np_y = np.arange(48) * 1.1 - 20
+    if axis_order == "descending":
+        np_x, np_y = np_x[::-1], np_y[::-1]
+    elif axis_order == "mixed":
+        rng.shuffle(np_x)
+        rng.shuffle(np_y)
+    pixlut = (np_x, np_y)
+
+    contours = []
+    for _ in range(5):
+        points = rng.uniform(-40, 40, size=(rng.integers(1, 50), 3))
+        points[::4, 0] = np_x[3]
+        points[::5, 1] = np_y[7]
+        contours.append(list(points.ravel()))
+
+    for contour in contours:
+        assert calculate_pixels(pixlut, contour, prone, feetfirst) == \
+               legacy_calculate_pixels(pixlut, contour, prone, feetfirst)
+    assert calculate_contours_pixels(pixlut, contours, prone, feetfirst) == \
+           [legacy_calculate_pixels(pixlut, contour, prone, feetfirst)
+            for contour in contours]
+
+
 def test_add_to_roi():
     rt_ss = dataset.Dataset()
 
@@ -184,6 +286,191 @@ def test_create_roi():
     assert (rt_ss.RTROIObservationsSequence[0].RTROIInterpretedType == "ORGAN")
 
 
+def test_create_roi_with_contours_of_many_slices():
+    rt_ss = dataset.Dataset()
+    rt_ss.StructureSetROISequence = []
+    rt_ss.ROIContourSequence = []
+    rt_ss.RTROIObservationsSequence = []
+
+    roi_coordinates = [0, 0, 0, 0, 1, 0, 1, 0, 0, 0, 0, 0]
+    roi_list = []
+    for i in range(40):
+        image_ds = dataset.Dataset()
+        image_ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+        image_ds.SOPInstanceUID = "1.2.3.%d" % i
+        image_ds.FrameOfReferenceUID = "1.2.3"
+        roi_list.append({'coords': roi_coordinates, 'ds': image_ds})
+
+    patient_dict_container = PatientDictContainer()
+    patient_dict_container.set_initial_values(None, None, None,
+                                              blah="blah", rois={})
+    rt_ss = create_roi(rt_ss, "FirstROI", roi_list[:1])
+    rt_ss = create_roi(rt_ss, "NewTestROI", roi_list[:30])
+    patient_dict_container.set("rois", {2: {"name": "NewTestROI"}})
+    rt_ss = add_contours_to_roi(rt_ss, "NewTestROI", roi_list[30:35])
+    rt_ss = create_roi(rt_ss, "NewTestROI", roi_list[35:])
+
+    assert len(rt_ss.StructureSetROISequence) == 2
+    assert len(rt_ss.ROIContourSequence) == 2
+    assert rt_ss.ROIContourSequence[1].ReferencedROINumber == 2
+    contour_sequence = rt_ss.ROIContourSequence[1].ContourSequence
+    assert [contour.ContourNumber for contour in contour_sequence] == \
+        list(range(1, 41))
+    assert [contour.ContourImageSequence[0].ReferencedSOPInstanceUID
+            for contour in contour_sequence] == \
+        [roi_info['ds'].SOPInstanceUID for roi_info in roi_list]
+    assert all(contour.NumberOfContourPoints == 3
+               for contour in contour_sequence)
+
+    # The same contours as adding them one at a time
+    single_rtss = dataset.Dataset()
+    single_rtss.StructureSetROISequence = []
+    single_rtss.ROIContourSequence = []
+    single_rtss.RTROIObservationsSequence = []
+    patient_dict_container.set("rois", {})
+    single_rtss = create_roi(single_rtss, "NewTestROI", roi_list[:1])
+    for roi_info in roi_list[1:]:
+        single_rtss = add_to_roi(single_rtss, "NewTestROI",
+                                 roi_info['coords'], roi_info['ds'])
+    assert list(single_rtss.ROIContourSequence[0].ContourSequence) == \
+        list(contour_sequence)
+
+
+def square(x_min, y_min, x_max, y_max):
+    """Axial contour pixels of a square."""
+    return [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+
+
+def test_transform_rois_contours():
+    """
+    Tests that the coronal and sagittal contours outline the ROI on each
+    line, including where it is concave.
+    """
+    uids = ["1.2.%d" % i for i in range(8)]
+    patient_dict_container = PatientDictContainer()
+    patient_dict_container.set_initial_values(
+        None, None, None, dict_uid=dict(enumerate(uids)))
+    # A box on slices 1 to 3 and a narrower box on slices 4 to 6
+    axial_contours = {uid: [] for uid in uids}
+    for i in range(1, 4):
+        axial_contours[uids[i]] = [square(10, 30, 20, 40)]
+    for i in range(4, 7):
+        axial_contours[uids[i]] = [square(10, 30, 12, 40)]
+
+    coronal, sagittal = transform_rois_contours({"ROI": axial_contours})
+    assert sorted(coronal["ROI"]) == list(range(30, 41))
+    assert sorted(sagittal["ROI"]) == list(range(10, 21))
+
+    outline = Polygon(coronal["ROI"][35][0])
+    assert np.allclose(outline.bounds, (10, 1, 20, 6))
+    assert outline.contains(Point(15, 2))
+    assert outline.contains(Point(11, 5))
+    assert not outline.contains(Point(15, 5))
+
+    assert len(sagittal["ROI"][15]) == 1
+    assert np.allclose(Polygon(sagittal["ROI"][15][0]).bounds,
+                       (30, 1, 40, 3))
+
+
+def test_resliced_roi_contours_are_cached():
+    """
+    Tests that an ROI is only resliced again once its contour data
+    changes.
+    """
+    uids = ["1.2.%d" % i for i in range(3)]
+    patient_dict_container = PatientDictContainer()
+    patient_dict_container.set_initial_values(
+        None, None, None, dict_uid=dict(enumerate(uids)),
+        raw_contour={"ROI": {}})
+    axial_contours = {"ROI": {uid: [square(1, 1, 4, 4)] for uid in uids}}
+
+    coronal, sagittal = get_resliced_roi_contours(
+        "ROI", axial_contours, patient_dict_container)
+    again = get_resliced_roi_contours("ROI", axial_contours,
+                                      patient_dict_container)
+    assert again[0] is coronal and again[1] is sagittal
+
+    patient_dict_container.set("raw_contour", {"ROI": {}})
+    axial_contours["ROI"][uids[2]] = []
+    changed = get_resliced_roi_contours("ROI", axial_contours,
+                                        patient_dict_container)
+    assert changed[0] is not coronal
+    assert np.allclose(Polygon(changed[0][2][0]).bounds, (1, 0, 4, 1))
+
+
+def roi_polygons_container():
+    """
+    Sets up PatientDictContainer with an ROI drawn as a square on the
+    middle three of five 512x512 slices.
+    """
+    uids = ["1.2.%d" % i for i in range(5)]
+    image = dataset.Dataset()
+    image.Rows = 512
+    pixlut = (list(np.arange(512) * 0.5 - 128), list(np.arange(512) * 0.5))
+    raw_contour = {"ROI": {uid: [[10, 20, i, 30, 20, i, 30, 40, i,
+                                  10, 40, i]]
+                           for i, uid in enumerate(uids[1:4])}}
+    patient_dict_container = PatientDictContainer()
+    patient_dict_container.set_initial_values(
+        None, {0: image}, None, dict_uid=dict(enumerate(uids)),
+        raw_contour=raw_contour, pixluts={uid: pixlut for uid in uids})
+    return patient_dict_container, uids
+
+
+def test_roi_polygons_match_calc_roi_polygon():
+    """
+    Tests that the polygons calculated on demand are the ones calculated
+    for every slice before, and that each slice is calculated once.
+    """
+    patient_dict_container, uids = roi_polygons_container()
+    dict_rois_contours = get_roi_contour_pixel(
+        patient_dict_container.get("raw_contour"), ["ROI"],
+        patient_dict_container.get("pixluts"))
+
+    roi_polygons = ROIPolygons("ROI", "axial", uids, 1, SliceLRUCache(),
+                               patient_dict_container)
+    assert list(roi_polygons) == uids
+    for uid in uids:
+        assert [polygon.toList() for polygon in roi_polygons[uid]] == \
+               [polygon.toList() for polygon in
+                calc_roi_polygon("ROI", uid, dict_rois_contours)]
+    assert roi_polygons[uids[2]]
+    assert roi_polygons[uids[2]] is roi_polygons[uids[2]]
+    with pytest.raises(KeyError):
+        roi_polygons["1.2.9"]
+
+    coronal = ROIPolygons("ROI", "coronal", range(512), 2, SliceLRUCache(),
+                          patient_dict_container)
+    assert coronal.dict_rois_contours is None
+    coronal_contours = get_resliced_roi_contours(
+        "ROI", dict_rois_contours, patient_dict_container)[0]
+    assert coronal[60]
+    for line in (0, 60, 70, 200):
+        assert [polygon.toList() for polygon in coronal[line]] == \
+               [polygon.toList() for polygon in
+                calc_roi_polygon("ROI", line, {"ROI": coronal_contours}, 2)]
+
+
+def test_roi_polygons_prefetch():
+    """
+    Tests that prefetching calculates the neighbouring slices only, and
+    that polygons of a replaced ROIPolygons are not reused.
+    """
+    patient_dict_container, uids = roi_polygons_container()
+    cache = get_roi_polygon_cache(patient_dict_container)
+    assert cache.max_size == ROI_POLYGON_CACHE_SIZE
+    assert get_roi_polygon_cache(patient_dict_container) is cache
+    roi_polygons = ROIPolygons("ROI", "axial", uids, 1, cache,
+                               patient_dict_container)
+    roi_polygons.prefetch(uids[0], radius=2)
+    assert [roi_polygons.is_cached(uid) for uid in uids] == \
+           [False, True, True, False, False]
+
+    replaced = ROIPolygons("ROI", "axial", uids, 1, cache,
+                           patient_dict_container)
+    assert not replaced.is_cached(uids[1])
+
+
 def test_roi_to_geometry(test_object):
     roi_names = [roi['name']
                  for roi in test_object.
@@ -2,7 +2,9 @@ import os
 import numpy
 import pytest
 
+from src.Model.CalculateImages import convert_raw_data, get_image_keys
 from src.Model.SUV2ROI import SUV2ROI
+from src.Model.SUVVolume import get_image_suv_volume, get_weight_over_dose
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model import ImageLoading
 
@@ -102,35 +104,44 @@ def test_calculate_suv_values(test_object):
     :param test_object: test_object function, for accessing the shared
                         TestStructureTab object.
     """
-    datasets = []
-
-    # Loop through each dataset in PT CTAC, append them to datasets
-    for ds in test_object.dicom_files["PT CTAC"]:
-        datasets.append(ds)
+    patient_dict_container = test_object.patient_dict_container
+    dataset = patient_dict_container.dataset
+    keys = get_image_keys(dataset)
+    pixel_arrays = [dataset[key].pixel_array.copy() for key in keys]
+
+    # Load the pixel values rescaled, as for display
+    patient_dict_container.set("pixel_values",
+                               convert_raw_data(dataset, False))
+    patient_dict_container.set("scaled", True)
+
+    # Calculate SUV values
+    patient_weight = test_object.suv2roi.patient_weight
+    suv_volume, failure_reason = get_image_suv_volume(patient_weight)
+    assert failure_reason is None
+    weight_over_dose = get_weight_over_dose(dataset[keys[0]],
+                                            patient_weight)
 
     # Loop through each dataset, perform tests
-    for ds in datasets:
-        # Calculate SUV values
-        suv_values = test_object.suv2roi.pet2suv(ds)
+    for key, pixel_array, suv_values in zip(keys, pixel_arrays,
+                                            suv_volume):
         test_object.suv_data.append(suv_values)
 
-        # Assert that there are SUV values, and that there are the same
-        # amount of SUV values as there are pixels in the dataset
-        assert len(suv_values) == len(ds.pixel_array)
+        # Assert that there are the same amount of SUV values as there
+        # are pixels in the dataset
+        assert suv_values.shape == pixel_array.shape
 
         # Manually SUV values
         # Get data necessary for Bq/ml to SUV calculation
-        rescale_slope = ds.RescaleSlope
-        rescale_intercept = ds.RescaleIntercept
-        pixel_array = ds.pixel_array
+        rescale_slope = dataset[key].RescaleSlope
+        rescale_intercept = dataset[key].RescaleIntercept
 
         # Convert Bq/ml to SUV
         suv = (pixel_array * rescale_slope + rescale_intercept) \
-            * test_object.suv2roi.weight_over_dose
+            * weight_over_dose
 
         # Assert that manually-generated SUV values are the same as
-        # code-generated SUV values
-        assert numpy.array_equal(suv_values, suv)
+        # code-generated SUV values, which are single precision
+        assert numpy.allclose(suv_values, suv, rtol=1e-6)
 
 
 @pytest.mark.skip()
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from pydicom.dataset import Dataset
+from pydicom.uid import generate_uid
+
+from src.Model.CalculateImages import convert_raw_data
+from src.Model.SUVVolume import get_image_suv_volume, \
+    get_suv_failure_reason, get_suv_volume, get_weight_over_dose
+
+
+def create_pet_dataset(pixels, slope, intercept=0.0):
+    """A PET image in Bq/mL which is attenuation and decay corrected."""
+    ds = Dataset()
+    ds.SOPInstanceUID = generate_uid()
+    ds.Units = "BQML"
+    ds.CorrectedImage = ["ATTN", "DECY"]
+    ds.DecayCorrection = "START"
+    ds.RescaleSlope = slope
+    ds.RescaleIntercept = intercept
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    radiopharmaceutical_info = Dataset()
+    radiopharmaceutical_info.RadionuclideTotalDose = 350000000
+    ds.RadiopharmaceuticalInformationSequence = [radiopharmaceutical_info]
+    ds.convert_pixel_data = lambda: None
+    ds._pixel_array = pixels
+    return ds
+
+
+def add_pet_slices(container, scaled):
+    """
+    Adds 5 PET slices to a FakeDictContainer.
+    :return: The raw pixels and the rescale slope of each slice.
+    """
+    rng = np.random.default_rng(0)
+    raw = rng.integers(0, 32767, size=(5, 16, 12), dtype=np.int16)
+    slopes = [0.5, 1.25, 2.0, 0.75, 4.0]
+    container.dataset.update(
+        {i: create_pet_dataset(raw[i].copy(), slope)
+         for i, slope in enumerate(slopes)})
+    if scaled:
+        container.set("scaled", True)
+    container.set("pixel_values",
+                  convert_raw_data(container.dataset, not scaled))
+    return raw, slopes
+
+
+@pytest.mark.parametrize("scaled", [True, False])
+def test_suv_volume_matches_slices(scaled, fake_dict_container):
+    """
+    Tests that the SUV volume is the same as converting each slice, both
+    from pixel values that were rescaled for display and that were not.
+    """
+    container = fake_dict_container()
+    raw, slopes = add_pet_slices(container, scaled)
+    suv_volume, failure_reason = get_image_suv_volume(70000, container)
+    assert failure_reason is None
+    assert suv_volume.dtype == np.float32
+    assert suv_volume.shape == raw.shape
+
+    weight_over_dose = get_weight_over_dose(container.dataset[0], 70000)
+    for i, slope in enumerate(slopes):
+        suv = raw[i] * slope * weight_over_dose
+        assert np.allclose(suv_volume[i], suv, rtol=1e-6)
+
+    assert get_image_suv_volume(70000, container)[0] is suv_volume
+    assert get_image_suv_volume(80000, container)[0] is not suv_volume
+
+    # Another series is converted, even if its datasets are reused
+    suv_volume = get_image_suv_volume(70000, container)[0]
+    container.dataset[2].SOPInstanceUID = generate_uid()
+    assert get_image_suv_volume(70000, container)[0] is not suv_volume
+
+
+def test_suv_volume_with_intercept():
+    """Tests that the rescale intercept of every slice is applied."""
+    pixels = np.arange(6, dtype=np.int16).reshape(2, 1, 3)
+    datasets = [create_pet_dataset(pixels[0], 2.0, 10.0),
+                create_pet_dataset(pixels[1], 3.0, -1.0)]
+    suv_volume = get_suv_volume(datasets, pixels, False, 0.5)
+    assert np.array_equal(suv_volume,
+                          [[[5, 6, 7]], [[4, 5.5, 7]]])
+
+
+def test_suv_failure_reason(fake_dict_container):
+    """Tests that images which cannot be converted to SUV are rejected."""
+    ds = create_pet_dataset(np.zeros((2, 2)), 1.0)
+    assert get_suv_failure_reason(ds, 70000) is None
+    assert get_suv_failure_reason(ds, None) == "WEIGHT"
+
+    ds.CorrectedImage = ["ATTN"]
+    ds.DecayCorrection = "ADMIN"
+    assert get_suv_failure_reason(ds, 70000) == "DECY"
+
+    ds.Units = "CNTS"
+    assert get_suv_failure_reason(ds, 70000) == "UNIT"
+
+    container = fake_dict_container()
+    add_pet_slices(container, True)
+    container.dataset[3].Units = "CNTS"
+    assert get_image_suv_volume(70000, container) == (None, "UNIT")
@@ -1,13 +1,23 @@
 import os
+import numpy
 import pytest
 from pathlib import Path
 
 from PySide6.QtCore import Qt
+from PySide6.QtGui import QImage, QPixmap
 from pydicom import dcmread
+from pydicom.dataset import Dataset, FileMetaDataset
 from pydicom.errors import InvalidDicomError
+from pydicom.uid import ExplicitVRLittleEndian
 from src.Controller.GUIController import MainWindow
+from src.Controller.ROIOptionsController import RoiDrawOptions
 from src.Model import ImageLoading
 from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.RegionGrowing import pixel_coords_to_mask
+from src.View.mainpage.DrawROIWindow.Drawing import Drawing
+
+from test_model_drawing_mask import legacy_painted_pixels
+from test_model_region_growing import create_slice, legacy_region_growing
 
 
 def find_DICOM_files(file_path):
@@ -167,3 +177,191 @@ def test_roi_windowing(qtbot, test_object):
     assert existing_view != new_view
 
     assert draw_roi_window.dicom_view.label_wl.text() == f"W/L: {str(new_window)}/{str(new_level)}"
+
+
+def test_fill_region(qtbot):
+    """
+    Tests that filling from a seed selects the pixels the breadth first
+    search did, and blends the drawn colour into those pixels only.
+    """
+    pixel_array = create_slice(size=512)
+    dataset = Dataset()
+    dataset.Rows = 512
+    dataset.Columns = 512
+    dataset._pixel_array = pixel_array
+    grey = numpy.clip(pixel_array // 8 + 64, 0, 255).astype(numpy.uint8)
+    q_image = QImage(grey.data, 512, 512, 512, QImage.Format_Grayscale8)
+
+    drawing = Drawing(QPixmap.fromImage(q_image), pixel_array.transpose(),
+                      800, 1600, dataset, None, False, 0, 19, False, 0.5, 5,
+                      xy=[256, 256])
+    assert drawing._display_pixel_color()
+    assert drawing.target_pixel_coords == legacy_region_growing(
+        pixel_array, (256, 256), 800, 1600, (0, 0, 512, 512), 5, set())
+
+    for x, y in [(256, 256), (200, 300), (5, 5), (500, 20)]:
+        old = int(grey[y, x])
+        if (x, y) in drawing.target_pixel_coords:
+            expected = (int(255 * 0.5 + old * 0.5), int(old * 0.5),
+                        int(old * 0.5), 255)
+        else:
+            expected = (old, old, old, 255)
+        assert drawing.q_image.pixelColor(x, y).getRgb() == expected
+
+
+def test_brush(qtbot):
+    """
+    Tests that painting and erasing with the brush changes the pixels the
+    per-pixel loops did, and only repaints the changed part of the image.
+    """
+    pixel_array = create_slice(size=512)
+    dataset = Dataset()
+    dataset.Rows = 512
+    dataset.Columns = 512
+    dataset._pixel_array = pixel_array
+    grey = numpy.clip(pixel_array // 8 + 64, 0, 255).astype(numpy.uint8)
+    q_image = QImage(grey.data, 512, 512, 512, QImage.Format_Grayscale8)
+
+    drawing = Drawing(QPixmap.fromImage(q_image), pixel_array.transpose(),
+                      800, 1600, dataset, None, False, 0, 10, True, 0.5, 5,
+                      xy=[256, 256])
+    drawing._display_pixel_color()
+    expected = set(drawing.target_pixel_coords)
+
+    drawing.fill_pixels_within_circle(100, 120)
+    drawing.fill_pixels_within_circle(104, 121)
+    expected |= legacy_painted_pixels((100, 120), 10, (0, 0, 512, 512))
+    expected |= legacy_painted_pixels((104, 121), 10, (0, 0, 512, 512))
+    assert drawing.target_pixel_coords == expected
+    assert drawing.q_image.pixelColor(100, 120).red() == \
+           int(255 * 0.5 + grey[120, 100] * 0.5)
+
+    drawing.draw_tool_radius = 6.5
+    drawing.remove_pixels_within_circle(256, 256)
+    drawing.remove_pixels_within_circle(102, 121)
+    for center in [(256, 256), (102, 121)]:
+        expected = {pixel for pixel in expected
+                    if numpy.hypot(pixel[0] - center[0],
+                                   pixel[1] - center[1]) > 6.5}
+    assert drawing.target_pixel_coords == expected
+    assert numpy.array_equal(drawing.target_mask,
+                             pixel_coords_to_mask(expected, (512, 512)))
+    assert drawing.q_image.pixelColor(256, 256).getRgb() == \
+           (grey[256, 256], grey[256, 256], grey[256, 256], 255)
+
+    assert drawing.q_pixmaps.pixmap().toImage().convertToFormat(
+        QImage.Format_RGB32) == drawing.q_image
+
+
+def test_set_target_mask(qtbot):
+    """
+    Tests that replacing the highlighted pixels, as undoing does, restores
+    the colour of the pixels which are no longer highlighted.
+    """
+    pixel_array = create_slice(size=512)
+    dataset = Dataset()
+    dataset.Rows = 512
+    dataset.Columns = 512
+    dataset._pixel_array = pixel_array
+    grey = numpy.clip(pixel_array // 8 + 64, 0, 255).astype(numpy.uint8)
+    q_image = QImage(grey.data, 512, 512, 512, QImage.Format_Grayscale8)
+    target_mask = numpy.zeros((512, 512), dtype=bool)
+    target_mask[100:110, 200:230] = True
+
+    drawing = Drawing(QPixmap.fromImage(q_image), pixel_array.transpose(),
+                      800, 1600, dataset, None, False, 0, 10, True, 0.5, 5,
+                      target_mask)
+    drawing.update_dicom_image()
+    assert drawing.target_pixel_coords == \
+           {(x, y) for x in range(200, 230) for y in range(100, 110)}
+    assert drawing.q_image.pixelColor(205, 105).red() == \
+           int(255 * 0.5 + grey[105, 205] * 0.5)
+
+    drawing.fill_pixels_within_circle(300, 300)
+    drawing.set_target_mask(target_mask)
+    assert numpy.array_equal(drawing.target_mask, target_mask)
+    assert drawing.q_image.pixelColor(300, 300).getRgb() == \
+           (grey[300, 300], grey[300, 300], grey[300, 300], 255)
+    assert drawing.q_pixmaps.pixmap().toImage().convertToFormat(
+        QImage.Format_RGB32) == drawing.q_image
+
+
+@pytest.fixture
+def draw_roi_window(qtbot):
+    """
+    A Draw ROI window of 5 64x64 slices, where only slice 2 has pixels
+    of 1000. The patient loaded before is restored afterwards.
+    """
+    patient_dict_container = PatientDictContainer()
+    loaded = (patient_dict_container.path, patient_dict_container.dataset,
+              patient_dict_container.filepaths,
+              patient_dict_container.additional_data)
+    datasets = {}
+    for i in range(5):
+        dataset = Dataset()
+        dataset.Rows = 64
+        dataset.Columns = 64
+        dataset.SOPInstanceUID = "1.2.%d" % i
+        dataset.SOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+        dataset.ImagePositionPatient = [0, 0, i]
+        dataset.PixelSpacing = [1, 1]
+        dataset.InstanceNumber = i + 1
+        dataset.PatientPosition = "HFS"
+        dataset.file_meta = FileMetaDataset()
+        dataset.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        dataset.BitsAllocated = 16
+        dataset.BitsStored = 16
+        dataset.HighBit = 15
+        dataset.PixelRepresentation = 1
+        dataset.SamplesPerPixel = 1
+        dataset.PhotometricInterpretation = "MONOCHROME2"
+        pixel_array = numpy.zeros((64, 64), dtype=numpy.int16)
+        if i == 2:
+            pixel_array[20:40, 25:45] = 1000
+        dataset.PixelData = pixel_array.tobytes()
+        dataset.convert_pixel_data()
+        datasets[i] = dataset
+    q_image = QImage(64, 64, QImage.Format_Grayscale8)
+    q_image.fill(0)
+    patient_dict_container.set_initial_values("", datasets, {})
+    patient_dict_container.set("pixmaps_axial",
+                               [QPixmap.fromImage(q_image)] * 5)
+    patient_dict_container.set("window", 400)
+    patient_dict_container.set("level", 40)
+    patient_dict_container.set("dict_uid",
+                               {i: "1.2.%d" % i for i in range(5)})
+    patient_dict_container.set("rois", {})
+    patient_dict_container.set("selected_rois", [])
+    patient_dict_container.set("selected_doses", [])
+    try:
+        yield RoiDrawOptions({}, Dataset())
+    finally:
+        patient_dict_container.set_initial_values(*loaded[:3],
+                                                  **(loaded[3] or {}))
+
+
+def test_3d_fill_of_seed_slice_only(qtbot, draw_roi_window):
+    """
+    Tests that a 3D fill which only reaches the slice of the seed is kept
+    when the slice is left, rather than replaced by the empty drawing the
+    seed was selected on.
+    """
+    draw_roi_window.dicom_view.slider.setValue(2)
+    draw_roi_window.min_pixel_density_line_edit.setText("500")
+    draw_roi_window.max_pixel_density_line_edit.setText("1500")
+    draw_roi_window.internal_hole_max_line_edit.setText("0")
+    draw_roi_window.onFillClicked(True)
+
+    draw_roi_window.seed = [35, 30]
+    last_slice = draw_roi_window.process_3D_roi(
+        500, 1500, 2, 0, (0, 0, 64, 64))
+    assert last_slice == 2
+    draw_roi_window.show_3D_roi(last_slice)
+    assert draw_roi_window.drawingROI.target_mask[30, 35]
+
+    draw_roi_window.dicom_view.slider.setValue(3)
+    expected = numpy.zeros((64, 64), dtype=bool)
+    expected[20:40, 25:45] = True
+    assert numpy.array_equal(draw_roi_window.drawing_mask.get_slice(2),
+                             expected)
+    assert draw_roi_window.drawing_mask.drawn_slices() == [2]
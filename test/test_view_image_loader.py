@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import Future
+
+from src.View.ImageLoader import DeferredProgress, ImageLoader
+
+
+def test_wait_for_dvh_advice():
+    """
+    Tests that waiting for the DVH advice returns once the user has
+    answered, and stops when loading is interrupted instead.
+    """
+    image_loader = ImageLoader([], None, None)
+    interrupt_flag = threading.Event()
+    timer = threading.Timer(0.2, image_loader.update_calc_dvh, [True])
+    timer.start()
+    assert image_loader.wait_for_dvh_advice(interrupt_flag)
+    assert image_loader.calc_dvh
+
+    image_loader = ImageLoader([], None, None)
+    interrupt_flag.set()
+    assert not image_loader.wait_for_dvh_advice(interrupt_flag)
+
+
+def test_wait_for_dvhs():
+    """
+    Tests that waiting for the speculative DVH calculation returns its
+    result, or None when loading is interrupted first.
+    """
+    interrupt_flag = threading.Event()
+    dvh_future = Future()
+    timer = threading.Timer(0.2, dvh_future.set_result, [({}, {})])
+    timer.start()
+    assert ImageLoader.wait_for_dvhs(dvh_future, interrupt_flag) == ({}, {})
+
+    interrupt_flag.set()
+    assert ImageLoader.wait_for_dvhs(Future(), interrupt_flag) is None
+
+
+def test_deferred_progress(fake_signal):
+    """
+    Tests that the progress of the speculative DVH calculation is only
+    shown once the DVHs are wanted, starting from the latest progress.
+    """
+    progress_callback = fake_signal()
+    dvh_progress = DeferredProgress(progress_callback)
+    calculation = threading.Thread(target=lambda: [
+        dvh_progress.emit(("Calculating DVHs... (%d/4)" % i, 60 + 5 * i))
+        for i in range(1, 3)])
+    calculation.start()
+    calculation.join()
+    assert progress_callback.values == []
+
+    dvh_progress.start()
+    dvh_progress.emit(("Calculating DVHs... (3/4)", 75))
+    assert progress_callback.values == [("Calculating DVHs... (2/4)", 70),
+                                        ("Calculating DVHs... (3/4)", 75)]